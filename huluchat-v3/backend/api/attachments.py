@@ -0,0 +1,92 @@
+"""Attachment download API"""
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_session as get_db_session
+from models.attachments import AttachmentModel
+from services.blob_store import blob_store, is_digest
+
+router = APIRouter()
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into inclusive (start, end).
+
+    Returns:
+        None to serve the whole blob (no header, or a multi-range request)
+
+    Raises:
+        ValueError: The range cannot be satisfied
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        # Multiple ranges or another unit: ignoring the header is allowed
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError("Empty range")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+@router.get("/{attachment_id}", name="download_attachment")
+async def download_attachment(
+    attachment_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db_session),
+):
+    """Download an attachment blob. Supports single Range requests."""
+    if not is_digest(attachment_id):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    attachment = await db.get(AttachmentModel, attachment_id)
+    if attachment is None or not blob_store.exists(attachment_id):
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    size = attachment.size
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Content-addressed, so the content never changes
+        "ETag": f'"{attachment_id}"',
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None or size == 0:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    # A sync iterator, so blob reads run in the threadpool
+    body = blob_store.iter_range(attachment_id, start, end) if size else iter(())
+    return StreamingResponse(
+        body,
+        status_code=status_code,
+        media_type=attachment.mime_type,
+        headers=headers,
+    )
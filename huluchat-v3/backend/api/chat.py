@@ -3,20 +3,55 @@ import uuid
 import json
 import logging
 import asyncio
+from contextlib import aclosing
+from dataclasses import dataclass
 from datetime import datetime
+from functools import partial
 from typing import Optional, List
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from core.config import settings
 from core.database import get_session as get_db_session
 from core.security import sanitize_error_message, get_safe_error_type
-from models.schemas import MessageModel
+from api.sessions import SessionModel
+from api.settings import get_context_length, get_image_max_dimension
+from models.schemas import (
+    MessageModel,
+    MESSAGE_STATUS_CANCELLED,
+    MESSAGE_STATUS_COMPLETE,
+    MESSAGE_STATUS_ERROR,
+    MESSAGE_STATUS_STREAMING,
+)
 from sqlalchemy import delete as sql_delete
-from services.openai_service import openai_service
+from services.openai_service import TokenUsage, openai_service
 from services.ollama_service import ollama_service
+from services.usage import record_usage
+from services.pagination import KeysetPage, keyset_page
+from services.metrics import first_token_seconds, generation_tokens_per_second, turns_in_flight
+from services.tracing import current_trace, span, trace_recorder
 from services.mcp_service import mcp_service
+from services.context_window import build_context_window, compute_history_budget, estimate_text_tokens
+from services.attachment_text import extract_attachments_text
+from services.attachments import (
+    files_for_client,
+    images_for_client,
+    images_for_context,
+    release_references,
+    store_files,
+    store_images,
+    stored_files_text,
+)
+from services.history_cache import history_cache
+from services.image_pipeline import apply_image_placeholders, prepare_images
+from services.message_checkpoint import MessageCheckpoint
+from services.stream_coalescer import CoalesceConfig, StreamCoalescer
+from services.ws_outbound import OutboundQueue
+from services.stream_registry import GenerationStream, stream_registry
+from services.stream_guard import StreamStalled, guard_stream
+from services.hedging import first_token_latency, hedge_delay, hedged_stream
 from services.mcp_tool_adapter import (
     mcp_tools_to_openai_format,
     parse_mcp_tool_call,
@@ -30,6 +65,13 @@ logger = logging.getLogger(__name__)
 # WebSocket heartbeat configuration
 WEBSOCKET_PING_INTERVAL = 30  # seconds
 WEBSOCKET_PING_TIMEOUT = 10   # seconds to wait for pong response
+# Seconds a disconnected turn gets to save its partial response
+TURN_SHUTDOWN_TIMEOUT = 5
+# How often a detached turn checks whether a client resumed it
+STREAM_RESUME_POLL_INTERVAL = 1
+
+# Max number of recent messages loaded as candidates for the context window
+CONTEXT_HISTORY_MAX_MESSAGES = 200
 
 
 def get_service_for_model(model: Optional[str]):
@@ -49,23 +91,172 @@ def get_service_for_model(model: Optional[str]):
         return openai_service, model
 
 
+def _resolve_model(model_id: str, service_kwargs: dict):
+    """Get the service for a model and the stream_chat kwargs it accepts."""
+    service, model_name = get_service_for_model(model_id)
+    kwargs = {**service_kwargs, "model": model_name}
+    if service is ollama_service:
+        # Ollama takes neither max_tokens nor MCP tools
+        kwargs.pop("max_tokens", None)
+        kwargs.pop("tools", None)
+    return service, kwargs
+
+
+class HedgedService:
+    """Chat service stand-in that hedges a model with an alternate one.
+
+    The first stream_chat() call races the two models (see
+    services.hedging); later calls of the same turn (tool call
+    continuations) go to the model that answered.
+    """
+
+    def __init__(self, model_id: str, hedge_model_id: str, on_hedge_win=None):
+        self.model_id = model_id
+        self.hedge_model_id = hedge_model_id
+        self.on_hedge_win = on_hedge_win
+        self.answered_by: Optional[str] = None
+
+    async def stream_chat(self, **kwargs):
+        if self.answered_by is not None:
+            service, kwargs = _resolve_model(self.answered_by, kwargs)
+            async with aclosing(service.stream_chat(**kwargs)) as stream:
+                async for chunk in stream:
+                    yield chunk
+            return
+
+        primary, primary_kwargs = _resolve_model(self.model_id, kwargs)
+        hedge, hedge_kwargs = _resolve_model(self.hedge_model_id, kwargs)
+        self.answered_by = self.model_id
+
+        async def hedge_won():
+            self.answered_by = self.hedge_model_id
+            if self.on_hedge_win is not None:
+                await self.on_hedge_win(self.hedge_model_id)
+
+        stream = hedged_stream(
+            lambda: primary.stream_chat(**primary_kwargs),
+            lambda: hedge.stream_chat(**hedge_kwargs),
+            hedge_delay(self.model_id),
+            self.model_id,
+            hedge_won,
+        )
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk
+
+
 class ConnectionManager:
-    """Manage WebSocket connections."""
+    """Manage WebSocket connections.
+
+    Each connection has a bounded outbound queue drained by its own writer
+    task, so send_json() never waits on the client socket. A client that
+    falls so far behind that its queue cannot absorb more messages (even
+    after merging text deltas) is disconnected.
+    """
 
-    def __init__(self):
+    def __init__(self, queue_size: Optional[int] = None):
         self.active_connections: dict[str, WebSocket] = {}
+        self.queue_size = queue_size or settings.ws_outbound_queue_size
+        self._queues: dict[str, OutboundQueue] = {}
+        self._writers: dict[str, asyncio.Task] = {}
+        self.slow_consumer_disconnects = 0
 
     async def connect(self, websocket: WebSocket, session_id: str):
         await websocket.accept()
+        # A new connection for the same session replaces the old one
+        self._stop_writer(session_id)
+        queue = OutboundQueue(self.queue_size)
         self.active_connections[session_id] = websocket
+        self._queues[session_id] = queue
+        self._writers[session_id] = asyncio.create_task(
+            self._writer(session_id, websocket, queue)
+        )
 
-    def disconnect(self, session_id: str):
+    def disconnect(self, session_id: str, websocket: Optional[WebSocket] = None):
+        """Forget a connection.
+
+        Args:
+            session_id: Session ID
+            websocket: If given, only disconnect when it is still the active
+                connection (a reconnect may already have replaced it)
+        """
+        if websocket is not None and self.active_connections.get(session_id) is not websocket:
+            return
+        self._stop_writer(session_id)
         if session_id in self.active_connections:
             del self.active_connections[session_id]
 
     async def send_json(self, session_id: str, data: dict):
-        if session_id in self.active_connections:
-            await self.active_connections[session_id].send_json(data)
+        """Queue a message for the session's client without waiting on the socket."""
+        queue = self._queues.get(session_id)
+        if queue is None:
+            return
+        if not queue.put_nowait(data):
+            self._drop_slow_consumer(session_id)
+
+    def get_metrics(self) -> dict:
+        """Outbound queue metrics for all connections."""
+        per_session = {
+            session_id: {
+                "depth": queue.depth,
+                "max_depth": queue.max_depth,
+                "enqueued": queue.enqueued,
+                "sent": queue.sent,
+                "merged": queue.merged,
+            }
+            for session_id, queue in self._queues.items()
+        }
+        depths = [q["depth"] for q in per_session.values()]
+        return {
+            "connections": len(per_session),
+            "queue_capacity": self.queue_size,
+            "total_queue_depth": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "merged_frames": sum(q["merged"] for q in per_session.values()),
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "sessions": per_session,
+        }
+
+    async def _writer(self, session_id: str, websocket: WebSocket, queue: OutboundQueue):
+        """Drain the outbound queue onto the socket."""
+        try:
+            while True:
+                data = await queue.get()
+                if data is None:
+                    break
+                await websocket.send_json(data)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"WebSocket writer for {session_id} stopped: {e}")
+            queue.close()
+
+    def _stop_writer(self, session_id: str):
+        queue = self._queues.pop(session_id, None)
+        if queue is not None:
+            queue.close()
+        writer = self._writers.pop(session_id, None)
+        if writer is not None and not writer.done():
+            writer.cancel()
+
+    def _drop_slow_consumer(self, session_id: str):
+        """Disconnect a client whose outbound queue overflowed."""
+        websocket = self.active_connections.get(session_id)
+        self.slow_consumer_disconnects += 1
+        logger.warning(f"Outbound queue full for session {session_id}, disconnecting slow client")
+        self.disconnect(session_id)
+        if websocket is not None:
+            asyncio.create_task(self._close_quietly(websocket))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=1013, reason="Client too slow"),
+                timeout=WEBSOCKET_PING_TIMEOUT,
+            )
+        except Exception:
+            pass
 
 
 manager = ConnectionManager()
@@ -76,97 +267,83 @@ async def get_session_messages(
     session_id: str,
     limit: int = 50
 ) -> list[dict]:
-    """Get message history for a session.
+    """Get the most recent message history for a session.
+
+    Loads the newest `limit` messages and returns them in chronological order.
+    Warm sessions are served from the in-memory history cache.
 
     Returns messages in OpenAI format:
     - Text only: {"role": "user", "content": "text"}
     - With images: {"role": "user", "content": [{"type": "text", ...}, {"type": "image_url", ...}]}
     - With files: File content is extracted and appended to text content
     """
+    cached = history_cache.get(session_id, limit)
+    if cached is not None:
+        return cached
+
     result = await db.execute(
         select(MessageModel)
         .where(MessageModel.session_id == session_id)
-        .order_by(MessageModel.created_at.asc())
+        # Replies still being generated are not part of the context yet
+        .where(MessageModel.status != MESSAGE_STATUS_STREAMING)
+        .order_by(MessageModel.seq.desc())
         .limit(limit)
     )
-    messages = result.scalars().all()
-
-    formatted = []
-    for m in messages:
-        msg = {"role": m.role}
-        content = m.content
-
-        # Handle file attachments - extract text content for AI context
-        if m.files:
-            try:
-                files = json.loads(m.files)
-                file_context = _extract_file_context(files)
-                if file_context:
-                    content = f"{content}\n\n{file_context}" if content else file_context
-            except json.JSONDecodeError:
-                pass
-
-        if m.images:
-            # Multimodal message with images
-            try:
-                images = json.loads(m.images)
-                msg["content"] = [{"type": "text", "text": content}] + images
-            except json.JSONDecodeError:
-                msg["content"] = content
-        else:
-            # Text only message (may include extracted file content)
+    messages = list(reversed(result.scalars().all()))
+
+    formatted = [format_message_for_context(m) for m in messages]
+    history_cache.set(session_id, formatted, complete=len(messages) < limit)
+    return list(formatted)
+
+
+def format_message_for_context(m: MessageModel) -> dict:
+    """Convert a stored message to OpenAI chat format."""
+    msg = {"role": m.role}
+    content = m.content
+
+    # Handle file attachments - text is extracted once when the message is
+    # saved; rows saved before that are extracted on the fly
+    file_context = m.file_context
+    if file_context is None and m.files:
+        file_context = _extract_file_context(m.files)
+    if file_context:
+        content = f"{content}\n\n{file_context}" if content else file_context
+
+    if m.images:
+        # Multimodal message with images
+        try:
+            images = images_for_context(json.loads(m.images))
+            msg["content"] = [{"type": "text", "text": content}] + images
+        except json.JSONDecodeError:
             msg["content"] = content
-        formatted.append(msg)
-
-    return formatted
+    else:
+        # Text only message (may include extracted file content)
+        msg["content"] = content
+    return msg
 
 
-def _extract_file_context(files: list[dict]) -> str:
-    """Extract readable context from file attachments.
+def get_history_token_budget(model: Optional[str], max_tokens: Optional[int] = None) -> int:
+    """Get the prompt token budget for a chat turn with the given model.
 
-    For text files, decode and include content.
-    For binary files, include metadata only.
+    Args:
+        model: Requested model identifier (None for the default model)
+        max_tokens: Requested completion size, defaults to settings.max_tokens
     """
-    contexts = []
-    for file in files:
-        name = file.get("name", "unknown")
-        file_type = file.get("type", "")
-        content = file.get("content", "")
-
-        # Check if it's a text-based file type
-        text_types = [
-            "text/", "application/json", "application/javascript",
-            "application/xml", "application/x-www-form-urlencoded"
-        ]
-        is_text = any(t in file_type for t in text_types)
-
-        if is_text and content:
-            try:
-                # Extract text from data URL (data:xxx;base64,yyy)
-                if content.startswith("data:"):
-                    # Handle data URL format
-                    import base64
-                    parts = content.split(",", 1)
-                    if len(parts) == 2:
-                        encoded = parts[1]
-                        decoded = base64.b64decode(encoded).decode("utf-8", errors="replace")
-                        # Limit content length for context
-                        if len(decoded) > 10000:
-                            decoded = decoded[:10000] + "\n... (truncated)"
-                        contexts.append(f"📄 File: {name}\n```\n{decoded}\n```")
-                        continue
-                # Plain text content
-                contexts.append(f"📄 File: {name}\n```\n{content}\n```")
-            except Exception:
-                # If decoding fails, just add file info
-                contexts.append(f"📄 File: {name} ({file_type})")
-        else:
-            # Binary file - just add metadata
-            size = file.get("size", 0)
-            size_str = f"{size} bytes" if size < 1024 else f"{size // 1024} KB"
-            contexts.append(f"📎 File: {name} ({file_type}, {size_str})")
+    reserved = int(max_tokens) if max_tokens is not None else settings.max_tokens
+    return compute_history_budget(
+        get_context_length(model),
+        reserved,
+        settings.chat_context_max_tokens,
+    )
 
-    return "\n\n".join(contexts)
+
+def _extract_file_context(files_json: str) -> str:
+    """Extract readable context from a message's file attachments JSON."""
+    try:
+        files = json.loads(files_json)
+    except json.JSONDecodeError:
+        return ""
+    return extract_attachments_text(files)
 
 
 async def save_message(
@@ -178,6 +355,7 @@ async def save_message(
     files: Optional[str] = None,
     model_id: Optional[str] = None,
     regenerated_from: Optional[str] = None,
+    status: str = MESSAGE_STATUS_COMPLETE,
 ) -> MessageModel:
     """Save a message to the database.
 
@@ -190,7 +368,20 @@ async def save_message(
         files: Optional JSON string of file attachments
         model_id: Optional model ID used to generate this message
         regenerated_from: Optional original message ID if this is a regeneration
+        status: Generation status ('complete', 'cancelled', 'error' or
+            'streaming' for a reply that is checkpointed while it streams)
     """
+    # Attachment contents go to the blob store; the message keeps references
+    file_context = None
+    if images:
+        images = json.dumps(await store_images(db, json.loads(images)))
+    if files:
+        stored_files = await store_files(db, json.loads(files))
+        files = json.dumps(stored_files)
+        # Text is read from the stored blobs, which also resolves files re-sent
+        # by download URL. Decoding (and PDF parsing) can be slow, keep it off
+        # the event loop
+        file_context = await asyncio.to_thread(stored_files_text, stored_files)
     message = MessageModel(
         id=str(uuid.uuid4()),
         session_id=session_id,
@@ -198,17 +389,343 @@ async def save_message(
         content=content,
         images=images,
         files=files,
+        file_context=file_context,
         model_id=model_id,
         regenerated_from=regenerated_from,
         regenerated_at=datetime.utcnow() if regenerated_from else None,
+        status=status,
         created_at=datetime.utcnow(),
     )
     db.add(message)
     await db.commit()
     await db.refresh(message)
+    if status != MESSAGE_STATUS_STREAMING:
+        history_cache.append(session_id, format_message_for_context(message))
     return message
 
 
+async def _delete_messages(db: AsyncSession, *conditions) -> None:
+    """Delete the matching messages and release their attachments (caller commits)."""
+    result = await db.execute(
+        select(MessageModel.images, MessageModel.files).where(*conditions)
+    )
+    await release_references(db, result.all())
+    await db.execute(sql_delete(MessageModel).where(*conditions))
+
+
+async def finish_assistant_message(
+    checkpoint: MessageCheckpoint,
+    session_id: str,
+    content: str,
+    status: str,
+) -> None:
+    """Write the final state of a checkpointed reply and add it to the history cache."""
+    with span("save_reply", status=status):
+        message = await checkpoint.finish(content, status)
+    if message is not None:
+        history_cache.append(session_id, format_message_for_context(message))
+
+
+@dataclass
+class StreamResult:
+    """Outcome of streaming one assistant response.
+
+    Filled in while streaming so partial content survives cancellation.
+    """
+    content: str = ""
+    error: Optional[str] = None
+    done: bool = False
+    # Set once MCP tools ran (their side effects rule out a failover)
+    tools_used: bool = False
+    # Model that produced the response (after any failover or hedge)
+    model: Optional[str] = None
+    # Seconds from the provider request to the first text
+    first_token_seconds: Optional[float] = None
+    # Tokens reported by the provider, summed over tool call continuations
+    usage: Optional[TokenUsage] = None
+
+    def add_usage(self, usage: TokenUsage) -> None:
+        if self.usage is None:
+            self.usage = TokenUsage()
+        self.usage.prompt_tokens += usage.prompt_tokens
+        self.usage.completion_tokens += usage.completion_tokens
+
+
+async def _execute_tool_calls(
+    tool_calls: list,
+    server_configs: dict,
+    coalescer: StreamCoalescer,
+) -> list[dict]:
+    """Execute MCP tool calls and notify the client about each one.
+
+    Returns:
+        Tool result messages in OpenAI format
+    """
+    tool_results = []
+    for tc in tool_calls:
+        # Parse server_id and tool_name
+        parsed = parse_mcp_tool_call(tc.function_name)
+        if not parsed:
+            logger.warning(f"Unknown tool call format: {tc.function_name}")
+            continue
+
+        server_id, tool_name = parsed
+        server_config = server_configs.get(server_id)
+
+        # Notify client about tool call
+        await coalescer.send_event(format_tool_call_message(
+            server_name=server_config.name if server_config else server_id,
+            tool_name=tool_name,
+            status="calling"
+        ))
+
+        # Execute the tool
+        try:
+            # Parse arguments from JSON string
+            arguments = json.loads(tc.function_arguments) if isinstance(tc.function_arguments, str) else tc.function_arguments
+            with span("tool_call", server=server_id, tool=tool_name) as tool_span:
+                result = await mcp_service.call_tool(server_id, tool_name, arguments)
+                tool_span.set(success=result.success)
+
+            # Notify client about result
+            await coalescer.send_event(format_tool_call_message(
+                server_name=server_config.name if server_config else server_id,
+                tool_name=tool_name,
+                status="success" if result.success else "error",
+                result=result.content if result.success else None,
+                error=result.error if not result.success else None
+            ))
+
+            tool_results.append(build_tool_result_message(
+                tool_call_id=tc.id,
+                content=result.content if result.success else f"Error: {result.error}"
+            ))
+
+        except Exception as e:
+            logger.error(f"Tool execution failed: {e}")
+            await coalescer.send_event(format_tool_call_message(
+                server_name=server_config.name if server_config else server_id,
+                tool_name=tool_name,
+                status="error",
+                error=str(e)
+            ))
+            tool_results.append(build_tool_result_message(
+                tool_call_id=tc.id,
+                content=f"Error: {str(e)}"
+            ))
+
+    return tool_results
+
+
+async def _stream_response(
+    service,
+    service_kwargs: dict,
+    coalescer: StreamCoalescer,
+    server_configs: dict,
+    result: StreamResult,
+    checkpoint: Optional[MessageCheckpoint] = None,
+) -> None:
+    """Stream an assistant response (with tool calls) to the client.
+
+    Text is forwarded through the coalescer and accumulated in `result`,
+    with periodic checkpoints of the partial text when `checkpoint` is given.
+    The final save and sending stream_end are left to the caller.
+    Provider streams are closed deterministically, including on cancellation.
+
+    Raises:
+        StreamStalled: The provider missed its first-token or stall deadline
+    """
+    history = service_kwargs["messages"]
+    deadlines = (settings.chat_first_token_timeout, settings.chat_stall_timeout)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async with aclosing(guard_stream(service.stream_chat(**service_kwargs), *deadlines)) as stream:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                result.add_usage(chunk.usage)
+            if chunk.error:
+                result.error = chunk.error
+                return
+
+            # Handle tool calls
+            if chunk.has_tool_calls and chunk.tool_calls:
+                tool_results = await _execute_tool_calls(chunk.tool_calls, server_configs, coalescer)
+                result.tools_used = True
+
+                # If we have tool results, continue the conversation
+                if tool_results:
+                    # Add assistant message with tool calls to history
+                    assistant_tool_msg = {
+                        "role": "assistant",
+                        "content": None,
+                        "tool_calls": [
+                            {
+                                "id": tc.id,
+                                "type": "function",
+                                "function": {
+                                    "name": tc.function_name,
+                                    "arguments": tc.function_arguments
+                                }
+                            }
+                            for tc in chunk.tool_calls
+                            if parse_mcp_tool_call(tc.function_name)
+                        ]
+                    }
+                    extended_history = history + [assistant_tool_msg] + tool_results
+
+                    # Continue streaming with tool results (tools stay available)
+                    cont_kwargs = {**service_kwargs, "messages": extended_history}
+                    cont_stream = guard_stream(service.stream_chat(**cont_kwargs), *deadlines)
+                    with span("continuation_stream", tool_results=len(tool_results)):
+                        async with aclosing(cont_stream):
+                            async for cont_chunk in cont_stream:
+                                if cont_chunk.usage is not None:
+                                    result.add_usage(cont_chunk.usage)
+                                if cont_chunk.error:
+                                    result.error = cont_chunk.error
+                                    return
+                                if cont_chunk.is_done:
+                                    result.done = True
+                                    return
+                                if cont_chunk.content:
+                                    result.content += cont_chunk.content
+                                    await coalescer.add(cont_chunk.content)
+                                    if checkpoint is not None:
+                                        checkpoint.update(result.content)
+                continue
+
+            if chunk.is_done:
+                result.done = True
+                return
+            if chunk.content:
+                if result.first_token_seconds is None:
+                    result.first_token_seconds = loop.time() - started
+                result.content += chunk.content
+                await coalescer.add(chunk.content)
+                if checkpoint is not None:
+                    checkpoint.update(result.content)
+
+
+def observe_stream_metrics(result: StreamResult, total_seconds: float) -> None:
+    """Record the time to first token and generation speed of a response."""
+    model = result.model
+    if model is None or result.first_token_seconds is None:
+        return
+    first_token_seconds.observe(result.first_token_seconds, model)
+    if result.usage is not None:
+        completion_tokens = result.usage.completion_tokens
+    else:
+        completion_tokens = estimate_text_tokens(result.content)
+    generation_seconds = total_seconds - result.first_token_seconds
+    if completion_tokens and generation_seconds > 0:
+        generation_tokens_per_second.observe(completion_tokens / generation_seconds, model)
+
+
+def get_fallback_chain(model: Optional[str]) -> List[str]:
+    """The requested model followed by the configured fallback models."""
+    chain = [model or settings.openai_model]
+    for fallback in settings.chat_fallback_models.split(","):
+        fallback = fallback.strip()
+        if fallback and fallback not in chain:
+            chain.append(fallback)
+    return chain
+
+
+async def _stream_with_failover(
+    chain: List[str],
+    service_kwargs: dict,
+    coalescer: StreamCoalescer,
+    server_configs: dict,
+    result: StreamResult,
+    checkpoint: Optional[MessageCheckpoint] = None,
+    on_model_switch=None,
+    hedge_model: Optional[str] = None,
+) -> None:
+    """Stream the response from the first model of the chain that answers.
+
+    While nothing has been sent to the client (no text, no tool calls), a
+    model that stalls or fails hands over to the next one. With hedge_model
+    the first model is hedged by it (quick panel turns). on_model_switch is
+    awaited with (model id, "failover" | "hedge") before another model's
+    output is streamed. result.model is the model that answered.
+    """
+    for index, model_id in enumerate(chain):
+        hedged = index == 0 and hedge_model is not None
+        if hedged:
+            on_hedge_win = partial(on_model_switch, reason="hedge") if on_model_switch else None
+            service, kwargs = HedgedService(model_id, hedge_model, on_hedge_win), service_kwargs
+        else:
+            service, kwargs = _resolve_model(model_id, service_kwargs)
+        if index > 0 and on_model_switch is not None:
+            await on_model_switch(model_id, reason="failover")
+
+        result.model = model_id
+        result.error = None
+        # Usage is recorded for the model that answers
+        result.usage = None
+        # Tool calls and continuation streams are timed inside this span
+        with span("provider_stream", model=model_id, attempt=index, hedged=hedged) as stream_span:
+            try:
+                await _stream_response(service, kwargs, coalescer, server_configs, result, checkpoint)
+            except StreamStalled as e:
+                logger.warning(f"Model {model_id} stalled: {e}")
+                result.error = "AI 响应超时，请稍后重试"
+            stream_span.set(first_token_seconds=result.first_token_seconds, failed=bool(result.error))
+        if hedged:
+            result.model = service.answered_by or model_id
+        elif result.first_token_seconds is not None and index == 0:
+            # Latency samples for hedge delays (hedged streams record their own)
+            first_token_latency.record(model_id, result.first_token_seconds)
+
+        if not result.error or result.content or result.tools_used or index == len(chain) - 1:
+            return
+        logger.warning(f"Model {model_id} failed before responding, failing over to {chain[index + 1]}")
+
+
+async def get_hedge_model(
+    db: AsyncSession,
+    session_id: str,
+    model_chain: List[str],
+) -> Optional[str]:
+    """Model that hedges this turn, if hedging applies.
+
+    Only quick panel sessions are hedged, and only when
+    QUICKPANEL_HEDGE_ENABLED is set. The hedge is QUICKPANEL_HEDGE_MODEL,
+    or else the first fallback model.
+    """
+    if not settings.quickpanel_hedge_enabled:
+        return None
+    source = await db.scalar(select(SessionModel.source).where(SessionModel.id == session_id))
+    if source != "quickpanel":
+        return None
+    hedge_model = settings.quickpanel_hedge_model.strip() or next(iter(model_chain[1:]), None)
+    if hedge_model == model_chain[0]:
+        return None
+    return hedge_model
+
+
+async def wait_for_resume(turn: asyncio.Task, generation: Optional[GenerationStream]):
+    """Let a turn outlive its socket while a client may still resume it.
+
+    The turn runs to completion as long as some client is attached to its
+    generation. Once it has been detached for STREAM_RESUME_GRACE_SECONDS it
+    is cancelled, which saves the partial response.
+    """
+    loop = asyncio.get_running_loop()
+    grace = settings.stream_resume_grace_seconds
+    detached_since = loop.time()
+    while not turn.done():
+        if generation is not None and generation.attached:
+            detached_since = loop.time()
+        elif loop.time() - detached_since >= grace:
+            if generation is not None:
+                generation.cancel()
+            await asyncio.wait({turn}, timeout=TURN_SHUTDOWN_TIMEOUT)
+            return
+        await asyncio.wait({turn}, timeout=STREAM_RESUME_POLL_INTERVAL)
+
+
 @router.websocket("/ws/{session_id}")
 async def chat_websocket(
     websocket: WebSocket,
@@ -221,12 +738,41 @@ async def chat_websocket(
     - Server sends ping every 30 seconds
     - Client must respond with pong within 10 seconds
     - If no pong received, connection is considered stale and closed
+
+    Streamed text is coalesced into fewer frames. Clients can tune this with
+    {"type": "config", "coalesce_ms": 16, "coalesce_bytes": 256}
+    (coalesce_ms=0 sends every chunk immediately).
+
+    The socket keeps being read while a response streams, so the client can
+    send {"type": "cancel"} to stop the current generation. The partial
+    response is saved with status "cancelled" and stream_end carries
+    "cancelled": true.
+
+    Resumable streams:
+    - Every event of a generation carries "stream_id" and a "seq" number
+    - If the socket drops, the generation keeps running for
+      STREAM_RESUME_GRACE_SECONDS before it is cancelled
+    - A reconnecting client sends
+      {"type": "resume", "stream_id": "...", "last_seq": 12} and receives the
+      events it missed, or a "stream_resync" event with the full text so far
+      if they were evicted; unknown streams get "resume_failed"
     """
     await manager.connect(websocket, session_id)
+    # Events of a generation started on an earlier socket are buffered until
+    # this client asks to resume it
+    stream_registry.detach_session(session_id)
 
     # Heartbeat state
     last_pong_time = datetime.utcnow()
     heartbeat_task = None
+    # Stream coalescing settings, adjustable by the client with a "config" message
+    coalesce_config = CoalesceConfig.from_settings()
+    # Chat messages waiting for the turn worker, processed one at a time
+    pending_turns: asyncio.Queue = asyncio.Queue()
+    turn_worker_task = None
+    current_turn: Optional[asyncio.Task] = None
+    # Generation of the current turn (event log, cancel state, provider stream task)
+    current_generation: Optional[GenerationStream] = None
 
     async def heartbeat_sender():
         """Send periodic ping messages to keep connection alive."""
@@ -241,95 +787,125 @@ async def chat_websocket(
                     await websocket.close(code=1001, reason="Heartbeat timeout")
                     break
                 # Send ping
-                await websocket.send_json({"type": "ping"})
+                await manager.send_json(session_id, {"type": "ping"})
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.debug(f"Heartbeat task ended: {e}")
                 break
 
-    # Start heartbeat task
-    heartbeat_task = asyncio.create_task(heartbeat_sender())
-
-    try:
-        while True:
-            # Receive message from client
-            data = await websocket.receive_json()
-
-            # Handle pong response for heartbeat
-            if data.get("type") == "pong":
-                last_pong_time = datetime.utcnow()
-                continue
-            user_content = data.get("content", "")
-            # Get images from client (list of base64 data URLs)
-            images = data.get("images", [])
-            # Get files from client (list of file attachments)
-            files = data.get("files", [])
-            # Get model from client, or use default
-            request_model = data.get("model")
-            # Get optional parameters from client
-            temperature = data.get("temperature")  # None means use default
-            top_p = data.get("top_p")  # None means use default
-            max_tokens = data.get("max_tokens")  # None means use default
-            # Get MCP enable flag
-            use_mcp = data.get("use_mcp", True)  # Enable MCP tools by default
-            # Get quoted message ID for reply context - TASK-200
-            quoted_message_id = data.get("quoted_message_id")
-
-            # Allow empty content if images or files are provided
-            if not user_content.strip() and not images and not files:
-                continue
-
-            # Handle regenerate: delete messages after the specified message
-            regenerate = data.get("regenerate", False)
-            delete_from_message_id = data.get("delete_from_message_id")
-            skip_save_user = False  # Flag to skip saving user message
-
-            if regenerate and delete_from_message_id:
-                # Delete all messages created after the specified message
-                # This effectively removes the AI response and any subsequent messages
+    async def send_event(generation: GenerationStream, data: dict):
+        """Record a generation event and forward it while a client is attached."""
+        event = generation.publish(data)
+        if generation.attached:
+            await manager.send_json(session_id, event)
+
+    async def handle_turn(data: dict):
+        """Run one chat turn as a registered generation."""
+        nonlocal current_generation
+        generation = stream_registry.create(session_id)
+        current_generation = generation
+        turns_in_flight.inc()
+        try:
+            # Spans of the turn's phases; the trace id is sent on stream_start
+            with trace_recorder.turn(session_id):
+                await run_turn(data, generation)
+        finally:
+            turns_in_flight.dec()
+            stream_registry.finish(generation)
+
+    async def run_turn(data: dict, generation: GenerationStream):
+        """Run one chat turn: save the user message, stream and save the reply."""
+        emit = partial(send_event, generation)
+
+        user_content = data.get("content", "")
+        # Get images from client (list of base64 data URLs)
+        images = data.get("images", [])
+        # Get files from client (list of file attachments)
+        files = data.get("files", [])
+        # Get model from client, or use default
+        request_model = data.get("model")
+        # Get optional parameters from client
+        temperature = data.get("temperature")  # None means use default
+        top_p = data.get("top_p")  # None means use default
+        max_tokens = data.get("max_tokens")  # None means use default
+        # Get MCP enable flag
+        use_mcp = data.get("use_mcp", True)  # Enable MCP tools by default
+        # Get quoted message ID for reply context - TASK-200
+        quoted_message_id = data.get("quoted_message_id")
+
+        # Allow empty content if images or files are provided
+        if not user_content.strip() and not images and not files:
+            return
+
+        # Handle regenerate: delete messages after the specified message
+        regenerate = data.get("regenerate", False)
+        delete_from_message_id = data.get("delete_from_message_id")
+        skip_save_user = False  # Flag to skip saving user message
+
+        if regenerate and delete_from_message_id:
+            # Delete all messages created after the specified message
+            # This effectively removes the AI response and any subsequent messages
+            with span("regenerate_delete"):
                 try:
-                    # Get the timestamp of the message to delete from
+                    # Get the position of the message to delete from
                     result = await db.execute(
-                        select(MessageModel.created_at)
+                        select(MessageModel.seq)
                         .where(MessageModel.id == delete_from_message_id)
                         .where(MessageModel.session_id == session_id)
                     )
-                    msg_row = result.scalar_one_or_none()
-                    if msg_row:
-                        # Delete all messages after this timestamp (excluding the message itself)
-                        await db.execute(
-                            sql_delete(MessageModel)
-                            .where(MessageModel.session_id == session_id)
-                            .where(MessageModel.created_at > msg_row)
+                    msg_seq = result.scalar_one_or_none()
+                    if msg_seq is not None:
+                        # Delete all messages after it (excluding the message itself)
+                        await _delete_messages(
+                            db,
+                            MessageModel.session_id == session_id,
+                            MessageModel.seq > msg_seq,
                         )
                         await db.commit()
+                        history_cache.invalidate(session_id)
                         logger.info(f"Regenerate: deleted messages after {delete_from_message_id}")
                         # Skip saving user message - it already exists (just updated or being reused)
                         skip_save_user = True
                 except Exception as e:
                     logger.error(f"Failed to delete messages for regenerate: {e}")
 
-            # Prepare images for storage (JSON string)
-            images_json = json.dumps(images) if images else None
-            # Prepare files for storage (JSON string)
-            files_json = json.dumps(files) if files else None
+        # Prepare images for storage (JSON string)
+        images_json = json.dumps(images) if images else None
+        # Prepare files for storage (JSON string)
+        files_json = json.dumps(files) if files else None
 
-            # Save user message (skip if this is a regenerate/edit request)
-            if not skip_save_user:
+        # Save user message (skip if this is a regenerate/edit request)
+        if not skip_save_user:
+            with span("save_user_message"):
                 await save_message(db, session_id, "user", user_content, images_json, files_json)
 
-            # Notify client that streaming is starting
-            await manager.send_json(session_id, {
-                "type": "stream_start",
-                "session_id": session_id,
-            })
-
-            # Get conversation history for context
-            history = await get_session_messages(db, session_id, limit=20)
-
-            # Handle quoted message - add to context if provided - TASK-200
-            if quoted_message_id:
+        # Models to try in order: the requested one, then the fallbacks
+        model_chain = get_fallback_chain(request_model)
+        primary_model = model_chain[0]
+        trace = current_trace()
+        if trace is not None:
+            trace.set(model=primary_model)
+
+        # Notify client that streaming is starting
+        start_event = {
+            "type": "stream_start",
+            "session_id": session_id,
+            "model": model_chain[0],
+        }
+        if trace is not None:
+            # Correlates client reports with /api/debug/traces and the slow turn log
+            start_event["trace_id"] = trace.trace_id
+        await emit(start_event)
+
+        # Get conversation history for context (newest first, trimmed to budget below)
+        with span("load_history") as history_span:
+            history = await get_session_messages(db, session_id, limit=CONTEXT_HISTORY_MAX_MESSAGES)
+            history_span.set(messages=len(history))
+
+        # Handle quoted message - add to context if provided - TASK-200
+        if quoted_message_id:
+            with span("quoted_lookup"):
                 try:
                     quoted_result = await db.execute(
                         select(MessageModel)
@@ -350,48 +926,80 @@ async def chat_websocket(
                 except Exception as e:
                     logger.warning(f"Failed to get quoted message {quoted_message_id}: {e}")
 
-            # Determine which service to use based on model
-            service, model_name = get_service_for_model(request_model)
-            is_ollama = service is ollama_service
+        # Determine which service to use based on model
+        context_model = request_model
+        service, model_name = get_service_for_model(context_model)
+        is_ollama = service is ollama_service
+
+        # Check service availability
+        if is_ollama:
+            # Ollama service check
+            ollama_available = await ollama_service.is_available()
+            if not ollama_available and len(model_chain) > 1:
+                # Go straight to the fallback models
+                model_chain = model_chain[1:]
+                await emit({
+                    "type": "stream_start",
+                    "session_id": session_id,
+                    "model": model_chain[0],
+                    "failover": True,
+                })
+                # Size the context and pick tools for the model that answers
+                context_model = model_chain[0]
+                service, model_name = get_service_for_model(context_model)
+                is_ollama = service is ollama_service
+            elif not ollama_available:
+                await emit({
+                    "type": "stream_chunk",
+                    "content": "⚠️ Ollama 服务不可用。请确认 Ollama 正在运行，或切换到 OpenAI 模型。\n\n",
+                })
+                await emit({
+                    "type": "stream_end",
+                    "session_id": session_id,
+                })
+                return
+        if not is_ollama:
+            # OpenAI service check
+            if not openai_service.is_configured():
+                # Fallback: echo mode when not configured
+                await emit({
+                    "type": "stream_chunk",
+                    "content": "⚠️ OpenAI API Key not configured. Please set OPENAI_API_KEY environment variable.\n\n",
+                })
+                await emit({
+                    "type": "stream_chunk",
+                    "content": f"You said: {user_content}",
+                })
+                # Save assistant message
+                await save_message(db, session_id, "assistant",
+                    f"⚠️ OpenAI API Key not configured.\n\nYou said: {user_content}")
+                await emit({
+                    "type": "stream_end",
+                    "session_id": session_id,
+                })
+                return
+
+        with span("prepare_context") as context_span:
+            # Only recent turns keep their images; older ones become placeholders
+            history = apply_image_placeholders(history, settings.chat_image_keep_turns)
 
-            # Check service availability
             if is_ollama:
-                # Ollama service check
-                if not await ollama_service.is_available():
-                    await manager.send_json(session_id, {
-                        "type": "stream_chunk",
-                        "content": "⚠️ Ollama 服务不可用。请确认 Ollama 正在运行，或切换到 OpenAI 模型。\n\n",
-                    })
-                    await manager.send_json(session_id, {
-                        "type": "stream_end",
-                        "session_id": session_id,
-                    })
-                    continue
-            else:
-                # OpenAI service check
-                if not openai_service.is_configured():
-                    # Fallback: echo mode when not configured
-                    await manager.send_json(session_id, {
-                        "type": "stream_chunk",
-                        "content": "⚠️ OpenAI API Key not configured. Please set OPENAI_API_KEY environment variable.\n\n",
-                    })
-                    await manager.send_json(session_id, {
-                        "type": "stream_chunk",
-                        "content": f"You said: {user_content}",
-                    })
-                    # Save assistant message
-                    await save_message(db, session_id, "assistant",
-                        f"⚠️ OpenAI API Key not configured.\n\nYou said: {user_content}")
-                    await manager.send_json(session_id, {
-                        "type": "stream_end",
-                        "session_id": session_id,
-                    })
-                    continue
-
-            # Get MCP tools if enabled
-            mcp_tools = None
-            server_configs = {}
-            if use_mcp and not is_ollama:  # MCP tools only work with OpenAI-compatible APIs
+                # Cached model metadata gives the real num_ctx for the budget below
+                await ollama_service.get_model_details(model_name)
+
+            # Keep the newest messages that fit the model's context budget
+            context = build_context_window(
+                history, get_history_token_budget(context_model, max_tokens)
+            )
+            # Downscale and re-encode the images that are still sent
+            history = await prepare_images(context.messages, get_image_max_dimension(context_model))
+            context_span.set(messages=len(history))
+
+        # Get MCP tools if enabled
+        mcp_tools = None
+        server_configs = {}
+        if use_mcp and not is_ollama:  # MCP tools only work with OpenAI-compatible APIs
+            with span("load_mcp_tools") as tools_span:
                 try:
                     mcp_tools_raw = await mcp_service.get_all_tools()
                     if mcp_tools_raw:
@@ -402,211 +1010,335 @@ async def chat_websocket(
                         logger.info(f"Loaded {len(mcp_tools)} MCP tools from {len(mcp_tools_raw)} servers")
                 except Exception as e:
                     logger.warning(f"Failed to load MCP tools: {e}")
+                tools_span.set(tools=len(mcp_tools or ()))
+
+        # Quick panel turns may race a second model for a faster first token
+        hedge_model = await get_hedge_model(db, session_id, model_chain)
+
+        # Stream AI response with potential tool calls
+        stream_result = StreamResult()
+        # Batch small text chunks into fewer WebSocket frames
+        coalescer = StreamCoalescer(emit, coalesce_config)
+        cancelled = False
+        # The reply row exists from the start and is checkpointed while it streams
+        assistant_message = await save_message(
+            db, session_id, "assistant", "",
+            model_id=request_model, status=MESSAGE_STATUS_STREAMING,
+        )
+        checkpoint = MessageCheckpoint(db, assistant_message)
+        # Final message status and stream timing, for the usage record
+        final_status = None
+        stream_seconds = None
+        loop = asyncio.get_running_loop()
+
+        async def report_queue_position(position: int) -> None:
+            await emit({
+                "type": "queue_position",
+                "session_id": session_id,
+                "position": position,
+            })
 
-            # Stream AI response with potential tool calls
-            full_response = ""
-            try:
-                # Build kwargs for service call based on service type
-                service_kwargs = {
-                    "messages": history,
-                    "model": model_name,
-                    "temperature": float(temperature) if temperature is not None else None,
-                    "top_p": float(top_p) if top_p is not None else None,
-                }
-                # Ollama doesn't support max_tokens in the same way
-                if not is_ollama and max_tokens is not None:
-                    service_kwargs["max_tokens"] = int(max_tokens)
-
-                # Add MCP tools if available
-                if mcp_tools:
-                    service_kwargs["tools"] = mcp_tools
-
-                async for chunk in service.stream_chat(**service_kwargs):
-                    if chunk.error:
-                        await manager.send_json(session_id, {
-                            "type": "error",
-                            "error": chunk.error,
-                        })
-                        break
-
-                    # Handle tool calls
-                    if chunk.has_tool_calls and chunk.tool_calls:
-                        tool_results = []
-                        for tc in chunk.tool_calls:
-                            # Parse server_id and tool_name
-                            parsed = parse_mcp_tool_call(tc.function_name)
-                            if not parsed:
-                                logger.warning(f"Unknown tool call format: {tc.function_name}")
-                                continue
-
-                            server_id, tool_name = parsed
-                            server_config = server_configs.get(server_id)
-
-                            # Notify client about tool call
-                            await manager.send_json(session_id, format_tool_call_message(
-                                server_name=server_config.name if server_config else server_id,
-                                tool_name=tool_name,
-                                status="calling"
-                            ))
-
-                            # Execute the tool
-                            try:
-                                # Parse arguments from JSON string
-                                arguments = json.loads(tc.function_arguments) if isinstance(tc.function_arguments, str) else tc.function_arguments
-                                result = await mcp_service.call_tool(server_id, tool_name, arguments)
-
-                                # Notify client about result
-                                await manager.send_json(session_id, format_tool_call_message(
-                                    server_name=server_config.name if server_config else server_id,
-                                    tool_name=tool_name,
-                                    status="success" if result.success else "error",
-                                    result=result.content if result.success else None,
-                                    error=result.error if not result.success else None
-                                ))
-
-                                tool_results.append(build_tool_result_message(
-                                    tool_call_id=tc.id,
-                                    content=result.content if result.success else f"Error: {result.error}"
-                                ))
-
-                            except Exception as e:
-                                logger.error(f"Tool execution failed: {e}")
-                                await manager.send_json(session_id, format_tool_call_message(
-                                    server_name=server_config.name if server_config else server_id,
-                                    tool_name=tool_name,
-                                    status="error",
-                                    error=str(e)
-                                ))
-                                tool_results.append(build_tool_result_message(
-                                    tool_call_id=tc.id,
-                                    content=f"Error: {str(e)}"
-                                ))
-
-                        # If we have tool results, continue the conversation
-                        if tool_results:
-                            # Add assistant message with tool calls to history
-                            assistant_tool_msg = {
-                                "role": "assistant",
-                                "content": None,
-                                "tool_calls": [
-                                    {
-                                        "id": tc.id,
-                                        "type": "function",
-                                        "function": {
-                                            "name": tc.function_name,
-                                            "arguments": tc.function_arguments
-                                        }
-                                    }
-                                    for tc in chunk.tool_calls
-                                    if parse_mcp_tool_call(tc.function_name)
-                                ]
-                            }
-                            extended_history = history + [assistant_tool_msg] + tool_results
-
-                            # Continue streaming with tool results
-                            service_kwargs["messages"] = extended_history
-                            service_kwargs["tools"] = mcp_tools  # Keep tools available
+        async def report_model_switch(model_id: str, reason: str) -> None:
+            # Nothing was streamed yet, so the client simply starts over
+            await coalescer.send_event({
+                "type": "stream_start",
+                "session_id": session_id,
+                "model": model_id,
+                reason: True,
+            })
 
-                            async for cont_chunk in service.stream_chat(**service_kwargs):
-                                if cont_chunk.error:
-                                    await manager.send_json(session_id, {
-                                        "type": "error",
-                                        "error": cont_chunk.error,
-                                    })
-                                    break
+        try:
+            # Build kwargs for service call based on service type
+            service_kwargs = {
+                "messages": history,
+                "model": model_name,
+                "temperature": float(temperature) if temperature is not None else None,
+                "top_p": float(top_p) if top_p is not None else None,
+                # Fair queuing across sessions; the client sees its queue position
+                "session_id": session_id,
+                "on_queue_position": report_queue_position,
+                # Deadlines start when the provider slot is granted, not while queued
+                "signal_slot": True,
+            }
+            # Ollama doesn't support max_tokens in the same way
+            if not is_ollama and max_tokens is not None:
+                service_kwargs["max_tokens"] = int(max_tokens)
 
-                                if cont_chunk.is_done:
-                                    if full_response:
-                                        await save_message(db, session_id, "assistant", full_response)
-                                    await manager.send_json(session_id, {
-                                        "type": "stream_end",
-                                        "session_id": session_id,
-                                    })
-                                elif cont_chunk.content:
-                                    full_response += cont_chunk.content
-                                    await manager.send_json(session_id, {
-                                        "type": "stream_chunk",
-                                        "content": cont_chunk.content,
-                                    })
-                        continue
-
-                    if chunk.is_done:
-                        # Save the complete assistant response with model_id
-                        if full_response:
-                            await save_message(
-                                db, session_id, "assistant", full_response,
-                                model_id=request_model
-                            )
-                        await manager.send_json(session_id, {
-                            "type": "stream_end",
-                            "session_id": session_id,
-                        })
-                    elif chunk.content:
-                        full_response += chunk.content
-                        await manager.send_json(session_id, {
-                            "type": "stream_chunk",
-                            "content": chunk.content,
-                        })
+            # Add MCP tools if available
+            if mcp_tools:
+                service_kwargs["tools"] = mcp_tools
 
-            except Exception as e:
-                # SECURITY: Sanitize error message to prevent sensitive info leakage
-                safe_message = sanitize_error_message(e)
-                logger.error(f"Error during streaming: {get_safe_error_type(e)}")
-                await manager.send_json(session_id, {
+            if generation.cancel_requested:
+                cancelled = True
+            else:
+                # Run the provider stream as its own task so a cancel can abort it
+                stream_started = loop.time()
+                stream_task = asyncio.create_task(_stream_with_failover(
+                    model_chain, service_kwargs, coalescer, server_configs, stream_result,
+                    checkpoint, on_model_switch=report_model_switch,
+                    hedge_model=hedge_model,
+                ))
+                generation.task = stream_task
+                try:
+                    await asyncio.wait({stream_task})
+                finally:
+                    generation.task = None
+                stream_seconds = loop.time() - stream_started
+                cancelled = stream_task.cancelled()
+                if stream_result.model != primary_model:
+                    assistant_message.model_id = stream_result.model
+                if not cancelled:
+                    # Re-raise streaming errors for the handler below
+                    stream_task.result()
+
+            if cancelled:
+                logger.info(f"Generation cancelled for session {session_id}")
+                # Keep what was generated so far
+                final_status = MESSAGE_STATUS_CANCELLED
+                await finish_assistant_message(
+                    checkpoint, session_id, stream_result.content, final_status
+                )
+                await coalescer.send_event({
+                    "type": "stream_end",
+                    "session_id": session_id,
+                    "cancelled": True,
+                })
+            elif stream_result.error:
+                # Keep the partial response, marked as failed
+                final_status = MESSAGE_STATUS_ERROR
+                await finish_assistant_message(
+                    checkpoint, session_id, stream_result.content, final_status
+                )
+                await coalescer.send_event({
                     "type": "error",
-                    "error": f"AI 响应出错: {safe_message}",
+                    "error": stream_result.error,
+                })
+            elif stream_result.done:
+                # Save the complete assistant response
+                final_status = MESSAGE_STATUS_COMPLETE
+                await finish_assistant_message(
+                    checkpoint, session_id, stream_result.content, final_status
+                )
+                await coalescer.send_event({
+                    "type": "stream_end",
+                    "session_id": session_id,
                 })
+            else:
+                # The provider stream ended without finishing the response
+                final_status = MESSAGE_STATUS_ERROR
+                await finish_assistant_message(
+                    checkpoint, session_id, stream_result.content, final_status
+                )
+
+        except Exception as e:
+            # SECURITY: Sanitize error message to prevent sensitive info leakage
+            safe_message = sanitize_error_message(e)
+            logger.error(f"Error during streaming: {get_safe_error_type(e)}")
+            final_status = MESSAGE_STATUS_ERROR
+            try:
+                await finish_assistant_message(
+                    checkpoint, session_id, stream_result.content, MESSAGE_STATUS_ERROR
+                )
+            except Exception as save_error:
+                # Left "streaming"; recovered at the next startup
+                logger.error(f"Failed to save partial response: {get_safe_error_type(save_error)}")
+            await coalescer.send_event({
+                "type": "error",
+                "error": f"AI 响应出错: {safe_message}",
+            })
+        finally:
+            await coalescer.aclose()
+
+        if trace is not None:
+            trace.set(
+                model=stream_result.model or primary_model,
+                status=final_status,
+                tools_used=stream_result.tools_used,
+            )
+        if final_status == MESSAGE_STATUS_COMPLETE:
+            observe_stream_metrics(stream_result, stream_seconds)
+        if final_status is not None and stream_seconds is not None and settings.usage_tracking_enabled:
+            with span("record_usage"):
+                try:
+                    await record_usage(
+                        db,
+                        message_id=assistant_message.id,
+                        session_id=session_id,
+                        model_id=stream_result.model or primary_model,
+                        status=final_status,
+                        usage=stream_result.usage,
+                        first_token_seconds=stream_result.first_token_seconds,
+                        total_seconds=stream_seconds,
+                        messages=history,
+                        content=stream_result.content,
+                    )
+                except Exception as e:
+                    logger.warning(f"Failed to record usage: {get_safe_error_type(e)}")
+
+    async def turn_worker():
+        """Process queued chat messages one turn at a time."""
+        nonlocal current_turn
+        while True:
+            data = await pending_turns.get()
+            current_turn = asyncio.create_task(handle_turn(data))
+            # asyncio.wait does not propagate the turn's exception into the worker
+            await asyncio.wait({current_turn})
+            if not current_turn.cancelled() and current_turn.exception():
+                logger.error(f"Chat turn failed: {get_safe_error_type(current_turn.exception())}")
+            current_turn = None
+
+    async def resume_stream(data: dict):
+        """Send the events of a generation the client missed, then reattach it."""
+        generation = stream_registry.get(data.get("stream_id"))
+        if generation is None or generation.session_id != session_id:
+            await manager.send_json(session_id, {
+                "type": "resume_failed",
+                "stream_id": data.get("stream_id"),
+            })
+            return
+        try:
+            last_seq = int(data.get("last_seq", 0))
+        except (TypeError, ValueError):
+            last_seq = 0
+        missed = generation.events_after(last_seq)
+        if missed is None:
+            missed = [generation.resync_event()]
+        # send_json only enqueues, so no event is published between the
+        # replay and reattaching
+        for event in missed:
+            await manager.send_json(session_id, event)
+        generation.attached = True
+
+    # Start heartbeat task
+    heartbeat_task = asyncio.create_task(heartbeat_sender())
+    turn_worker_task = asyncio.create_task(turn_worker())
+
+    try:
+        while True:
+            # Keep reading while a turn runs so pong and cancel are handled promptly
+            data = await websocket.receive_json()
+            message_type = data.get("type")
+
+            # Handle pong response for heartbeat
+            if message_type == "pong":
+                last_pong_time = datetime.utcnow()
+                continue
+
+            # Handle per-connection stream settings
+            if message_type == "config":
+                coalesce_config = coalesce_config.updated(data)
+                continue
+
+            # Stop the current generation
+            if message_type == "cancel":
+                generation = stream_registry.active_for_session(session_id)
+                if generation is not None:
+                    generation.cancel()
+                continue
+
+            # Replay a generation this client lost track of (e.g. after reconnecting)
+            if message_type == "resume":
+                await resume_stream(data)
+                continue
+
+            await pending_turns.put(data)
 
     except WebSocketDisconnect:
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, websocket)
         logger.info(f"WebSocket disconnected: {session_id}")
 
     except Exception as e:
         # SECURITY: Log error type only, not full message which may contain sensitive info
         logger.error(f"WebSocket error: {get_safe_error_type(e)}")
-        manager.disconnect(session_id)
+        manager.disconnect(session_id, websocket)
 
     finally:
-        # Cancel heartbeat task on exit
-        if heartbeat_task and not heartbeat_task.done():
-            heartbeat_task.cancel()
-            try:
-                await heartbeat_task
-            except asyncio.CancelledError:
-                pass
+        # Queued turns are dropped; the current generation keeps running
+        # detached so a reconnecting client can resume it
+        for task in (turn_worker_task, heartbeat_task):
+            if task and not task.done():
+                task.cancel()
+        if session_id not in manager.active_connections:
+            stream_registry.detach_session(session_id)
+        if current_turn is not None and not current_turn.done():
+            await wait_for_resume(current_turn, current_generation)
+        for task in (turn_worker_task, current_turn, heartbeat_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+
+@router.get("/connections/metrics")
+async def get_connection_metrics():
+    """Get outbound queue metrics for active chat WebSockets."""
+    return manager.get_metrics()
 
 
 @router.get("/{session_id}/messages")
 async def get_messages(
     session_id: str,
+    request: Request,
     db: AsyncSession = Depends(get_db_session),
     limit: int = 50,
     offset: int = 0,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    latest: bool = False,
 ):
-    """Get message history for a session."""
-    result = await db.execute(
-        select(MessageModel)
-        .where(MessageModel.session_id == session_id)
-        .order_by(MessageModel.created_at.asc())
-        .offset(offset)
-        .limit(limit)
-    )
-    messages = result.scalars().all()
+    """Get message history for a session, in conversation order.
+
+    Pages are keyed on the message seq, which is never reused within a
+    session, so a cursor keeps its place when messages are deleted. For a
+    chat view, request the `latest` messages, then pass prev_cursor as
+    `before` to load older ones; next_cursor as `after` pages forward.
+    `offset` is still accepted for older clients.
+    """
+    from fastapi import HTTPException
+
+    query = select(MessageModel).where(MessageModel.session_id == session_id)
+    if offset and after is None and before is None and not latest:
+        result = await db.execute(
+            query.order_by(MessageModel.seq.asc())
+            .offset(offset)
+            .limit(limit)
+        )
+        page = KeysetPage(items=result.scalars().all())
+    else:
+        try:
+            page = await keyset_page(
+                db, query, (MessageModel.seq,),
+                limit=limit, after=after, before=before, from_end=latest,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    messages = page.items
+
+    def attachment_url(attachment_id: str) -> str:
+        return str(request.url_for("download_attachment", attachment_id=attachment_id))
+
     return {
         "messages": [
             {
                 "id": m.id,
                 "role": m.role,
                 "content": m.content,
-                "images": json.loads(m.images) if m.images else None,
-                "files": json.loads(m.files) if m.files else None,
+                # Attachments are returned as download URLs, not inline data
+                "images": images_for_client(json.loads(m.images), attachment_url) if m.images else None,
+                "files": files_for_client(json.loads(m.files), attachment_url) if m.files else None,
                 "model_id": m.model_id,
                 "regenerated_from": m.regenerated_from,
                 "regenerated_at": m.regenerated_at.isoformat() if m.regenerated_at else None,
+                "status": m.status,
                 "created_at": m.created_at.isoformat(),
+                "seq": m.seq,
             }
             for m in messages
-        ]
+        ],
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
     }
 
 
@@ -640,15 +1372,16 @@ async def update_message(
 
     # Delete all messages after this one if requested (TASK-196)
     if delete_after:
-        await db.execute(
-            sql_delete(MessageModel)
-            .where(MessageModel.session_id == session_id)
-            .where(MessageModel.created_at > message.created_at)
+        await _delete_messages(
+            db,
+            MessageModel.session_id == session_id,
+            MessageModel.seq > message.seq,
         )
         logger.info(f"Edit message: deleted messages after {message_id}")
 
     await db.commit()
     await db.refresh(message)
+    history_cache.invalidate(session_id)
 
     return {
         "id": message.id,
@@ -678,7 +1411,9 @@ async def delete_message(
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
 
+    await release_references(db, [(message.images, message.files)])
     await db.delete(message)
     await db.commit()
+    history_cache.invalidate(session_id)
 
     return {"status": "deleted", "message_id": message_id}
@@ -0,0 +1,35 @@
+"""Debug API - recent chat turn traces"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from core.config import settings
+from services.tracing import trace_recorder
+
+router = APIRouter()
+
+
+@router.get("/traces")
+async def list_traces(
+    limit: int = Query(20, ge=1, le=500, description="Max traces returned"),
+    min_seconds: Optional[float] = Query(None, ge=0, description="Only turns at least this slow"),
+    session_id: Optional[str] = Query(None, description="Only turns of this session"),
+):
+    """Most recent turn traces, newest first."""
+    traces = trace_recorder.recent(limit=None, min_seconds=min_seconds or 0.0)
+    if session_id:
+        traces = [trace for trace in traces if trace.session_id == session_id]
+    return {
+        "enabled": settings.chat_tracing_enabled,
+        "slow_seconds": settings.chat_trace_slow_seconds,
+        "traces": [trace.to_dict() for trace in traces[:limit]],
+    }
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """One turn trace by the trace_id sent on stream_start."""
+    trace = trace_recorder.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace.to_dict()
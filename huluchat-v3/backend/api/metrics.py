@@ -0,0 +1,81 @@
+"""Metrics API - Prometheus text format"""
+from typing import Iterable
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.metrics import Counter, Gauge, Metric, registry
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def collect_connections() -> Iterable[Metric]:
+    """WebSocket connections and slow-consumer disconnects."""
+    from api.chat import manager
+
+    active = Gauge("huluchat_websockets_active", "Open chat WebSocket connections")
+    active.set(len(manager.active_connections))
+    dropped = Counter(
+        "huluchat_websocket_slow_consumer_disconnects",
+        "Connections dropped because the client could not keep up",
+    )
+    dropped.inc(amount=manager.slow_consumer_disconnects)
+    return [active, dropped]
+
+
+def collect_providers() -> Iterable[Metric]:
+    """Provider queues, retries and hedged requests."""
+    from services.hedging import hedge_stats
+    from services.provider_retry import retry_stats
+    from services.provider_scheduler import provider_scheduler
+
+    active = Gauge("huluchat_provider_requests_active", "Provider requests holding a slot", ("provider",))
+    queued = Gauge("huluchat_provider_requests_queued", "Provider requests waiting for a slot", ("provider",))
+    for provider, stats in provider_scheduler.stats().items():
+        active.set(stats["active"], provider)
+        queued.set(stats["queued"], provider)
+
+    retries = Counter(
+        "huluchat_provider_retries",
+        "Provider retry outcomes (retry, recovered, exhausted)",
+        ("provider", "operation", "outcome"),
+    )
+    for labels, count in retry_stats.snapshot().items():
+        retries.inc(*labels, amount=count)
+
+    hedges = Counter(
+        "huluchat_hedged_requests",
+        "Hedging outcomes by primary model (not_hedged, primary, hedge)",
+        ("model", "outcome"),
+    )
+    for labels, count in hedge_stats.counts.items():
+        hedges.inc(*labels, amount=count)
+    return [active, queued, retries, hedges]
+
+
+def collect_executors() -> Iterable[Metric]:
+    """Work waiting for the ChromaDB thread pool, and the image cache."""
+    from services import async_chroma
+    from services.image_pipeline import image_cache
+
+    depth = Gauge("huluchat_chroma_executor_queue_depth", "ChromaDB operations waiting for a thread")
+    executor = async_chroma._chroma_executor
+    depth.set(executor._work_queue.qsize() if executor is not None else 0)
+
+    cache = Counter("huluchat_image_cache_lookups", "Prepared image cache lookups", ("result",))
+    cache.inc("hit", amount=image_cache.hits)
+    cache.inc("miss", amount=image_cache.misses)
+    return [depth, cache]
+
+
+registry.add_collector(collect_connections)
+registry.add_collector(collect_providers)
+registry.add_collector(collect_executors)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
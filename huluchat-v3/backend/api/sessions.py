@@ -1,6 +1,6 @@
 """Session management API"""
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, Response
 from fastapi.responses import PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_
@@ -13,16 +13,24 @@ from core.database import get_session as get_db_session, Base
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy import Index
 from models.schemas import MessageModel
+from services.history_cache import history_cache
+from services import pagination, search as search_index
+import models.session_summary  # noqa: F401  (summary triggers for create_all)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Response header with the cursor of the next search page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 class SessionModel(Base):
     """Database model for sessions"""
     __tablename__ = "sessions"
     __table_args__ = (
         Index('ix_sessions_folder_updated', 'folder_id', 'updated_at'),
+        # Keyset pages of the session list
+        Index('ix_sessions_updated_id', 'updated_at', 'id'),
     )
 
     id: Mapped[str] = mapped_column(primary_key=True)
@@ -31,6 +39,14 @@ class SessionModel(Base):
     source: Mapped[str] = mapped_column(default="main", index=True)  # 'main' or 'quickpanel'
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Summary of the messages, maintained by triggers (models/session_summary.py)
+    message_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    last_message_preview: Mapped[Optional[str]] = mapped_column(nullable=True)
+    last_model_id: Mapped[Optional[str]] = mapped_column(nullable=True)
+    total_tokens: Mapped[int] = mapped_column(default=0, server_default="0")
+    # Seq of the next message; never lowered, so seq numbers are not reused
+    next_seq: Mapped[int] = mapped_column(default=1, server_default="1")
 
 
 class SessionResponse(BaseModel):
@@ -41,6 +57,13 @@ class SessionResponse(BaseModel):
     source: str = "main"  # 'main' or 'quickpanel'
     created_at: datetime
     updated_at: datetime
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    # Start of the last message's content
+    last_message_preview: Optional[str] = None
+    last_model_id: Optional[str] = None
+    # Prompt + completion tokens spent in the session
+    total_tokens: int = 0
 
     class Config:
         from_attributes = True
@@ -56,7 +79,9 @@ class MessageMatch(BaseModel):
     id: str
     session_id: str
     role: str
-    content_snippet: str  # Truncated content with match highlighted
+    content_snippet: str  # Plain text around the match
+    # HTML-escaped snippet with matches wrapped in <mark>
+    highlighted_snippet: Optional[str] = None
     created_at: datetime
 
 
@@ -65,15 +90,24 @@ class SessionSearchResult(BaseModel):
     session: SessionResponse
     matched_messages: List[MessageMatch] = []
     match_type: str  # 'title' or 'content' or 'both'
+    # HTML-escaped title with matches wrapped in <mark> (title matches only)
+    title_highlight: Optional[str] = None
+    # bm25 relevance, lower is better
+    score: Optional[float] = None
 
 
 class SessionListResponse(BaseModel):
     """Paginated session list response"""
     sessions: List[SessionResponse]
-    total: int
+    # Matching sessions; None unless include_total is set
+    total: Optional[int] = None
     limit: int
     offset: int
     has_more: bool
+    # Pass as `after` for the next (older) page; None on the last page
+    next_cursor: Optional[str] = None
+    # Pass as `before` for the previous (newer) page
+    prev_cursor: Optional[str] = None
 
 
 @router.get("/", response_model=SessionListResponse)
@@ -81,13 +115,18 @@ async def list_sessions(
     folder_id: Optional[str] = Query(None, description="Filter by folder ID"),
     source: Optional[str] = Query(None, description="Filter by session source (main/quickpanel)"),
     limit: int = Query(50, ge=1, le=200, description="Number of sessions to return"),
-    offset: int = Query(0, ge=0, description="Number of sessions to skip"),
+    offset: int = Query(0, ge=0, description="Number of sessions to skip (ignored with a cursor)"),
+    after: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    before: Optional[str] = Query(None, description="prev_cursor of the following page"),
+    include_total: bool = Query(True, description="Count all matching sessions (an extra scan)"),
     db: AsyncSession = Depends(get_db_session)
 ):
-    """List sessions with pagination, optionally filtered by folder and source.
+    """List sessions, most recently updated first, optionally filtered by folder and source.
 
     Default pagination: 50 sessions per page.
-    Use limit and offset parameters for infinite scroll or load more patterns.
+    Pages are keyed on (updated_at, id): pass next_cursor as `after` to
+    load more, prev_cursor as `before` to go back. `offset` is still
+    accepted for older clients, but deep offsets scan every skipped row.
     """
     from sqlalchemy import func
 
@@ -102,45 +141,69 @@ async def list_sessions(
         base_query = base_query.where(SessionModel.source == source)
         count_query = count_query.where(SessionModel.source == source)
 
-    # Get total count
-    total_result = await db.execute(count_query)
-    total = total_result.scalar() or 0
+    total = None
+    if include_total:
+        total = (await db.execute(count_query)).scalar() or 0
 
-    # Get paginated sessions
-    query = base_query.order_by(SessionModel.updated_at.desc()).offset(offset).limit(limit)
-    result = await db.execute(query)
-    sessions = result.scalars().all()
+    if offset and after is None and before is None:
+        # Legacy offset page; one extra row tells whether more follow
+        query = (
+            base_query.order_by(SessionModel.updated_at.desc(), SessionModel.id.desc())
+            .offset(offset).limit(limit + 1)
+        )
+        sessions = (await db.execute(query)).scalars().all()
+        has_more = len(sessions) > limit
+        page = pagination.KeysetPage(items=sessions[:limit])
+        if has_more:
+            last = page.items[-1]
+            page.next_cursor = pagination.encode_cursor(last.updated_at, last.id)
+    else:
+        try:
+            page = await pagination.keyset_page(
+                db, base_query, (SessionModel.updated_at, SessionModel.id),
+                limit=limit, descending=True, after=after, before=before,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        has_more = page.next_cursor is not None
 
     return SessionListResponse(
-        sessions=[SessionResponse.model_validate(s) for s in sessions],
+        sessions=[SessionResponse.model_validate(s) for s in page.items],
         total=total,
         limit=limit,
         offset=offset,
-        has_more=(offset + len(sessions)) < total
+        has_more=has_more,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
     )
 
 
 @router.get("/search/", response_model=List[SessionSearchResult])
 async def search_sessions(
+    response: Response,
     q: str = Query(..., min_length=1, description="Search query"),
     folder_id: Optional[str] = Query(None, description="Filter by folder ID"),
     date_from: Optional[str] = Query(None, description="Filter from date (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Filter to date (YYYY-MM-DD)"),
+    limit: int = Query(50, ge=1, le=200, description="Max sessions returned"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Search sessions by title and message content with optional filters.
 
+    Results are ranked by relevance (bm25). When more results exist, the
+    X-Next-Cursor response header holds the cursor of the next page.
+
     Args:
         q: Search query string
         folder_id: Optional folder ID to filter results
         date_from: Optional start date (inclusive, YYYY-MM-DD format)
         date_to: Optional end date (inclusive, YYYY-MM-DD format)
+        limit: Max sessions per page
+        cursor: Cursor of the page to return
     """
     from datetime import datetime as dt
 
-    query = q.lower().strip()
-    results = []
-
     # Parse date filters
     parsed_date_from = None
     parsed_date_to = None
@@ -157,109 +220,50 @@ async def search_sessions(
         except ValueError:
             pass
 
-    # Build base title query with filters
-    title_query = select(SessionModel).where(SessionModel.title.ilike(f"%{query}%"))
-
-    # Apply folder filter
-    if folder_id is not None:
-        title_query = title_query.where(SessionModel.folder_id == folder_id)
-
-    # Apply date filters
-    if parsed_date_from:
-        title_query = title_query.where(SessionModel.updated_at >= parsed_date_from)
-    if parsed_date_to:
-        title_query = title_query.where(SessionModel.updated_at <= parsed_date_to)
-
-    title_query = title_query.order_by(SessionModel.updated_at.desc())
-
-    # Search in session titles
-    title_result = await db.execute(title_query)
-    title_sessions = {s.id: s for s in title_result.scalars().all()}
+    try:
+        page = await search_index.search_sessions(
+            db, q,
+            folder_id=folder_id,
+            date_from=parsed_date_from,
+            date_to=parsed_date_to,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
 
-    # Search in message content
-    message_query = (
-        select(MessageModel, SessionModel)
-        .join(SessionModel, MessageModel.session_id == SessionModel.id)
-        .where(MessageModel.content.ilike(f"%{query}%"))
-    )
+    sessions = {}
+    if page.hits:
+        result = await db.execute(
+            select(SessionModel).where(SessionModel.id.in_([hit.session_id for hit in page.hits]))
+        )
+        sessions = {s.id: s for s in result.scalars().all()}
 
-    # Apply folder filter to message search
-    if folder_id is not None:
-        message_query = message_query.where(SessionModel.folder_id == folder_id)
-
-    # Apply date filters to message search
-    if parsed_date_from:
-        message_query = message_query.where(SessionModel.updated_at >= parsed_date_from)
-    if parsed_date_to:
-        message_query = message_query.where(SessionModel.updated_at <= parsed_date_to)
-
-    message_query = message_query.order_by(SessionModel.updated_at.desc())
-    message_result = await db.execute(message_query)
-    message_rows = message_result.all()
-
-    # Group messages by session
-    session_messages = {}
-    sessions_from_messages = {}
-    for msg, session in message_rows:
-        if session.id not in session_messages:
-            session_messages[session.id] = []
-            sessions_from_messages[session.id] = session
-        session_messages[session.id].append(msg)
-
-    # Combine results
-    all_session_ids = set(title_sessions.keys()) | set(sessions_from_messages.keys())
-
-    for session_id in all_session_ids:
-        # Get session (from either source)
-        session = title_sessions.get(session_id) or sessions_from_messages.get(session_id)
+    results = []
+    for hit in page.hits:
+        session = sessions.get(hit.session_id)
         if not session:
             continue
-
-        # Determine match type
-        in_title = session_id in title_sessions
-        in_content = session_id in session_messages
-        match_type = "both" if (in_title and in_content) else ("title" if in_title else "content")
-
-        # Get matched messages
-        matched_messages = []
-        if in_content:
-            for msg in session_messages[session_id][:3]:  # Limit to 3 messages
-                # Create snippet around match
-                content = msg.content
-                idx = content.lower().find(query)
-                if idx != -1:
-                    # Extract context around match (50 chars before and after)
-                    start = max(0, idx - 50)
-                    end = min(len(content), idx + len(query) + 50)
-                    snippet = content[start:end]
-                    if start > 0:
-                        snippet = "..." + snippet
-                    if end < len(content):
-                        snippet = snippet + "..."
-                else:
-                    snippet = content[:100] + "..." if len(content) > 100 else content
-
-                matched_messages.append(MessageMatch(
-                    id=msg.id,
-                    session_id=msg.session_id,
-                    role=msg.role,
-                    content_snippet=snippet,
-                    created_at=msg.created_at
-                ))
-
+        match_type = "both" if (hit.in_title and hit.in_content) else ("title" if hit.in_title else "content")
         results.append(SessionSearchResult(
-            session=SessionResponse(
-                id=session.id,
-                title=session.title,
-                created_at=session.created_at,
-                updated_at=session.updated_at
-            ),
-            matched_messages=matched_messages,
-            match_type=match_type
+            session=SessionResponse.model_validate(session),
+            matched_messages=[
+                MessageMatch(
+                    id=m.id,
+                    session_id=m.session_id,
+                    role=m.role,
+                    content_snippet=m.snippet,
+                    highlighted_snippet=m.highlighted,
+                    created_at=m.created_at,
+                )
+                for m in hit.messages
+            ],
+            match_type=match_type,
+            title_highlight=hit.title_highlight,
+            score=hit.score,
         ))
-
-    # Sort by updated_at desc
-    results.sort(key=lambda x: x.session.updated_at, reverse=True)
     return results
 
 
@@ -310,6 +314,7 @@ async def delete_session(
         raise HTTPException(status_code=404, detail="Session not found")
     await db.delete(session)
     await db.commit()
+    history_cache.invalidate(session_id)
     return {"status": "deleted"}
 
 
@@ -395,7 +400,7 @@ async def generate_session_title(
     msg_result = await db.execute(
         select(MessageModel)
         .where(MessageModel.session_id == session_id)
-        .order_by(MessageModel.created_at.asc())
+        .order_by(MessageModel.seq.asc())
         .limit(10)  # Use first 10 messages for context
     )
     messages = msg_result.scalars().all()
@@ -492,7 +497,7 @@ async def export_session(
     msg_result = await db.execute(
         select(MessageModel)
         .where(MessageModel.session_id == session_id)
-        .order_by(MessageModel.created_at.asc())
+        .order_by(MessageModel.seq.asc())
     )
     messages = msg_result.scalars().all()
 
@@ -659,6 +664,7 @@ async def batch_delete_sessions(
         session = result.scalar_one_or_none()
         if session:
             await db.delete(session)
+            history_cache.invalidate(session_id)
             deleted_count += 1
         else:
             errors.append(f"Session {session_id} not found")
@@ -749,7 +755,7 @@ async def batch_export_sessions(
         msg_result = await db.execute(
             select(MessageModel)
             .where(MessageModel.session_id == session_id)
-            .order_by(MessageModel.created_at.asc())
+            .order_by(MessageModel.seq.asc())
         )
         messages = msg_result.scalars().all()
 
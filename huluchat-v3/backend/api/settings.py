@@ -3,7 +3,8 @@ Settings API - Configuration management
 """
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
+import asyncio
 import json
 from pathlib import Path
 
@@ -147,6 +148,78 @@ AVAILABLE_MODELS: List[ModelInfo] = [
 ]
 
 
+# Context window sizes (in tokens) for the models above, used to budget chat history
+MODEL_CONTEXT_LENGTHS: Dict[str, int] = {
+    "deepseek-chat": 65536,
+    "deepseek-reasoner": 65536,
+    "gpt-4.1": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "o3-mini": 200000,
+    "o1": 200000,
+    "o1-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+    "claude-sonnet-4-20250514": 200000,
+    "claude-3-5-sonnet-20241022": 200000,
+    "claude-3-5-haiku-20241022": 200000,
+    "claude-3-opus-20240229": 200000,
+    "glm-5": 128000,
+}
+
+# Fallback for unknown models (custom endpoints)
+DEFAULT_CONTEXT_LENGTH = 8192
+
+
+def get_context_length(model_id: Optional[str]) -> int:
+    """Get the context window size for a model.
+
+    Args:
+        model_id: Model identifier (e.g., "gpt-4o", "ollama:llama3"), None for default model
+
+    Returns:
+        Context window size in tokens
+    """
+    model_id = model_id or settings.openai_model
+    if model_id.startswith("ollama:"):
+        from services.ollama_service import ollama_service
+
+        # Metadata is cached by ollama_service.get_model_details(); num_ctx
+        # is sized per request up to this limit
+        return ollama_service.context_limit(model_id[len("ollama:"):])
+    return MODEL_CONTEXT_LENGTHS.get(model_id, DEFAULT_CONTEXT_LENGTH)
+
+
+# Largest image side (px) worth sending per model; bigger images are downscaled
+MODEL_IMAGE_MAX_DIMENSIONS: Dict[str, int] = {
+    "gpt-4.1": 2048,
+    "gpt-4o": 2048,
+    "gpt-4o-mini": 2048,
+    "gpt-4-turbo": 2048,
+    "claude-sonnet-4-20250514": 1568,
+    "claude-3-5-sonnet-20241022": 1568,
+    "claude-3-5-haiku-20241022": 1568,
+    "claude-3-opus-20240229": 1568,
+}
+# Local vision models (llava etc.) work at low resolutions
+OLLAMA_IMAGE_MAX_DIMENSION = 1024
+
+
+def get_image_max_dimension(model_id: Optional[str]) -> int:
+    """Get the maximum image dimension to send to a model.
+
+    Args:
+        model_id: Model identifier, None for default model
+
+    Returns:
+        Maximum width/height in pixels
+    """
+    model_id = model_id or settings.openai_model
+    if model_id.startswith("ollama:"):
+        return OLLAMA_IMAGE_MAX_DIMENSION
+    return MODEL_IMAGE_MAX_DIMENSIONS.get(model_id, settings.image_max_dimension)
+
+
 def load_user_settings() -> dict:
     """Load user settings from file"""
     if SETTINGS_FILE.exists():
@@ -261,25 +334,40 @@ async def test_connection():
     if not api_key:
         raise HTTPException(status_code=400, detail="API key not configured")
 
-    try:
-        from openai import AsyncOpenAI
+    from openai import AsyncOpenAI
+    from services.provider_clients import create_http_client, default_timeout, provider_clients
 
+    # The shared client is only used when testing the live settings; anything
+    # else would replace the client that chat requests are using
+    shared = api_key == settings.openai_api_key and (base_url or None) == (settings.openai_base_url or None)
+    if shared:
+        client = provider_clients.get("openai", api_key, base_url or None)
+    else:
+        timeout = default_timeout()
         client = AsyncOpenAI(
             api_key=api_key,
-            base_url=base_url if base_url else None,
+            base_url=base_url or None,
+            timeout=timeout,
+            max_retries=0,
+            http_client=create_http_client(timeout),
         )
 
+    try:
         # Use chat completion to test connection (works with all providers)
         # This is more reliable than models.list() which some providers don't support
-        await client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": "Hi"}],
-            max_tokens=1,  # Minimize cost
-        )
+        async with provider_clients.in_use(client):
+            await client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": "Hi"}],
+                max_tokens=1,  # Minimize cost
+            )
 
         return {"status": "success", "message": "Connection successful"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Connection failed: {str(e)}")
+    finally:
+        if not shared:
+            await client.close()
 
 
 # Ollama endpoints
@@ -296,6 +384,9 @@ class OllamaModelInfo(BaseModel):
     name: str
     size: int
     modified_at: Optional[str] = None
+    # From /api/show (None if unknown)
+    context_length: Optional[int] = None
+    capabilities: List[str] = []
 
 
 class OllamaModelsResponse(BaseModel):
@@ -303,6 +394,17 @@ class OllamaModelsResponse(BaseModel):
     models: List[OllamaModelInfo]
 
 
+class OllamaWarmupRequest(BaseModel):
+    """Ollama warm-up request"""
+    model: str
+
+
+class OllamaWarmupResponse(BaseModel):
+    """Ollama warm-up response"""
+    model: str
+    loaded: bool
+
+
 @router.get("/ollama/status", response_model=OllamaStatusResponse)
 async def get_ollama_status():
     """Check if Ollama service is available."""
@@ -324,13 +426,36 @@ async def get_ollama_models():
         return OllamaModelsResponse(models=[])
 
     models = await ollama_service.list_models()
+    # Cached per model, so only the first listing asks the server
+    details = await asyncio.gather(
+        *(ollama_service.get_model_details(m.get("name", "")) for m in models)
+    )
     return OllamaModelsResponse(
         models=[
             OllamaModelInfo(
                 name=m.get("name", ""),
                 size=m.get("size", 0),
                 modified_at=m.get("modified_at"),
+                context_length=d.context_length if d else None,
+                capabilities=d.capabilities if d else [],
             )
-            for m in models
+            for m, d in zip(models, details)
         ]
     )
+
+
+@router.post("/ollama/warmup", response_model=OllamaWarmupResponse)
+async def warmup_ollama_model(request: OllamaWarmupRequest):
+    """Load an Ollama model into memory before the first message."""
+    from services.ollama_service import ollama_service
+
+    model = request.model
+    if model.startswith("ollama:"):
+        model = model[len("ollama:"):]
+    if not model:
+        raise HTTPException(status_code=400, detail="Model name is required")
+    if not settings.ollama_enabled:
+        return OllamaWarmupResponse(model=model, loaded=False)
+
+    loaded = await ollama_service.warm_up(model)
+    return OllamaWarmupResponse(model=model, loaded=loaded)
@@ -0,0 +1,55 @@
+"""Usage API - token, latency and cost aggregates"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import get_session as get_db_session
+from models.usage import UsageAggregateList
+from services.usage import aggregate_usage
+
+router = APIRouter()
+
+
+async def _aggregate(
+    db: AsyncSession,
+    group_by: str,
+    days: Optional[int],
+    model: Optional[str],
+    limit: int,
+) -> UsageAggregateList:
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    items = await aggregate_usage(db, group_by, since=since, model_id=model, limit=limit)
+    return UsageAggregateList(group_by=group_by, since=since, items=items)
+
+
+@router.get("/models", response_model=UsageAggregateList)
+async def usage_by_model(
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Only the last N days (omit for all)"),
+    limit: int = Query(100, ge=1, le=500, description="Max models returned"),
+    db: AsyncSession = Depends(get_db_session),
+):
+    """Usage per model, largest first."""
+    return await _aggregate(db, "model", days, None, limit)
+
+
+@router.get("/daily", response_model=UsageAggregateList)
+async def usage_by_day(
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Only the last N days (omit for all)"),
+    model: Optional[str] = Query(None, description="Only this model"),
+    db: AsyncSession = Depends(get_db_session),
+):
+    """Usage per UTC day, oldest first."""
+    return await _aggregate(db, "day", days, model, 3650)
+
+
+@router.get("/sessions", response_model=UsageAggregateList)
+async def usage_by_session(
+    days: Optional[int] = Query(None, ge=1, le=3650, description="Only the last N days (omit for all)"),
+    model: Optional[str] = Query(None, description="Only this model"),
+    limit: int = Query(50, ge=1, le=500, description="Max sessions returned"),
+    db: AsyncSession = Depends(get_db_session),
+):
+    """Usage per session, largest first."""
+    return await _aggregate(db, "session", days, model, limit)
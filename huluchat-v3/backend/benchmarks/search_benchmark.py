@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Benchmark session search: FTS5 index (CJK bigrams) vs. the previous ILIKE scan.
+
+Builds a temporary SQLite database with a synthetic mixed Chinese/English
+corpus, then runs the same queries through:
+
+    ilike      the pre-FTS search_sessions: title and message ILIKE '%q%',
+               every matching message row loaded
+    unicode61  a plain unicode61 FTS5 index (whole CJK runs as one token)
+    fts        services.search.search_sessions (the current endpoint)
+
+Recall is measured per query against the sessions found by ilike (the
+substring ground truth for single-term queries) and averaged per query kind.
+
+Usage:
+    python benchmarks/search_benchmark.py
+    python benchmarks/search_benchmark.py --sessions 2000 --messages 30 --repeat 5
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+# Add the backend directory to the path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from api.sessions import SessionModel
+from core.database import Base
+from models.schemas import MessageModel
+from services.search import search_sessions
+
+# Common characters; the Chinese vocabulary is random 2-4 character words of them
+CHINESE_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说"
+    "产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点"
+    "从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原"
+    "又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革"
+    "位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强"
+)
+CHINESE_FILLER = ["的", "了", "是", "在", "我", "你", "这个", "一下", "怎么", "可以", "吗", "帮我"]
+ENGLISH_WORDS = [
+    "python", "rust", "docker", "kubernetes", "database", "index", "query", "latency",
+    "websocket", "stream", "token", "prompt", "model", "cache", "search", "sqlite",
+    "fastapi", "react", "typescript", "function", "error", "deploy", "server", "async",
+    "thread", "memory", "vector", "embedding", "gradient", "tensor", "compiler", "parser",
+    "router", "schema", "migration", "cursor", "snapshot", "replica", "cluster", "gateway",
+]
+
+
+class Vocabulary:
+    """Words drawn with Zipf (1/rank) frequencies, like words in real chat text."""
+
+    def __init__(self, words, rng: random.Random):
+        self.words = list(words)
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.words))))
+
+    def draw(self) -> str:
+        return self.rng.choices(self.words, cum_weights=self.cum_weights)[0]
+
+
+def make_vocabularies(rng: random.Random):
+    words = set()
+    while len(words) < 3000:
+        words.add("".join(rng.choice(CHINESE_CHARS) for _ in range(rng.choice((2, 2, 2, 3, 4)))))
+    zh_words = sorted(words)
+    rng.shuffle(zh_words)
+    return Vocabulary(zh_words, rng), Vocabulary(ENGLISH_WORDS, rng)
+
+
+def make_sentence(rng: random.Random, zh: Vocabulary, en: Vocabulary) -> str:
+    """A chat-like line: unsegmented Chinese with some English terms mixed in."""
+    if rng.random() < 0.25:
+        return " ".join(en.draw() for _ in range(rng.randint(6, 20))).capitalize() + "."
+    parts = []
+    for _ in range(rng.randint(6, 18)):
+        roll = rng.random()
+        if roll < 0.55:
+            parts.append(zh.draw())
+        elif roll < 0.9:
+            parts.append(rng.choice(CHINESE_FILLER))
+        else:
+            parts.append(f" {en.draw()} ")
+    return "".join(parts) + "。"
+
+
+def make_queries(zh: Vocabulary, en: Vocabulary):
+    """(kind, query) pairs at several frequency ranks of the vocabularies."""
+    queries = [(f"zh-{len(zh.words[rank])}char", zh.words[rank]) for rank in (0, 20, 300, 2000)]
+    queries += [
+        ("zh-phrase", zh.words[1] + zh.words[5]),
+        ("zh-phrase", zh.words[3][-1] + zh.words[40][0]),
+        ("zh-1char", zh.words[2][0]),
+        ("zh-1char", zh.words[500][-1]),
+        ("en-word", en.words[0]),
+        ("en-word", en.words[25]),
+        ("en-prefix", en.words[3][:4]),
+        ("en-prefix", en.words[30][:3]),
+        ("mixed", f"{en.words[1]} {zh.words[10]}"),
+        ("mixed", f"{en.words[15]} {zh.words[200]}"),
+    ]
+    return queries
+
+
+async def build_corpus(engine, sessions: int, messages: int, rng: random.Random, zh, en) -> int:
+    maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    now = datetime.utcnow()
+    total = 0
+    async with maker() as db:
+        for _ in range(sessions):
+            session_id = str(uuid.uuid4())
+            title = zh.draw() + zh.draw() if rng.random() < 0.7 else (
+                " ".join(en.draw() for _ in range(3)).title()
+            )
+            await db.execute(insert(SessionModel).values(
+                id=session_id, title=title, source="main", created_at=now, updated_at=now,
+            ))
+            rows = [
+                {
+                    "id": str(uuid.uuid4()),
+                    "session_id": session_id,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": " ".join(make_sentence(rng, zh, en) for _ in range(rng.randint(1, 6))),
+                    "created_at": now,
+                    "seq": i + 1,
+                }
+                for i in range(messages)
+            ]
+            await db.execute(insert(MessageModel), rows)
+            total += len(rows)
+        await db.commit()
+    return total
+
+
+async def ilike_search(db: AsyncSession, q: str) -> set:
+    """The search_sessions query path before the FTS index."""
+    query = q.lower().strip()
+    title_result = await db.execute(
+        select(SessionModel).where(SessionModel.title.ilike(f"%{query}%"))
+        .order_by(SessionModel.updated_at.desc())
+    )
+    found = {s.id for s in title_result.scalars().all()}
+    message_result = await db.execute(
+        select(MessageModel, SessionModel)
+        .join(SessionModel, MessageModel.session_id == SessionModel.id)
+        .where(MessageModel.content.ilike(f"%{query}%"))
+        .order_by(SessionModel.updated_at.desc())
+    )
+    for msg, session in message_result.all():
+        found.add(session.id)
+        # The old path built a snippet for every loaded row
+        msg.content.lower().find(query)
+    return found
+
+
+async def unicode61_search(db: AsyncSession, q: str) -> set:
+    terms = " ".join(f'"{term}"*' for term in q.lower().split())
+    result = await db.execute(text(
+        "SELECT DISTINCT m.session_id FROM words_fts JOIN messages AS m ON m.rowid = words_fts.rowid "
+        "WHERE words_fts MATCH :q "
+        "UNION SELECT s.id FROM sessions AS s WHERE s.title LIKE :like"
+    ), {"q": terms, "like": f"%{q}%"})
+    return set(result.scalars().all())
+
+
+async def fts_search(db: AsyncSession, q: str) -> set:
+    page = await search_sessions(db, q, limit=1_000_000)
+    return {hit.session_id for hit in page.hits}
+
+
+async def fts_first_page(db: AsyncSession, q: str) -> set:
+    page = await search_sessions(db, q, limit=50)
+    return {hit.session_id for hit in page.hits}
+
+
+async def timed(fn, db, q: str, repeat: int):
+    durations = []
+    result = set()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await fn(db, q)
+        durations.append(time.perf_counter() - started)
+    return result, statistics.median(durations) * 1000
+
+
+async def main(args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(text(
+                "CREATE VIRTUAL TABLE words_fts USING fts5(content, content='messages', "
+                "content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            ))
+
+        rng = random.Random(args.seed)
+        zh, en = make_vocabularies(rng)
+        queries = make_queries(zh, en)
+        started = time.perf_counter()
+        total = await build_corpus(engine, args.sessions, args.messages, rng, zh, en)
+        load_seconds = time.perf_counter() - started
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO words_fts(words_fts) VALUES ('rebuild')"))
+        print(f"Corpus: {args.sessions} sessions, {total} messages "
+              f"(generated and inserted with the index triggers in {load_seconds:.1f}s)\n")
+
+        maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        header = (f"{'kind':<10} {'query':<14} {'ilike':>7} {'ms':>8} | {'u61 rec':>7} {'ms':>7} | "
+                  f"{'fts rec':>7} {'ms':>7} {'page ms':>8}")
+        print(header)
+        print("-" * len(header))
+        recall = {"unicode61": {}, "fts": {}}
+        totals = {"ilike": 0.0, "unicode61": 0.0, "fts": 0.0, "page": 0.0}
+        async with maker() as db:
+            for kind, q in queries:
+                truth, ilike_ms = await timed(ilike_search, db, q, args.repeat)
+                words, words_ms = await timed(unicode61_search, db, q, args.repeat)
+                found, fts_ms = await timed(fts_search, db, q, args.repeat)
+                _page, page_ms = await timed(fts_first_page, db, q, args.repeat)
+                words_recall = len(words & truth) / len(truth) if truth else 1.0
+                fts_recall = len(found & truth) / len(truth) if truth else 1.0
+                recall["unicode61"].setdefault(kind, []).append(words_recall)
+                recall["fts"].setdefault(kind, []).append(fts_recall)
+                for key, value in (("ilike", ilike_ms), ("unicode61", words_ms), ("fts", fts_ms), ("page", page_ms)):
+                    totals[key] += value
+                print(f"{kind:<10} {q:<14} {len(truth):>7} {ilike_ms:>8.1f} | {words_recall:>7.2f} "
+                      f"{words_ms:>7.1f} | {fts_recall:>7.2f} {fts_ms:>7.1f} {page_ms:>8.1f}")
+
+        print("\nMean recall vs. ilike by query kind:")
+        for kind in dict.fromkeys(kind for kind, _q in queries):
+            print(f"  {kind:<10} unicode61 {statistics.mean(recall['unicode61'][kind]):.2f}   "
+                  f"fts {statistics.mean(recall['fts'][kind]):.2f}")
+        print(f"\nTotal median latency: ilike {totals['ilike']:.0f} ms, unicode61 {totals['unicode61']:.0f} ms, "
+              f"fts (all results) {totals['fts']:.0f} ms, fts (first page of 50) {totals['page']:.0f} ms")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000, help="Sessions in the corpus")
+    parser.add_argument("--messages", type=int, default=40, help="Messages per session")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per query (median is reported)")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
@@ -8,6 +8,8 @@ class Settings(BaseSettings):
 
     # Database - use absolute path for data directory
     database_url: str = "sqlite+aiosqlite:///./data/huluchat.db"
+    # Content-addressed storage for message attachments (images, files)
+    attachments_dir: str = "./data/attachments"
 
     # OpenAI
     openai_api_key: Optional[str] = None
@@ -27,6 +29,10 @@ class Settings(BaseSettings):
     top_p: float = 1.0
     max_tokens: int = 4096
 
+    # Upper bound on estimated prompt tokens sent per chat turn, even for
+    # models with larger context windows (keeps provider latency in check)
+    chat_context_max_tokens: int = 32000
+
     # Request timeouts (in seconds)
     # OpenAI/DeepSeek API timeout
     openai_timeout: int = 120
@@ -35,10 +41,111 @@ class Settings(BaseSettings):
     # Read timeout for non-streaming requests
     http_read_timeout: int = 60
 
+    # Provider HTTP connection pools (shared across requests)
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    # Seconds an idle connection is kept open for reuse
+    http_keepalive_expiry: float = 60.0
+    # Use HTTP/2 when the h2 package is installed
+    http2_enabled: bool = True
+
+    # Provider request scheduling (queued requests are served fairly across sessions)
+    # Concurrent requests per cloud provider (OpenAI-compatible APIs)
+    provider_max_concurrency: int = 8
+    # Concurrent requests per model (0 = no per-model limit)
+    model_max_concurrency: int = 4
+    # Initial request rate limit per cloud provider; replaced by the
+    # provider's x-ratelimit-* headers once known (0 = learn from headers)
+    provider_requests_per_minute: int = 0
+    # Concurrent generations sent to the local Ollama server
+    ollama_max_concurrency: int = 1
+
+    # Retries of transient provider errors (connection, timeout, 429, 5xx),
+    # with exponential backoff and jitter unless the provider sends Retry-After
+    provider_max_retries: int = 3
+    provider_retry_base_delay: float = 0.5
+    provider_retry_max_delay: float = 8.0
+    # Max total seconds a single request may spend waiting between retries
+    provider_retry_budget_seconds: float = 30.0
+
+    # Stream deadlines (seconds, 0 disables): until the first token, and the
+    # longest gap between chunks after that
+    chat_first_token_timeout: float = 60.0
+    chat_stall_timeout: float = 45.0
+    # Comma-separated models tried in order when the requested model stalls
+    # or fails before sending anything, e.g. "gpt-4o-mini,ollama:llama3"
+    chat_fallback_models: str = ""
+
+    # Hedged requests for quick panel sessions: when the model has not sent
+    # a first token after the given percentile of its recent first-token
+    # latencies, the same request is also sent to the hedge model and the
+    # faster stream wins
+    quickpanel_hedge_enabled: bool = False
+    # Hedge model (empty = the first of chat_fallback_models)
+    quickpanel_hedge_model: str = ""
+    quickpanel_hedge_percentile: float = 90.0
+    # Hedge delay (seconds) until enough latencies are known, and its lower bound
+    quickpanel_hedge_default_delay: float = 2.0
+    quickpanel_hedge_min_delay: float = 0.3
+
+    # Usage capture: token counts, latency and estimated cost per response
+    usage_tracking_enabled: bool = True
+    # Ask OpenAI-compatible APIs for token usage in streams (stream_options);
+    # disable for servers that reject the parameter
+    provider_stream_usage: bool = True
+
+    # Per-turn tracing: a span per chat turn phase (see /api/debug/traces)
+    chat_tracing_enabled: bool = True
+    # Finished traces kept in memory
+    chat_trace_buffer_size: int = 100
+    # Turns slower than this (seconds) are logged as JSON to huluchat.slow_turns (0 disables)
+    chat_trace_slow_seconds: float = 30.0
+    # Also append slow turns to this file, one JSON object per line (empty = log only)
+    chat_trace_log_file: str = ""
+
+    # WebSocket stream coalescing (clients can override per connection)
+    # Buffered stream_chunk text is flushed after this many ms (0 disables)...
+    ws_coalesce_window_ms: int = 30
+    # ...or as soon as this many bytes are buffered, whichever comes first
+    ws_coalesce_max_bytes: int = 1024
+    # Max queued outbound messages per connection before a slow client is dropped
+    ws_outbound_queue_size: int = 256
+    # Seconds a generation keeps running after its client disconnects,
+    # waiting for the client to reconnect and resume the stream
+    stream_resume_grace_seconds: int = 60
+    # Events kept per generation for replay on resume
+    stream_resume_buffer_size: int = 1024
+    # Partial assistant responses are written to the database every N
+    # estimated tokens or T seconds while streaming, whichever comes first
+    chat_checkpoint_tokens: int = 200
+    chat_checkpoint_interval_seconds: float = 2.0
+
+    # Images sent to vision models
+    # Default max width/height for models without a known limit
+    image_max_dimension: int = 1568
+    # JPEG quality used when re-encoding downscaled images
+    image_jpeg_quality: int = 85
+    # Memory budget of the prepared image cache
+    image_cache_max_bytes: int = 64 * 1024 * 1024
+    # Images older than the last N user turns are replaced with a placeholder (0 keeps all)
+    chat_image_keep_turns: int = 2
+
     # Ollama
     ollama_enabled: bool = True
     ollama_base_url: str = "http://localhost:11434"
     ollama_timeout: int = 120
+    # Seconds the server status and model list are cached
+    ollama_status_ttl_seconds: float = 15.0
+    # Seconds model metadata (/api/show: context length, capabilities) is cached
+    ollama_model_info_ttl_seconds: float = 600.0
+    # Seconds before a failed probe is retried
+    ollama_retry_seconds: float = 2.0
+    # How long a model stays loaded after a request (Ollama duration, "-1" = forever)
+    ollama_keep_alive: str = "30m"
+    # Size num_ctx from the conversation instead of using the server default
+    ollama_auto_num_ctx: bool = True
+    # Upper bound for the automatic num_ctx (memory use grows with it)
+    ollama_max_num_ctx: int = 32768
 
     # Server
     host: str = "127.0.0.1"
@@ -1,13 +1,23 @@
 """
 HuluChat v3 - FastAPI Backend
 """
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from api import sessions, chat, health, settings, folders, templates, tags, bookmarks, mcp, preferences
-from api import session_templates, custom_commands
-from core.database import init_db
+from api import session_templates, custom_commands, attachments, usage, metrics, debug
+from core.database import engine, init_db, async_session
+from services.attachments import migrate_inline_attachments, sweep_unreferenced
+from services.ollama_service import ollama_service
+from services.provider_clients import provider_clients
+from services.message_checkpoint import recover_interrupted_messages
+from services.search import ensure_search_index
+from services.metrics import MetricsMiddleware, instrument_engine
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
@@ -15,9 +25,40 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     await init_db()
+    # Close replies that were still streaming when the last process stopped
+    try:
+        async with async_session() as db:
+            await recover_interrupted_messages(db)
+    except Exception as e:
+        logger.warning(f"Failed to recover interrupted messages: {type(e).__name__}")
+    # Re-index search if a VACUUM or table rebuild renumbered rowids
+    try:
+        async with async_session() as db:
+            rebuilt = await ensure_search_index(db)
+        if rebuilt:
+            logger.info(f"Rebuilt search index for {', '.join(rebuilt)}")
+    except Exception as e:
+        logger.warning(f"Failed to check search index: {type(e).__name__}")
+    # Remove unreferenced attachment blobs before any request can reference them
+    try:
+        async with async_session() as db:
+            await sweep_unreferenced(db)
+    except Exception as e:
+        logger.warning(f"Failed to sweep attachments: {type(e).__name__}")
+    # Move inline base64 attachments of older messages to the blob store
+    migration_task = asyncio.create_task(migrate_inline_attachments(async_session))
     yield
     # Shutdown
-    pass
+    migration_task.cancel()
+    try:
+        await migration_task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        logger.warning(f"Attachment migration failed: {type(e).__name__}")
+    # Close pooled provider connections
+    await provider_clients.close()
+    await ollama_service.close()
 
 
 app = FastAPI(
@@ -34,7 +75,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursor of /api/sessions/search/
+    expose_headers=["X-Next-Cursor"],
 )
+# Request latency per route, served with the other metrics at /api/metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
 
 # Include routers
 app.include_router(health.router, prefix="/api", tags=["health"])
@@ -48,7 +94,11 @@ app.include_router(bookmarks.router, prefix="/api", tags=["bookmarks"])
 app.include_router(mcp.router, prefix="/api", tags=["mcp"])
 app.include_router(preferences.router, prefix="/api/preferences", tags=["preferences"])
 app.include_router(session_templates.router, prefix="/api", tags=["session-templates"])
+app.include_router(attachments.router, prefix="/api/attachments", tags=["attachments"])
 app.include_router(custom_commands.router, prefix="/api", tags=["custom-commands"])
+app.include_router(usage.router, prefix="/api/usage", tags=["usage"])
+app.include_router(metrics.router, prefix="/api", tags=["metrics"])
+app.include_router(debug.router, prefix="/api/debug", tags=["debug"])
 
 
 if __name__ == "__main__":
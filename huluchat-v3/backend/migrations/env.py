@@ -15,6 +15,10 @@ from api.sessions import SessionModel
 from api.folders import FolderModel
 from api.templates import PromptTemplateModel
 from models.tags_bookmarks import SessionTagModel, MessageBookmarkModel
+from models.attachments import AttachmentModel
+from models.usage import MessageUsageModel
+# Registers search_tokens() on SQLite connections (used by the FTS triggers)
+import models.search  # noqa: F401
 
 # Import config for database URL
 from core.config import settings
@@ -19,10 +19,17 @@ depends_on: Union[str, Sequence[str], None] = None
 
 
 def upgrade() -> None:
+    # Check if columns already exist (may have been added in initial schema)
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('messages')]
+
     # Add images and files columns to messages table
     with op.batch_alter_table('messages') as batch_op:
-        batch_op.add_column(sa.Column('images', sa.Text(), nullable=True))
-        batch_op.add_column(sa.Column('files', sa.Text(), nullable=True))
+        if 'images' not in columns:
+            batch_op.add_column(sa.Column('images', sa.Text(), nullable=True))
+        if 'files' not in columns:
+            batch_op.add_column(sa.Column('files', sa.Text(), nullable=True))
 
 
 def downgrade() -> None:
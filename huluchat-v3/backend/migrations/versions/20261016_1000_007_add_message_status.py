@@ -0,0 +1,39 @@
+"""Add status column to messages table
+
+Revision ID: 007_add_message_status
+Revises: 006_add_session_templates
+Create Date: 2026-10-16
+
+Tracks the generation status of assistant messages:
+- complete: Normal, fully generated message (default for existing rows)
+- cancelled: Partial response stopped by the client
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007_add_message_status'
+down_revision: Union[str, None] = '006_add_session_templates'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('messages')]
+
+    if 'status' not in columns:
+        op.add_column(
+            'messages',
+            sa.Column('status', sa.String(20), nullable=False, server_default='complete')
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.drop_column('status')
@@ -0,0 +1,36 @@
+"""Add file_context column to messages table
+
+Revision ID: 008_add_message_file_context
+Revises: 007_add_message_status
+Create Date: 2026-10-16
+
+Stores the text extracted from a message's file attachments at save time,
+so the chat context no longer decodes attachments on every turn.
+Existing rows keep NULL and are extracted on the fly when loaded.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008_add_message_file_context'
+down_revision: Union[str, None] = '007_add_message_status'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('messages')]
+
+    if 'file_context' not in columns:
+        op.add_column('messages', sa.Column('file_context', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.drop_column('file_context')
@@ -0,0 +1,50 @@
+"""Add attachments table for the content-addressed blob store
+
+Revision ID: 009_add_attachments
+Revises: 008_add_message_file_context
+Create Date: 2026-10-16
+
+Attachment contents move from base64 data URLs in messages.images /
+messages.files to blob files keyed by SHA-256. Existing messages are
+converted online, in small batches, after the app starts
+(services.attachments.migrate_inline_attachments), so this migration only
+creates the table.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '009_add_attachments'
+down_revision: Union[str, None] = '008_add_message_file_context'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    existing_tables = inspector.get_table_names()
+
+    if 'attachments' not in existing_tables:
+        op.create_table(
+            'attachments',
+            sa.Column('id', sa.String(), nullable=False),
+            sa.Column('mime_type', sa.String(), nullable=False),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    existing_tables = inspector.get_table_names()
+
+    if 'attachments' in existing_tables:
+        op.drop_table('attachments')
@@ -0,0 +1,62 @@
+"""Add message_usage table for token, latency and cost capture
+
+Revision ID: 010_add_message_usage
+Revises: 009_add_attachments
+Create Date: 2026-10-16
+
+One row per assistant response: prompt/completion tokens, time to first
+token, total latency and estimated cost. Existing messages have no usage
+data, so nothing is backfilled.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '010_add_message_usage'
+down_revision: Union[str, None] = '009_add_attachments'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    existing_tables = inspector.get_table_names()
+
+    if 'message_usage' not in existing_tables:
+        op.create_table(
+            'message_usage',
+            sa.Column('id', sa.String(), nullable=False),
+            sa.Column('message_id', sa.String(), nullable=False),
+            sa.Column('session_id', sa.String(), nullable=False),
+            sa.Column('model_id', sa.String(), nullable=False),
+            sa.Column('provider', sa.String(), nullable=False),
+            sa.Column('status', sa.String(), nullable=False),
+            sa.Column('prompt_tokens', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('completion_tokens', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('estimated', sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column('first_token_seconds', sa.Float(), nullable=True),
+            sa.Column('total_seconds', sa.Float(), nullable=False, server_default='0'),
+            sa.Column('cost', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_message_usage_message_id', 'message_usage', ['message_id'])
+        op.create_index('ix_message_usage_session_id', 'message_usage', ['session_id'])
+        op.create_index('ix_message_usage_created_at', 'message_usage', ['created_at'])
+        op.create_index(
+            'ix_message_usage_model_created', 'message_usage', ['model_id', 'created_at']
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    existing_tables = inspector.get_table_names()
+
+    if 'message_usage' in existing_tables:
+        op.drop_table('message_usage')
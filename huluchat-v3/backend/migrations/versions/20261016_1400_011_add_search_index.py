@@ -0,0 +1,95 @@
+"""Add FTS5 full-text index for messages and session titles
+
+Revision ID: 011_add_search_index
+Revises: 010_add_message_usage
+Create Date: 2026-10-16
+
+messages_fts and sessions_fts are external-content FTS5 tables over
+messages.content and sessions.title, kept in sync by triggers. Existing
+rows are indexed in batches of BACKFILL_BATCH_SIZE rowids, so a large
+history never builds one huge FTS transaction segment in memory.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011_add_search_index'
+down_revision: Union[str, None] = '010_add_message_usage'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 2000
+
+# (table, indexed column)
+INDEXED = [('messages', 'content'), ('sessions', 'title')]
+
+
+def _create_statements(table: str, column: str) -> list:
+    fts = f'{table}_fts'
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column}, content='{table}', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+            INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column});
+        END""",
+    ]
+
+
+def _backfill(conn, table: str, column: str) -> None:
+    """Index the rows that existed before the triggers, one rowid range at a time."""
+    fts = f'{table}_fts'
+    last_rowid = conn.execute(sa.text(f'SELECT max(rowid) FROM {table}')).scalar()
+    if last_rowid is None:
+        return
+    start = 0
+    while start < last_rowid:
+        end = start + BACKFILL_BATCH_SIZE
+        conn.execute(
+            sa.text(
+                f'INSERT INTO {fts}(rowid, {column}) '
+                f'SELECT rowid, {column} FROM {table} WHERE rowid > :start AND rowid <= :end'
+            ),
+            {'start': start, 'end': min(end, last_rowid)},
+        )
+        start = end
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    existing_tables = sa.inspect(conn).get_table_names()
+
+    for table, column in INDEXED:
+        if f'{table}_fts' in existing_tables:
+            continue
+        # Index existing rows first; the triggers cover every later write
+        op.execute(_create_statements(table, column)[0])
+        _backfill(conn, table, column)
+        for statement in _create_statements(table, column)[1:]:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+
+    for table, _column in INDEXED:
+        fts = f'{table}_fts'
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+        op.execute(f'DROP TABLE IF EXISTS {fts}')
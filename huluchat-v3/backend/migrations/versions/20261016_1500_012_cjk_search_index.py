@@ -0,0 +1,125 @@
+"""Rebuild the FTS5 search index with CJK bigram tokens
+
+Revision ID: 012_cjk_search_index
+Revises: 011_add_search_index
+Create Date: 2026-10-16
+
+The unicode61 index from 011 treats a run of Chinese/Japanese/Korean text
+as a single token, so CJK words inside a sentence could not be found.
+messages_fts and sessions_fts become contentless tables over
+search_tokens(text): words for Latin text, overlapping bigrams for CJK runs
+(see models/search.py). search_tokens() is an application SQL function,
+registered on every connection by models.search (imported by env.py).
+
+Existing rows are indexed in batches of BACKFILL_BATCH_SIZE rowids.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '012_cjk_search_index'
+down_revision: Union[str, None] = '011_add_search_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 2000
+
+# (table, indexed column)
+INDEXED = [('messages', 'content'), ('sessions', 'title')]
+
+
+def _drop(table: str) -> None:
+    fts = f'{table}_fts'
+    for suffix in ('ai', 'ad', 'au'):
+        op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+    op.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def _backfill(conn, table: str, column: str, value: str) -> None:
+    """Index existing rows one rowid range at a time."""
+    fts = f'{table}_fts'
+    last_rowid = conn.execute(sa.text(f'SELECT max(rowid) FROM {table}')).scalar()
+    if last_rowid is None:
+        return
+    start = 0
+    while start < last_rowid:
+        end = start + BACKFILL_BATCH_SIZE
+        conn.execute(
+            sa.text(
+                f'INSERT INTO {fts}(rowid, {column}) '
+                f'SELECT rowid, {value} FROM {table} WHERE rowid > :start AND rowid <= :end'
+            ),
+            {'start': start, 'end': min(end, last_rowid)},
+        )
+        start = end
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+
+    for table, column in INDEXED:
+        fts = f'{table}_fts'
+        _drop(table)
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"{column}, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        _backfill(conn, table, column, f'search_tokens({column})')
+        op.execute(
+            f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, search_tokens(new.{column}));
+            END"""
+        )
+        op.execute(
+            f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column})
+                VALUES ('delete', old.rowid, search_tokens(old.{column}));
+            END"""
+        )
+        op.execute(
+            f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table}
+            WHEN old.{column} IS NOT new.{column} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column})
+                VALUES ('delete', old.rowid, search_tokens(old.{column}));
+                INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, search_tokens(new.{column}));
+            END"""
+        )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+
+    # Back to the unicode61 external-content index of 011
+    for table, column in INDEXED:
+        fts = f'{table}_fts'
+        _drop(table)
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"{column}, content='{table}', content_rowid='rowid', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        _backfill(conn, table, column, column)
+        op.execute(
+            f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column});
+            END"""
+        )
+        op.execute(
+            f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+            END"""
+        )
+        op.execute(
+            f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});
+                INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column});
+            END"""
+        )
@@ -0,0 +1,58 @@
+"""Add (timestamp, id) indexes for keyset pages of sessions and messages
+
+Revision ID: 013_add_keyset_indexes
+Revises: 012_cjk_search_index
+Create Date: 2026-10-16
+
+The session list is ordered by updated_at DESC, id DESC and paged with
+(updated_at, id) cursors; without a folder filter no index covered that
+order, so every page sorted the whole table.
+
+Message pages are ordered by (created_at, id). The (session_id, created_at)
+index could not break created_at ties, so SQLite sorted the rest of the
+session in a temporary B-tree; it is replaced by (session_id, created_at,
+id), which also serves every query the old index did.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '013_add_keyset_indexes'
+down_revision: Union[str, None] = '012_cjk_search_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _index_names(conn, table: str) -> set:
+    return {index['name'] for index in sa.inspect(conn).get_indexes(table)}
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    if 'ix_sessions_updated_id' not in _index_names(conn, 'sessions'):
+        op.create_index('ix_sessions_updated_id', 'sessions', ['updated_at', 'id'])
+
+    message_indexes = _index_names(conn, 'messages')
+    if 'ix_messages_session_created_id' not in message_indexes:
+        op.create_index(
+            'ix_messages_session_created_id', 'messages', ['session_id', 'created_at', 'id']
+        )
+    if 'ix_messages_session_created' in message_indexes:
+        op.drop_index('ix_messages_session_created', table_name='messages')
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+
+    message_indexes = _index_names(conn, 'messages')
+    if 'ix_messages_session_created' not in message_indexes:
+        op.create_index('ix_messages_session_created', 'messages', ['session_id', 'created_at'])
+    if 'ix_messages_session_created_id' in message_indexes:
+        op.drop_index('ix_messages_session_created_id', table_name='messages')
+
+    if 'ix_sessions_updated_id' in _index_names(conn, 'sessions'):
+        op.drop_index('ix_sessions_updated_id', table_name='sessions')
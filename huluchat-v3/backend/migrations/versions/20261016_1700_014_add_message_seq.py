@@ -0,0 +1,76 @@
+"""Add per-session message sequence numbers
+
+Revision ID: 014_add_message_seq
+Revises: 013_add_keyset_indexes
+Create Date: 2026-10-16
+
+Messages were ordered by created_at, which ties (or reorders) for messages
+written in the same clock tick. messages.seq numbers the messages of each
+session 1, 2, ... and (session_id, seq) is a unique index used for
+ordering, history loads, regenerate/edit truncation and pagination. It
+replaces the (session_id, created_at, id) index.
+
+Existing messages are numbered by (created_at, rowid); rowid follows
+insertion order, so it breaks timestamp ties the way the rows were written.
+
+The column is added with ALTER TABLE, not a batch table rebuild: a rebuild
+would drop the search index triggers and renumber the rowids the index
+refers to.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '014_add_message_seq'
+down_revision: Union[str, None] = '013_add_keyset_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('messages')]
+    indexes = {index['name'] for index in inspector.get_indexes('messages')}
+
+    if 'seq' not in columns:
+        op.add_column('messages', sa.Column('seq', sa.Integer(), nullable=True))
+
+    op.execute("DROP TABLE IF EXISTS temp.message_seq")
+    op.execute("CREATE TEMP TABLE message_seq (id VARCHAR PRIMARY KEY, seq INTEGER NOT NULL)")
+    op.execute(
+        """
+        INSERT INTO temp.message_seq (id, seq)
+        SELECT id, row_number() OVER (PARTITION BY session_id ORDER BY created_at, rowid)
+        FROM messages
+        """
+    )
+    op.execute(
+        "UPDATE messages SET seq = (SELECT seq FROM temp.message_seq WHERE message_seq.id = messages.id)"
+    )
+    op.execute("DROP TABLE temp.message_seq")
+
+    if 'ix_messages_session_seq' not in indexes:
+        op.create_index('ix_messages_session_seq', 'messages', ['session_id', 'seq'], unique=True)
+    if 'ix_messages_session_created_id' in indexes:
+        op.drop_index('ix_messages_session_created_id', table_name='messages')
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = [col['name'] for col in inspector.get_columns('messages')]
+    indexes = {index['name'] for index in inspector.get_indexes('messages')}
+
+    if 'ix_messages_session_created_id' not in indexes:
+        op.create_index(
+            'ix_messages_session_created_id', 'messages', ['session_id', 'created_at', 'id']
+        )
+    if 'ix_messages_session_seq' in indexes:
+        op.drop_index('ix_messages_session_seq', table_name='messages')
+    if 'seq' in columns:
+        # Plain ALTER TABLE DROP COLUMN (SQLite 3.35+), see the note above
+        op.drop_column('messages', 'seq')
@@ -0,0 +1,131 @@
+"""Add denormalized session summary columns
+
+Revision ID: 015_add_session_summary
+Revises: 014_add_message_seq
+Create Date: 2026-10-16
+
+sessions gets message_count, last_message_at, last_message_preview,
+last_model_id and total_tokens, so the session list can show them without
+loading messages. Existing sessions are backfilled from their messages and
+message_usage rows; triggers keep the columns current from then on (see
+models/session_summary.py, which creates the same triggers for create_all).
+
+Columns are added and dropped with plain ALTER TABLE: a batch rebuild of
+sessions would drop its search index triggers and renumber its rowids.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '015_add_session_summary'
+down_revision: Union[str, None] = '014_add_message_seq'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Characters of the last message kept in last_message_preview
+PREVIEW_CHARS = 120
+
+
+def _columns() -> list:
+    return [
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('last_message_preview', sa.String(), nullable=True),
+        sa.Column('last_model_id', sa.String(), nullable=True),
+        sa.Column('total_tokens', sa.Integer(), nullable=False, server_default='0'),
+    ]
+
+
+TRIGGERS = ['message_ai', 'message_ad', 'message_au', 'usage_ai', 'usage_ad']
+
+
+def _last_message(column: str, session_id: str, where: str = '') -> str:
+    return (
+        f'(SELECT {column} FROM messages WHERE session_id = {session_id}{where} '
+        f'ORDER BY seq DESC LIMIT 1)'
+    )
+
+
+PREVIEW = f'substr(content, 1, {PREVIEW_CHARS})'
+LAST_MODEL_WHERE = ' AND model_id IS NOT NULL'
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    columns = [col['name'] for col in sa.inspect(conn).get_columns('sessions')]
+
+    for column in _columns():
+        if column.name not in columns:
+            op.add_column('sessions', column)
+
+    op.execute(
+        f"""UPDATE sessions SET
+            message_count = (SELECT count(*) FROM messages WHERE session_id = sessions.id),
+            last_message_at = {_last_message('created_at', 'sessions.id')},
+            last_message_preview = {_last_message(PREVIEW, 'sessions.id')},
+            last_model_id = {_last_message('model_id', 'sessions.id', LAST_MODEL_WHERE)},
+            total_tokens = (
+                SELECT coalesce(sum(prompt_tokens + completion_tokens), 0)
+                FROM message_usage WHERE session_id = sessions.id
+            )"""
+    )
+
+    op.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS session_summary_message_ai AFTER INSERT ON messages BEGIN
+            UPDATE sessions SET
+                message_count = message_count + 1,
+                last_message_at = new.created_at,
+                last_message_preview = substr(new.content, 1, {PREVIEW_CHARS}),
+                last_model_id = coalesce(new.model_id, last_model_id)
+            WHERE id = new.session_id;
+        END"""
+    )
+    op.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS session_summary_message_ad AFTER DELETE ON messages BEGIN
+            UPDATE sessions SET
+                message_count = max(message_count - 1, 0),
+                last_message_at = {_last_message('created_at', 'old.session_id')},
+                last_message_preview = {_last_message(PREVIEW, 'old.session_id')},
+                last_model_id = {_last_message('model_id', 'old.session_id', LAST_MODEL_WHERE)}
+            WHERE id = old.session_id;
+        END"""
+    )
+    op.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS session_summary_message_au
+        AFTER UPDATE OF content, model_id ON messages
+        WHEN old.content IS NOT new.content OR old.model_id IS NOT new.model_id BEGIN
+            UPDATE sessions SET
+                last_message_preview = {_last_message(PREVIEW, 'new.session_id')},
+                last_model_id = {_last_message('model_id', 'new.session_id', LAST_MODEL_WHERE)}
+            WHERE id = new.session_id;
+        END"""
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS session_summary_usage_ai AFTER INSERT ON message_usage BEGIN
+            UPDATE sessions SET total_tokens = total_tokens + new.prompt_tokens + new.completion_tokens
+            WHERE id = new.session_id;
+        END"""
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS session_summary_usage_ad AFTER DELETE ON message_usage BEGIN
+            UPDATE sessions SET
+                total_tokens = max(total_tokens - old.prompt_tokens - old.completion_tokens, 0)
+            WHERE id = old.session_id;
+        END"""
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS session_summary_{name}')
+
+    columns = [col['name'] for col in sa.inspect(conn).get_columns('sessions')]
+    for column in reversed(_columns()):
+        if column.name in columns:
+            # Plain ALTER TABLE DROP COLUMN (SQLite 3.35+), see the note above
+            op.drop_column('sessions', column.name)
@@ -0,0 +1,59 @@
+"""Add a per-session message seq high-water mark
+
+Revision ID: 016_add_session_next_seq
+Revises: 015_add_session_summary
+Create Date: 2026-10-17
+
+Messages were numbered max(seq) + 1, so deleting the newest messages
+(regenerate, edit truncation) handed their numbers to the next messages and
+a cursor holding an old seq pointed at a different message. sessions.next_seq
+is the number of the next message: a trigger raises it on every insert and
+nothing lowers it. Existing sessions start after their last message.
+
+The column is added with plain ALTER TABLE: a batch rebuild of sessions
+would drop its search index triggers and renumber its rowids.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '016_add_session_next_seq'
+down_revision: Union[str, None] = '015_add_session_summary'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    columns = [col['name'] for col in sa.inspect(conn).get_columns('sessions')]
+
+    if 'next_seq' not in columns:
+        op.add_column(
+            'sessions', sa.Column('next_seq', sa.Integer(), nullable=False, server_default='1')
+        )
+
+    op.execute(
+        """UPDATE sessions SET next_seq = coalesce(
+            (SELECT max(seq) FROM messages WHERE session_id = sessions.id), 0
+        ) + 1"""
+    )
+    op.execute(
+        """CREATE TRIGGER IF NOT EXISTS session_summary_message_seq AFTER INSERT ON messages BEGIN
+            UPDATE sessions SET next_seq = max(next_seq, new.seq + 1)
+            WHERE id = new.session_id;
+        END"""
+    )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+
+    op.execute('DROP TRIGGER IF EXISTS session_summary_message_seq')
+
+    columns = [col['name'] for col in sa.inspect(conn).get_columns('sessions')]
+    if 'next_seq' in columns:
+        # Plain ALTER TABLE DROP COLUMN (SQLite 3.35+), see the note above
+        op.drop_column('sessions', 'next_seq')
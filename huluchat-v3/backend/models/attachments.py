@@ -0,0 +1,22 @@
+"""Content-addressed attachment model."""
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+
+class AttachmentModel(Base):
+    """Database model for a stored attachment blob.
+
+    The id is the SHA-256 of the content, so identical uploads share one
+    blob on disk. ref_count counts the message references to it; blobs
+    that drop to zero are removed by the startup sweep.
+    """
+    __tablename__ = "attachments"
+
+    id: Mapped[str] = mapped_column(primary_key=True)  # SHA-256 hex digest
+    mime_type: Mapped[str] = mapped_column(default="application/octet-stream")
+    size: Mapped[int] = mapped_column(default=0)
+    ref_count: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
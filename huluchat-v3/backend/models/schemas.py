@@ -3,16 +3,23 @@ from datetime import datetime
 from typing import Optional, List
 from pydantic import BaseModel
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Text, Index
+from sqlalchemy import Text, Index, column, event, func, select, table
 
 from core.database import Base
 
+# Generation status of a message
+MESSAGE_STATUS_COMPLETE = "complete"
+MESSAGE_STATUS_CANCELLED = "cancelled"
+MESSAGE_STATUS_STREAMING = "streaming"
+MESSAGE_STATUS_ERROR = "error"
+
 
 class MessageModel(Base):
     """Database model for messages."""
     __tablename__ = "messages"
     __table_args__ = (
-        Index('ix_messages_session_created', 'session_id', 'created_at'),
+        # Ordering, history loads, regenerate truncation and keyset pages
+        Index('ix_messages_session_seq', 'session_id', 'seq', unique=True),
     )
 
     id: Mapped[str] = mapped_column(primary_key=True)
@@ -23,13 +30,56 @@ class MessageModel(Base):
     images: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     # Store files as JSON string: [{"id": "...", "name": "...", "type": "...", "size": 123, "content": "data:..."}]
     files: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Text extracted from the files once at save time, used for the AI context
+    file_context: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     # Model used to generate this message (for AI messages)
     model_id: Mapped[Optional[str]] = mapped_column(nullable=True)
     # Original message ID if this is a regenerated response
     regenerated_from: Mapped[Optional[str]] = mapped_column(nullable=True)
     # When this message was regenerated
     regenerated_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    # 'complete', 'streaming' while being generated, or 'cancelled' / 'error'
+    # for a partial response
+    status: Mapped[str] = mapped_column(
+        default=MESSAGE_STATUS_COMPLETE, server_default=MESSAGE_STATUS_COMPLETE
+    )
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    # Position in the session (1, 2, ...), assigned on insert. Unlike
+    # created_at it never ties, so it defines the order of a conversation.
+    # Numbers are never reused: after a regenerate/edit truncation the next
+    # message continues from the session's next_seq
+    seq: Mapped[Optional[int]] = mapped_column(nullable=True)
+
+
+# The sessions columns the seq assignment reads (SessionModel lives in api/sessions.py)
+_sessions = table("sessions", column("id"), column("next_seq"))
+
+
+@event.listens_for(MessageModel, "before_insert")
+def assign_message_seq(mapper, connection, target: MessageModel) -> None:
+    """Number a new message after every number its session has used.
+
+    sessions.next_seq is a high-water mark raised by a trigger on insert
+    (models/session_summary.py) and never lowered by deletes, so a number
+    that a cursor may still hold is not given to a different message. The
+    latest seq + 1 covers messages of sessions without a row.
+
+    The number is a subquery of the INSERT itself, so two writers cannot
+    read the same maximum; the unique (session_id, seq) index backs this up.
+    The attribute is expired after the flush: refresh the object to read it.
+    """
+    if target.seq is None:
+        next_seq = (
+            select(_sessions.c.next_seq)
+            .where(_sessions.c.id == target.session_id)
+            .scalar_subquery()
+        )
+        after_last = (
+            select(func.coalesce(func.max(MessageModel.seq), 0) + 1)
+            .where(MessageModel.session_id == target.session_id)
+            .scalar_subquery()
+        )
+        target.seq = select(func.max(func.coalesce(next_seq, 1), after_last)).scalar_subquery()
 
 
 class MessageCreate(BaseModel):
@@ -48,6 +98,7 @@ class MessageResponse(BaseModel):
     model_id: Optional[str] = None
     regenerated_from: Optional[str] = None
     regenerated_at: Optional[datetime] = None
+    status: str = MESSAGE_STATUS_COMPLETE
     created_at: datetime
 
     class Config:
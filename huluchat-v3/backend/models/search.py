@@ -0,0 +1,162 @@
+"""SQLite FTS5 index of message contents and session titles.
+
+Chinese, Japanese and Korean text has no spaces between words, so FTS5's
+unicode61 tokenizer would index a whole CJK run as one token and only match
+it exactly. Text is therefore indexed through search_tokens(), which keeps
+Latin words (and other space-separated scripts) as words and splits CJK
+runs into overlapping bigrams plus the run's last character:
+
+    "HuluChat 引用回复" -> "huluchat 引用 用回 回复 复"
+
+A CJK query of two or more characters becomes a phrase of its bigrams,
+which matches exactly where the characters appear consecutively (the same
+substring semantics as LIKE); a single character is a prefix query. Unlike
+a trigram index, two-character words - most Chinese words - use the index.
+
+messages_fts and sessions_fts are contentless FTS5 tables holding only the
+inverted index of search_tokens(text). Triggers keep them in sync with every
+insert, delete and content/title update, including bulk deletes that bypass
+the ORM; search_tokens() is registered as an SQL function on every SQLite
+connection for them. Snippets are built from the original rows by
+services/search.py.
+
+Rowids of tables without an INTEGER PRIMARY KEY can change on VACUUM or
+when a table is rebuilt (including alembic batch operations). At startup
+services.search.ensure_search_index() compares the rowids held by each index
+with the table's and rebuilds an index whose rowids no longer match.
+
+The tables are created by migrations 011/012; the metadata listener below
+does the same for databases built with create_all (tests, first-run
+fallback).
+"""
+import re
+from typing import List
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from core.database import Base
+
+# Hiragana, katakana, CJK unified ideographs (+ extension A), compatibility ideographs, Hangul
+CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_CHAR = re.compile(f"[{CJK_RANGES}]")
+# A CJK run, or a word of other letters and digits (underscore separates, as in unicode61)
+TOKEN_PATTERN = re.compile(f"[{CJK_RANGES}]+|[^\\W_{CJK_RANGES}]+")
+
+# Folds case and diacritics of the words search_tokens() emits
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+FTS_PREFIX = "2 3"
+
+# (table, indexed column)
+INDEXED_COLUMNS = [("messages", "content"), ("sessions", "title")]
+
+
+def is_cjk(token: str) -> bool:
+    return _CJK_CHAR.match(token) is not None
+
+
+def cjk_bigrams(run: str) -> List[str]:
+    """Overlapping bigrams of a CJK run (a single character stays as is)."""
+    return [run[i:i + 2] for i in range(len(run) - 1)] or [run]
+
+
+def search_tokens(value) -> str:
+    """The text that is indexed for a message or title, space-separated."""
+    if not value:
+        return ""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(str(value)):
+        token = match.group()
+        if is_cjk(token):
+            tokens.extend(cjk_bigrams(token))
+            if len(token) > 1:
+                # Single-character prefix queries find the run's last character too
+                tokens.append(token[-1])
+        else:
+            tokens.append(token.lower())
+    return " ".join(tokens)
+
+
+def search_index_ddl(table: str, column: str) -> List[str]:
+    fts = f"{table}_fts"
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {column}, content='', tokenize='{FTS_TOKENIZE}', prefix='{FTS_PREFIX}'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, search_tokens(new.{column}));
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column})
+            VALUES ('delete', old.rowid, search_tokens(old.{column}));
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table}
+        WHEN old.{column} IS NOT new.{column} BEGIN
+            INSERT INTO {fts}({fts}, rowid, {column})
+            VALUES ('delete', old.rowid, search_tokens(old.{column}));
+            INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, search_tokens(new.{column}));
+        END""",
+    ]
+
+
+def drop_search_index_ddl(table: str) -> List[str]:
+    fts = f"{table}_fts"
+    return [f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ("ai", "ad", "au")] + [
+        f"DROP TABLE IF EXISTS {fts}"
+    ]
+
+
+def rebuild_search_index_ddl(table: str, column: str) -> List[str]:
+    fts = f"{table}_fts"
+    return [
+        f"INSERT INTO {fts}({fts}) VALUES ('delete-all')",
+        f"INSERT INTO {fts}(rowid, {column}) SELECT rowid, search_tokens({column}) FROM {table}",
+    ]
+
+
+def search_index_drift_sql(table: str) -> str:
+    """Query returning 1 when the index rows and the table rows have different rowids.
+
+    A contentless index keeps one {fts}_docsize row per indexed rowid.
+    """
+    docsize = f"{table}_fts_docsize"
+    return f"""SELECT EXISTS (SELECT rowid FROM {table} EXCEPT SELECT id FROM {docsize})
+        OR EXISTS (SELECT id FROM {docsize} EXCEPT SELECT rowid FROM {table})"""
+
+
+@event.listens_for(Engine, "connect")
+def register_search_functions(dbapi_connection, connection_record):
+    """Make search_tokens() available to the index triggers (SQLite only)."""
+    if hasattr(dbapi_connection, "create_function"):
+        dbapi_connection.create_function("search_tokens", 1, search_tokens, deterministic=True)
+
+
+def _has_search_tables(metadata) -> bool:
+    return all(table in metadata.tables for table, _column in INDEXED_COLUMNS)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """Create the FTS tables and triggers after create_all (SQLite only)."""
+    if connection.dialect.name != "sqlite" or not _has_search_tables(target):
+        return
+    for table, column in INDEXED_COLUMNS:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": f"{table}_fts"}
+        ).first()
+        for statement in search_index_ddl(table, column):
+            connection.execute(text(statement))
+        if not exists:
+            # Index rows that were written before the index existed
+            for statement in rebuild_search_index_ddl(table, column):
+                connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_search_index(target, connection, **kw):
+    """Drop the FTS tables and triggers before drop_all (SQLite only)."""
+    if connection.dialect.name != "sqlite" or not _has_search_tables(target):
+        return
+    for table, _column in INDEXED_COLUMNS:
+        for statement in drop_search_index_ddl(table):
+            connection.execute(text(statement))
@@ -0,0 +1,117 @@
+"""Denormalized per-session summary columns, maintained by triggers.
+
+The session list shows each session's message count, last message time,
+a preview of the last message, the last model used and the tokens spent,
+without loading messages. SessionModel stores these values:
+
+    message_count          messages in the session
+    last_message_at        created_at of the last message (by seq)
+    last_message_preview   first PREVIEW_CHARS characters of its content
+    last_model_id          model_id of the last message that has one
+    total_tokens           prompt + completion tokens of its message_usage rows
+
+SQLite triggers on messages and message_usage keep them current within the
+statement that changes a message, so they commit or roll back with it. That
+covers every write path: save_message, streaming checkpoints, regenerate
+and edit truncation, bulk deletes that bypass the ORM, and the startup
+recovery of interrupted messages. Each trigger touches one session row via
+index seeks on (session_id, seq).
+
+total_tokens counts tokens that were spent, so it does not go down when a
+regenerate deletes the reply they were spent on.
+
+next_seq is maintained the same way: it is raised past the seq of every
+inserted message and never lowered, so message numbers (and the cursors
+built on them) are not reused after the newest messages are deleted.
+
+The triggers are created by migrations 015 and 016; the metadata listener
+below does the same for databases built with create_all (tests, first-run
+fallback).
+"""
+from typing import List
+
+from sqlalchemy import event, text
+
+from core.database import Base
+
+# Characters of the last message kept in last_message_preview
+PREVIEW_CHARS = 120
+
+_TABLES = ("sessions", "messages", "message_usage")
+
+
+def _last_message(column: str, session_id: str, where: str = "") -> str:
+    return (
+        f"(SELECT {column} FROM messages WHERE session_id = {session_id}{where} "
+        f"ORDER BY seq DESC LIMIT 1)"
+    )
+
+
+def session_summary_ddl() -> List[str]:
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS session_summary_message_ai AFTER INSERT ON messages BEGIN
+            UPDATE sessions SET
+                message_count = message_count + 1,
+                last_message_at = new.created_at,
+                last_message_preview = substr(new.content, 1, {PREVIEW_CHARS}),
+                last_model_id = coalesce(new.model_id, last_model_id)
+            WHERE id = new.session_id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS session_summary_message_ad AFTER DELETE ON messages BEGIN
+            UPDATE sessions SET
+                message_count = max(message_count - 1, 0),
+                last_message_at = {_last_message("created_at", "old.session_id")},
+                last_message_preview = {_last_message(f"substr(content, 1, {PREVIEW_CHARS})", "old.session_id")},
+                last_model_id = {_last_message("model_id", "old.session_id", " AND model_id IS NOT NULL")}
+            WHERE id = old.session_id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS session_summary_message_au AFTER UPDATE OF content, model_id ON messages
+        WHEN old.content IS NOT new.content OR old.model_id IS NOT new.model_id BEGIN
+            UPDATE sessions SET
+                last_message_preview = {_last_message(f"substr(content, 1, {PREVIEW_CHARS})", "new.session_id")},
+                last_model_id = {_last_message("model_id", "new.session_id", " AND model_id IS NOT NULL")}
+            WHERE id = new.session_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS session_summary_message_seq AFTER INSERT ON messages BEGIN
+            UPDATE sessions SET next_seq = max(next_seq, new.seq + 1)
+            WHERE id = new.session_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS session_summary_usage_ai AFTER INSERT ON message_usage BEGIN
+            UPDATE sessions SET total_tokens = total_tokens + new.prompt_tokens + new.completion_tokens
+            WHERE id = new.session_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS session_summary_usage_ad AFTER DELETE ON message_usage BEGIN
+            UPDATE sessions SET
+                total_tokens = max(total_tokens - old.prompt_tokens - old.completion_tokens, 0)
+            WHERE id = old.session_id;
+        END""",
+    ]
+
+
+def drop_session_summary_ddl() -> List[str]:
+    return [
+        f"DROP TRIGGER IF EXISTS session_summary_{name}"
+        for name in ("message_ai", "message_ad", "message_au", "message_seq", "usage_ai", "usage_ad")
+    ]
+
+
+def _has_summary_tables(metadata) -> bool:
+    return all(table in metadata.tables for table in _TABLES)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_session_summary_triggers(target, connection, **kw):
+    """Create the summary triggers after create_all (SQLite only)."""
+    if connection.dialect.name != "sqlite" or not _has_summary_tables(target):
+        return
+    for statement in session_summary_ddl():
+        connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_session_summary_triggers(target, connection, **kw):
+    """Drop the summary triggers before drop_all (SQLite only)."""
+    if connection.dialect.name != "sqlite" or not _has_summary_tables(target):
+        return
+    for statement in drop_session_summary_ddl():
+        connection.execute(text(statement))
@@ -0,0 +1,63 @@
+"""Per-message usage model and schemas."""
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+
+class MessageUsageModel(Base):
+    """Database model for the usage of one assistant response.
+
+    Rows are kept when their session is deleted, so totals per model and
+    day stay complete. Token counts come from the provider; when it does
+    not report them they are estimated and `estimated` is set.
+    """
+    __tablename__ = "message_usage"
+    __table_args__ = (
+        Index('ix_message_usage_model_created', 'model_id', 'created_at'),
+    )
+
+    id: Mapped[str] = mapped_column(primary_key=True)
+    message_id: Mapped[str] = mapped_column(index=True)
+    session_id: Mapped[str] = mapped_column(index=True)
+    # Model that produced the response (after any failover or hedge)
+    model_id: Mapped[str] = mapped_column()
+    provider: Mapped[str] = mapped_column()  # 'openai' or 'ollama'
+    # Message status at the end of the turn (complete, cancelled, error)
+    status: Mapped[str] = mapped_column()
+    prompt_tokens: Mapped[int] = mapped_column(default=0)
+    completion_tokens: Mapped[int] = mapped_column(default=0)
+    estimated: Mapped[bool] = mapped_column(default=False)
+    # Seconds from the provider request to the first text (None if no text)
+    first_token_seconds: Mapped[Optional[float]] = mapped_column(nullable=True)
+    # Seconds from the provider request to the end of the response
+    total_seconds: Mapped[float] = mapped_column(default=0.0)
+    # Estimated cost in USD (None for models without a known price)
+    cost: Mapped[Optional[float]] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, index=True)
+
+
+class UsageAggregate(BaseModel):
+    """Usage totals of one group (model, day or session)."""
+    key: str
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    # None when no response in the group has a known price
+    cost: Optional[float] = None
+    avg_first_token_seconds: Optional[float] = None
+    avg_total_seconds: Optional[float] = None
+    # Completion tokens per second of generation (after the first token)
+    tokens_per_second: Optional[float] = None
+
+
+class UsageAggregateList(BaseModel):
+    """Schema for a list of usage aggregates."""
+    group_by: str
+    since: Optional[datetime] = None
+    items: List[UsageAggregate]
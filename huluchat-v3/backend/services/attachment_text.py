@@ -0,0 +1,96 @@
+"""Text extraction for chat message attachments.
+
+Attachments arrive as data URLs inside the message's files JSON, or as
+blobs already in the store. Their readable text is extracted once, when
+the message is saved, and stored in
+messages.file_context so building the chat context only concatenates
+strings instead of re-decoding every attachment on every turn.
+
+- Text types are base64-decoded
+- PDFs go through DocumentProcessor
+- Other binary files are described by name, type and size
+"""
+import base64
+import logging
+from pathlib import Path
+from typing import Optional
+
+from services.document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+# Max characters of extracted text kept per attachment
+MAX_ATTACHMENT_CHARS = 10000
+
+TEXT_TYPES = [
+    "text/", "application/json", "application/javascript",
+    "application/xml", "application/x-www-form-urlencoded",
+]
+
+_document_processor = DocumentProcessor()
+
+
+def _decode_data_url(content: str) -> Optional[bytes]:
+    """Decode the payload of a base64 data URL (data:xxx;base64,yyy)."""
+    parts = content.split(",", 1)
+    if len(parts) != 2:
+        return None
+    return base64.b64decode(parts[1])
+
+
+def _truncate(text: str) -> str:
+    if len(text) > MAX_ATTACHMENT_CHARS:
+        return text[:MAX_ATTACHMENT_CHARS] + "\n... (truncated)"
+    return text
+
+
+def _describe(name: str, file_type: str, size: int) -> str:
+    size_str = f"{size} bytes" if size < 1024 else f"{size // 1024} KB"
+    return f"📎 File: {name} ({file_type}, {size_str})"
+
+
+def _is_pdf(name: str, file_type: str) -> bool:
+    return file_type == "application/pdf" or Path(name).suffix.lower() == ".pdf"
+
+
+def extract_file_text(file: dict, data: Optional[bytes] = None) -> str:
+    """Extract readable context from one attachment.
+
+    Args:
+        file: Attachment metadata, with an inline data URL as "content"
+        data: Contents of an attachment already in the blob store
+    """
+    name = file.get("name", "unknown")
+    file_type = file.get("type", "")
+    content = file.get("content", "")
+
+    is_text = any(t in file_type for t in TEXT_TYPES)
+
+    if data is None and content.startswith("data:"):
+        try:
+            data = _decode_data_url(content)
+        except Exception:
+            # If decoding fails, just add file info
+            if is_text:
+                return f"📄 File: {name} ({file_type})"
+            return _describe(name, file_type, file.get("size", 0))
+
+    if is_text and data is not None:
+        decoded = _truncate(data.decode("utf-8", errors="replace"))
+        return f"📄 File: {name}\n```\n{decoded}\n```"
+    if is_text and content:
+        # Plain text content
+        return f"📄 File: {name}\n```\n{content}\n```"
+
+    if _is_pdf(name, file_type) and data:
+        result = _document_processor.process_pdf_bytes(data, name)
+        if result.success and result.content.strip():
+            return f"📄 File: {name}\n```\n{_truncate(result.content)}\n```"
+
+    # Binary file (or PDF without a text layer) - just add metadata
+    return _describe(name, file_type, file.get("size", 0))
+
+
+def extract_attachments_text(files: list[dict]) -> str:
+    """Extract readable context from all attachments of a message."""
+    return "\n\n".join(extract_file_text(file) for file in files)
@@ -0,0 +1,371 @@
+"""Message attachments backed by the content-addressed blob store.
+
+Images and files used to be stored inline as base64 data URLs in
+messages.images / messages.files. They are now written once to the blob
+store and the message JSON only keeps a reference:
+
+- images: {"type": "image_url", "image_url": {"url": "attachment:<sha256>"},
+  "attachment_id": "<sha256>", "mime_type": "image/png"}
+- files: the original metadata plus "attachment_id" (no "content")
+
+References are resolved to download URLs for the client. The chat history
+keeps image references too; they become data URLs only when the provider
+request is built (services/image_pipeline.py). Each reference is counted in
+attachments.ref_count; blobs nobody references are removed by
+sweep_unreferenced() at startup, before requests are served, so a sweep can
+never race with a message that is about to reference the blob again.
+"""
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import re
+from collections import Counter
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from models.attachments import AttachmentModel
+from models.schemas import MessageModel
+from services.attachment_text import extract_attachments_text, extract_file_text
+from services.blob_store import blob_store, is_digest
+from services.history_cache import history_cache
+
+logger = logging.getLogger(__name__)
+
+# URL scheme of stored attachment references
+ATTACHMENT_REF_PREFIX = "attachment:"
+# Download URLs handed to the client, recognised when a client sends one back
+_DOWNLOAD_URL_RE = re.compile(r"/attachments/([0-9a-f]{64})(?:[/?#]|$)")
+
+# Messages converted per transaction by the online migration
+MIGRATION_BATCH_SIZE = 50
+
+
+def parse_data_url(url: str) -> Optional[Tuple[str, bytes]]:
+    """Split a base64 data URL into (mime type, bytes).
+
+    Returns:
+        None if the value is not a base64 data URL
+    """
+    if not isinstance(url, str) or not url.startswith("data:"):
+        return None
+    header, sep, payload = url.partition(",")
+    if not sep or not header.endswith(";base64"):
+        return None
+    mime_type = header[len("data:"):-len(";base64")] or "application/octet-stream"
+    try:
+        return mime_type, base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def referenced_id(url: Optional[str]) -> Optional[str]:
+    """Get the attachment id of a download URL sent back by the client.
+
+    Stored references ("attachment:...") are deliberately not matched: they
+    are already counted, so storing a message twice (e.g. the online
+    migration revisiting a row) never adds a second reference.
+    """
+    if not isinstance(url, str):
+        return None
+    match = _DOWNLOAD_URL_RE.search(url)
+    return match.group(1) if match else None
+
+
+async def _add_reference(
+    db: AsyncSession,
+    digest: str,
+    mime_type: Optional[str] = None,
+    size: int = 0,
+) -> bool:
+    """Count one more reference to a blob, creating its row if needed.
+
+    Returns:
+        False if the attachment is unknown and no mime type was given to create it
+    """
+    result = await db.execute(
+        update(AttachmentModel)
+        .where(AttachmentModel.id == digest)
+        .values(ref_count=AttachmentModel.ref_count + 1)
+    )
+    if result.rowcount:
+        return True
+    if mime_type is None:
+        return False
+    db.add(AttachmentModel(id=digest, mime_type=mime_type, size=size, ref_count=1))
+    await db.flush()
+    return True
+
+
+async def _store_url(db: AsyncSession, url: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Store a data URL, or re-reference an attachment by its download URL.
+
+    Returns:
+        (attachment id, mime type), or None if the value is left inline
+    """
+    digest = referenced_id(url)
+    if digest is not None:
+        attachment = await db.get(AttachmentModel, digest)
+        if attachment is None or not await _add_reference(db, digest):
+            return None
+        return digest, attachment.mime_type
+
+    parsed = parse_data_url(url)
+    if parsed is None:
+        return None
+    mime_type, data = parsed
+    digest = await asyncio.to_thread(blob_store.put, data)
+    await _add_reference(db, digest, mime_type, len(data))
+    return digest, mime_type
+
+
+async def store_images(db: AsyncSession, images: list) -> list:
+    """Move inline images to the blob store, returning the referencing JSON list."""
+    stored = []
+    for image in images:
+        url = (image.get("image_url") or {}).get("url") if isinstance(image, dict) else None
+        result = await _store_url(db, url)
+        if result is None:
+            stored.append(image)
+            continue
+        digest, mime_type = result
+        stored.append({
+            "type": "image_url",
+            "image_url": {"url": f"{ATTACHMENT_REF_PREFIX}{digest}"},
+            "attachment_id": digest,
+            "mime_type": mime_type,
+        })
+    return stored
+
+
+async def store_files(db: AsyncSession, files: list) -> list:
+    """Move inline file contents to the blob store, keeping their metadata."""
+    stored = []
+    for file in files:
+        content = file.get("content") if isinstance(file, dict) else None
+        result = await _store_url(db, content)
+        if result is None:
+            stored.append(file)
+            continue
+        digest, _ = result
+        meta = {k: v for k, v in file.items() if k != "content"}
+        meta["attachment_id"] = digest
+        stored.append(meta)
+    return stored
+
+
+def stored_files_text(files: list) -> str:
+    """Extract the readable text of files returned by store_files().
+
+    Stored files are read back from the blob store, including attachments a
+    client re-sent by their download URL. A download URL that did not
+    resolve to a stored attachment is not file content: the file is only
+    described.
+    """
+    texts = []
+    for file in files:
+        digest = file.get("attachment_id")
+        if digest:
+            try:
+                data = blob_store.read(digest)
+            except (OSError, ValueError):
+                logger.warning(f"Attachment blob missing: {digest}")
+                data = None
+            texts.append(extract_file_text(file, data))
+        elif referenced_id(file.get("content")) is not None:
+            texts.append(extract_file_text({k: v for k, v in file.items() if k != "content"}))
+        else:
+            texts.append(extract_file_text(file))
+    return "\n\n".join(texts)
+
+
+def _ids_from_json(images_json: Optional[str], files_json: Optional[str]) -> List[str]:
+    ids = []
+    for raw in (images_json, files_json):
+        if not raw:
+            continue
+        try:
+            items = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict) and is_digest(item.get("attachment_id", "")):
+                ids.append(item["attachment_id"])
+    return ids
+
+
+async def release_references(
+    db: AsyncSession,
+    rows: Iterable[Tuple[Optional[str], Optional[str]]],
+) -> None:
+    """Drop the references held by messages that are being deleted.
+
+    Args:
+        db: Database session (the caller commits)
+        rows: (images JSON, files JSON) of each deleted message
+    """
+    counts = Counter()
+    for images_json, files_json in rows:
+        counts.update(_ids_from_json(images_json, files_json))
+    for digest, count in counts.items():
+        await db.execute(
+            update(AttachmentModel)
+            .where(AttachmentModel.id == digest)
+            .values(ref_count=AttachmentModel.ref_count - count)
+        )
+
+
+def attachment_ref_id(url: Optional[str]) -> Optional[str]:
+    """Get the attachment id of a stored reference ("attachment:<sha256>")."""
+    if not isinstance(url, str) or not url.startswith(ATTACHMENT_REF_PREFIX):
+        return None
+    digest = url[len(ATTACHMENT_REF_PREFIX):]
+    return digest if is_digest(digest) else None
+
+
+def images_for_context(images: list) -> list:
+    """Image parts of a stored message for the chat history.
+
+    Stored images stay references, so cached history never holds their
+    contents; prepare_images() reads the blobs when the provider request
+    is built.
+    """
+    parts = []
+    for image in images:
+        digest = image.get("attachment_id") if isinstance(image, dict) else None
+        if not digest:
+            parts.append(image)
+            continue
+        parts.append({
+            "type": "image_url",
+            "image_url": {"url": f"{ATTACHMENT_REF_PREFIX}{digest}"},
+            "mime_type": image.get("mime_type", "image/png"),
+        })
+    return parts
+
+
+def images_for_client(images: list, url_for: Callable[[str], str]) -> list:
+    """Replace image references with download URLs."""
+    public = []
+    for image in images:
+        digest = image.get("attachment_id") if isinstance(image, dict) else None
+        if not digest:
+            public.append(image)
+            continue
+        public.append({
+            "type": "image_url",
+            "image_url": {"url": url_for(digest)},
+            "attachment_id": digest,
+        })
+    return public
+
+
+def files_for_client(files: list, url_for: Callable[[str], str]) -> list:
+    """Point stored files' content at their download URLs."""
+    public = []
+    for file in files:
+        digest = file.get("attachment_id") if isinstance(file, dict) else None
+        public.append({**file, "content": url_for(digest)} if digest else file)
+    return public
+
+
+async def sweep_unreferenced(db: AsyncSession) -> int:
+    """Delete blobs that no message references (run before serving requests).
+
+    Removes attachment rows whose ref_count dropped to zero and blob files
+    without a row (left behind when a message save failed after the blob was
+    written).
+
+    Returns:
+        Number of blobs removed
+    """
+    result = await db.execute(
+        select(AttachmentModel.id).where(AttachmentModel.ref_count <= 0)
+    )
+    unreferenced = set(result.scalars().all())
+    if unreferenced:
+        await db.execute(delete(AttachmentModel).where(AttachmentModel.id.in_(unreferenced)))
+        await db.commit()
+
+    result = await db.execute(select(AttachmentModel.id))
+    known = set(result.scalars().all())
+
+    def remove_blobs() -> int:
+        removed = 0
+        for digest in list(blob_store.iter_digests()):
+            if digest in unreferenced or digest not in known:
+                blob_store.delete(digest)
+                removed += 1
+        return removed
+
+    removed = await asyncio.to_thread(remove_blobs)
+    if removed:
+        logger.info(f"Removed {removed} unreferenced attachment blobs")
+    return removed
+
+
+async def migrate_inline_attachments(
+    session_factory: async_sessionmaker,
+    batch_size: int = MIGRATION_BATCH_SIZE,
+) -> int:
+    """Move base64 attachments of existing messages into the blob store.
+
+    Runs in the background while the app serves requests: messages are
+    converted in small batches (one transaction each), walking the primary
+    key so rows that cannot be converted are not revisited.
+
+    Returns:
+        Number of messages converted
+    """
+    converted = 0
+    last_id = ""
+    while True:
+        async with session_factory() as db:
+            result = await db.execute(
+                select(MessageModel)
+                .where(MessageModel.id > last_id)
+                .where(MessageModel.images.like("%data:%") | MessageModel.files.like("%data:%"))
+                .order_by(MessageModel.id)
+                .limit(batch_size)
+            )
+            messages = result.scalars().all()
+            if not messages:
+                break
+
+            sessions = set()
+            for message in messages:
+                last_id = message.id
+                try:
+                    files = json.loads(message.files) if message.files else None
+                    images = json.loads(message.images) if message.images else None
+                except json.JSONDecodeError:
+                    continue
+                if files and message.file_context is None:
+                    # Extract while the inline content is still there
+                    message.file_context = await asyncio.to_thread(extract_attachments_text, files)
+                if files:
+                    message.files = json.dumps(await store_files(db, files))
+                if images:
+                    message.images = json.dumps(await store_images(db, images))
+                sessions.add(message.session_id)
+                converted += 1
+            try:
+                await db.commit()
+            except Exception as e:
+                # e.g. a message deleted meanwhile; blobs written for the
+                # batch are swept at the next startup
+                logger.warning(f"Attachment migration batch failed: {type(e).__name__}")
+                await db.rollback()
+                continue
+
+        for session_id in sessions:
+            history_cache.invalidate(session_id)
+        # Let request handlers run between batches
+        await asyncio.sleep(0)
+
+    if converted:
+        logger.info(f"Moved attachments of {converted} messages to the blob store")
+    return converted
@@ -0,0 +1,101 @@
+"""Content-addressed blob storage on the local filesystem.
+
+Blobs are stored under their SHA-256 hex digest, fanned out by the first two
+characters (root/ab/abcdef...). Writing the same content twice is a no-op,
+which gives deduplication for free. All methods are blocking; call them via
+asyncio.to_thread from async code.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Read size for streaming blobs
+CHUNK_SIZE = 64 * 1024
+
+
+def is_digest(value: str) -> bool:
+    """Check whether a string is a SHA-256 hex digest."""
+    return bool(_DIGEST_RE.match(value or ""))
+
+
+class BlobStore:
+    """Stores immutable blobs keyed by their SHA-256 digest."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.attachments_dir)
+
+    def path_for(self, digest: str) -> Path:
+        """Path of a blob on disk (it may not exist)."""
+        if not is_digest(digest):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return self.root / digest[:2] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).is_file()
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its digest.
+
+        Writes go to a temporary file that is atomically renamed, so readers
+        never see a partial blob.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if path.is_file():
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        return self.path_for(digest).read_bytes()
+
+    def iter_range(self, digest: str, start: int, end: int) -> Iterator[bytes]:
+        """Yield the bytes start..end (inclusive) of a blob in chunks."""
+        with open(self.path_for(digest), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, digest: str) -> None:
+        try:
+            self.path_for(digest).unlink()
+        except FileNotFoundError:
+            pass
+
+    def iter_digests(self) -> Iterator[str]:
+        """Yield the digests of all stored blobs."""
+        if not self.root.is_dir():
+            return
+        for path in self.root.glob("??/*"):
+            if path.is_file() and is_digest(path.name):
+                yield path.name
+
+
+# Global blob store instance
+blob_store = BlobStore()
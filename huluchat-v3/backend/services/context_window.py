@@ -0,0 +1,161 @@
+"""Token-budgeted context window assembly for chat turns.
+
+Picks the newest history messages that fit a token budget while always
+keeping the leading system prompt(s) and the current turn.
+
+Token counts are estimated (no tokenizer dependency): CJK characters are
+counted as roughly one token each, other text as roughly four characters
+per token, and each image as a fixed cost.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fixed per-message overhead (role, separators) used by chat formats
+MESSAGE_OVERHEAD_TOKENS = 4
+# Approximate cost of one image part (OpenAI high-detail 512px tile baseline)
+IMAGE_TOKENS = 765
+# Average characters per token for non-CJK text
+CHARS_PER_TOKEN = 4
+
+_CJK_PATTERN = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]"
+)
+
+
+@dataclass
+class ContextWindow:
+    """Result of context window assembly."""
+    messages: List[dict] = field(default_factory=list)
+    estimated_tokens: int = 0
+    dropped_count: int = 0
+
+
+def estimate_text_tokens(text: Optional[str]) -> int:
+    """Estimate the token count of a piece of text."""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message: dict) -> int:
+    """Estimate the token count of one OpenAI-format message."""
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content = message.get("content")
+
+    if isinstance(content, str):
+        tokens += estimate_text_tokens(content)
+    elif isinstance(content, list):
+        for part in content:
+            if part.get("type") == "text":
+                tokens += estimate_text_tokens(part.get("text"))
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += estimate_text_tokens(function.get("name"))
+        tokens += estimate_text_tokens(function.get("arguments"))
+
+    return tokens
+
+
+def estimate_messages_tokens(messages: List[dict]) -> int:
+    """Estimate the total token count of a list of messages."""
+    return sum(estimate_message_tokens(m) for m in messages)
+
+
+def compute_history_budget(
+    context_length: int,
+    reserved_output_tokens: int,
+    max_history_tokens: Optional[int] = None,
+) -> int:
+    """Compute how many tokens the prompt history may use.
+
+    Args:
+        context_length: Model context window size in tokens
+        reserved_output_tokens: Tokens kept free for the completion
+        max_history_tokens: Optional hard cap on history size
+
+    Returns:
+        Token budget for the prompt messages
+    """
+    # Never let the output reservation eat more than half the window
+    reserved = min(max(reserved_output_tokens, 0), context_length // 2)
+    budget = context_length - reserved
+    if max_history_tokens is not None:
+        budget = min(budget, max_history_tokens)
+    return max(budget, 0)
+
+
+def build_context_window(messages: List[dict], budget_tokens: int) -> ContextWindow:
+    """Select the newest messages that fit in the token budget.
+
+    Always kept, even if they exceed the budget on their own:
+    - Leading system messages (system/template prompt)
+    - The current turn: the last user message and everything after it
+
+    Older messages between these are added newest-first until the budget
+    is exhausted; the first message that does not fit stops the scan so the
+    kept history stays contiguous.
+
+    Args:
+        messages: Chronologically ordered OpenAI-format messages
+        budget_tokens: Maximum estimated tokens for the whole prompt
+
+    Returns:
+        ContextWindow with the selected messages in chronological order
+    """
+    if not messages:
+        return ContextWindow()
+
+    head_end = 0
+    while head_end < len(messages) and messages[head_end].get("role") == "system":
+        head_end += 1
+
+    tail_start = len(messages)
+    for i in range(len(messages) - 1, head_end - 1, -1):
+        if messages[i].get("role") == "user":
+            tail_start = i
+            break
+    else:
+        # No user message: treat the last message as the current turn
+        tail_start = max(head_end, len(messages) - 1)
+
+    head = messages[:head_end]
+    tail = messages[tail_start:]
+    middle = messages[head_end:tail_start]
+
+    used = estimate_messages_tokens(head) + estimate_messages_tokens(tail)
+    remaining = budget_tokens - used
+
+    selected: List[dict] = []
+    for message in reversed(middle):
+        cost = estimate_message_tokens(message)
+        if cost > remaining:
+            break
+        selected.append(message)
+        remaining -= cost
+    selected.reverse()
+
+    # A tool result cannot lead the history without its assistant tool call
+    while selected and selected[0].get("role") == "tool":
+        remaining += estimate_message_tokens(selected.pop(0))
+
+    dropped = len(middle) - len(selected)
+    if dropped:
+        logger.info(
+            f"Context window: kept {len(head) + len(selected) + len(tail)} messages, "
+            f"dropped {dropped} older messages (budget={budget_tokens})"
+        )
+
+    return ContextWindow(
+        messages=head + selected + tail,
+        estimated_tokens=budget_tokens - remaining,
+        dropped_count=dropped,
+    )
@@ -11,6 +11,9 @@ from dataclasses import dataclass
 from openai import AsyncOpenAI, APIError, RateLimitError
 
 from core.config import settings
+from services.provider_clients import provider_clients
+from services.provider_retry import with_retry
+from services.provider_scheduler import provider_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -46,21 +49,17 @@ class EmbeddingService:
         base_url: Optional[str] = None
     ):
         self.model = model
-        self._api_key = api_key or settings.openai_api_key
-        self._base_url = base_url or settings.openai_base_url
-        self._client: Optional[AsyncOpenAI] = None
+        # Explicit overrides; otherwise the current settings are used per call
+        self._api_key = api_key
+        self._base_url = base_url
         self._cache: Dict[str, List[float]] = {}
 
     def _get_client(self) -> AsyncOpenAI:
-        """Get or create OpenAI client."""
-        if self._client is None:
-            if not self._api_key:
-                raise ValueError("OpenAI API key not configured")
-            self._client = AsyncOpenAI(
-                api_key=self._api_key,
-                base_url=self._base_url
-            )
-        return self._client
+        """Get the shared OpenAI client (pooled connections, follows settings changes)."""
+        api_key = self._api_key or settings.openai_api_key
+        if not api_key:
+            raise ValueError("OpenAI API key not configured")
+        return provider_clients.get("openai", api_key, self._base_url or settings.openai_base_url)
 
     def get_embedding_dimension(self) -> int:
         """Get the dimension of embeddings for the current model.
@@ -101,11 +100,16 @@ class EmbeddingService:
         # Call API
         client = self._get_client()
 
+        async def request():
+            async with provider_scheduler.slot("openai", self.model):
+                async with provider_clients.in_use(client):
+                    return await client.embeddings.create(
+                        model=self.model,
+                        input=text
+                    )
+
         try:
-            response = await client.embeddings.create(
-                model=self.model,
-                input=text
-            )
+            response = await with_retry("openai", "embed", request)
 
             embedding = response.data[0].embedding
 
@@ -155,11 +159,16 @@ class EmbeddingService:
         if uncached_texts:
             client = self._get_client()
 
+            async def request():
+                async with provider_scheduler.slot("openai", self.model):
+                    async with provider_clients.in_use(client):
+                        return await client.embeddings.create(
+                            model=self.model,
+                            input=[t[1] for t in uncached_texts]
+                        )
+
             try:
-                response = await client.embeddings.create(
-                    model=self.model,
-                    input=[t[1] for t in uncached_texts]
-                )
+                response = await with_retry("openai", "embed_batch", request)
 
                 for j, (original_idx, text, cache_key) in enumerate(uncached_texts):
                     embedding = response.data[j].embedding
@@ -0,0 +1,169 @@
+"""Hedged provider requests for latency-critical turns.
+
+Time to first token of a single provider has a long tail. A hedged request
+starts the primary stream and, if it has not produced a first token after
+a delay, starts a second stream against an alternate model. Whichever
+produces a first token first is streamed; the other one is cancelled.
+
+The hedge delay is a percentile of the primary model's recent first-token
+latencies (first_token_latency), so only the slowest requests get hedged.
+hedge_stats counts how often a hedge was sent and which side won.
+"""
+import asyncio
+import logging
+from collections import Counter, deque
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+
+from core.config import settings
+from services.openai_service import StreamChunk
+
+logger = logging.getLogger(__name__)
+
+# First-token latencies kept per model
+LATENCY_WINDOW = 200
+# Samples needed before the percentile replaces the default hedge delay
+MIN_LATENCY_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Recent first-token latencies per model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, model: str, percentile: float) -> Optional[float]:
+        """Latency percentile (0-100), or None with too few samples."""
+        samples = self._samples.get(model)
+        if not samples or len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+
+class HedgeStats:
+    """Hedging outcomes per primary model.
+
+    Outcomes: not_hedged (primary answered within the delay), primary and
+    hedge (the side that won after a hedge was sent).
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def record(self, model: str, outcome: str) -> None:
+        self.counts[(model, outcome)] += 1
+
+    def win_rate(self, model: str) -> Optional[float]:
+        """Share of hedged requests won by the hedge."""
+        hedged = self.counts[(model, "primary")] + self.counts[(model, "hedge")]
+        return self.counts[(model, "hedge")] / hedged if hedged else None
+
+    def reset(self) -> None:
+        self.counts.clear()
+
+
+first_token_latency = LatencyTracker()
+hedge_stats = HedgeStats()
+
+
+def hedge_delay(model: str) -> float:
+    """Seconds to wait for the primary's first token before hedging."""
+    delay = first_token_latency.percentile(model, settings.quickpanel_hedge_percentile)
+    if delay is None:
+        delay = settings.quickpanel_hedge_default_delay
+    return max(delay, settings.quickpanel_hedge_min_delay)
+
+
+def _answers(chunks: List[StreamChunk]) -> bool:
+    return bool(chunks) and bool(chunks[-1].content or chunks[-1].has_tool_calls)
+
+
+async def _until_first_token(stream: AsyncIterator[StreamChunk]) -> List[StreamChunk]:
+    """Read a stream up to its first content chunk (or error / end)."""
+    buffered = []
+    while True:
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            return buffered
+        buffered.append(chunk)
+        if chunk.content or chunk.has_tool_calls or chunk.error or chunk.is_done:
+            return buffered
+
+
+async def hedged_stream(
+    start_primary: Callable[[], AsyncIterator[StreamChunk]],
+    start_hedge: Callable[[], AsyncIterator[StreamChunk]],
+    delay: float,
+    model: str,
+    on_hedge_win: Optional[Callable[[], Awaitable[None]]] = None,
+) -> AsyncIterator[StreamChunk]:
+    """Stream the primary, hedged by a second stream after delay seconds.
+
+    Args:
+        start_primary: Opens the primary stream
+        start_hedge: Opens the hedge stream (only called when hedging)
+        delay: Seconds to wait for the primary's first token
+        model: Primary model id, for latency samples and hedge_stats
+        on_hedge_win: Awaited when the hedge stream is chosen, before its
+            first chunk is yielded
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    primary = start_primary()
+    primary_task = asyncio.create_task(_until_first_token(primary))
+    streams = {primary_task: primary}
+    winner = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if not done:
+            hedge = start_hedge()
+            streams[asyncio.create_task(_until_first_token(hedge))] = hedge
+            logger.info(f"Hedging {model} after {delay:.2f}s")
+
+        pending = set(streams)
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # The primary wins a tie
+            for task in sorted(done, key=lambda t: t is not primary_task):
+                if task.exception() is None and _answers(task.result()):
+                    winner = task
+                    break
+        if winner is None:
+            # Neither answered: surface the primary's error
+            winner = primary_task
+    finally:
+        losers = [task for task in streams if task is not winner]
+        for task in losers:
+            task.cancel()
+        await asyncio.gather(*losers, return_exceptions=True)
+        for task in losers:
+            await streams[task].aclose()
+
+    if len(streams) == 1:
+        hedge_stats.record(model, "not_hedged")
+    else:
+        hedge_stats.record(model, "primary" if winner is primary_task else "hedge")
+
+    async with aclosing(streams[winner]) as stream:
+        if winner is not primary_task and on_hedge_win is not None:
+            await on_hedge_win()
+        buffered = winner.result()
+        if winner is primary_task and _answers(buffered):
+            first_token_latency.record(model, loop.time() - started)
+        for chunk in buffered:
+            yield chunk
+        async for chunk in stream:
+            yield chunk
@@ -0,0 +1,108 @@
+"""In-memory LRU cache of formatted conversation history.
+
+Keeps the OpenAI-format history of recently active sessions so the chat
+turn loop does not re-query and re-format the messages table on every
+message. Only cold sessions hit the database.
+
+Writers must keep the cache coherent:
+- append() after a message is saved
+- invalidate() after messages are edited, deleted or truncated
+"""
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SESSIONS = 64
+DEFAULT_MAX_MESSAGES = 200
+
+
+@dataclass
+class _CacheEntry:
+    """Cached history for one session."""
+    messages: List[dict] = field(default_factory=list)
+    # True when messages holds the whole session (nothing older in the DB)
+    complete: bool = False
+
+
+class HistoryCache:
+    """Bounded LRU cache of formatted history per session."""
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+    ):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str, limit: int) -> Optional[List[dict]]:
+        """Get the newest `limit` cached messages for a session.
+
+        Returns:
+            Messages in chronological order, or None on a cache miss
+        """
+        entry = self._entries.get(session_id)
+        if entry is None or (len(entry.messages) < limit and not entry.complete):
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return list(entry.messages[-limit:])
+
+    def set(self, session_id: str, messages: List[dict], complete: bool) -> None:
+        """Store the history loaded from the database for a session.
+
+        Args:
+            session_id: Session ID
+            messages: Formatted messages in chronological order
+            complete: Whether messages covers the whole session
+        """
+        if len(messages) > self.max_messages:
+            messages = messages[-self.max_messages:]
+            complete = False
+        self._entries[session_id] = _CacheEntry(messages=list(messages), complete=complete)
+        self._entries.move_to_end(session_id)
+
+        while len(self._entries) > self.max_sessions:
+            evicted_id, _ = self._entries.popitem(last=False)
+            logger.debug(f"History cache evicted session {evicted_id}")
+
+    def append(self, session_id: str, message: dict) -> None:
+        """Append a newly saved message to a warm session.
+
+        Cold sessions are left alone; the next load reads the message from the DB.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+
+        entry.messages.append(message)
+        if len(entry.messages) > self.max_messages:
+            del entry.messages[:-self.max_messages]
+            entry.complete = False
+        self._entries.move_to_end(session_id)
+
+    def invalidate(self, session_id: str) -> None:
+        """Drop the cached history for a session."""
+        self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        """Drop all cached history."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+
+# Global cache instance
+history_cache = HistoryCache()
@@ -0,0 +1,251 @@
+"""Image preparation for vision model requests.
+
+Client images reach the provider inside the chat history, and every earlier
+image of a session is re-sent on every turn. Before a request is sent:
+
+1. Images older than the last N user turns are replaced with a short text
+   placeholder (apply_image_placeholders)
+2. The remaining images are downscaled to the model's maximum dimension
+   and re-encoded (JPEG for opaque images, PNG when there is transparency),
+   in a thread pool; results are cached by content hash (prepare_images).
+   Stored attachment references are read from the blob store here, so the
+   history cache only holds references
+
+Pillow is optional: without it images are sent unchanged.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from core.config import settings
+from services.attachments import attachment_ref_id, parse_data_url
+from services.blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+IMAGE_PLACEHOLDER = "[Image omitted from earlier in the conversation]"
+
+# Thread pool for image decoding / encoding
+_image_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_image_executor() -> ThreadPoolExecutor:
+    """Get or create the image processing thread pool executor."""
+    global _image_executor
+    if _image_executor is None:
+        _image_executor = ThreadPoolExecutor(
+            max_workers=2,
+            thread_name_prefix="image-"
+        )
+    return _image_executor
+
+
+def downscale_image(
+    data: bytes,
+    max_dimension: int,
+    quality: int = 85,
+) -> Optional[Tuple[str, bytes]]:
+    """Fit an image within max_dimension and re-encode it.
+
+    Returns:
+        (mime type, bytes), or None to keep the original (Pillow missing,
+        unreadable image, animation, or re-encoding would not make it smaller)
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if getattr(image, "is_animated", False):
+                return None
+            resized = max(image.size) > max_dimension
+            image.load()
+            if resized:
+                image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            has_alpha = image.mode in ("RGBA", "LA") or (
+                image.mode == "P" and "transparency" in image.info
+            )
+            output = io.BytesIO()
+            if has_alpha:
+                image.save(output, format="PNG", optimize=True)
+                mime_type = "image/png"
+            else:
+                image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+                mime_type = "image/jpeg"
+    except Exception as e:
+        logger.debug(f"Image left unchanged: {type(e).__name__}")
+        return None
+
+    encoded = output.getvalue()
+    if not resized and len(encoded) >= len(data):
+        return None
+    return mime_type, encoded
+
+
+class ImageCache:
+    """LRU cache of prepared data URLs, bounded by total size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, int]) -> Optional[str]:
+        url = self._entries.get(key)
+        if url is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return url
+
+    def set(self, key: Tuple[str, int], url: str) -> None:
+        if len(url) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= len(self._entries.pop(key))
+        self._entries[key] = url
+        self._size += len(url)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+image_cache = ImageCache(settings.image_cache_max_bytes)
+
+
+async def prepare_image_url(
+    url: str,
+    max_dimension: int,
+    mime_type: Optional[str] = None,
+) -> Optional[str]:
+    """Downscale and re-encode an image (cached by content hash).
+
+    Args:
+        url: Data URL, or a stored attachment reference
+        max_dimension: Max width / height for the model
+        mime_type: Type of a stored attachment
+
+    Returns:
+        The data URL to send, or None if a referenced blob is missing
+    """
+    digest = attachment_ref_id(url)
+    if digest is not None:
+        # Blobs are stored under the SHA-256 of their content
+        key = (digest, max_dimension)
+        cached = image_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            data = await asyncio.to_thread(blob_store.read, digest)
+        except (OSError, ValueError):
+            logger.warning(f"Attachment blob missing: {digest}")
+            return None
+        original = f"data:{mime_type or 'image/png'};base64,{base64.b64encode(data).decode('ascii')}"
+    else:
+        parsed = parse_data_url(url)
+        if parsed is None:
+            return url
+        _, data = parsed
+        key = (hashlib.sha256(data).hexdigest(), max_dimension)
+        cached = image_cache.get(key)
+        if cached is not None:
+            return cached
+        original = url
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        get_image_executor(), downscale_image, data, max_dimension, settings.image_jpeg_quality
+    )
+    if result is None:
+        prepared = original
+    else:
+        mime_type, encoded = result
+        prepared = f"data:{mime_type};base64,{base64.b64encode(encoded).decode('ascii')}"
+    image_cache.set(key, prepared)
+    return prepared
+
+
+def _is_image_part(part) -> bool:
+    return isinstance(part, dict) and part.get("type") == "image_url"
+
+
+async def prepare_images(messages: List[dict], max_dimension: int) -> List[dict]:
+    """Prepare every image of a message list for a model.
+
+    Stored attachment references become data URLs; images whose blob is
+    missing are left out.
+
+    Returns:
+        A new list; input messages are not modified (they may be cached)
+    """
+    prepared = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, list) or not any(_is_image_part(p) for p in content):
+            prepared.append(message)
+            continue
+        parts = []
+        for part in content:
+            if _is_image_part(part):
+                url = await prepare_image_url(
+                    part["image_url"]["url"], max_dimension, part.get("mime_type")
+                )
+                if url is None:
+                    continue
+                part = {k: v for k, v in part.items() if k != "mime_type"}
+                part["image_url"] = {**part["image_url"], "url": url}
+            parts.append(part)
+        prepared.append({**message, "content": parts})
+    return prepared
+
+
+def apply_image_placeholders(messages: List[dict], keep_turns: int) -> List[dict]:
+    """Replace images older than the last keep_turns user turns with text.
+
+    Args:
+        messages: Chat messages in OpenAI format
+        keep_turns: Number of most recent user turns whose images are kept
+            (0 keeps all images)
+
+    Returns:
+        A new list; input messages are not modified (they may be cached)
+    """
+    if keep_turns <= 0:
+        return list(messages)
+
+    user_indexes = [i for i, m in enumerate(messages) if m.get("role") == "user"]
+    if len(user_indexes) <= keep_turns:
+        return list(messages)
+    cutoff = user_indexes[-keep_turns]
+
+    result = []
+    for index, message in enumerate(messages):
+        content = message.get("content")
+        if index >= cutoff or not isinstance(content, list):
+            result.append(message)
+            continue
+        omitted = sum(1 for part in content if _is_image_part(part))
+        if not omitted:
+            result.append(message)
+            continue
+        texts = [part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text"]
+        text = "\n\n".join(t for t in texts if t)
+        placeholder = IMAGE_PLACEHOLDER if omitted == 1 else f"{IMAGE_PLACEHOLDER} x{omitted}"
+        result.append({**message, "content": f"{text}\n\n{placeholder}" if text else placeholder})
+    return result
@@ -2,6 +2,7 @@
 import asyncio
 import json
 import logging
+import time
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from contextlib import AsyncExitStack
@@ -20,6 +21,7 @@ from models.mcp_server import (
     MCPAllStatus,
     TransportType,
 )
+from services.metrics import mcp_tool_call_seconds
 
 logger = logging.getLogger(__name__)
 
@@ -305,9 +307,12 @@ class MCPService:
             )
 
         session = self._sessions[server_id]
+        started = time.perf_counter()
+        outcome = "exception"
 
         try:
             result = await session.call_tool(tool_name, arguments=arguments)
+            outcome = "error" if result.isError else "success"
 
             # Extract content from result
             content_parts = []
@@ -333,6 +338,14 @@ class MCPService:
                 error=str(e)
             )
 
+        finally:
+            config = self._configs.get(server_id)
+            mcp_tool_call_seconds.observe(
+                time.perf_counter() - started,
+                config.name if config else server_id,
+                outcome,
+            )
+
     async def connect_all(self) -> List[MCPServerStatus]:
         """Connect to all enabled servers with auto_connect."""
         await self._ensure_initialized()
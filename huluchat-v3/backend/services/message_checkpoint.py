@@ -0,0 +1,142 @@
+"""Incremental checkpointing of streamed assistant responses.
+
+The assistant message row is created with status "streaming" when the
+provider stream starts, and its content is rewritten in batches while text
+arrives (every N estimated tokens or T seconds). A crash or restart then
+loses at most one batch instead of the whole answer.
+
+The final write moves the status to "complete", "cancelled" or "error".
+Rows still "streaming" at startup belong to a generation that died with
+the previous process; recover_interrupted_messages() closes them.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.schemas import (
+    MessageModel,
+    MESSAGE_STATUS_ERROR,
+    MESSAGE_STATUS_STREAMING,
+)
+from services.context_window import estimate_text_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class MessageCheckpoint:
+    """Batched writes of one streaming assistant message.
+
+    Checkpoint writes run in a background task so neither the provider
+    stream nor a cancellation of it ever interrupts a commit half-way.
+    At most one write is in flight; text arriving meanwhile goes into the
+    next checkpoint.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        message: MessageModel,
+        every_tokens: Optional[int] = None,
+        interval_seconds: Optional[float] = None,
+    ):
+        self.db = db
+        self.message = message
+        self.every_tokens = every_tokens or settings.chat_checkpoint_tokens
+        self.interval_seconds = (
+            interval_seconds if interval_seconds is not None
+            else settings.chat_checkpoint_interval_seconds
+        )
+        self._saved_length = len(message.content or "")
+        self._saved_at = time.monotonic()
+        self._write_task: Optional[asyncio.Task] = None
+        self.finished = False
+        # Number of intermediate checkpoint writes
+        self.checkpoints = 0
+
+    def update(self, content: str) -> None:
+        """Record the text generated so far, writing a checkpoint if one is due."""
+        if self.finished:
+            return
+        if self._write_task is not None and not self._write_task.done():
+            return
+        pending = content[self._saved_length:]
+        if not pending:
+            return
+        due_by_time = time.monotonic() - self._saved_at >= self.interval_seconds
+        if due_by_time or estimate_text_tokens(pending) >= self.every_tokens:
+            self._write_task = asyncio.create_task(self._write(content))
+
+    async def _write(self, content: str) -> None:
+        self.message.content = content
+        try:
+            await self.db.commit()
+        except Exception as e:
+            logger.warning(f"Failed to checkpoint message {self.message.id}: {type(e).__name__}")
+            await self.db.rollback()
+            return
+        self._saved_length = len(content)
+        self._saved_at = time.monotonic()
+        self.checkpoints += 1
+
+    async def finish(self, content: str, status: str) -> Optional[MessageModel]:
+        """Write the final content and status.
+
+        An empty response leaves nothing worth keeping, so its row is deleted.
+        Only the first call has an effect.
+
+        Returns:
+            The saved message, or None if it was deleted (or already finished)
+        """
+        if self.finished:
+            return None
+        self.finished = True
+        if self._write_task is not None:
+            await asyncio.wait({self._write_task})
+            self._write_task = None
+
+        if not content:
+            await self.db.delete(self.message)
+            await self.db.commit()
+            return None
+
+        self.message.content = content
+        self.message.status = status
+        await self.db.commit()
+        await self.db.refresh(self.message)
+        return self.message
+
+
+async def recover_interrupted_messages(db: AsyncSession) -> int:
+    """Close assistant messages left "streaming" by a previous process.
+
+    Partial responses are kept with status "error"; empty placeholders are
+    deleted.
+
+    Returns:
+        Number of messages recovered or removed
+    """
+    result = await db.execute(
+        select(MessageModel).where(MessageModel.status == MESSAGE_STATUS_STREAMING)
+    )
+    messages = result.scalars().all()
+    if not messages:
+        return 0
+
+    empty_ids = [m.id for m in messages if not m.content]
+    for message in messages:
+        if message.content:
+            message.status = MESSAGE_STATUS_ERROR
+    if empty_ids:
+        await db.execute(delete(MessageModel).where(MessageModel.id.in_(empty_ids)))
+    await db.commit()
+
+    logger.info(
+        f"Recovered {len(messages) - len(empty_ids)} interrupted messages, "
+        f"removed {len(empty_ids)} empty placeholders"
+    )
+    return len(messages)
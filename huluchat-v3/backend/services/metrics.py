@@ -0,0 +1,328 @@
+"""In-process metrics, exposed in the Prometheus text format (/api/metrics).
+
+Counters, gauges and histograms keep plain numbers per label set. Recording
+a value is a dict lookup plus a bisect for histograms; memory is only
+allocated the first time a label set is seen. Nothing is recorded per
+streamed token: provider latencies are observed once per turn, DB queries
+once per statement execution and HTTP requests once per request.
+
+Values kept elsewhere (scheduler queues, retry counters, caches) are not
+copied here; collector callbacks read them when the endpoint is scraped.
+"""
+import re
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+LabelValues = Tuple[str, ...]
+
+# Seconds, for request and provider latencies
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+# Seconds, for database statements
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Generated tokens per second
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """A named metric with a fixed list of label names."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, str, float]]:
+        """(suffix, label values, extra label, value) of every sample."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, extra, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # An unlabelled metric is exported as 0 before its first update
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "_total", labels, "", value
+
+
+class Gauge(Metric):
+    """A value that goes up and down, per label set."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # An unlabelled metric is exported as 0 before its first update
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", labels, "", value
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        # counts[i] = observations in bucket i (not cumulative); last is +Inf
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets, per label set."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, _HistogramValue] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = _HistogramValue(len(self.buckets) + 1)
+        entry.counts[bisect_left(self.buckets, value)] += 1
+        entry.sum += value
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry.counts) if entry else 0
+
+    def samples(self):
+        for labels, entry in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry.counts):
+                cumulative += count
+                yield "_bucket", labels, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", labels, "", entry.sum
+            yield "_count", labels, "", cumulative
+
+
+Collector = Callable[[], Iterable[Metric]]
+
+
+class MetricsRegistry:
+    """Registered metrics and scrape-time collectors."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        """Add a callback returning metrics built at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+turns_in_flight = registry.gauge(
+    "huluchat_chat_turns_in_flight", "Chat turns currently being processed"
+)
+first_token_seconds = registry.histogram(
+    "huluchat_provider_first_token_seconds",
+    "Seconds from the provider request to the first text, by model",
+    ("model",),
+)
+generation_tokens_per_second = registry.histogram(
+    "huluchat_provider_tokens_per_second",
+    "Completion tokens per second after the first token, by model",
+    ("model",),
+    THROUGHPUT_BUCKETS,
+)
+db_query_seconds = registry.histogram(
+    "huluchat_db_query_seconds",
+    "Database statement latency, by statement kind and table",
+    ("statement",),
+    DB_BUCKETS,
+)
+mcp_tool_call_seconds = registry.histogram(
+    "huluchat_mcp_tool_call_seconds",
+    "MCP tool call latency, by server and outcome",
+    ("server", "outcome"),
+)
+http_request_seconds = registry.histogram(
+    "huluchat_http_request_seconds",
+    "HTTP request latency, by method, route and status class",
+    ("method", "route", "status"),
+)
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+\"?(\w+)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(statement: str) -> str:
+    """Low-cardinality label for a SQL statement, e.g. 'SELECT messages'."""
+    words = statement.split(None, 1)
+    if not words:
+        return "other"
+    verb = words[0].upper()
+    match = _TABLE_PATTERN.search(statement)
+    return f"{verb} {match.group(1)}" if match else verb
+
+
+def instrument_engine(engine) -> None:
+    """Observe the latency of every statement executed on an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if starts:
+            db_query_seconds.observe(time.perf_counter() - starts.pop(), statement_label(statement))
+
+
+def route_template(scope) -> Optional[str]:
+    """Path template of the route that handled a request, e.g. '/api/attachments/{attachment_id}'."""
+    # Newer FastAPI versions resolve included routers lazily; the matched
+    # route then only knows its path relative to the router prefix
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(context, "path", None)
+    if path:
+        return path
+    return getattr(scope.get("route"), "path", None)
+
+
+def _status_class(status: Optional[int]) -> str:
+    return f"{status // 100}xx" if status else "none"
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing HTTP request latency per route template.
+
+    Requests that match no route share the 'unmatched' label, so unknown
+    paths cannot grow the number of label sets. WebSocket connections are
+    not timed here.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            # Turned into a 500 response by the outer error middleware
+            status = status or 500
+            raise
+        finally:
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route_template(scope) or "unmatched",
+                _status_class(status),
+            )
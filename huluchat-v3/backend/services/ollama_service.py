@@ -1,16 +1,113 @@
-"""Ollama streaming service for HuluChat."""
+"""Ollama streaming service for HuluChat.
+
+Server status, the installed model list (/api/tags) and per-model metadata
+(/api/show) are cached with a TTL. Concurrent callers share one in-flight
+request (single-flight), and a stale "available" status is served while it
+is refreshed in the background, so a chat turn does not pay a probe round
+trip before the real request.
+
+Model residency: Ollama unloads a model after it has been idle, and the next
+request pays a multi-second load. Every chat sends settings.ollama_keep_alive,
+warm_up() preloads a model when it is selected, and num_ctx is sized from the
+conversation in power-of-two steps. A model is reloaded whenever num_ctx
+changes, so the size chosen for a model never shrinks.
+"""
+import asyncio
 import logging
-from typing import AsyncIterator, Optional
-from dataclasses import dataclass
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 import json
 
 import httpx
 
 from core.config import settings
-from services.openai_service import StreamChunk
+from services.provider_clients import create_http_client
+from services.openai_service import StreamChunk, TokenUsage
+from services.context_window import estimate_messages_tokens
+from services.provider_scheduler import QueuePositionCallback, provider_scheduler
 
 logger = logging.getLogger(__name__)
 
+# Ollama's num_ctx when neither the request nor the Modelfile sets one
+OLLAMA_DEFAULT_NUM_CTX = 4096
+# Tokens kept free for the reply when sizing num_ctx
+OLLAMA_RESPONSE_RESERVE_TOKENS = 1024
+
+
+@dataclass
+class OllamaModelDetails:
+    """Metadata of an installed model, from /api/show."""
+    name: str
+    # Longest context the model was trained for
+    context_length: Optional[int] = None
+    # num_ctx set in the model's Modelfile (None = server default)
+    num_ctx: Optional[int] = None
+    # e.g. ["completion", "tools", "vision"]
+    capabilities: List[str] = field(default_factory=list)
+
+
+def parse_model_details(name: str, data: dict) -> OllamaModelDetails:
+    """Build OllamaModelDetails from an /api/show response."""
+    context_length = None
+    for key, value in (data.get("model_info") or {}).items():
+        if key.endswith(".context_length") and isinstance(value, int):
+            context_length = value
+            break
+
+    num_ctx = None
+    for line in (data.get("parameters") or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "num_ctx" and parts[1].isdigit():
+            num_ctx = int(parts[1])
+
+    capabilities = list(data.get("capabilities") or [])
+    if not capabilities:
+        # Older servers do not report capabilities
+        capabilities = ["completion"]
+        if data.get("projector_info"):
+            capabilities.append("vision")
+    return OllamaModelDetails(name, context_length, num_ctx, capabilities)
+
+
+def max_num_ctx(details: Optional[OllamaModelDetails]) -> int:
+    """Largest num_ctx used for a model.
+
+    The Modelfile's num_ctx (or the server default) is the floor; with
+    ollama_auto_num_ctx it may grow up to the model's trained context
+    length, capped by settings.ollama_max_num_ctx.
+    """
+    floor = (details.num_ctx if details else None) or OLLAMA_DEFAULT_NUM_CTX
+    if not settings.ollama_auto_num_ctx or details is None:
+        return floor
+    ceiling = min(details.context_length or floor, settings.ollama_max_num_ctx)
+    return max(floor, ceiling)
+
+
+def choose_num_ctx(needed_tokens: int, details: Optional[OllamaModelDetails]) -> int:
+    """Smallest power-of-two step of num_ctx that fits needed_tokens.
+
+    Args:
+        needed_tokens: Estimated prompt tokens plus room for the reply
+        details: Model metadata (None = unknown model, server default)
+
+    Returns:
+        num_ctx between the model's floor and max_num_ctx()
+    """
+    num_ctx = (details.num_ctx if details else None) or OLLAMA_DEFAULT_NUM_CTX
+    ceiling = max_num_ctx(details)
+    while num_ctx < needed_tokens and num_ctx < ceiling:
+        num_ctx *= 2
+    return min(num_ctx, ceiling)
+
+
+def keep_alive_value(keep_alive: str):
+    """Ollama keep_alive from a setting: durations as-is, bare numbers as seconds."""
+    try:
+        return int(keep_alive)
+    except ValueError:
+        return keep_alive
+
 
 class OllamaService:
     """Async Ollama service with streaming support."""
@@ -18,6 +115,14 @@ class OllamaService:
     def __init__(self):
         self._client: Optional[httpx.AsyncClient] = None
         self._base_url = settings.ollama_base_url
+        # Cached values with their expiry (time.monotonic)
+        self._status: Optional[Tuple[float, bool]] = None
+        self._models: Optional[Tuple[float, list]] = None
+        self._details: Dict[str, Tuple[float, Optional[OllamaModelDetails]]] = {}
+        # Requests in flight, shared by concurrent callers
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # num_ctx each model was last loaded with
+        self._loaded_num_ctx: Dict[str, int] = {}
 
     @property
     def client(self) -> httpx.AsyncClient:
@@ -29,35 +134,178 @@ class OllamaService:
                 write=settings.ollama_timeout,
                 pool=settings.http_connect_timeout,
             )
-            self._client = httpx.AsyncClient(
-                base_url=self._base_url,
-                timeout=timeout,
-            )
+            self._client = create_http_client(timeout, base_url=self._base_url)
         return self._client
 
-    async def is_available(self) -> bool:
-        """Check if Ollama service is running and accessible."""
+    async def close(self) -> None:
+        """Close the HTTP client and its connection pool."""
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._loaded_num_ctx.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _single_flight(self, key: str, factory: Callable[[], Awaitable]) -> asyncio.Task:
+        """Start a request, or join the one already in flight for the key."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+
+            def done(finished: asyncio.Task) -> None:
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+                if not finished.cancelled() and finished.exception() is not None:
+                    logger.debug(f"Ollama request {key} failed: {finished.exception()}")
+
+            task.add_done_callback(done)
+        return task
+
+    async def _fetch_tags(self, timeout: float) -> Optional[list]:
+        """GET /api/tags, updating the status and model list caches."""
+        now = time.monotonic()
         try:
-            response = await self.client.get("/api/tags", timeout=5.0)
-            return response.status_code == 200
+            response = await self.client.get("/api/tags", timeout=timeout)
         except Exception as e:
             logger.debug(f"Ollama availability check failed: {e}")
-            return False
+            self._status = (now + settings.ollama_retry_seconds, False)
+            return None
+        if response.status_code != 200:
+            self._status = (now + settings.ollama_retry_seconds, False)
+            return None
+
+        self._status = (now + settings.ollama_status_ttl_seconds, True)
+        try:
+            models = response.json().get("models", [])
+        except Exception as e:
+            logger.error(f"Failed to list Ollama models: {e}")
+            return None
+        self._models = (now + settings.ollama_status_ttl_seconds, models)
+        return models
+
+    def mark_unavailable(self) -> None:
+        """Forget the cached status after a failed request (re-probed next time)."""
+        self._status = None
+
+    async def is_available(self) -> bool:
+        """Check if Ollama service is running and accessible (cached)."""
+        if self._status is not None:
+            expires_at, available = self._status
+            if time.monotonic() < expires_at:
+                return available
+            if available:
+                # Serve the stale status and refresh it in the background
+                self._single_flight("tags", lambda: self._fetch_tags(5.0))
+                return True
+        # shield: a cancelled caller must not cancel the shared probe
+        await asyncio.shield(self._single_flight("tags", lambda: self._fetch_tags(5.0)))
+        return bool(self._status and self._status[1])
 
     async def list_models(self) -> list[dict]:
-        """Get list of installed Ollama models.
+        """Get list of installed Ollama models (cached).
 
         Returns:
             List of model dicts with keys: name, size, modified_at
         """
+        if self._models is not None and time.monotonic() < self._models[0]:
+            return self._models[1]
+        models = await asyncio.shield(
+            self._single_flight("tags", lambda: self._fetch_tags(10.0))
+        )
+        return models or []
+
+    async def _fetch_details(self, name: str) -> Optional[OllamaModelDetails]:
+        """POST /api/show, updating the model details cache."""
+        now = time.monotonic()
         try:
-            response = await self.client.get("/api/tags", timeout=10.0)
+            response = await self.client.post("/api/show", json={"model": name}, timeout=10.0)
             if response.status_code == 200:
-                data = response.json()
-                return data.get("models", [])
+                details = parse_model_details(name, response.json())
+                self._details[name] = (now + settings.ollama_model_info_ttl_seconds, details)
+                return details
+            logger.debug(f"Ollama /api/show {name} returned {response.status_code}")
         except Exception as e:
-            logger.error(f"Failed to list Ollama models: {e}")
-        return []
+            logger.debug(f"Ollama /api/show {name} failed: {e}")
+        self._details[name] = (now + settings.ollama_retry_seconds, None)
+        return None
+
+    async def get_model_details(self, name: str) -> Optional[OllamaModelDetails]:
+        """Get a model's context length and capabilities (cached).
+
+        Returns:
+            None if the model is unknown or Ollama is unreachable
+        """
+        entry = self._details.get(name)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        return await asyncio.shield(
+            self._single_flight(f"show:{name}", lambda: self._fetch_details(name))
+        )
+
+    def cached_model_details(self, name: str) -> Optional[OllamaModelDetails]:
+        """Last known details of a model, without a request (may be stale)."""
+        entry = self._details.get(name)
+        return entry[1] if entry is not None else None
+
+    def context_limit(self, name: str) -> int:
+        """Context window (tokens) available for a model's prompt and reply."""
+        return max_num_ctx(self.cached_model_details(name))
+
+    def num_ctx_for(self, name: str, needed_tokens: int) -> int:
+        """num_ctx for a request, never below one the model was loaded with.
+
+        Changing num_ctx makes Ollama reload the model, so a model keeps
+        the largest size it has been used with.
+        """
+        num_ctx = choose_num_ctx(needed_tokens, self.cached_model_details(name))
+        return max(num_ctx, self._loaded_num_ctx.get(name, 0))
+
+    async def _load(self, model: str) -> bool:
+        """POST /api/generate without a prompt, which only loads the model."""
+        details = await self.get_model_details(model)
+        num_ctx = max(
+            choose_num_ctx(0, details), self._loaded_num_ctx.get(model, 0)
+        )
+        payload = {
+            "model": model,
+            "keep_alive": keep_alive_value(settings.ollama_keep_alive),
+            "options": {"num_ctx": num_ctx},
+        }
+        try:
+            response = await self.client.post(
+                "/api/generate",
+                json=payload,
+                timeout=httpx.Timeout(settings.ollama_timeout, connect=10.0),
+            )
+        except httpx.ConnectError as e:
+            logger.warning(f"Ollama warm-up of {model} failed: {e}")
+            self.mark_unavailable()
+            return False
+        except Exception as e:
+            logger.warning(f"Ollama warm-up of {model} failed: {type(e).__name__}: {e}")
+            return False
+        if response.status_code != 200:
+            logger.warning(f"Ollama warm-up of {model} returned {response.status_code}")
+            return False
+        self._loaded_num_ctx[model] = num_ctx
+        logger.info(f"Ollama model {model} loaded (num_ctx={num_ctx})")
+        return True
+
+    async def warm_up(self, model: str) -> bool:
+        """Load a model into memory ahead of the first message.
+
+        Concurrent warm-ups of the same model share one request.
+
+        Args:
+            model: Model name (without ollama: prefix)
+
+        Returns:
+            True if the model is loaded
+        """
+        return await asyncio.shield(
+            self._single_flight(f"warmup:{model}", lambda: self._load(model))
+        )
 
     async def stream_chat(
         self,
@@ -65,6 +313,10 @@ class OllamaService:
         model: str = "llama2",
         temperature: Optional[float] = None,
         top_p: Optional[float] = None,
+        session_id: Optional[str] = None,
+        on_queue_position: Optional[QueuePositionCallback] = None,
+        signal_slot: bool = False,
+        num_ctx: Optional[int] = None,
     ) -> AsyncIterator[StreamChunk]:
         """Stream chat completion from Ollama.
 
@@ -73,56 +325,82 @@ class OllamaService:
             model: Model name to use (without ollama: prefix)
             temperature: Sampling temperature (0-2), defaults to settings.temperature
             top_p: Nucleus sampling (0-1), defaults to settings.top_p
+            session_id: Chat session the request belongs to (fair queuing)
+            on_queue_position: Awaited with the queue position while waiting for a slot
+            signal_slot: Yield waiting_for_slot chunks around the wait for a slot
+            num_ctx: Context window to load the model with, sized from the
+                messages when None
 
         Yields:
             StreamChunk objects containing content or error
         """
         temperature = temperature if temperature is not None else settings.temperature
         top_p = top_p if top_p is not None else settings.top_p
+        if num_ctx is None:
+            num_ctx = self.num_ctx_for(
+                model, estimate_messages_tokens(messages) + OLLAMA_RESPONSE_RESERVE_TOKENS
+            )
 
         payload = {
             "model": model,
             "messages": messages,
             "stream": True,
+            "keep_alive": keep_alive_value(settings.ollama_keep_alive),
             "options": {
                 "temperature": temperature,
                 "top_p": top_p,
+                "num_ctx": num_ctx,
             },
         }
 
         try:
-            logger.info(f"Ollama stream_chat: model={model}, messages_count={len(messages)}, temp={temperature}, top_p={top_p}")
+            logger.info(f"Ollama stream_chat: model={model}, messages_count={len(messages)}, num_ctx={num_ctx}, temp={temperature}, top_p={top_p}")
 
-            async with self.client.stream(
-                "POST",
-                "/api/chat",
-                json=payload,
-                timeout=httpx.Timeout(settings.ollama_timeout, connect=10.0),
-            ) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Ollama returned status {response.status_code}: {error_text}")
-                    yield StreamChunk(content="", error=f"Ollama error: {response.status_code}")
-                    return
-
-                async for line in response.aiter_lines():
-                    if line.strip():
-                        try:
-                            chunk = json.loads(line)
-                            # Ollama streaming format
-                            if "message" in chunk:
-                                content = chunk["message"].get("content", "")
-                                if content:
-                                    yield StreamChunk(content=content)
-
-                            if chunk.get("done"):
-                                yield StreamChunk(content="", is_done=True)
-
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Failed to parse Ollama response line: {line[:100]}, error: {e}")
+            # Wait for a slot: a local Ollama serves few generations at once
+            if signal_slot:
+                yield StreamChunk(waiting_for_slot=True)
+            async with provider_scheduler.slot(
+                "ollama", model, session_id, on_queue_position
+            ):
+                if signal_slot:
+                    yield StreamChunk(waiting_for_slot=False)
+                async with self.client.stream(
+                    "POST",
+                    "/api/chat",
+                    json=payload,
+                    timeout=httpx.Timeout(settings.ollama_timeout, connect=10.0),
+                ) as response:
+                    if response.status_code != 200:
+                        error_text = await response.aread()
+                        logger.error(f"Ollama returned status {response.status_code}: {error_text}")
+                        yield StreamChunk(content="", error=f"Ollama error: {response.status_code}")
+                        return
+                    self._loaded_num_ctx[model] = num_ctx
+
+                    async for line in response.aiter_lines():
+                        if line.strip():
+                            try:
+                                chunk = json.loads(line)
+                                # Ollama streaming format
+                                if "message" in chunk:
+                                    content = chunk["message"].get("content", "")
+                                    if content:
+                                        yield StreamChunk(content=content)
+
+                                if chunk.get("done"):
+                                    if "eval_count" in chunk or "prompt_eval_count" in chunk:
+                                        yield StreamChunk(usage=TokenUsage(
+                                            prompt_tokens=chunk.get("prompt_eval_count", 0),
+                                            completion_tokens=chunk.get("eval_count", 0),
+                                        ))
+                                    yield StreamChunk(content="", is_done=True)
+
+                            except json.JSONDecodeError as e:
+                                logger.warning(f"Failed to parse Ollama response line: {line[:100]}, error: {e}")
 
         except httpx.ConnectError as e:
             logger.error(f"Ollama connection error: {e}")
+            self.mark_unavailable()
             yield StreamChunk(content="", error="无法连接到 Ollama 服务，请确认 Ollama 正在运行")
 
         except httpx.TimeoutException:
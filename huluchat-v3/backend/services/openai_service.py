@@ -1,6 +1,8 @@
 """OpenAI streaming service for HuluChat."""
+import asyncio
 import logging
 import json
+from contextlib import aclosing
 from typing import AsyncIterator, Optional, Union, List, Dict, Any
 from dataclasses import dataclass, field
 
@@ -10,6 +12,9 @@ from openai.types.chat import ChatCompletionChunk
 import httpx
 
 from core.config import settings
+from services.provider_clients import provider_clients
+from services.provider_retry import RetryState, with_retry
+from services.provider_scheduler import QueuePositionCallback, provider_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +35,13 @@ class ToolCall:
     function_arguments: Dict[str, Any]
 
 
+@dataclass
+class TokenUsage:
+    """Token counts reported by the provider for one request."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
 @dataclass
 class StreamChunk:
     """A chunk of streaming response."""
@@ -38,37 +50,39 @@ class StreamChunk:
     error: Optional[str] = None
     tool_calls: List[ToolCallDelta] = field(default_factory=list)
     has_tool_calls: bool = False
+    # Set on one chunk near the end of the stream, if the provider reports it
+    usage: Optional[TokenUsage] = None
+    # Scheduler signal, not output (stream_chat(signal_slot=True)): True before
+    # waiting for a provider slot, False once it is granted (see stream_guard)
+    waiting_for_slot: Optional[bool] = None
 
 
 # Type for multimodal content
 MultimodalContent = Union[str, List[dict]]
 
 
+def describe_api_error(error: Exception) -> str:
+    """User-facing message for a provider API error."""
+    if isinstance(error, APITimeoutError):
+        return "请求超时，请稍后重试"
+    if isinstance(error, APIConnectionError):
+        return f"连接失败: {str(error)}"
+    if isinstance(error, APIStatusError):
+        return f"请求失败: {error.message}"
+    return str(error)
+
+
 class OpenAIService:
     """Async OpenAI service with streaming support."""
 
-    def __init__(self):
-        self._client: Optional[AsyncOpenAI] = None
-
     @property
     def client(self) -> AsyncOpenAI:
-        """Lazy initialization of OpenAI client with configurable timeout."""
-        if self._client is None:
-            if not settings.openai_api_key:
-                raise ValueError("OpenAI API key not configured")
-            # Configure timeout for OpenAI requests
-            timeout = httpx.Timeout(
-                connect=settings.http_connect_timeout,
-                read=settings.openai_timeout,
-                write=settings.http_read_timeout,
-                pool=settings.http_connect_timeout,
-            )
-            self._client = AsyncOpenAI(
-                api_key=settings.openai_api_key,
-                base_url=settings.openai_base_url,
-                timeout=timeout,
-            )
-        return self._client
+        """Shared OpenAI client for the current key and endpoint (pooled connections)."""
+        if not settings.openai_api_key:
+            raise ValueError("OpenAI API key not configured")
+        return provider_clients.get(
+            "openai", settings.openai_api_key, settings.openai_base_url
+        )
 
     async def stream_chat(
         self,
@@ -78,6 +92,9 @@ class OpenAIService:
         top_p: Optional[float] = None,
         max_tokens: Optional[int] = None,
         tools: Optional[List[dict]] = None,
+        session_id: Optional[str] = None,
+        on_queue_position: Optional[QueuePositionCallback] = None,
+        signal_slot: bool = False,
     ) -> AsyncIterator[StreamChunk]:
         """Stream chat completion from OpenAI.
 
@@ -89,6 +106,10 @@ class OpenAIService:
             top_p: Nucleus sampling (0-1), defaults to settings.top_p
             max_tokens: Max tokens in response, defaults to settings.max_tokens
             tools: Optional list of tools in OpenAI format for function calling
+            session_id: Chat session the request belongs to (fair queuing)
+            on_queue_position: Awaited with the queue position while waiting for a slot
+            signal_slot: Yield waiting_for_slot chunks around the wait for a
+                slot (lets guard_stream start its deadlines when it is granted)
 
         Yields:
             StreamChunk objects containing content, tool_calls, or error
@@ -98,100 +119,159 @@ class OpenAIService:
         top_p = top_p if top_p is not None else settings.top_p
         max_tokens = max_tokens if max_tokens is not None else settings.max_tokens
 
-        try:
-            logger.info(f"stream_chat: model={model}, messages_count={len(messages)}, temp={temperature}, top_p={top_p}, tools_count={len(tools) if tools else 0}")
-
-            # Build API call parameters
-            api_params = {
-                "model": model,
-                "messages": messages,
-                "stream": True,
-                "temperature": temperature,
-                "top_p": top_p,
-                "max_tokens": max_tokens,
-            }
-
-            # Add tools if provided
-            if tools:
-                api_params["tools"] = tools
-                api_params["tool_choice"] = "auto"
-
-            stream = await self.client.chat.completions.create(**api_params)
-
-            # Track tool calls across chunks
-            tool_calls_accumulator: Dict[int, ToolCallDelta] = {}
-
-            async for chunk in stream:
-                if not chunk.choices:
+        logger.info(f"stream_chat: model={model}, messages_count={len(messages)}, temp={temperature}, top_p={top_p}, tools_count={len(tools) if tools else 0}")
+
+        # Build API call parameters
+        api_params = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+        }
+
+        # Add tools if provided
+        if tools:
+            api_params["tools"] = tools
+            api_params["tool_choice"] = "auto"
+
+        if settings.provider_stream_usage:
+            # Token counts arrive in a final chunk without choices
+            api_params["stream_options"] = {"include_usage": True}
+
+        retry = RetryState("openai", "stream_chat")
+        while True:
+            started = False
+            try:
+                async with aclosing(
+                    self._stream_attempt(api_params, session_id, on_queue_position, signal_slot)
+                ) as attempt:
+                    async for chunk in attempt:
+                        if chunk.waiting_for_slot is None:
+                            started = True
+                        yield chunk
+                retry.succeeded()
+                return
+
+            except (APIConnectionError, APIStatusError) as e:
+                # Retry only while nothing has reached the client
+                delay = None if started else retry.next_delay(e)
+                if delay is not None:
+                    await asyncio.sleep(delay)
                     continue
+                logger.error(f"API error: {type(e).__name__}: {e}")
+                yield StreamChunk(error=describe_api_error(e))
+                return
 
-                delta = chunk.choices[0].delta
-
-                # Handle content
-                if delta.content:
-                    yield StreamChunk(content=delta.content)
-
-                # Handle tool calls (accumulate across chunks)
-                if delta.tool_calls:
-                    for tc in delta.tool_calls:
-                        idx = tc.index
-                        if idx not in tool_calls_accumulator:
-                            tool_calls_accumulator[idx] = ToolCallDelta()
-
-                        if tc.id:
-                            tool_calls_accumulator[idx].id = tc.id
-                        if tc.function:
-                            if tc.function.name:
-                                tool_calls_accumulator[idx].function_name = tc.function.name
-                            if tc.function.arguments:
-                                # Accumulate arguments (they come in pieces)
-                                existing = tool_calls_accumulator[idx].function_arguments or ""
-                                tool_calls_accumulator[idx].function_arguments = existing + tc.function.arguments
-
-            # After streaming, yield completed tool calls if any
-            if tool_calls_accumulator:
-                completed_calls = []
-                for idx, tc in sorted(tool_calls_accumulator.items()):
-                    if tc.id and tc.function_name and tc.function_arguments:
-                        try:
-                            args = json.loads(tc.function_arguments)
-                            completed_calls.append(ToolCall(
-                                id=tc.id,
-                                function_name=tc.function_name,
-                                function_arguments=args
-                            ))
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Failed to parse tool arguments: {e}")
+            except Exception as e:
+                logger.error(f"Chat request error: {type(e).__name__}: {e}")
+                yield StreamChunk(error=str(e))
+                return
+
+    async def _stream_attempt(
+        self,
+        api_params: dict,
+        session_id: Optional[str],
+        on_queue_position: Optional[QueuePositionCallback],
+        signal_slot: bool = False,
+    ) -> AsyncIterator[StreamChunk]:
+        """One streaming request; provider errors are raised to stream_chat.
+
+        The scheduler slot covers the HTTP stream only. Usage, tool calls and
+        is_done are yielded after it is released, because the caller runs the
+        tools and then opens a continuation stream that needs its own slot.
+        """
+        stream = None
+        # Track tool calls across chunks
+        tool_calls_accumulator: Dict[int, ToolCallDelta] = {}
+        usage = None
+        try:
+            # Wait for a provider slot (concurrency caps, rate limit, fair queue)
+            if signal_slot:
+                yield StreamChunk(waiting_for_slot=True)
+            async with provider_scheduler.slot(
+                "openai", api_params["model"], session_id, on_queue_position
+            ):
+                if signal_slot:
+                    yield StreamChunk(waiting_for_slot=False)
+                # The client stays open for this stream even if settings replace it
+                async with provider_clients.in_use(self.client) as client:
+                    raw = await client.chat.completions.with_raw_response.create(**api_params)
+                    provider_scheduler.record_headers("openai", raw.headers)
+                    stream = raw.parse()
+
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None) is not None:
+                            usage = TokenUsage(
+                                prompt_tokens=chunk.usage.prompt_tokens or 0,
+                                completion_tokens=chunk.usage.completion_tokens or 0,
+                            )
+                        if not chunk.choices:
                             continue
 
-                if completed_calls:
-                    yield StreamChunk(
-                        content="",
-                        tool_calls=[ToolCallDelta(
+                        delta = chunk.choices[0].delta
+
+                        # Handle content
+                        if delta.content:
+                            yield StreamChunk(content=delta.content)
+
+                        # Handle tool calls (accumulate across chunks)
+                        if delta.tool_calls:
+                            for tc in delta.tool_calls:
+                                idx = tc.index
+                                if idx not in tool_calls_accumulator:
+                                    tool_calls_accumulator[idx] = ToolCallDelta()
+
+                                if tc.id:
+                                    tool_calls_accumulator[idx].id = tc.id
+                                if tc.function:
+                                    if tc.function.name:
+                                        tool_calls_accumulator[idx].function_name = tc.function.name
+                                    if tc.function.arguments:
+                                        # Accumulate arguments (they come in pieces)
+                                        existing = tool_calls_accumulator[idx].function_arguments or ""
+                                        tool_calls_accumulator[idx].function_arguments = existing + tc.function.arguments
+
+                    # Fully read: free the connection before the slot is released
+                    await stream.close()
+                    stream = None
+        finally:
+            # Release the HTTP stream even when the consumer stops early (cancel)
+            if stream is not None:
+                await stream.close()
+
+        if usage is not None:
+            yield StreamChunk(usage=usage)
+
+        # After streaming, yield completed tool calls if any
+        if tool_calls_accumulator:
+            completed_calls = []
+            for idx, tc in sorted(tool_calls_accumulator.items()):
+                if tc.id and tc.function_name and tc.function_arguments:
+                    try:
+                        args = json.loads(tc.function_arguments)
+                        completed_calls.append(ToolCall(
                             id=tc.id,
                             function_name=tc.function_name,
-                            function_arguments=json.dumps(tc.function_arguments)
-                        ) for tc in completed_calls],
-                        has_tool_calls=True
-                    )
-
-            yield StreamChunk(content="", is_done=True)
-
-        except APIConnectionError as e:
-            logger.error(f"API connection error: {e}")
-            yield StreamChunk(error=f"连接失败: {str(e)}")
-
-        except APITimeoutError as e:
-            logger.error(f"API timeout error: {e}")
-            yield StreamChunk(error=f"请求超时，请稍后重试")
-
-        except APIStatusError as e:
-            logger.error(f"API status error: {e.status_code} {e.message}")
-            yield StreamChunk(error=f"请求失败: {e.message}")
-
-        except Exception as e:
-            logger.error(f"Chat request error: {type(e).__name__}: {e}")
-            yield StreamChunk(error=str(e))
+                            function_arguments=args
+                        ))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Failed to parse tool arguments: {e}")
+                        continue
+
+            if completed_calls:
+                yield StreamChunk(
+                    content="",
+                    tool_calls=[ToolCallDelta(
+                        id=tc.id,
+                        function_name=tc.function_name,
+                        function_arguments=json.dumps(tc.function_arguments)
+                    ) for tc in completed_calls],
+                    has_tool_calls=True
+                )
+
+        yield StreamChunk(content="", is_done=True)
 
     def is_configured(self) -> bool:
         """Check if OpenAI is properly configured."""
@@ -223,27 +303,26 @@ class OpenAIService:
         temperature = temperature if temperature is not None else settings.temperature
         max_tokens = max_tokens if max_tokens is not None else settings.max_tokens
 
+        async def request():
+            async with provider_scheduler.slot("openai", model):
+                async with provider_clients.in_use(self.client) as client:
+                    return await client.chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=False,
+                    )
+
         try:
-            response = await self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                stream=False,
-            )
+            raw = await with_retry("openai", "chat", request)
+            provider_scheduler.record_headers("openai", raw.headers)
+            response = raw.parse()
             return response.choices[0].message.content or ""
 
-        except APIConnectionError as e:
-            logger.error(f"API connection error: {e}")
-            raise Exception(f"连接失败: {str(e)}")
-
-        except APITimeoutError as e:
-            logger.error(f"API timeout error: {e}")
-            raise Exception(f"请求超时，请稍后重试")
-
-        except APIStatusError as e:
-            logger.error(f"API status error: {e.status_code} {e.message}")
-            raise Exception(f"请求失败: {e.message}")
+        except (APIConnectionError, APIStatusError) as e:
+            logger.error(f"API error: {type(e).__name__}: {e}")
+            raise Exception(describe_api_error(e))
 
         except Exception as e:
             logger.error(f"Chat request error: {type(e).__name__}: {e}")
@@ -255,7 +334,7 @@ openai_service = OpenAIService()
 
 
 def get_client_for_provider(provider: str) -> AsyncOpenAI:
-    """Get OpenAI-compatible client for different providers.
+    """Get the shared OpenAI-compatible client for a provider.
 
     Args:
         provider: Provider name ('deepseek', 'openai', 'ollama')
@@ -266,29 +345,17 @@ def get_client_for_provider(provider: str) -> AsyncOpenAI:
     Raises:
         ValueError: If provider is unknown or API key not configured
     """
-    # Configure timeout for all providers
-    timeout = httpx.Timeout(
-        connect=settings.http_connect_timeout,
-        read=settings.openai_timeout,
-        write=settings.http_read_timeout,
-        pool=settings.http_connect_timeout,
-    )
-
     if provider == "deepseek":
         if not settings.deepseek_api_key:
             raise ValueError("DeepSeek API key not configured")
-        return AsyncOpenAI(
-            api_key=settings.deepseek_api_key,
-            base_url=settings.deepseek_base_url,
-            timeout=timeout,
+        return provider_clients.get(
+            "deepseek", settings.deepseek_api_key, settings.deepseek_base_url
         )
     elif provider == "openai":
         if not settings.openai_api_key:
             raise ValueError("OpenAI API key not configured")
-        return AsyncOpenAI(
-            api_key=settings.openai_api_key,
-            base_url=settings.openai_base_url,
-            timeout=timeout,
+        return provider_clients.get(
+            "openai", settings.openai_api_key, settings.openai_base_url
         )
     elif provider == "ollama":
         # Use longer timeout for Ollama (local inference may be slow)
@@ -298,9 +365,10 @@ def get_client_for_provider(provider: str) -> AsyncOpenAI:
             write=settings.ollama_timeout,
             pool=settings.http_connect_timeout,
         )
-        return AsyncOpenAI(
-            api_key="ollama",  # Ollama doesn't need a real API key
-            base_url=f"{settings.ollama_base_url}/v1",
+        return provider_clients.get(
+            "ollama",
+            "ollama",  # Ollama doesn't need a real API key
+            f"{settings.ollama_base_url}/v1",
             timeout=ollama_timeout,
         )
     else:
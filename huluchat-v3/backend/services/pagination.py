@@ -0,0 +1,133 @@
+"""Keyset (cursor) pagination.
+
+An OFFSET page gets slower the deeper it is, because the database still
+walks every skipped row. A keyset page instead starts at the boundary row
+the client last saw - a range seek on an index such as (updated_at, id) -
+so every page costs the same, and rows inserted or moved meanwhile do not
+shift later pages. The sort key must be unique: sessions use
+(updated_at, id), where the id breaks timestamp ties; messages use their
+per-session seq.
+
+Cursors are opaque to clients: base64 of the JSON key values of a
+boundary row (datetimes as ISO strings). Pages can be read in both
+directions of the list order: ``after`` returns the rows following the
+cursor row, ``before`` the rows preceding it, and ``from_end`` the last
+rows of the list (the newest messages of a chat, for instance).
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass
+class KeysetPage:
+    """One page of rows, in list order."""
+    items: List[Any] = field(default_factory=list)
+    # Pass as `after` for the rows following the page; None when there are none
+    next_cursor: Optional[str] = None
+    # Pass as `before` for the rows preceding the page; None when there are none
+    prev_cursor: Optional[str] = None
+
+
+def encode_cursor(*values: Any) -> str:
+    """Cursor of a row from its sort key values."""
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else value for value in values],
+        separators=(",", ":"),
+    ).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_columns: Sequence) -> Tuple[Any, ...]:
+    """Sort key values of a cursor, checked against the key columns' types.
+
+    Raises:
+        ValueError: The cursor is malformed or belongs to another sort key
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(key_columns):
+            raise ValueError("wrong number of values")
+        decoded = []
+        for column, value in zip(key_columns, values):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif not isinstance(value, python_type) or isinstance(value, bool):
+                raise ValueError(f"expected {python_type.__name__}")
+            decoded.append(value)
+        return tuple(decoded)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid page cursor") from e
+
+
+async def keyset_page(
+    db: AsyncSession,
+    query: Select,
+    key_columns: Sequence,
+    limit: int,
+    descending: bool = False,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    from_end: bool = False,
+) -> KeysetPage:
+    """Run `query` for one page ordered by `key_columns`.
+
+    Args:
+        query: Select of ORM entities with the filters applied (no ORDER BY)
+        key_columns: Mapped columns of a unique sort key, e.g. (updated_at, id)
+        limit: Max rows per page
+        descending: List order is newest first
+        after: Return the rows following this cursor
+        before: Return the rows preceding this cursor
+        from_end: Without a cursor, return the last rows instead of the first
+
+    Raises:
+        ValueError: A cursor is malformed, or both after and before are given
+    """
+    if after is not None and before is not None:
+        raise ValueError("Pass either after or before, not both")
+
+    def position(cursor: str):
+        values = decode_cursor(cursor, key_columns)
+        return values[0] if len(values) == 1 else tuple_(*values)
+
+    key = key_columns[0] if len(key_columns) == 1 else tuple_(*key_columns)
+    if after is not None:
+        bound = position(after)
+        query = query.where(key < bound if descending else key > bound)
+    if before is not None:
+        bound = position(before)
+        query = query.where(key > bound if descending else key < bound)
+
+    # A backward page is read in reverse order, from the cursor outwards
+    backward = before is not None or (from_end and after is None)
+    if descending != backward:
+        query = query.order_by(*(column.desc() for column in key_columns))
+    else:
+        query = query.order_by(*(column.asc() for column in key_columns))
+    rows = list((await db.execute(query.limit(limit + 1))).scalars().all())
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    page = KeysetPage(items=rows)
+    if rows:
+        def cursor_of(row) -> str:
+            return encode_cursor(*(getattr(row, column.key) for column in key_columns))
+
+        if backward:
+            page.prev_cursor = cursor_of(rows[0]) if more else None
+            # Coming from a cursor, its row (at least) follows the page
+            page.next_cursor = cursor_of(rows[-1]) if before is not None else None
+        else:
+            page.next_cursor = cursor_of(rows[-1]) if more else None
+            page.prev_cursor = cursor_of(rows[0]) if after is not None else None
+    return page
@@ -0,0 +1,169 @@
+"""Shared, pooled HTTP clients for AI providers.
+
+Building an AsyncOpenAI client per call means a new connection pool, so
+every request pays DNS, TCP and TLS setup again. The registry keeps one
+live client per (provider, base_url) on a tuned httpx pool with keep-alive
+and HTTP/2 (when the optional h2 package is installed).
+
+When the endpoint's API key fingerprint or timeout changes (settings
+update), get() builds a new client and the superseded one is closed as soon
+as no request is using it:
+requests hold their client with in_use(), so a settings change never cuts
+off a stream that is still running. close() shuts everything down and runs
+in the app lifespan shutdown.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional h2 package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def default_timeout() -> httpx.Timeout:
+    """Timeout for cloud provider requests."""
+    return httpx.Timeout(
+        connect=settings.http_connect_timeout,
+        read=settings.openai_timeout,
+        write=settings.http_read_timeout,
+        pool=settings.http_connect_timeout,
+    )
+
+
+def create_http_client(
+    timeout: httpx.Timeout,
+    base_url: Optional[str] = None,
+) -> httpx.AsyncClient:
+    """Create an httpx client with the shared pool and keep-alive settings."""
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    kwargs = {"timeout": timeout, "limits": limits}
+    if base_url:
+        kwargs["base_url"] = base_url
+    return httpx.AsyncClient(
+        http2=settings.http2_enabled and HTTP2_AVAILABLE,
+        **kwargs,
+    )
+
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    """Short hash identifying an API key without keeping it in the registry key."""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+class ProviderClientRegistry:
+    """Caches one AsyncOpenAI client per provider endpoint."""
+
+    def __init__(self):
+        # (provider, base_url) -> (key fingerprint, timeout, client)
+        self._clients: Dict[Tuple[str, str], Tuple[str, httpx.Timeout, AsyncOpenAI]] = {}
+        # Requests in flight per client (see in_use())
+        self._users: Dict[AsyncOpenAI, int] = {}
+        # Superseded clients still serving requests, closed after the last one
+        self._retired: Set[AsyncOpenAI] = set()
+        self._closing: Set[asyncio.Task] = set()
+        self.created = 0
+
+    def get(
+        self,
+        provider: str,
+        api_key: str,
+        base_url: Optional[str] = None,
+        timeout: Optional[httpx.Timeout] = None,
+    ) -> AsyncOpenAI:
+        """Get the shared client for a provider, replacing it if the key or timeout changed.
+
+        Args:
+            provider: Provider name ('openai', 'deepseek', 'ollama', ...)
+            api_key: API key to authenticate with
+            base_url: API base URL (None for the SDK default)
+            timeout: Request timeout (default_timeout() when None)
+        """
+        endpoint = (provider, base_url or "")
+        fingerprint = key_fingerprint(api_key)
+        timeout = timeout or default_timeout()
+        entry = self._clients.get(endpoint)
+        if entry is not None:
+            if entry[0] == fingerprint and entry[1] == timeout:
+                return entry[2]
+            logger.info(f"Replacing {provider} client after settings change")
+            self._retire(entry[2])
+
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            # Retries are budgeted and counted by services.provider_retry
+            max_retries=0,
+            http_client=create_http_client(timeout),
+        )
+        self._clients[endpoint] = (fingerprint, timeout, client)
+        self.created += 1
+        return client
+
+    @asynccontextmanager
+    async def in_use(self, client: AsyncOpenAI) -> AsyncIterator[AsyncOpenAI]:
+        """Keep a client open while a request uses it, even if it is replaced meanwhile."""
+        self._users[client] = self._users.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            remaining = self._users.pop(client) - 1
+            if remaining:
+                self._users[client] = remaining
+            elif client in self._retired:
+                self._retired.discard(client)
+                self._close_soon(client)
+
+    def _retire(self, client: AsyncOpenAI) -> None:
+        if self._users.get(client):
+            self._retired.add(client)
+        else:
+            self._close_soon(client)
+
+    def _close_soon(self, client: AsyncOpenAI) -> None:
+        """Close a client in the background (at shutdown without a running loop)."""
+        try:
+            task = asyncio.get_running_loop().create_task(self._close_client(client))
+        except RuntimeError:
+            self._retired.add(client)
+            return
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_client(client: AsyncOpenAI) -> None:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug(f"Failed to close provider client: {e}")
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def close(self) -> None:
+        """Close all clients and their connection pools."""
+        clients = [client for _, _, client in self._clients.values()] + list(self._retired)
+        self._clients.clear()
+        self._retired.clear()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        for client in clients:
+            await self._close_client(client)
+
+
+# Global registry instance
+provider_clients = ProviderClientRegistry()
@@ -0,0 +1,162 @@
+"""Retries for transient provider failures.
+
+Connection errors, timeouts, 429 and 5xx responses are retried with
+exponential backoff and full jitter, or after the delay the provider asks
+for in Retry-After. Each request has a retry budget (max retries and total
+seconds spent waiting); once it is used up the error reaches the caller.
+
+Streams are only retried before their first chunk has been yielded, so a
+client never sees a response restart halfway. The OpenAI SDK's own retries
+are disabled (see provider_clients) so every retry is counted here.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from openai import APIConnectionError, APIStatusError
+
+from core.config import settings
+from services.provider_scheduler import parse_retry_after, provider_scheduler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient (connection, timeout, 429, 5xx)."""
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, APIConnectionError)
+
+
+def backoff_delay(retry: int, base: float, maximum: float) -> float:
+    """Exponential backoff with full jitter for the given retry (0-based)."""
+    return random.uniform(0, min(maximum, base * 2 ** retry))
+
+
+class RetryStats:
+    """Retry counters per (provider, operation, outcome).
+
+    Outcomes: retry (a retry was scheduled), recovered (a request succeeded
+    after retrying), exhausted (retry budget used up).
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def record(self, provider: str, operation: str, outcome: str) -> None:
+        self.counts[(provider, operation, outcome)] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, str, str], int]:
+        return dict(self.counts)
+
+    def reset(self) -> None:
+        self.counts.clear()
+
+
+retry_stats = RetryStats()
+
+
+class RetryState:
+    """Retry budget of one request.
+
+    Args:
+        provider: Provider name, for counters and rate limit pauses
+        operation: Operation name ('stream_chat', 'chat', 'embed', ...)
+        max_retries: Defaults to settings.provider_max_retries
+        budget_seconds: Max total backoff, defaults to settings.provider_retry_budget_seconds
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        operation: str,
+        max_retries: Optional[int] = None,
+        budget_seconds: Optional[float] = None,
+    ):
+        self.provider = provider
+        self.operation = operation
+        self.max_retries = max_retries if max_retries is not None else settings.provider_max_retries
+        self.budget_seconds = (
+            budget_seconds if budget_seconds is not None else settings.provider_retry_budget_seconds
+        )
+        self.retries = 0
+        self.waited = 0.0
+
+    def next_delay(self, error: BaseException) -> Optional[float]:
+        """Seconds to wait before retrying after an error.
+
+        Returns:
+            None if the error is not retryable or the budget is used up
+        """
+        retry_after = None
+        if isinstance(error, APIStatusError):
+            retry_after = parse_retry_after(error.response.headers)
+            if error.status_code == 429:
+                # Hold back the provider's other queued requests too
+                provider_scheduler.record_rate_limited(self.provider, retry_after)
+
+        if not is_retryable(error):
+            return None
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = backoff_delay(
+                self.retries, settings.provider_retry_base_delay, settings.provider_retry_max_delay
+            )
+        if self.retries >= self.max_retries or self.waited + delay > self.budget_seconds:
+            retry_stats.record(self.provider, self.operation, "exhausted")
+            return None
+
+        self.retries += 1
+        self.waited += delay
+        retry_stats.record(self.provider, self.operation, "retry")
+        logger.warning(
+            f"{self.provider} {self.operation} failed ({type(error).__name__}), "
+            f"retry {self.retries}/{self.max_retries} in {delay:.2f}s"
+        )
+        return delay
+
+    def succeeded(self) -> None:
+        if self.retries:
+            retry_stats.record(self.provider, self.operation, "recovered")
+
+
+async def with_retry(
+    provider: str,
+    operation: str,
+    call: Callable[[], Awaitable[T]],
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+) -> T:
+    """Run a non-streaming provider call, retrying transient failures.
+
+    Args:
+        provider: Provider name
+        operation: Operation name for the counters
+        call: Makes one attempt (called again for each retry)
+        sleep: Backoff sleep (replaceable in tests)
+    """
+    state = RetryState(provider, operation)
+    started = time.monotonic()
+    while True:
+        try:
+            result = await call()
+        except Exception as e:
+            delay = state.next_delay(e)
+            if delay is None:
+                raise
+            await sleep(delay)
+            continue
+        state.succeeded()
+        if state.retries:
+            logger.info(
+                f"{provider} {operation} succeeded after {state.retries} retries "
+                f"({time.monotonic() - started:.1f}s)"
+            )
+        return result
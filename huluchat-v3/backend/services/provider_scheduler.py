@@ -0,0 +1,325 @@
+"""Admission control for AI provider requests.
+
+Every chat stream and embedding call takes a slot from the scheduler before
+it reaches the provider, so many concurrent sessions cannot flood
+DeepSeek/OpenAI with requests (429 bursts) or a local Ollama with parallel
+generations:
+
+- Concurrency caps per provider and per model
+- A request token bucket per provider, learned from the provider's
+  x-ratelimit-* response headers and paused by Retry-After on a 429
+- Fair queuing: waiting requests are served round-robin across sessions,
+  so one busy session cannot starve the others
+- Waiters get their queue position through an optional callback (pushed
+  to the WebSocket client as queue_position events)
+"""
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Mapping, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Queue key of requests that do not belong to a chat session
+BACKGROUND_QUEUE = "__background__"
+
+QueuePositionCallback = Callable[[int], Awaitable[Any]]
+
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate limit reset value ("20ms", "1.5s", "6m0s" or plain seconds).
+
+    Returns:
+        Seconds, or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART_RE.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        return None
+    return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds to wait from a Retry-After (or retry-after-ms) header."""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+    return parse_reset_duration(headers.get("retry-after"))
+
+
+class TokenBucket:
+    """Request rate limiter; starts unlimited until a limit is known.
+
+    Args:
+        requests_per_minute: Initial limit (0 = unlimited until headers arrive)
+    """
+
+    def __init__(self, requests_per_minute: int = 0, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.capacity: Optional[float] = None
+        self.rate = 0.0
+        self.tokens = 0.0
+        self._updated = clock()
+        # Hard pause (remaining == 0 or a 429), as a clock timestamp
+        self.blocked_until = 0.0
+        if requests_per_minute > 0:
+            self.set_limit(requests_per_minute)
+
+    def set_limit(self, requests_per_minute: float) -> None:
+        self._refill()
+        first = self.capacity is None
+        self.capacity = float(requests_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity if first else min(self.tokens, self.capacity)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        if self.capacity is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a request may be sent (0 = now)."""
+        now = self._clock()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.capacity is None:
+            return 0.0
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def take(self) -> None:
+        if self.capacity is not None:
+            self._refill()
+            self.tokens = max(self.tokens - 1, 0.0)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Sync the bucket with x-ratelimit-{limit,remaining,reset}-requests."""
+        try:
+            limit = float(headers.get("x-ratelimit-limit-requests") or 0)
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            remaining = float(remaining) if remaining is not None else None
+        except ValueError:
+            return
+        if limit > 0 and limit != self.capacity:
+            self.set_limit(limit)
+        if remaining is not None and self.capacity is not None:
+            self._refill()
+            self.tokens = min(remaining, self.capacity)
+        if remaining is not None and remaining <= 0:
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self.pause(reset)
+
+    def pause(self, seconds: float) -> None:
+        """Stop sending requests for the given time (e.g. Retry-After)."""
+        self.blocked_until = max(self.blocked_until, self._clock() + seconds)
+
+
+class _Waiter:
+    def __init__(self, session_id: str, model: str):
+        self.session_id = session_id
+        self.model = model
+        self.granted = False
+        self.position = 0
+        self.changed = asyncio.Event()
+
+
+class _ProviderQueue:
+    """Slots, rate limit and fair queue of one provider."""
+
+    def __init__(self, name: str, max_concurrency: int, requests_per_minute: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.active_by_model: Dict[str, int] = {}
+        self.bucket = TokenBucket(requests_per_minute)
+        # session id -> its waiters in arrival order; dict order is the
+        # round-robin order (a served session moves to the back)
+        self.waiters: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+
+    def queued(self) -> int:
+        return sum(len(w) for w in self.waiters.values())
+
+
+class ProviderScheduler:
+    """Per-provider concurrency, rate limit and fair queueing."""
+
+    def __init__(self):
+        self._queues: Dict[str, _ProviderQueue] = {}
+
+    def _limits(self, provider: str):
+        if provider == "ollama":
+            return settings.ollama_max_concurrency, 0
+        return settings.provider_max_concurrency, settings.provider_requests_per_minute
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            max_concurrency, rpm = self._limits(provider)
+            queue = _ProviderQueue(provider, max_concurrency, rpm)
+            self._queues[provider] = queue
+        return queue
+
+    def stats(self) -> Dict[str, dict]:
+        """Active and queued requests per provider."""
+        return {
+            name: {
+                "active": queue.active,
+                "queued": queue.queued(),
+                "max_concurrency": queue.max_concurrency,
+                "rate_limit": queue.bucket.capacity,
+            }
+            for name, queue in self._queues.items()
+        }
+
+    def record_headers(self, provider: str, headers: Mapping[str, str]) -> None:
+        """Feed response rate limit headers into the provider's token bucket."""
+        self._queue(provider).bucket.update_from_headers(headers)
+
+    def record_rate_limited(self, provider: str, retry_after: Optional[float]) -> None:
+        """Pause a provider after a 429."""
+        queue = self._queue(provider)
+        queue.bucket.pause(retry_after if retry_after is not None else 1.0)
+        logger.warning(f"{provider} rate limited, pausing for {retry_after or 1.0}s")
+
+    def _model_has_capacity(self, queue: _ProviderQueue, model: str) -> bool:
+        limit = settings.model_max_concurrency
+        return limit <= 0 or queue.active_by_model.get(model, 0) < limit
+
+    def _dispatch(self, queue: _ProviderQueue) -> None:
+        """Grant free slots round-robin across sessions, then update positions."""
+        while queue.waiters and queue.active < queue.max_concurrency:
+            delay = queue.bucket.wait_time()
+            if delay > 0:
+                self._schedule_wakeup(queue, delay)
+                break
+            waiter = None
+            for session_id, waiters in queue.waiters.items():
+                # Only the oldest request of each session is considered
+                if self._model_has_capacity(queue, waiters[0].model):
+                    waiter = waiters.popleft()
+                    if not waiters:
+                        del queue.waiters[session_id]
+                    else:
+                        queue.waiters.move_to_end(session_id)
+                    break
+            if waiter is None:
+                break
+            queue.bucket.take()
+            queue.active += 1
+            queue.active_by_model[waiter.model] = queue.active_by_model.get(waiter.model, 0) + 1
+            waiter.granted = True
+            waiter.changed.set()
+
+        # Positions follow the order requests would be served in
+        position = 0
+        pending = [deque(w) for w in queue.waiters.values()]
+        while pending:
+            for waiters in pending:
+                waiter = waiters.popleft()
+                position += 1
+                if waiter.position != position:
+                    waiter.position = position
+                    waiter.changed.set()
+            pending = [w for w in pending if w]
+
+    def _schedule_wakeup(self, queue: _ProviderQueue, delay: float) -> None:
+        if queue.wakeup is not None:
+            return
+
+        def wakeup():
+            queue.wakeup = None
+            self._dispatch(queue)
+
+        queue.wakeup = asyncio.get_running_loop().call_later(delay, wakeup)
+
+    def _release(self, queue: _ProviderQueue, model: str) -> None:
+        queue.active -= 1
+        remaining = queue.active_by_model.get(model, 1) - 1
+        if remaining > 0:
+            queue.active_by_model[model] = remaining
+        else:
+            queue.active_by_model.pop(model, None)
+        self._dispatch(queue)
+
+    def _remove(self, queue: _ProviderQueue, waiter: _Waiter) -> None:
+        waiters = queue.waiters.get(waiter.session_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del queue.waiters[waiter.session_id]
+        self._dispatch(queue)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        provider: str,
+        model: str,
+        session_id: Optional[str] = None,
+        on_queue_position: Optional[QueuePositionCallback] = None,
+    ) -> AsyncIterator[None]:
+        """Hold a provider slot for the duration of a request.
+
+        Args:
+            provider: Provider name ('openai', 'ollama', ...)
+            model: Model the request uses (for the per-model cap)
+            session_id: Chat session, the unit of fair queuing
+            on_queue_position: Awaited with the 1-based queue position
+                whenever it changes while the request waits
+        """
+        queue = self._queue(provider)
+        waiter = _Waiter(session_id or BACKGROUND_QUEUE, model)
+        queue.waiters.setdefault(waiter.session_id, deque()).append(waiter)
+        self._dispatch(queue)
+
+        try:
+            reported = 0
+            while not waiter.granted:
+                if on_queue_position is not None and waiter.position != reported:
+                    reported = waiter.position
+                    await on_queue_position(reported)
+                    continue
+                waiter.changed.clear()
+                await waiter.changed.wait()
+        except BaseException:
+            if waiter.granted:
+                self._release(queue, model)
+            else:
+                self._remove(queue, waiter)
+            raise
+
+        try:
+            yield
+        finally:
+            self._release(queue, model)
+
+
+# Global scheduler instance
+provider_scheduler = ProviderScheduler()
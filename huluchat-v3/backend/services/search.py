@@ -0,0 +1,311 @@
+"""Full-text search over session titles and message contents.
+
+Queries run against the FTS5 index in models/search.py instead of scanning
+messages with LIKE, and are split the same way the index is: a word becomes
+a quoted prefix term ("pyth"* matches python), a CJK run a phrase of its
+bigrams ("搜索引" -> "搜索 索引", i.e. a substring match) and a single CJK
+character a prefix term. All terms must match.
+
+Sessions are ranked by their best bm25 score over the title and message
+hits (title hits weigh double), then by id, which makes (score, id) a
+stable keyset cursor. The index is contentless, so snippets and title
+highlights are cut from the original text in Python, for the returned page
+only. Text is HTML-escaped before matches are wrapped in <mark>, so message
+content never reaches the client as markup.
+"""
+import base64
+import html
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.search import (
+    CJK_RANGES,
+    INDEXED_COLUMNS,
+    TOKEN_PATTERN,
+    cjk_bigrams,
+    is_cjk,
+    rebuild_search_index_ddl,
+    search_index_drift_sql,
+)
+
+# Matched messages returned per session
+MESSAGES_PER_SESSION = 3
+# Characters of context on each side of the first match in a snippet
+SNIPPET_CONTEXT_CHARS = 50
+# bm25 multiplier for title hits (scores are negative: lower is better)
+TITLE_WEIGHT = 2.0
+
+_RANK_SQL = """
+WITH hits AS (
+    SELECT m.session_id AS session_id, messages_fts.rank AS score, 0 AS in_title
+    FROM messages_fts JOIN messages AS m ON m.rowid = messages_fts.rowid
+    WHERE messages_fts MATCH :query
+    UNION ALL
+    SELECT s.id, sessions_fts.rank * :title_weight, 1
+    FROM sessions_fts JOIN sessions AS s ON s.rowid = sessions_fts.rowid
+    WHERE sessions_fts MATCH :query
+),
+ranked AS (
+    SELECT hits.session_id AS session_id, s.title AS title, min(hits.score) AS score,
+           max(hits.in_title) AS in_title, min(hits.in_title) = 0 AS in_content
+    FROM hits JOIN sessions AS s ON s.id = hits.session_id
+    WHERE {filters}
+    GROUP BY hits.session_id
+)
+SELECT session_id, title, score, in_title, in_content FROM ranked
+WHERE {after}
+ORDER BY score, session_id
+LIMIT :limit
+"""
+
+_MESSAGES_SQL = """
+SELECT m.id AS id, m.session_id AS session_id, m.role AS role,
+       m.created_at AS created_at, m.content AS content
+FROM (
+    SELECT best.rowid AS rid, messages_fts.rank AS score,
+           row_number() OVER (PARTITION BY best.session_id ORDER BY messages_fts.rank) AS n
+    FROM messages_fts JOIN messages AS best ON best.rowid = messages_fts.rowid
+    WHERE messages_fts MATCH :query AND best.session_id IN :session_ids
+) AS top JOIN messages AS m ON m.rowid = top.rid
+WHERE top.n <= :per_session
+ORDER BY top.score
+"""
+
+
+@dataclass
+class MessageHit:
+    """A matched message with its snippet."""
+    id: str
+    session_id: str
+    role: str
+    created_at: datetime
+    # Plain text around the match
+    snippet: str
+    # The same text, HTML-escaped, with matches wrapped in <mark>
+    highlighted: str
+
+
+@dataclass
+class SessionHit:
+    """A matched session and its best message hits."""
+    session_id: str
+    score: float
+    in_title: bool
+    in_content: bool
+    # HTML-escaped title with matches wrapped in <mark> (title hits only)
+    title_highlight: Optional[str] = None
+    messages: List[MessageHit] = field(default_factory=list)
+
+
+@dataclass
+class SearchPage:
+    """One page of search results."""
+    hits: List[SessionHit]
+    # Pass back as `cursor` for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """FTS5 MATCH expression for user input, split like the indexed text.
+
+    Returns:
+        The expression, or None when the input has no searchable words
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(query.lower()):
+        if is_cjk(token) and len(token) > 1:
+            terms.append('"' + " ".join(cjk_bigrams(token)) + '"')
+        else:
+            terms.append(f'"{token}"*')
+    return " ".join(terms) or None
+
+
+def highlight_pattern(query: str) -> Optional["re.Pattern[str]"]:
+    """Case-insensitive pattern of the query's CJK runs and words (to the end of the word)."""
+    terms = sorted(set(TOKEN_PATTERN.findall(query.lower())), key=len, reverse=True)
+    if not terms:
+        return None
+    alternatives = [
+        re.escape(term) if is_cjk(term) else f"{re.escape(term)}[^\\W_{CJK_RANGES}]*"
+        for term in terms
+    ]
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def highlight(value: str, pattern: "re.Pattern[str]") -> str:
+    """HTML-escaped text with every match wrapped in <mark>."""
+    parts = []
+    position = 0
+    for match in pattern.finditer(value):
+        parts.append(html.escape(value[position:match.start()], quote=False))
+        parts.append(f"<mark>{html.escape(match.group(), quote=False)}</mark>")
+        position = match.end()
+    parts.append(html.escape(value[position:], quote=False))
+    return "".join(parts)
+
+
+def make_snippet(content: str, pattern: "re.Pattern[str]") -> Tuple[str, str]:
+    """Text around the first match: (plain snippet, highlighted snippet).
+
+    Matches folded by the index (e.g. accents) may not be found again here;
+    the snippet then starts at the beginning of the message.
+    """
+    match = pattern.search(content)
+    if match is None:
+        start, end = 0, min(len(content), 2 * SNIPPET_CONTEXT_CHARS)
+    else:
+        start = max(0, match.start() - SNIPPET_CONTEXT_CHARS)
+        end = min(len(content), match.end() + SNIPPET_CONTEXT_CHARS)
+    window = content[start:end]
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if end < len(content) else ""
+    return prefix + window + suffix, prefix + highlight(window, pattern) + suffix
+
+
+def encode_cursor(score: float, session_id: str) -> str:
+    payload = json.dumps([score, session_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, session_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), str(session_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid search cursor") from e
+
+
+async def search_sessions(
+    db: AsyncSession,
+    query: str,
+    folder_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> SearchPage:
+    """Sessions whose title or messages match the query, best first.
+
+    Args:
+        query: User input; words match as prefixes, CJK text as substrings
+        folder_id: Only sessions in this folder
+        date_from / date_to: Only sessions updated in this range
+        limit: Max sessions per page
+        cursor: next_cursor of the previous page
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    match = build_match_query(query)
+    after = decode_cursor(cursor) if cursor else None
+    if match is None:
+        return SearchPage(hits=[])
+
+    params: Dict[str, object] = {"query": match, "title_weight": TITLE_WEIGHT, "limit": limit + 1}
+    binds = []
+    filters = []
+    if folder_id is not None:
+        filters.append("s.folder_id = :folder_id")
+        params["folder_id"] = folder_id
+    if date_from is not None:
+        filters.append("s.updated_at >= :date_from")
+        params["date_from"] = date_from
+        binds.append(bindparam("date_from", type_=DateTime()))
+    if date_to is not None:
+        filters.append("s.updated_at <= :date_to")
+        params["date_to"] = date_to
+        binds.append(bindparam("date_to", type_=DateTime()))
+    after_clause = "1"
+    if after is not None:
+        after_clause = "score > :after_score OR (score = :after_score AND session_id > :after_id)"
+        params["after_score"], params["after_id"] = after
+
+    statement = text(_RANK_SQL.format(
+        filters=" AND ".join(filters) or "1", after=after_clause,
+    )).bindparams(*binds)
+    rows = (await db.execute(statement, params)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].session_id)
+    pattern = highlight_pattern(query)
+    hits = [
+        SessionHit(
+            session_id=row.session_id,
+            score=row.score,
+            in_title=bool(row.in_title),
+            in_content=bool(row.in_content),
+            title_highlight=highlight(row.title, pattern) if row.in_title else None,
+        )
+        for row in rows
+    ]
+    content_hits = [hit for hit in hits if hit.in_content]
+    if content_hits:
+        await _add_messages(db, match, pattern, content_hits)
+    return SearchPage(hits=hits, next_cursor=next_cursor)
+
+
+async def _add_messages(
+    db: AsyncSession,
+    match: str,
+    pattern: "re.Pattern[str]",
+    hits: List[SessionHit],
+) -> None:
+    """Fill in the best matched messages, with snippets, for a page of hits."""
+    by_id = {hit.session_id: hit for hit in hits}
+    statement = (
+        text(_MESSAGES_SQL)
+        .bindparams(bindparam("session_ids", expanding=True))
+        .columns(id=None, session_id=None, role=None, created_at=DateTime(), content=None)
+    )
+    result = await db.execute(statement, {
+        "query": match,
+        "session_ids": list(by_id),
+        "per_session": MESSAGES_PER_SESSION,
+    })
+    for row in result.mappings():
+        snippet, highlighted = make_snippet(row["content"], pattern)
+        by_id[row["session_id"]].messages.append(MessageHit(
+            id=row["id"],
+            session_id=row["session_id"],
+            role=row["role"],
+            created_at=row["created_at"],
+            snippet=snippet,
+            highlighted=highlighted,
+        ))
+
+
+async def rebuild_search_index(db: AsyncSession) -> None:
+    """Re-create the FTS indexes from the messages and sessions tables.
+
+    Needed after operations that renumber rowids (VACUUM, table rebuilds).
+    """
+    for table, column in INDEXED_COLUMNS:
+        for statement in rebuild_search_index_ddl(table, column):
+            await db.execute(text(statement))
+    await db.commit()
+
+
+async def ensure_search_index(db: AsyncSession) -> List[str]:
+    """Rebuild the FTS indexes whose rowids no longer match their table.
+
+    Run at startup, so an index left stale by a VACUUM or table rebuild is
+    repaired before the first search. Returns the rebuilt tables.
+    """
+    rebuilt = []
+    for table, column in INDEXED_COLUMNS:
+        if (await db.execute(text(search_index_drift_sql(table)))).scalar():
+            for statement in rebuild_search_index_ddl(table, column):
+                await db.execute(text(statement))
+            rebuilt.append(table)
+    await db.commit()
+    return rebuilt
@@ -0,0 +1,146 @@
+"""Coalescing of streamed text chunks for the chat WebSocket.
+
+Fast providers emit one or two tokens per chunk. Sending each one as its
+own JSON frame costs a JSON encode and a WebSocket frame per token on the
+server and a render per token on the client. StreamCoalescer buffers
+`stream_chunk` content and flushes it when either the time window elapses
+or the buffered size crosses a byte threshold, whichever comes first.
+
+Non-text events (stream_end, tool calls, errors) go through send_event(),
+which flushes pending text first so ordering is preserved.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Limits for client-supplied settings
+MAX_WINDOW_MS = 200
+MIN_MAX_BYTES = 1
+MAX_MAX_BYTES = 64 * 1024
+
+
+@dataclass
+class CoalesceConfig:
+    """Per-connection coalescing settings.
+
+    A window of 0 ms disables coalescing (every chunk is sent immediately).
+    """
+    window_ms: int = 30
+    max_bytes: int = 1024
+
+    @classmethod
+    def from_settings(cls) -> "CoalesceConfig":
+        """Build the default config from application settings."""
+        return cls(
+            window_ms=settings.ws_coalesce_window_ms,
+            max_bytes=settings.ws_coalesce_max_bytes,
+        )
+
+    def updated(self, data: dict) -> "CoalesceConfig":
+        """Return a copy updated from a client `config` message.
+
+        Unknown or invalid values are ignored; valid ones are clamped.
+        """
+        window_ms = self.window_ms
+        max_bytes = self.max_bytes
+        try:
+            if data.get("coalesce_ms") is not None:
+                window_ms = min(max(int(data["coalesce_ms"]), 0), MAX_WINDOW_MS)
+            if data.get("coalesce_bytes") is not None:
+                max_bytes = min(max(int(data["coalesce_bytes"]), MIN_MAX_BYTES), MAX_MAX_BYTES)
+        except (TypeError, ValueError):
+            logger.debug(f"Ignoring invalid coalesce config: {data}")
+        return CoalesceConfig(window_ms=window_ms, max_bytes=max_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+
+class StreamCoalescer:
+    """Buffer stream_chunk content and flush on a time window or byte threshold."""
+
+    def __init__(
+        self,
+        send: Callable[[dict], Awaitable[None]],
+        config: Optional[CoalesceConfig] = None,
+    ):
+        self._send = send
+        self.config = config or CoalesceConfig.from_settings()
+        self._buffer: List[str] = []
+        self._buffered_bytes = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        # Stats for this stream
+        self.chunks_in = 0
+        self.frames_out = 0
+
+    async def add(self, content: str) -> None:
+        """Queue text content for the client."""
+        if not content:
+            return
+        self.chunks_in += 1
+
+        if not self.config.enabled:
+            await self._send_frame(content)
+            return
+
+        self._buffer.append(content)
+        self._buffered_bytes += len(content.encode("utf-8"))
+
+        if self._buffered_bytes >= self.config.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_window())
+
+    async def flush(self) -> None:
+        """Send any buffered text now."""
+        self._cancel_timer()
+        async with self._lock:
+            if not self._buffer:
+                return
+            content = "".join(self._buffer)
+            self._buffer.clear()
+            self._buffered_bytes = 0
+            await self._send_frame_locked(content)
+
+    async def send_event(self, data: dict) -> None:
+        """Flush buffered text, then send a non-text event."""
+        await self.flush()
+        async with self._lock:
+            await self._send(data)
+
+    async def aclose(self) -> None:
+        """Flush remaining text and stop the timer."""
+        await self.flush()
+
+    async def _flush_after_window(self) -> None:
+        try:
+            await asyncio.sleep(self.config.window_ms / 1000)
+        except asyncio.CancelledError:
+            return
+        # Clear before flushing so flush() does not cancel this task
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.debug(f"Coalesced flush failed: {e}")
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            if self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+
+    async def _send_frame(self, content: str) -> None:
+        async with self._lock:
+            await self._send_frame_locked(content)
+
+    async def _send_frame_locked(self, content: str) -> None:
+        self.frames_out += 1
+        await self._send({"type": "stream_chunk", "content": content})
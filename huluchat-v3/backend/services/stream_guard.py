@@ -0,0 +1,69 @@
+"""Deadlines for provider streams.
+
+A provider stream can hang after the connection is established; the HTTP
+read timeout only fires after openai_timeout seconds. guard_stream()
+enforces two tighter deadlines around a stream_chat iterator:
+
+- time to first token: until the first content (or tool call) chunk
+- stall: the longest gap between two chunks after that
+
+Time spent queued for a provider slot is not the provider's fault: while
+the stream signals waiting_for_slot=True no deadline runs, and the first
+token deadline starts when the slot is granted. The signal chunks are not
+passed on.
+
+When a deadline passes the provider stream is closed and StreamStalled is
+raised, so the caller can fail over to another model.
+"""
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+
+from services.openai_service import StreamChunk
+
+
+class StreamStalled(Exception):
+    """A provider stream missed its first-token or inter-chunk deadline."""
+
+    def __init__(self, first_token: bool, timeout: float):
+        self.first_token = first_token
+        self.timeout = timeout
+        what = "first token" if first_token else "next chunk"
+        super().__init__(f"No {what} within {timeout:g}s")
+
+
+async def guard_stream(
+    stream: AsyncIterator[StreamChunk],
+    first_token_timeout: Optional[float],
+    stall_timeout: Optional[float],
+) -> AsyncIterator[StreamChunk]:
+    """Re-yield a provider stream, enforcing its deadlines.
+
+    Args:
+        stream: A stream_chat() iterator (closed when the guard is closed)
+        first_token_timeout: Seconds until the first content chunk (None/0 = no limit)
+        stall_timeout: Max seconds between chunks afterwards (None/0 = no limit)
+
+    Raises:
+        StreamStalled: A deadline passed
+    """
+    started = False
+    queued = False
+    async with aclosing(stream):
+        while True:
+            if queued:
+                timeout = None
+            else:
+                timeout = (stall_timeout if started else first_token_timeout) or None
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise StreamStalled(not started, timeout) from None
+            if chunk.waiting_for_slot is not None:
+                queued = chunk.waiting_for_slot
+                continue
+            if chunk.content or chunk.has_tool_calls:
+                started = True
+            yield chunk
@@ -0,0 +1,141 @@
+"""Registry of in-flight generations for resumable chat streams.
+
+Every assistant generation gets a stream id and a bounded ring buffer of
+sequence-numbered events. If the client's socket drops, the generation
+keeps running (detached) for a grace period. A reconnecting client sends
+{"type": "resume", "stream_id": ..., "last_seq": n} and receives the events
+it missed, then the live tail.
+
+If the missed events have already been evicted from the ring buffer, the
+client gets a resync event carrying the full text generated so far.
+"""
+import asyncio
+import logging
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationStream:
+    """Sequence-numbered event log of one assistant generation."""
+
+    def __init__(self, session_id: str, buffer_size: int):
+        self.stream_id = str(uuid.uuid4())
+        self.session_id = session_id
+        self._buffer: Deque[Tuple[int, dict]] = deque(maxlen=max(buffer_size, 1))
+        self.last_seq = 0
+        # Full text streamed so far, used to resync clients that fell too far behind
+        self.content = ""
+        # Whether live events are forwarded to the session's connection
+        self.attached = True
+        self.finished = False
+        self.cancel_requested = False
+        # Task running the provider stream (cancelled by cancel())
+        self.task: Optional[asyncio.Task] = None
+
+    def publish(self, data: dict) -> dict:
+        """Stamp an event with stream id and sequence number and buffer it.
+
+        Returns:
+            The stamped event to send to the client
+        """
+        self.last_seq += 1
+        event = {**data, "stream_id": self.stream_id, "seq": self.last_seq}
+        self._buffer.append((self.last_seq, event))
+        if data.get("type") == "stream_chunk":
+            self.content += data.get("content", "")
+        return event
+
+    def events_after(self, last_seq: int) -> Optional[List[dict]]:
+        """Get buffered events with a sequence number above last_seq.
+
+        Returns:
+            The missed events, or None if some were already evicted
+        """
+        if last_seq >= self.last_seq:
+            return []
+        oldest_seq = self._buffer[0][0] if self._buffer else self.last_seq + 1
+        if last_seq + 1 < oldest_seq:
+            return None
+        return [event for seq, event in self._buffer if seq > last_seq]
+
+    def resync_event(self) -> dict:
+        """Event carrying the full text so far, for clients with a gap."""
+        return {
+            "type": "stream_resync",
+            "stream_id": self.stream_id,
+            "seq": self.last_seq,
+            "content": self.content,
+            "finished": self.finished,
+        }
+
+    def cancel(self) -> None:
+        """Stop the generation (before or during provider streaming)."""
+        self.cancel_requested = True
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+class StreamRegistry:
+    """Tracks generations by stream id and by session."""
+
+    def __init__(
+        self,
+        buffer_size: Optional[int] = None,
+        retention_seconds: Optional[float] = None,
+    ):
+        self.buffer_size = buffer_size or settings.stream_resume_buffer_size
+        self.retention_seconds = (
+            retention_seconds if retention_seconds is not None
+            else settings.stream_resume_grace_seconds
+        )
+        self._streams: Dict[str, GenerationStream] = {}
+
+    def create(self, session_id: str) -> GenerationStream:
+        """Register a new generation for a session."""
+        generation = GenerationStream(session_id, self.buffer_size)
+        self._streams[generation.stream_id] = generation
+        return generation
+
+    def get(self, stream_id: Optional[str]) -> Optional[GenerationStream]:
+        """Get a generation by stream id."""
+        if not stream_id:
+            return None
+        return self._streams.get(stream_id)
+
+    def active_for_session(self, session_id: str) -> Optional[GenerationStream]:
+        """Get the unfinished generation of a session, if any."""
+        for generation in reversed(list(self._streams.values())):
+            if generation.session_id == session_id and not generation.finished:
+                return generation
+        return None
+
+    def detach_session(self, session_id: str) -> None:
+        """Stop forwarding live events of a session until the client resumes."""
+        for generation in self._streams.values():
+            if generation.session_id == session_id and not generation.finished:
+                generation.attached = False
+
+    def finish(self, generation: GenerationStream) -> None:
+        """Mark a generation finished; keep it briefly so clients can fetch the tail."""
+        generation.finished = True
+        if self.retention_seconds <= 0:
+            self._streams.pop(generation.stream_id, None)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._streams.pop(generation.stream_id, None)
+            return
+        loop.call_later(self.retention_seconds, self._streams.pop, generation.stream_id, None)
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+
+# Global registry instance
+stream_registry = StreamRegistry()
@@ -0,0 +1,219 @@
+"""Per-turn tracing of chat WebSocket turns.
+
+A turn gets a trace with a random id (sent to the client as ``trace_id`` on
+stream_start) and one span per phase: regenerate cleanup, saving the user
+message, loading history, the provider stream, tool execution, continuation
+streams and the final save. Spans are timed with ``time.perf_counter``
+relative to the start of the turn.
+
+The current trace is kept in a context variable, so helpers called from the
+turn (including tasks it creates) open spans without the trace being passed
+around. Without a current trace - tracing disabled, or code running outside
+a turn - ``span()`` is one context variable lookup returning a shared no-op.
+
+Finished traces go to a bounded in-memory buffer (served at
+/api/debug/traces). Turns slower than ``chat_trace_slow_seconds`` are also
+written as one JSON object per line to the ``huluchat.slow_turns`` logger,
+and to ``chat_trace_log_file`` when set.
+"""
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+slow_turn_logger = logging.getLogger("huluchat.slow_turns")
+
+_current_trace: ContextVar[Optional["TurnTrace"]] = ContextVar("chat_turn_trace", default=None)
+
+
+class Span:
+    """One timed phase of a turn."""
+
+    __slots__ = ("name", "start", "duration", "attributes")
+
+    def __init__(self, name: str, start: float, attributes: Dict[str, Any]):
+        self.name = name
+        # Seconds since the start of the turn
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start_ms": round(self.start * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            **({"attributes": self.attributes} if self.attributes else {}),
+        }
+
+
+class _SpanContext:
+    """Context manager timing one span; ``set()`` adds attributes."""
+
+    __slots__ = ("_trace", "_span")
+
+    def __init__(self, trace: "TurnTrace", name: str, attributes: Dict[str, Any]):
+        self._trace = trace
+        self._span = Span(name, 0.0, attributes)
+
+    def set(self, **attributes: Any) -> None:
+        self._span.attributes.update(attributes)
+
+    def __enter__(self) -> "_SpanContext":
+        self._span.start = time.perf_counter() - self._trace.started
+        self._trace.spans.append(self._span)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._span.duration = time.perf_counter() - self._trace.started - self._span.start
+        if exc_type is not None:
+            self._span.attributes["error"] = exc_type.__name__
+        return False
+
+
+class _NoopSpan:
+    """Shared stand-in for a span when no trace is active."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class TurnTrace:
+    """Spans and attributes of one chat turn."""
+
+    def __init__(self, session_id: str):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self.attributes: Dict[str, Any] = {}
+
+    def span(self, name: str, **attributes: Any) -> _SpanContext:
+        return _SpanContext(self, name, attributes)
+
+    def set(self, **attributes: Any) -> None:
+        """Add turn-level attributes (model, status, ...)."""
+        self.attributes.update(attributes)
+
+    def finish(self) -> float:
+        self.duration = time.perf_counter() - self.started
+        return self.duration
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "started_at": self.started_at.isoformat() + "Z",
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+def current_trace() -> Optional[TurnTrace]:
+    """The trace of the turn being run, if tracing is enabled."""
+    return _current_trace.get()
+
+
+def span(name: str, **attributes: Any):
+    """Time a phase of the current turn (a no-op outside a traced turn).
+
+    Usage:
+        with span("load_history") as s:
+            ...
+            s.set(messages=len(history))
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return trace.span(name, **attributes)
+
+
+class TraceRecorder:
+    """Keeps the last finished traces and logs slow turns."""
+
+    def __init__(self, size: Optional[int] = None):
+        self._traces: deque = deque(maxlen=size or settings.chat_trace_buffer_size)
+        self._file_handler: Optional[logging.Handler] = None
+
+    @contextmanager
+    def turn(self, session_id: str) -> Iterator[Optional[TurnTrace]]:
+        """Trace a turn; yields None when tracing is disabled."""
+        if not settings.chat_tracing_enabled:
+            yield None
+            return
+        trace = TurnTrace(session_id)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            self.finish(trace)
+
+    def finish(self, trace: TurnTrace) -> None:
+        """Store a finished trace; log it when the turn was slow."""
+        duration = trace.finish()
+        self._traces.append(trace)
+        threshold = settings.chat_trace_slow_seconds
+        if threshold > 0 and duration >= threshold:
+            self._log_slow_turn(trace)
+
+    def _log_slow_turn(self, trace: TurnTrace) -> None:
+        if settings.chat_trace_log_file and self._file_handler is None:
+            self._file_handler = _json_lines_handler(settings.chat_trace_log_file)
+            if self._file_handler is not None:
+                slow_turn_logger.addHandler(self._file_handler)
+        slow_turn_logger.warning(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+
+    def recent(self, limit: Optional[int] = 50, min_seconds: float = 0.0) -> List[TurnTrace]:
+        """Finished traces, newest first (limit None returns all)."""
+        traces = [
+            trace for trace in reversed(self._traces)
+            if (trace.duration or 0.0) >= min_seconds
+        ]
+        return traces if limit is None else traces[:limit]
+
+    def get(self, trace_id: str) -> Optional[TurnTrace]:
+        for trace in self._traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def clear(self) -> None:
+        self._traces.clear()
+
+
+def _json_lines_handler(path: str) -> Optional[logging.Handler]:
+    """File handler writing bare messages, one JSON object per line."""
+    try:
+        handler = logging.FileHandler(path, encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"Cannot open slow turn log {path}: {e}")
+        return None
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+# Global instance
+trace_recorder = TraceRecorder()
@@ -0,0 +1,179 @@
+"""Usage capture: tokens, latency and estimated cost per assistant response.
+
+Providers report token counts at the end of a stream (stream_options
+include_usage for OpenAI-compatible APIs, prompt_eval_count / eval_count
+for Ollama). Each turn stores one message_usage row with those counts, the
+time to first token and the total latency. When a provider reports no
+usage the counts are estimated from the text and the row is flagged.
+
+Costs use MODEL_PRICES (USD per million tokens); local Ollama models cost
+nothing and unknown models have no cost. Aggregates are computed in SQL
+per model, UTC day or session.
+"""
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.usage import MessageUsageModel, UsageAggregate
+from services.context_window import estimate_messages_tokens, estimate_text_tokens
+from services.openai_service import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "deepseek-chat": (0.27, 1.10),
+    "deepseek-reasoner": (0.55, 2.19),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "o3-mini": (1.10, 4.40),
+    "o1": (15.00, 60.00),
+    "o1-mini": (1.10, 4.40),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-opus-20240229": (15.00, 75.00),
+}
+
+USAGE_GROUPS = ("model", "day", "session")
+
+
+def estimate_cost(model_id: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimated cost in USD, or None for a model without a known price."""
+    if model_id.startswith("ollama:"):
+        return 0.0
+    prices = MODEL_PRICES.get(model_id)
+    if prices is None:
+        return None
+    prompt_price, completion_price = prices
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+async def record_usage(
+    db: AsyncSession,
+    message_id: str,
+    session_id: str,
+    model_id: str,
+    status: str,
+    usage: Optional[TokenUsage],
+    first_token_seconds: Optional[float],
+    total_seconds: float,
+    messages: Optional[List[dict]] = None,
+    content: str = "",
+) -> MessageUsageModel:
+    """Store the usage of one assistant response.
+
+    Args:
+        db: Database session
+        message_id: Assistant message ID
+        session_id: Session ID
+        model_id: Model that produced the response
+        status: Final message status
+        usage: Token counts reported by the provider (None = estimate them)
+        first_token_seconds: Seconds until the first text, None if there was none
+        total_seconds: Seconds until the response ended
+        messages: Prompt messages, for the estimate when usage is None
+        content: Response text, for the estimate when usage is None
+    """
+    if usage is not None:
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        prompt_tokens = estimate_messages_tokens(messages or [])
+        completion_tokens = estimate_text_tokens(content)
+
+    row = MessageUsageModel(
+        id=str(uuid.uuid4()),
+        message_id=message_id,
+        session_id=session_id,
+        model_id=model_id,
+        provider="ollama" if model_id.startswith("ollama:") else "openai",
+        status=status,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        estimated=usage is None,
+        first_token_seconds=first_token_seconds,
+        total_seconds=total_seconds,
+        cost=estimate_cost(model_id, prompt_tokens, completion_tokens),
+    )
+    db.add(row)
+    await db.commit()
+    return row
+
+
+async def aggregate_usage(
+    db: AsyncSession,
+    group_by: str,
+    since: Optional[datetime] = None,
+    model_id: Optional[str] = None,
+    limit: int = 100,
+) -> List[UsageAggregate]:
+    """Usage totals grouped by model, UTC day or session.
+
+    Args:
+        db: Database session
+        group_by: 'model', 'day' or 'session'
+        since: Only responses created at or after this time
+        model_id: Only responses of this model
+        limit: Max groups returned
+
+    Returns:
+        Days in date order; models and sessions by total tokens, largest first
+    """
+    if group_by not in USAGE_GROUPS:
+        raise ValueError(f"Unknown usage group: {group_by}")
+
+    usage = MessageUsageModel
+    if group_by == "model":
+        key = usage.model_id
+    elif group_by == "day":
+        key = func.date(usage.created_at)
+    else:
+        key = usage.session_id
+
+    total_tokens = func.sum(usage.prompt_tokens + usage.completion_tokens)
+    # Generation time and tokens of the responses that produced text
+    generation_seconds = func.sum(usage.total_seconds - usage.first_token_seconds)
+    generated_tokens = func.sum(
+        case((usage.first_token_seconds.isnot(None), usage.completion_tokens), else_=0)
+    )
+    query = select(
+        key.label("key"),
+        func.count(usage.id),
+        func.sum(usage.prompt_tokens),
+        func.sum(usage.completion_tokens),
+        total_tokens,
+        func.sum(usage.cost),
+        func.avg(usage.first_token_seconds),
+        func.avg(usage.total_seconds),
+        generation_seconds,
+        generated_tokens,
+    ).group_by(key)
+    if since is not None:
+        query = query.where(usage.created_at >= since)
+    if model_id is not None:
+        query = query.where(usage.model_id == model_id)
+    query = query.order_by(key if group_by == "day" else total_tokens.desc()).limit(limit)
+
+    result = await db.execute(query)
+    items = []
+    for (key_value, requests, prompt, completion, total, cost,
+         avg_first_token, avg_total, gen_seconds, gen_tokens) in result.all():
+        items.append(UsageAggregate(
+            key=str(key_value),
+            requests=requests,
+            prompt_tokens=prompt or 0,
+            completion_tokens=completion or 0,
+            total_tokens=total or 0,
+            cost=cost,
+            avg_first_token_seconds=avg_first_token,
+            avg_total_seconds=avg_total,
+            tokens_per_second=gen_tokens / gen_seconds if gen_seconds else None,
+        ))
+    return items
@@ -0,0 +1,113 @@
+"""Bounded outbound message queue for WebSocket connections.
+
+Each chat connection gets an OutboundQueue drained by a dedicated writer
+task, so the provider stream loop only enqueues and never waits on a slow
+client socket.
+
+When the queue is full:
+1. Consecutive stream_chunk text deltas are merged to free space; a merged
+   delta carries the newest seq, so a client resuming from it is not sent
+   text it already has
+2. If nothing can be merged, the consumer is considered too slow and
+   put_nowait() returns False so the caller can disconnect it
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 256
+
+
+def _is_text_delta(data: dict) -> bool:
+    return data.get("type") == "stream_chunk" and isinstance(data.get("content"), str)
+
+
+def _merged(older: dict, newer: dict) -> dict:
+    """One text delta covering both; a copy, since messages may be shared with other buffers."""
+    merged = {**older, "content": older["content"] + newer["content"]}
+    if "seq" in newer:
+        merged["seq"] = newer["seq"]
+    return merged
+
+
+class OutboundQueue:
+    """Bounded FIFO of JSON messages with text-delta merging."""
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE):
+        self.maxsize = max(maxsize, 1)
+        self._items: Deque[dict] = deque()
+        self._not_empty = asyncio.Event()
+        self._closed = False
+        # Metrics
+        self.enqueued = 0
+        self.sent = 0
+        self.merged = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of messages waiting to be sent."""
+        return len(self._items)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put_nowait(self, data: dict) -> bool:
+        """Enqueue a message without blocking.
+
+        Returns:
+            True if the message was queued (or merged), False if the queue is
+            closed or full with nothing left to merge.
+        """
+        if self._closed:
+            return False
+
+        if len(self._items) >= self.maxsize:
+            if _is_text_delta(data) and self._items and _is_text_delta(self._items[-1]):
+                self._merge_into_tail(data)
+                return True
+            self._compact()
+            if len(self._items) >= self.maxsize:
+                return False
+
+        self._items.append(data)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._not_empty.set()
+        return True
+
+    async def get(self) -> Optional[dict]:
+        """Wait for the next message. Returns None once the queue is closed and empty."""
+        while not self._items:
+            if self._closed:
+                return None
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        data = self._items.popleft()
+        self.sent += 1
+        return data
+
+    def close(self) -> None:
+        """Stop accepting messages and wake the writer."""
+        self._closed = True
+        self._not_empty.set()
+
+    def _merge_into_tail(self, data: dict) -> None:
+        self._items[-1] = _merged(self._items[-1], data)
+        self.enqueued += 1
+        self.merged += 1
+
+    def _compact(self) -> None:
+        """Merge every run of consecutive text deltas in the queue."""
+        compacted: Deque[dict] = deque()
+        for item in self._items:
+            if compacted and _is_text_delta(item) and _is_text_delta(compacted[-1]):
+                compacted[-1] = _merged(compacted[-1], item)
+                self.merged += 1
+            else:
+                compacted.append(item)
+        self._items = compacted
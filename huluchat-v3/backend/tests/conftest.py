@@ -16,6 +16,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app
 from core.database import Base, get_session
+from services.blob_store import blob_store
 
 
 # Use in-memory SQLite for testing
@@ -30,6 +31,14 @@ def event_loop() -> Generator[asyncio.AbstractEventLoop, None, None]:
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def attachment_dir(tmp_path, monkeypatch):
+    """Keep attachment blobs written by tests in a temporary directory."""
+    root = tmp_path / "attachments"
+    monkeypatch.setattr(blob_store, "root", root)
+    return root
+
+
 @pytest_asyncio.fixture(scope="function")
 async def test_engine():
     """Create a test database engine."""
@@ -0,0 +1,95 @@
+"""Tests for attachment text extraction."""
+import base64
+import json
+
+import pytest
+
+import services.attachment_text as attachment_text
+from api.chat import format_message_for_context, save_message
+from services.attachment_text import MAX_ATTACHMENT_CHARS, extract_file_text
+from services.document_processor import ProcessResult
+
+
+def _data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+class TestExtractFileText:
+    """Test cases for extract_file_text."""
+
+    def test_decodes_text_data_url(self):
+        """Text attachments are decoded into a fenced block."""
+        file = {"name": "a.txt", "type": "text/plain", "content": _data_url(b"hello", "text/plain")}
+        assert extract_file_text(file) == "📄 File: a.txt\n```\nhello\n```"
+
+    def test_truncates_long_text(self):
+        """Long attachments are cut to the per-file limit."""
+        data = b"x" * (MAX_ATTACHMENT_CHARS + 10)
+        file = {"name": "big.txt", "type": "text/plain", "content": _data_url(data, "text/plain")}
+        assert "... (truncated)" in extract_file_text(file)
+
+    def test_binary_file_is_described(self):
+        """Binary attachments contribute metadata only."""
+        file = {"name": "a.zip", "type": "application/zip", "size": 2048, "content": "data:..."}
+        assert extract_file_text(file) == "📎 File: a.zip (application/zip, 2 KB)"
+
+    def test_pdf_uses_document_processor(self, monkeypatch):
+        """PDF text is extracted with DocumentProcessor."""
+        seen = []
+
+        def fake_process(file_bytes, filename):
+            seen.append(file_bytes)
+            return ProcessResult(success=True, content="page text", file_type="pdf", chunk_count=1)
+
+        monkeypatch.setattr(attachment_text._document_processor, "process_pdf_bytes", fake_process)
+        file = {"name": "doc.pdf", "type": "application/pdf", "content": _data_url(b"%PDF", "application/pdf")}
+        assert extract_file_text(file) == "📄 File: doc.pdf\n```\npage text\n```"
+        assert seen == [b"%PDF"]
+
+    def test_unreadable_pdf_falls_back_to_metadata(self):
+        """A PDF without extractable text is described like other binaries."""
+        file = {
+            "name": "scan.pdf", "type": "application/pdf", "size": 10,
+            "content": _data_url(b"not a pdf", "application/pdf"),
+        }
+        assert extract_file_text(file) == "📎 File: scan.pdf (application/pdf, 10 bytes)"
+
+
+class TestSavedFileContext:
+    """Test cases for extraction at save time."""
+
+    @pytest.mark.asyncio
+    async def test_save_message_stores_extracted_text(self, db_session):
+        """The extracted text is stored and reused for the context."""
+        files = json.dumps([
+            {"name": "a.txt", "type": "text/plain", "content": _data_url(b"hello", "text/plain")},
+        ])
+        message = await save_message(db_session, "attach-session", "user", "see file", files=files)
+
+        assert message.file_context == "📄 File: a.txt\n```\nhello\n```"
+        # Raw attachments are not decoded again once the text is stored
+        message.files = "not json"
+        assert format_message_for_context(message)["content"] == f"see file\n\n{message.file_context}"
+
+    @pytest.mark.asyncio
+    async def test_resent_attachment_is_read_from_blob_store(self, db_session):
+        """A file re-sent by its download URL contributes its text, not the URL."""
+        first = await save_message(db_session, "attach-session", "user", "a", files=json.dumps([
+            {"name": "a.txt", "type": "text/plain", "content": _data_url(b"hello", "text/plain")},
+        ]))
+        digest = json.loads(first.files)[0]["attachment_id"]
+        url = f"http://127.0.0.1:8765/api/attachments/{digest}"
+
+        again = await save_message(db_session, "attach-session", "user", "again", files=json.dumps([
+            {"name": "a.txt", "type": "text/plain", "content": url},
+        ]))
+        assert again.file_context == "📄 File: a.txt\n```\nhello\n```"
+
+    @pytest.mark.asyncio
+    async def test_unknown_download_url_is_not_file_text(self, db_session):
+        """A download URL that resolves to nothing is described, never used as content."""
+        url = f"http://127.0.0.1:8765/api/attachments/{'0' * 64}"
+        message = await save_message(db_session, "attach-session", "user", "x", files=json.dumps([
+            {"name": "a.txt", "type": "text/plain", "content": url, "size": 5},
+        ]))
+        assert message.file_context == "📎 File: a.txt (text/plain, 5 bytes)"
@@ -0,0 +1,186 @@
+"""Tests for the content-addressed attachment store."""
+import base64
+import hashlib
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.attachments import parse_range
+from api.chat import format_message_for_context, save_message
+from models.attachments import AttachmentModel
+from models.schemas import MessageModel
+from services.attachments import migrate_inline_attachments, sweep_unreferenced
+from services.blob_store import BlobStore, blob_store
+from services.image_pipeline import prepare_images
+
+PNG = b"\x89PNG fake image bytes"
+
+
+def _data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def _image(data: bytes = PNG) -> dict:
+    return {"type": "image_url", "image_url": {"url": _data_url(data, "image/png")}}
+
+
+async def _ref_count(db, digest: str) -> int:
+    result = await db.execute(select(AttachmentModel.ref_count).where(AttachmentModel.id == digest))
+    return result.scalar_one()
+
+
+class TestBlobStore:
+    """Test cases for BlobStore."""
+
+    def test_put_is_content_addressed(self, tmp_path):
+        """Identical content is stored once under its SHA-256."""
+        store = BlobStore(str(tmp_path))
+        digest = store.put(b"hello")
+        assert digest == hashlib.sha256(b"hello").hexdigest()
+        assert store.put(b"hello") == digest
+        assert list(store.iter_digests()) == [digest]
+        assert b"".join(store.iter_range(digest, 1, 3)) == b"ell"
+
+    def test_rejects_invalid_digest(self, tmp_path):
+        """Paths are only built from real digests."""
+        with pytest.raises(ValueError):
+            BlobStore(str(tmp_path)).path_for("../etc/passwd")
+
+
+class TestParseRange:
+    """Test cases for Range header parsing."""
+
+    def test_ranges(self):
+        assert parse_range(None, 10) is None
+        assert parse_range("bytes=2-4", 10) == (2, 4)
+        assert parse_range("bytes=5-", 10) == (5, 9)
+        assert parse_range("bytes=-3", 10) == (7, 9)
+        assert parse_range("bytes=0-100", 10) == (0, 9)
+        assert parse_range("bytes=0-1,3-4", 10) is None
+
+    def test_unsatisfiable(self):
+        with pytest.raises(ValueError):
+            parse_range("bytes=10-", 10)
+
+
+class TestMessageAttachments:
+    """Test cases for storing message attachments by reference."""
+
+    @pytest.mark.asyncio
+    async def test_save_stores_references_and_dedups(self, db_session):
+        """Images are stored once; messages keep references with counts."""
+        images = json.dumps([_image()])
+        first = await save_message(db_session, "s1", "user", "a", images=images)
+        await save_message(db_session, "s1", "user", "b", images=images)
+
+        stored = json.loads(first.images)[0]
+        digest = stored["attachment_id"]
+        assert stored["image_url"]["url"] == f"attachment:{digest}"
+        assert "base64" not in first.images
+        assert await _ref_count(db_session, digest) == 2
+        assert blob_store.read(digest) == PNG
+
+        # The (cached) history keeps the reference; the provider request gets the image
+        context = format_message_for_context(first)
+        assert context["content"][1]["image_url"]["url"] == f"attachment:{digest}"
+        prepared = await prepare_images([context], max_dimension=1024)
+        assert prepared[0]["content"][1] == {
+            "type": "image_url", "image_url": {"url": _data_url(PNG, "image/png")},
+        }
+
+    @pytest.mark.asyncio
+    async def test_files_keep_metadata_without_content(self, db_session):
+        """File content moves to the blob store, metadata stays on the message."""
+        files = json.dumps([{
+            "id": "f1", "name": "a.txt", "type": "text/plain", "size": 5,
+            "content": _data_url(b"hello", "text/plain"),
+        }])
+        message = await save_message(db_session, "s1", "user", "see", files=files)
+        stored = json.loads(message.files)[0]
+        assert "content" not in stored
+        assert stored["name"] == "a.txt"
+        assert blob_store.read(stored["attachment_id"]) == b"hello"
+        assert "hello" in message.file_context
+
+    @pytest.mark.asyncio
+    async def test_sweep_removes_unreferenced_blobs(self, db_session):
+        """Blobs without references and orphan files are removed."""
+        db_session.add(AttachmentModel(id=blob_store.put(b"gone"), mime_type="text/plain", size=4, ref_count=0))
+        kept = blob_store.put(b"kept")
+        db_session.add(AttachmentModel(id=kept, mime_type="text/plain", size=4, ref_count=1))
+        await db_session.commit()
+        blob_store.put(b"orphan")
+
+        assert await sweep_unreferenced(db_session) == 2
+        assert list(blob_store.iter_digests()) == [kept]
+
+
+class TestAttachmentApi:
+    """Test cases for listing and downloading attachments."""
+
+    @pytest.mark.asyncio
+    async def test_messages_return_download_urls(self, client: AsyncClient, db_session):
+        """Message listings carry URLs instead of base64 data."""
+        session_id = (await client.post("/api/sessions/", json={"source": "main"})).json()["id"]
+        await save_message(db_session, session_id, "user", "pic", images=json.dumps([_image()]))
+
+        messages = (await client.get(f"/api/chat/{session_id}/messages")).json()["messages"]
+        image = messages[0]["images"][0]
+        digest = hashlib.sha256(PNG).hexdigest()
+        assert image["attachment_id"] == digest
+        assert image["image_url"]["url"] == f"http://test/api/attachments/{digest}"
+
+        response = await client.get(f"/api/attachments/{digest}")
+        assert response.status_code == 200
+        assert response.content == PNG
+        assert response.headers["content-type"] == "image/png"
+
+        partial = await client.get(f"/api/attachments/{digest}", headers={"Range": "bytes=1-3"})
+        assert partial.status_code == 206
+        assert partial.content == PNG[1:4]
+        assert partial.headers["content-range"] == f"bytes 1-3/{len(PNG)}"
+
+        bad = await client.get(f"/api/attachments/{digest}", headers={"Range": "bytes=999-"})
+        assert bad.status_code == 416
+
+    @pytest.mark.asyncio
+    async def test_download_url_sent_back_adds_reference(self, client: AsyncClient, db_session):
+        """Re-sending an image by its download URL references the same blob."""
+        first = await save_message(db_session, "s1", "user", "a", images=json.dumps([_image()]))
+        digest = json.loads(first.images)[0]["attachment_id"]
+        url = f"http://127.0.0.1:8765/api/attachments/{digest}"
+        await save_message(
+            db_session, "s1", "user", "again",
+            images=json.dumps([{"type": "image_url", "image_url": {"url": url}}]),
+        )
+        assert await _ref_count(db_session, digest) == 2
+
+        # Deleting a message releases its reference
+        response = await client.delete(f"/api/chat/s1/messages/{first.id}")
+        assert response.status_code == 200
+        assert await _ref_count(db_session, digest) == 1
+
+
+class TestOnlineMigration:
+    """Test cases for converting existing inline attachments."""
+
+    @pytest.mark.asyncio
+    async def test_converts_inline_messages(self, test_engine, db_session):
+        """Legacy base64 rows are rewritten to references in batches."""
+        for i in range(3):
+            db_session.add(MessageModel(
+                id=f"legacy-{i}", session_id="s1", role="user", content="old",
+                images=json.dumps([_image()]),
+            ))
+        await db_session.commit()
+
+        factory = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        assert await migrate_inline_attachments(factory, batch_size=2) == 3
+        assert await migrate_inline_attachments(factory, batch_size=2) == 0
+
+        result = await db_session.execute(select(MessageModel.images).execution_options(populate_existing=True))
+        assert all("base64" not in images for images in result.scalars())
+        assert await _ref_count(db_session, hashlib.sha256(PNG).hexdigest()) == 3
@@ -1,6 +1,13 @@
 """Tests for chat API endpoints."""
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import delete
+
+from api.chat import get_session_messages
+from models.schemas import MessageModel
+from services.history_cache import history_cache
 
 
 class TestChatMessages:
@@ -36,6 +43,137 @@ class TestChatMessages:
         assert "messages" in data
 
 
+class TestMessagePagination:
+    """Test cases for cursor pages of GET /api/chat/{session_id}/messages."""
+
+    async def add_messages(self, db_session, session_id, count):
+        base = datetime(2026, 1, 1)
+        for i in range(count):
+            db_session.add(MessageModel(
+                # Ids sort against insertion order
+                id=f"{session_id}-{count - i:02d}",
+                session_id=session_id,
+                role="user",
+                content=f"message {i}",
+                # Pairs of messages share a timestamp; seq keeps them in order
+                created_at=base + timedelta(seconds=i // 2),
+            ))
+        await db_session.commit()
+
+    @pytest.mark.asyncio
+    async def test_latest_then_older(self, client: AsyncClient, db_session):
+        await self.add_messages(db_session, "paged", 7)
+        url = "/api/chat/paged/messages"
+
+        data = (await client.get(url, params={"latest": True, "limit": 3})).json()
+        assert [m["content"] for m in data["messages"]] == ["message 4", "message 5", "message 6"]
+        assert data["next_cursor"] is None
+
+        seen = [m["content"] for m in data["messages"]]
+        while data["prev_cursor"]:
+            data = (await client.get(url, params={"before": data["prev_cursor"], "limit": 3})).json()
+            seen = [m["content"] for m in data["messages"]] + seen
+        assert seen == [f"message {i}" for i in range(7)]
+
+    @pytest.mark.asyncio
+    async def test_forward_pages(self, client: AsyncClient, db_session):
+        await self.add_messages(db_session, "forward", 5)
+        url = "/api/chat/forward/messages"
+
+        first = (await client.get(url, params={"limit": 2})).json()
+        assert [m["content"] for m in first["messages"]] == ["message 0", "message 1"]
+        assert first["prev_cursor"] is None
+        second = (await client.get(url, params={"after": first["next_cursor"], "limit": 2})).json()
+        assert [m["content"] for m in second["messages"]] == ["message 2", "message 3"]
+        # Back from the second page returns the first
+        back = (await client.get(url, params={"before": second["prev_cursor"], "limit": 2})).json()
+        assert back["messages"] == first["messages"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client: AsyncClient):
+        response = await client.get("/api/chat/any/messages", params={"before": "!!"})
+        assert response.status_code == 400
+
+
+class TestMessageSeq:
+    """Per-session sequence numbers and truncation by seq."""
+
+    async def add_messages(self, db_session, session_id, count):
+        stamp = datetime(2026, 1, 1)
+        for i in range(count):
+            # All written in the same clock tick
+            db_session.add(MessageModel(
+                id=f"{session_id}-{count - i}", session_id=session_id, role="user",
+                content=f"message {i}", created_at=stamp,
+            ))
+        await db_session.commit()
+
+    @pytest.mark.asyncio
+    async def test_numbered_per_session(self, client: AsyncClient, db_session):
+        await self.add_messages(db_session, "seq-a", 3)
+        await self.add_messages(db_session, "seq-b", 2)
+        data = (await client.get("/api/chat/seq-a/messages")).json()
+        assert [(m["content"], m["seq"]) for m in data["messages"]] == [
+            ("message 0", 1), ("message 1", 2), ("message 2", 3),
+        ]
+        data = (await client.get("/api/chat/seq-b/messages")).json()
+        assert [m["seq"] for m in data["messages"]] == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_edit_truncates_by_seq(self, client: AsyncClient, db_session):
+        await self.add_messages(db_session, "seq-edit", 4)
+        # "message 1" has the id seq-edit-3
+        response = await client.put(
+            "/api/chat/seq-edit/messages/seq-edit-3",
+            params={"content": "edited", "delete_after": True},
+        )
+        assert response.status_code == 200
+        data = (await client.get("/api/chat/seq-edit/messages")).json()
+        assert [m["content"] for m in data["messages"]] == ["message 0", "edited"]
+
+    @pytest.mark.asyncio
+    async def test_numbers_are_not_reused_after_delete(self, client: AsyncClient, db_session):
+        session_id = (await client.post("/api/sessions/", json={})).json()["id"]
+        await self.add_messages(db_session, session_id, 3)
+        await db_session.execute(delete(MessageModel).where(MessageModel.seq > 1))
+        await db_session.commit()
+
+        db_session.add(MessageModel(id="after-delete", session_id=session_id, role="user", content="again"))
+        await db_session.commit()
+        data = (await client.get(f"/api/chat/{session_id}/messages")).json()
+        assert [m["seq"] for m in data["messages"]] == [1, 4]
+
+    @pytest.mark.asyncio
+    async def test_history_in_seq_order(self, db_session):
+        history_cache.invalidate("seq-history")
+        await self.add_messages(db_session, "seq-history", 4)
+        history = await get_session_messages(db_session, "seq-history", limit=3)
+        assert [m["content"] for m in history] == ["message 1", "message 2", "message 3"]
+
+
+class TestSessionHistory:
+    """Test cases for loading conversation history."""
+
+    @pytest.mark.asyncio
+    async def test_loads_most_recent_messages_in_order(self, db_session):
+        """The newest messages are loaded, returned oldest-first."""
+        history_cache.invalidate("history-session")
+        base = datetime(2026, 1, 1)
+        for i in range(5):
+            db_session.add(MessageModel(
+                id=f"msg-{i}",
+                session_id="history-session",
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i}",
+                created_at=base + timedelta(seconds=i),
+            ))
+        await db_session.commit()
+
+        history = await get_session_messages(db_session, "history-session", limit=3)
+
+        assert [m["content"] for m in history] == ["message 2", "message 3", "message 4"]
+
+
 class TestMessageUpdate:
     """Test cases for updating messages."""
 
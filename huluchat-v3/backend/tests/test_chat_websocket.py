@@ -0,0 +1,438 @@
+"""Tests for the chat WebSocket turn loop (with a fake provider)."""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+
+from main import app
+from core.database import Base, get_session
+from services.openai_service import StreamChunk, TokenUsage
+import api.chat as chat_api
+
+
+class FakeProvider:
+    """OpenAI-compatible service stand-in with scripted chunks."""
+
+    def __init__(self, chunks: list[str], hang: bool = False):
+        self.chunks = chunks
+        self.hang = hang
+        self.closed = False
+        self.calls = 0
+
+    def is_configured(self) -> bool:
+        return True
+
+    async def stream_chat(self, **kwargs):
+        self.calls += 1
+        try:
+            for content in self.chunks:
+                yield StreamChunk(content=content)
+            if self.hang:
+                # A runaway generation that only stops when cancelled
+                await asyncio.sleep(60)
+            yield StreamChunk(is_done=True)
+        finally:
+            self.closed = True
+
+
+@pytest.fixture
+def ws_client(tmp_path):
+    """TestClient whose DB sessions use a temporary SQLite file."""
+    db_url = f"sqlite+aiosqlite:///{tmp_path / 'ws.db'}"
+
+    async def override_get_session():
+        engine = create_async_engine(db_url)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with maker() as session:
+            yield session
+        await engine.dispose()
+
+    app.dependency_overrides[get_session] = override_get_session
+    client = TestClient(app)
+    yield client
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    def install(provider: FakeProvider) -> FakeProvider:
+        monkeypatch.setattr(chat_api, "openai_service", provider)
+        return provider
+    return install
+
+
+def _receive_until(ws, message_type: str) -> list[dict]:
+    """Collect messages up to and including the first of the given type."""
+    received = []
+    while True:
+        data = ws.receive_json()
+        received.append(data)
+        if data["type"] == message_type:
+            return received
+
+
+class TestChatWebSocketTurn:
+    """Test cases for a normal streamed turn."""
+
+    def test_streams_and_saves_response(self, ws_client, fake_provider):
+        """Chunks are streamed, stream_end is sent and the reply is saved."""
+        fake_provider(FakeProvider(["Hel", "lo"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+
+        text = "".join(m["content"] for m in received if m["type"] == "stream_chunk")
+        assert received[0]["type"] == "stream_start"
+        assert text == "Hello"
+
+        messages = ws_client.get(f"/api/chat/{session_id}/messages").json()["messages"]
+        assert [(m["role"], m["content"], m["status"]) for m in messages] == [
+            ("user", "hi", "complete"),
+            ("assistant", "Hello", "complete"),
+        ]
+
+    def test_regenerate_replaces_reply(self, ws_client, fake_provider):
+        """Regenerating deletes the messages after the user message by seq."""
+        fake_provider(FakeProvider(["first"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "use_mcp": False})
+            _receive_until(ws, "stream_end")
+        user = ws_client.get(f"/api/chat/{session_id}/messages").json()["messages"][0]
+
+        fake_provider(FakeProvider(["second"]))
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({
+                "content": "hi", "use_mcp": False,
+                "regenerate": True, "delete_from_message_id": user["id"],
+            })
+            _receive_until(ws, "stream_end")
+
+        messages = ws_client.get(f"/api/chat/{session_id}/messages").json()["messages"]
+        # The deleted reply's number is not reused
+        assert [(m["content"], m["seq"]) for m in messages] == [("hi", 1), ("second", 3)]
+
+
+class TestChatWebSocketCancel:
+    """Test cases for cancelling an in-flight generation."""
+
+    def test_cancel_stops_stream_and_saves_partial(self, ws_client, fake_provider):
+        """A cancel message aborts the provider stream and keeps the partial text."""
+        provider = fake_provider(FakeProvider(["partial answer"], hang=True))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"type": "config", "coalesce_ms": 0})
+            ws.send_json({"content": "write forever", "use_mcp": False})
+            _receive_until(ws, "stream_chunk")
+            ws.send_json({"type": "pong"})
+            ws.send_json({"type": "cancel"})
+            end = _receive_until(ws, "stream_end")[-1]
+
+        assert end["cancelled"] is True
+        assert provider.closed is True
+
+        messages = ws_client.get(f"/api/chat/{session_id}/messages").json()["messages"]
+        assert messages[-1]["role"] == "assistant"
+        assert messages[-1]["content"] == "partial answer"
+        assert messages[-1]["status"] == "cancelled"
+
+    def test_cancel_without_generation_is_ignored(self, ws_client, fake_provider):
+        """Cancelling when idle does not affect the next turn."""
+        fake_provider(FakeProvider(["ok"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"type": "cancel"})
+            ws.send_json({"content": "hi", "use_mcp": False})
+            end = _receive_until(ws, "stream_end")[-1]
+
+        assert "cancelled" not in end
+
+
+class TestChatWebSocketResume:
+    """Test cases for resuming a generation's event stream."""
+
+    def test_events_carry_stream_id_and_seq(self, ws_client, fake_provider):
+        """Every event of a generation is numbered within one stream."""
+        fake_provider(FakeProvider(["a", "b"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"type": "config", "coalesce_ms": 0})
+            ws.send_json({"content": "hi", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+
+        assert len({m["stream_id"] for m in received}) == 1
+        assert [m["seq"] for m in received] == list(range(1, len(received) + 1))
+
+    def test_resume_replays_missed_events(self, ws_client, fake_provider):
+        """Resuming from a seq replays the later events in order."""
+        fake_provider(FakeProvider(["a", "b"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"type": "config", "coalesce_ms": 0})
+            ws.send_json({"content": "hi", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+            ws.send_json({
+                "type": "resume",
+                "stream_id": received[0]["stream_id"],
+                "last_seq": 1,
+            })
+            replayed = _receive_until(ws, "stream_end")
+
+        assert replayed == received[1:]
+
+    def test_resume_unknown_stream_fails(self, ws_client, fake_provider):
+        """Unknown stream ids are reported so the client can reload history."""
+        fake_provider(FakeProvider(["ok"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"type": "resume", "stream_id": "missing", "last_seq": 3})
+            reply = ws.receive_json()
+
+        assert reply == {"type": "resume_failed", "stream_id": "missing"}
+
+
+class QueuedProvider(FakeProvider):
+    """Reports queue positions before streaming, like a busy scheduler."""
+
+    async def stream_chat(self, **kwargs):
+        for position in (2, 1):
+            await kwargs["on_queue_position"](position)
+        async for chunk in super().stream_chat(**kwargs):
+            yield chunk
+
+
+class TestChatWebSocketQueue:
+    """Test cases for provider queue position events."""
+
+    def test_queue_position_events(self, ws_client, fake_provider):
+        fake_provider(QueuedProvider(["ok"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+
+        positions = [m["position"] for m in received if m["type"] == "queue_position"]
+        assert positions == [2, 1]
+        assert all(m["session_id"] == session_id for m in received if m["type"] == "queue_position")
+
+
+class ModelAwareProvider(FakeProvider):
+    """Hangs before the first token for the 'slow' model."""
+
+    def __init__(self, chunks: list[str]):
+        super().__init__(chunks)
+        self.models = []
+
+    async def stream_chat(self, **kwargs):
+        self.models.append(kwargs["model"])
+        if kwargs["model"] == "slow":
+            await asyncio.sleep(60)
+        async for chunk in super().stream_chat(**kwargs):
+            yield chunk
+
+
+class TestChatWebSocketFailover:
+    """Test cases for stall detection and fallback models."""
+
+    def test_stalled_model_fails_over(self, ws_client, fake_provider, monkeypatch):
+        monkeypatch.setattr(chat_api.settings, "chat_first_token_timeout", 0.05)
+        monkeypatch.setattr(chat_api.settings, "chat_fallback_models", "fast")
+        provider = fake_provider(ModelAwareProvider(["from fast"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "slow", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+
+        starts = [m for m in received if m["type"] == "stream_start"]
+        assert [s["model"] for s in starts] == ["slow", "fast"]
+        assert starts[1]["failover"] is True
+        assert provider.models == ["slow", "fast"]
+
+        messages = ws_client.get(f"/api/chat/{session_id}/messages").json()["messages"]
+        assert messages[-1]["content"] == "from fast"
+        assert messages[-1]["model_id"] == "fast"
+
+    def test_unavailable_ollama_turn_uses_fallback_model(self, ws_client, fake_provider, monkeypatch):
+        """Budget, images and tools follow the fallback model, not the Ollama one."""
+        monkeypatch.setattr(chat_api.settings, "chat_fallback_models", "gpt-4o")
+
+        async def unavailable():
+            return False
+
+        monkeypatch.setattr(chat_api.ollama_service, "is_available", unavailable)
+        budget_models = []
+        get_budget = chat_api.get_history_token_budget
+
+        def record_budget(model, max_tokens=None):
+            budget_models.append(model)
+            return get_budget(model, max_tokens)
+
+        monkeypatch.setattr(chat_api, "get_history_token_budget", record_budget)
+        tool_loads = []
+
+        async def get_all_tools():
+            tool_loads.append(True)
+            return []
+
+        monkeypatch.setattr(chat_api.mcp_service, "get_all_tools", get_all_tools)
+        provider = fake_provider(ModelAwareProvider(["from fallback"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "ollama:llama3", "use_mcp": True})
+            received = _receive_until(ws, "stream_end")
+
+        starts = [m for m in received if m["type"] == "stream_start"]
+        assert [s["model"] for s in starts] == ["ollama:llama3", "gpt-4o"]
+        assert provider.models == ["gpt-4o"]
+        assert budget_models == ["gpt-4o"]
+        assert tool_loads == [True]
+
+    def test_stall_without_fallback_is_an_error(self, ws_client, fake_provider, monkeypatch):
+        monkeypatch.setattr(chat_api.settings, "chat_first_token_timeout", 0.05)
+        monkeypatch.setattr(chat_api.settings, "chat_fallback_models", "")
+        fake_provider(ModelAwareProvider(["never"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "slow", "use_mcp": False})
+            error = _receive_until(ws, "error")[-1]
+
+        assert "超时" in error["error"]
+
+
+class TestChatWebSocketHedge:
+    """Test cases for hedged quick panel turns."""
+
+    def test_quickpanel_turn_is_hedged(self, ws_client, fake_provider, monkeypatch):
+        monkeypatch.setattr(chat_api.settings, "quickpanel_hedge_enabled", True)
+        monkeypatch.setattr(chat_api.settings, "quickpanel_hedge_model", "fast")
+        monkeypatch.setattr(chat_api.settings, "quickpanel_hedge_default_delay", 0.05)
+        monkeypatch.setattr(chat_api.settings, "quickpanel_hedge_min_delay", 0.0)
+        provider = fake_provider(ModelAwareProvider(["hedged"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "quickpanel"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "slow", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+
+        starts = [m for m in received if m["type"] == "stream_start"]
+        assert [s["model"] for s in starts] == ["slow", "fast"]
+        assert starts[1]["hedge"] is True
+        assert provider.models == ["slow", "fast"]
+        messages = ws_client.get(f"/api/chat/{session_id}/messages").json()["messages"]
+        assert messages[-1]["model_id"] == "fast"
+
+    def test_main_session_is_not_hedged(self, ws_client, fake_provider, monkeypatch):
+        monkeypatch.setattr(chat_api.settings, "quickpanel_hedge_enabled", True)
+        monkeypatch.setattr(chat_api.settings, "quickpanel_hedge_model", "fast")
+        provider = fake_provider(ModelAwareProvider(["plain"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "normal", "use_mcp": False})
+            _receive_until(ws, "stream_end")
+
+        assert provider.models == ["normal"]
+
+
+class UsageProvider(FakeProvider):
+    """Reports token usage before finishing, like include_usage streams."""
+
+    async def stream_chat(self, **kwargs):
+        for content in self.chunks:
+            yield StreamChunk(content=content)
+        yield StreamChunk(usage=TokenUsage(prompt_tokens=40, completion_tokens=2))
+        yield StreamChunk(is_done=True)
+
+
+class TestChatWebSocketUsage:
+    """Each turn stores its token usage and latency."""
+
+    def test_turn_records_usage(self, ws_client, fake_provider):
+        fake_provider(UsageProvider(["Hel", "lo"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "gpt-4o", "use_mcp": False})
+            _receive_until(ws, "stream_end")
+
+        # The usage row is written right after stream_end
+        for _ in range(50):
+            items = ws_client.get("/api/usage/sessions").json()["items"]
+            if items:
+                break
+            time.sleep(0.01)
+        assert items[0]["key"] == session_id
+        assert items[0]["prompt_tokens"] == 40
+        assert items[0]["completion_tokens"] == 2
+        assert items[0]["avg_first_token_seconds"] is not None
+        assert items[0]["cost"] > 0
+
+    def test_turn_updates_session_summary(self, ws_client, fake_provider):
+        fake_provider(UsageProvider(["Hel", "lo"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "gpt-4o", "use_mcp": False})
+            _receive_until(ws, "stream_end")
+
+        for _ in range(50):
+            session = ws_client.get("/api/sessions/").json()["sessions"][0]
+            if session["total_tokens"]:
+                break
+            time.sleep(0.01)
+        assert session["message_count"] == 2
+        assert session["last_message_preview"] == "Hello"
+        assert session["last_model_id"] == "gpt-4o"
+        assert session["total_tokens"] == 42
+        assert session["last_message_at"] is not None
+
+
+class TestChatWebSocketTracing:
+    """Each turn is traced and its trace id sent to the client."""
+
+    def test_turn_trace(self, ws_client, fake_provider):
+        fake_provider(FakeProvider(["Hel", "lo"]))
+        session_id = ws_client.post("/api/sessions/", json={"source": "main"}).json()["id"]
+
+        with ws_client.websocket_connect(f"/api/chat/ws/{session_id}") as ws:
+            ws.send_json({"content": "hi", "model": "gpt-4o", "use_mcp": False})
+            received = _receive_until(ws, "stream_end")
+        trace_id = received[0]["trace_id"]
+
+        # The trace is finished right after the usage record
+        for _ in range(50):
+            response = ws_client.get(f"/api/debug/traces/{trace_id}")
+            if response.status_code == 200:
+                break
+            time.sleep(0.01)
+        trace = response.json()
+        assert trace["session_id"] == session_id
+        assert trace["attributes"]["status"] == "complete"
+        names = [span["name"] for span in trace["spans"]]
+        assert names == [
+            "save_user_message",
+            "load_history",
+            "prepare_context",
+            "provider_stream",
+            "save_reply",
+            "record_usage",
+        ]
+        assert trace["spans"][3]["attributes"]["model"] == "gpt-4o"
+
+        listed = ws_client.get("/api/debug/traces", params={"session_id": session_id}).json()
+        assert [t["trace_id"] for t in listed["traces"]] == [trace_id]
@@ -0,0 +1,117 @@
+"""Tests for token-budgeted context window assembly."""
+from services.context_window import (
+    IMAGE_TOKENS,
+    MESSAGE_OVERHEAD_TOKENS,
+    build_context_window,
+    compute_history_budget,
+    estimate_message_tokens,
+    estimate_text_tokens,
+)
+
+
+def _msg(role: str, content: str) -> dict:
+    return {"role": role, "content": content}
+
+
+class TestTokenEstimation:
+    """Test cases for token estimation."""
+
+    def test_empty_text(self):
+        """Empty text costs nothing."""
+        assert estimate_text_tokens("") == 0
+        assert estimate_text_tokens(None) == 0
+
+    def test_latin_text_uses_chars_per_token(self):
+        """Latin text is estimated at about four characters per token."""
+        assert estimate_text_tokens("abcdefgh") == 2
+        assert estimate_text_tokens("abcde") == 2
+
+    def test_cjk_text_counts_one_token_per_char(self):
+        """CJK characters are counted individually."""
+        assert estimate_text_tokens("你好世界") == 4
+
+    def test_image_parts_have_fixed_cost(self):
+        """Image parts add a fixed cost to the message."""
+        message = {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "abcd"},
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64,xxx"}},
+            ],
+        }
+        assert estimate_message_tokens(message) == MESSAGE_OVERHEAD_TOKENS + 1 + IMAGE_TOKENS
+
+
+class TestHistoryBudget:
+    """Test cases for compute_history_budget."""
+
+    def test_reserves_output_tokens(self):
+        """Output tokens are subtracted from the context window."""
+        assert compute_history_budget(16000, 4000) == 12000
+
+    def test_reservation_capped_at_half_window(self):
+        """A huge max_tokens cannot consume the whole window."""
+        assert compute_history_budget(8000, 100000) == 4000
+
+    def test_applies_hard_cap(self):
+        """The configured cap limits large context windows."""
+        assert compute_history_budget(128000, 4000, 32000) == 32000
+
+
+class TestBuildContextWindow:
+    """Test cases for build_context_window."""
+
+    def test_empty_history(self):
+        """No messages yields an empty window."""
+        window = build_context_window([], 1000)
+        assert window.messages == []
+        assert window.dropped_count == 0
+
+    def test_keeps_everything_within_budget(self):
+        """All messages are kept when they fit."""
+        messages = [_msg("user", "hi"), _msg("assistant", "hello"), _msg("user", "bye")]
+        window = build_context_window(messages, 1000)
+        assert window.messages == messages
+        assert window.dropped_count == 0
+
+    def test_drops_oldest_messages_first(self):
+        """Older messages are dropped before newer ones."""
+        messages = [
+            _msg("user", "a" * 400),
+            _msg("assistant", "b" * 400),
+            _msg("user", "c" * 40),
+            _msg("assistant", "d" * 40),
+            _msg("user", "current"),
+        ]
+        window = build_context_window(messages, 60)
+        assert window.messages == messages[2:]
+        assert window.dropped_count == 2
+
+    def test_always_keeps_system_prompt_and_current_turn(self):
+        """System prompt and current turn survive even an exhausted budget."""
+        messages = [
+            _msg("system", "You are helpful."),
+            _msg("user", "old question"),
+            _msg("assistant", "old answer"),
+            _msg("user", "x" * 1000),
+        ]
+        window = build_context_window(messages, 10)
+        assert window.messages == [messages[0], messages[3]]
+        assert window.dropped_count == 2
+
+    def test_keeps_messages_after_last_user_message(self):
+        """Context appended after the current user message is part of the turn."""
+        quoted = _msg("system", "[引用回复] 之前的内容")
+        messages = [_msg("user", "old" * 100), _msg("assistant", "ok"), _msg("user", "new"), quoted]
+        window = build_context_window(messages, 30)
+        assert window.messages[-2:] == [messages[2], quoted]
+
+    def test_history_stays_contiguous(self):
+        """A large message stops the scan instead of being skipped over."""
+        messages = [
+            _msg("user", "small"),
+            _msg("assistant", "z" * 2000),
+            _msg("user", "current"),
+        ]
+        window = build_context_window(messages, 100)
+        assert window.messages == [messages[2]]
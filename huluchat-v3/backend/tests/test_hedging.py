@@ -0,0 +1,105 @@
+"""Tests for hedged provider requests."""
+import asyncio
+
+import pytest
+
+from services.hedging import HedgeStats, LatencyTracker, MIN_LATENCY_SAMPLES, hedge_stats, hedged_stream
+from services.openai_service import StreamChunk
+
+
+class Scripted:
+    """A stream that waits, then yields its chunks; remembers if it was closed."""
+
+    def __init__(self, delay: float, chunks: list[str], error: str = None):
+        self.delay = delay
+        self.chunks = chunks
+        self.error = error
+        self.started = False
+        self.closed = False
+
+    async def stream(self):
+        self.started = True
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                yield StreamChunk(error=self.error)
+                return
+            for content in self.chunks:
+                yield StreamChunk(content=content)
+            yield StreamChunk(is_done=True)
+        finally:
+            self.closed = True
+
+
+async def collect(primary: Scripted, hedge: Scripted, delay: float, on_hedge_win=None) -> str:
+    stream = hedged_stream(primary.stream, hedge.stream, delay, "primary-model", on_hedge_win)
+    return "".join([chunk.content async for chunk in stream])
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    hedge_stats.reset()
+    yield
+    hedge_stats.reset()
+
+
+class TestHedgedStream:
+    """Test cases for hedged_stream()."""
+
+    @pytest.mark.asyncio
+    async def test_fast_primary_is_not_hedged(self):
+        primary, hedge = Scripted(0, ["a", "b"]), Scripted(0, ["x"])
+        assert await collect(primary, hedge, 0.5) == "ab"
+        assert hedge.started is False
+        assert hedge_stats.counts[("primary-model", "not_hedged")] == 1
+
+    @pytest.mark.asyncio
+    async def test_hedge_wins_and_primary_is_cancelled(self):
+        primary, hedge = Scripted(10, ["slow"]), Scripted(0, ["fast"])
+        wins = []
+
+        async def on_hedge_win():
+            wins.append(True)
+
+        assert await collect(primary, hedge, 0.01, on_hedge_win) == "fast"
+        assert primary.closed is True
+        assert wins == [True]
+        assert hedge_stats.win_rate("primary-model") == 1.0
+
+    @pytest.mark.asyncio
+    async def test_primary_still_wins_after_hedge(self):
+        primary, hedge = Scripted(0.03, ["primary"]), Scripted(10, ["hedge"])
+        assert await collect(primary, hedge, 0.01) == "primary"
+        assert hedge.closed is True
+        assert hedge_stats.win_rate("primary-model") == 0.0
+
+    @pytest.mark.asyncio
+    async def test_failed_primary_loses_to_hedge(self):
+        primary, hedge = Scripted(0.02, [], error="boom"), Scripted(0.04, ["ok"])
+        assert await collect(primary, hedge, 0.01) == "ok"
+
+    @pytest.mark.asyncio
+    async def test_cancel_closes_both_streams(self):
+        primary, hedge = Scripted(10, ["a"]), Scripted(10, ["b"])
+        task = asyncio.create_task(collect(primary, hedge, 0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert primary.closed and hedge.closed
+
+
+class TestLatencyTracker:
+    """Test cases for LatencyTracker and HedgeStats."""
+
+    def test_percentile_needs_samples(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 1.0)
+        assert tracker.percentile("m", 90) is None
+        for i in range(MIN_LATENCY_SAMPLES):
+            tracker.record("m", float(i))
+        assert tracker.percentile("m", 50) == pytest.approx(9.0, abs=1)
+        assert tracker.percentile("m", 100) == MIN_LATENCY_SAMPLES - 1
+
+    def test_win_rate_without_hedges(self):
+        assert HedgeStats().win_rate("m") is None
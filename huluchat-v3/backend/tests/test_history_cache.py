@@ -0,0 +1,105 @@
+"""Tests for the per-session conversation history cache."""
+from datetime import datetime
+
+import pytest
+
+from api.chat import get_session_messages, save_message
+from models.schemas import MessageModel
+from services.history_cache import HistoryCache, history_cache
+
+
+def _msg(content: str) -> dict:
+    return {"role": "user", "content": content}
+
+
+class TestHistoryCache:
+    """Test cases for HistoryCache."""
+
+    def test_miss_on_unknown_session(self):
+        """Unknown sessions are a cache miss."""
+        cache = HistoryCache()
+        assert cache.get("s1", 10) is None
+        assert cache.misses == 1
+
+    def test_hit_returns_newest_messages(self):
+        """A warm session returns the newest `limit` messages."""
+        cache = HistoryCache()
+        cache.set("s1", [_msg("a"), _msg("b"), _msg("c")], complete=True)
+        assert cache.get("s1", 2) == [_msg("b"), _msg("c")]
+        assert cache.hits == 1
+
+    def test_incomplete_entry_misses_for_larger_limit(self):
+        """A partial history cannot answer a request for more messages."""
+        cache = HistoryCache()
+        cache.set("s1", [_msg("a"), _msg("b")], complete=False)
+        assert cache.get("s1", 5) is None
+        assert cache.get("s1", 2) == [_msg("a"), _msg("b")]
+
+    def test_append_only_updates_warm_sessions(self):
+        """Appending to a cold session does not create an entry."""
+        cache = HistoryCache()
+        cache.append("cold", _msg("x"))
+        assert "cold" not in cache
+
+        cache.set("warm", [_msg("a")], complete=True)
+        cache.append("warm", _msg("b"))
+        assert cache.get("warm", 10) == [_msg("a"), _msg("b")]
+
+    def test_append_trims_to_max_messages(self):
+        """Entries never grow beyond max_messages."""
+        cache = HistoryCache(max_messages=2)
+        cache.set("s1", [_msg("a"), _msg("b")], complete=True)
+        cache.append("s1", _msg("c"))
+        assert cache.get("s1", 2) == [_msg("b"), _msg("c")]
+        assert cache.get("s1", 3) is None
+
+    def test_evicts_least_recently_used_session(self):
+        """The least recently used session is evicted first."""
+        cache = HistoryCache(max_sessions=2)
+        cache.set("s1", [_msg("a")], complete=True)
+        cache.set("s2", [_msg("b")], complete=True)
+        cache.get("s1", 1)
+        cache.set("s3", [_msg("c")], complete=True)
+        assert "s1" in cache
+        assert "s2" not in cache
+        assert "s3" in cache
+
+    def test_returned_list_is_a_copy(self):
+        """Callers can extend the returned history without touching the cache."""
+        cache = HistoryCache()
+        cache.set("s1", [_msg("a")], complete=True)
+        history = cache.get("s1", 10)
+        history.append(_msg("quoted"))
+        assert cache.get("s1", 10) == [_msg("a")]
+
+    def test_invalidate(self):
+        """Invalidated sessions reload from the database."""
+        cache = HistoryCache()
+        cache.set("s1", [_msg("a")], complete=True)
+        cache.invalidate("s1")
+        assert cache.get("s1", 10) is None
+
+
+class TestHistoryCacheIntegration:
+    """Test cases for the cache in the chat history path."""
+
+    @pytest.mark.asyncio
+    async def test_saved_messages_are_appended_to_warm_history(self, db_session):
+        """save_message keeps a warm session's history current without a reload."""
+        history_cache.clear()
+        db_session.add(MessageModel(
+            id="cached-1",
+            session_id="cache-session",
+            role="user",
+            content="first",
+            created_at=datetime(2026, 1, 1),
+        ))
+        await db_session.commit()
+
+        assert await get_session_messages(db_session, "cache-session") == [_msg("first")]
+
+        await save_message(db_session, "cache-session", "assistant", "reply")
+        history = history_cache.get("cache-session", 50)
+
+        assert history == [_msg("first"), {"role": "assistant", "content": "reply"}]
+        history_cache.clear()
@@ -0,0 +1,127 @@
+"""Tests for image preparation before vision model requests."""
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from api.settings import get_image_max_dimension, OLLAMA_IMAGE_MAX_DIMENSION
+from services.blob_store import blob_store
+from services.image_pipeline import (
+    IMAGE_PLACEHOLDER,
+    ImageCache,
+    apply_image_placeholders,
+    downscale_image,
+    image_cache,
+    prepare_images,
+)
+
+
+def _png(size=(64, 32), mode="RGB") -> bytes:
+    output = io.BytesIO()
+    Image.new(mode, size, color=(200, 30, 30, 128)[:len(mode)]).save(output, format="PNG")
+    return output.getvalue()
+
+
+def _data_url(data: bytes, mime: str = "image/png") -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def _image_message(text: str, url: str) -> dict:
+    return {
+        "role": "user",
+        "content": [{"type": "text", "text": text}, {"type": "image_url", "image_url": {"url": url}}],
+    }
+
+
+def _decode(url: str) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+
+
+class TestDownscaleImage:
+    """Test cases for downscale_image."""
+
+    def test_fits_within_max_dimension(self):
+        """Large images keep their aspect ratio within the limit."""
+        mime_type, data = downscale_image(_png((400, 200)), max_dimension=100)
+        assert mime_type == "image/jpeg"
+        assert Image.open(io.BytesIO(data)).size == (100, 50)
+
+    def test_keeps_transparency(self):
+        """Images with alpha are re-encoded as PNG."""
+        mime_type, _ = downscale_image(_png((400, 200), mode="RGBA"), max_dimension=100)
+        assert mime_type == "image/png"
+
+    def test_unreadable_data_is_kept(self):
+        """Anything Pillow cannot read is sent unchanged."""
+        assert downscale_image(b"not an image", max_dimension=100) is None
+
+
+class TestPrepareImages:
+    """Test cases for prepare_images."""
+
+    @pytest.mark.asyncio
+    async def test_downscales_and_caches(self):
+        """Images are downscaled once per content and dimension."""
+        url = _data_url(_png((300, 300)))
+        messages = [_image_message("look", url)]
+
+        prepared = await prepare_images(messages, max_dimension=50)
+        assert _decode(prepared[0]["content"][1]["image_url"]["url"]).size == (50, 50)
+        # The (possibly cached) input is left untouched
+        assert messages[0]["content"][1]["image_url"]["url"] == url
+
+        hits = image_cache.hits
+        await prepare_images(messages, max_dimension=50)
+        assert image_cache.hits == hits + 1
+
+    @pytest.mark.asyncio
+    async def test_resolves_stored_references(self):
+        """Attachment references are read from the blob store; missing blobs are dropped."""
+        digest = blob_store.put(_png((300, 300)))
+        message = _image_message("look", f"attachment:{digest}")
+        message["content"][1]["mime_type"] = "image/png"
+        missing = {"type": "image_url", "image_url": {"url": f"attachment:{'0' * 64}"}}
+        message["content"].append(missing)
+
+        prepared = await prepare_images([message], max_dimension=50)
+        parts = prepared[0]["content"]
+        assert len(parts) == 2
+        assert set(parts[1]) == {"type", "image_url"}
+        assert _decode(parts[1]["image_url"]["url"]).size == (50, 50)
+
+    def test_cache_is_bounded_by_size(self):
+        """Old entries are evicted once the byte budget is exceeded."""
+        cache = ImageCache(max_bytes=10)
+        cache.set(("a", 1), "x" * 6)
+        cache.set(("b", 1), "y" * 6)
+        assert cache.get(("a", 1)) is None
+        assert cache.get(("b", 1)) == "y" * 6
+
+
+class TestImagePlaceholders:
+    """Test cases for apply_image_placeholders."""
+
+    def test_replaces_images_of_older_turns(self):
+        """Only the last N user turns keep their images."""
+        messages = [
+            _image_message("first", "data:image/png;base64,AAA"),
+            {"role": "assistant", "content": "ok"},
+            _image_message("second", "data:image/png;base64,BBB"),
+        ]
+        result = apply_image_placeholders(messages, keep_turns=1)
+        assert result[0]["content"] == f"first\n\n{IMAGE_PLACEHOLDER}"
+        assert result[2] is messages[2]
+        assert isinstance(messages[0]["content"], list)
+
+    def test_zero_keeps_all(self):
+        messages = [_image_message("first", "data:image/png;base64,AAA")]
+        assert apply_image_placeholders(messages, keep_turns=0) == messages
+
+
+class TestImageMaxDimension:
+    """Test cases for per-model image limits."""
+
+    def test_model_limits(self):
+        assert get_image_max_dimension("gpt-4o") == 2048
+        assert get_image_max_dimension("ollama:llava") == OLLAMA_IMAGE_MAX_DIMENSION
@@ -0,0 +1,96 @@
+"""Tests for checkpointing streamed assistant responses."""
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from models.schemas import (
+    MessageModel,
+    MESSAGE_STATUS_COMPLETE,
+    MESSAGE_STATUS_ERROR,
+    MESSAGE_STATUS_STREAMING,
+)
+from services.message_checkpoint import MessageCheckpoint, recover_interrupted_messages
+
+
+async def _placeholder(db, message_id: str = "reply", content: str = "") -> MessageModel:
+    message = MessageModel(
+        id=message_id,
+        session_id="checkpoint-session",
+        role="assistant",
+        content=content,
+        status=MESSAGE_STATUS_STREAMING,
+    )
+    db.add(message)
+    await db.commit()
+    return message
+
+
+async def _stored(db, message_id: str = "reply"):
+    result = await db.execute(
+        select(MessageModel.content, MessageModel.status).where(MessageModel.id == message_id)
+    )
+    return result.one_or_none()
+
+
+class TestMessageCheckpoint:
+    """Test cases for MessageCheckpoint."""
+
+    @pytest.mark.asyncio
+    async def test_writes_after_token_threshold(self, db_session):
+        """Partial text is saved once enough tokens accumulate."""
+        message = await _placeholder(db_session)
+        checkpoint = MessageCheckpoint(db_session, message, every_tokens=4, interval_seconds=60)
+
+        checkpoint.update("hi")
+        await asyncio.sleep(0)
+        assert checkpoint.checkpoints == 0
+
+        checkpoint.update("hi there, this is long enough")
+        await asyncio.sleep(0.01)
+        assert checkpoint.checkpoints == 1
+        assert await _stored(db_session) == ("hi there, this is long enough", MESSAGE_STATUS_STREAMING)
+
+    @pytest.mark.asyncio
+    async def test_writes_after_interval(self, db_session):
+        """A checkpoint is due once the interval has elapsed."""
+        message = await _placeholder(db_session)
+        checkpoint = MessageCheckpoint(db_session, message, every_tokens=1000, interval_seconds=0)
+        checkpoint.update("a")
+        await asyncio.sleep(0.01)
+        assert checkpoint.checkpoints == 1
+
+    @pytest.mark.asyncio
+    async def test_finish_sets_final_status(self, db_session):
+        """finish() writes the full text and the final status once."""
+        message = await _placeholder(db_session)
+        checkpoint = MessageCheckpoint(db_session, message, every_tokens=1, interval_seconds=0)
+        checkpoint.update("par")
+        saved = await checkpoint.finish("partial answer", MESSAGE_STATUS_COMPLETE)
+        assert saved is message
+        assert await _stored(db_session) == ("partial answer", MESSAGE_STATUS_COMPLETE)
+        assert await checkpoint.finish("ignored", MESSAGE_STATUS_ERROR) is None
+
+    @pytest.mark.asyncio
+    async def test_finish_deletes_empty_reply(self, db_session):
+        """An empty reply leaves no row behind."""
+        message = await _placeholder(db_session)
+        checkpoint = MessageCheckpoint(db_session, message)
+        assert await checkpoint.finish("", MESSAGE_STATUS_COMPLETE) is None
+        assert await _stored(db_session) is None
+
+
+class TestRecoverInterruptedMessages:
+    """Test cases for startup recovery."""
+
+    @pytest.mark.asyncio
+    async def test_recovers_partial_and_removes_empty(self, db_session):
+        """Partial replies become errors, empty placeholders are removed."""
+        await _placeholder(db_session, "partial", content="half an answer")
+        await _placeholder(db_session, "empty")
+
+        assert await recover_interrupted_messages(db_session) == 2
+
+        assert await _stored(db_session, "partial") == ("half an answer", MESSAGE_STATUS_ERROR)
+        assert await _stored(db_session, "empty") is None
+        assert await recover_interrupted_messages(db_session) == 0
@@ -0,0 +1,135 @@
+"""Tests for the in-process metrics and /api/metrics."""
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from services.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    db_query_seconds,
+    instrument_engine,
+    statement_label,
+)
+
+
+class TestPrimitives:
+    """Counter, gauge and histogram rendering."""
+
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests", "Requests", ("route",))
+        requests.inc("/a")
+        requests.inc("/a", amount=2)
+        active = registry.gauge("active", "Active")
+        active.inc()
+        active.inc()
+        active.dec()
+
+        output = registry.render()
+        assert "# TYPE requests counter" in output
+        assert 'requests_total{route="/a"} 3' in output
+        assert "active 1" in output
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency", "Latency", ("model",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5.0):
+            histogram.observe(value, "m")
+
+        lines = histogram.render()
+        assert 'latency_bucket{model="m",le="0.1"} 1' in lines
+        assert 'latency_bucket{model="m",le="1"} 3' in lines
+        assert 'latency_bucket{model="m",le="+Inf"} 4' in lines
+        assert 'latency_count{model="m"} 4' in lines
+        assert histogram.count("m") == 4
+
+    def test_label_values_escaped(self):
+        gauge = Gauge("g", "G", ("name",))
+        gauge.set(1, 'say "hi"\n')
+        assert gauge.render()[-1] == 'g{name="say \\"hi\\"\\n"} 1'
+
+    def test_collectors_read_at_scrape_time(self):
+        registry = MetricsRegistry()
+        state = {"depth": 0}
+
+        def collect():
+            depth = Gauge("depth", "Depth")
+            depth.set(state["depth"])
+            return [depth]
+
+        registry.add_collector(collect)
+        state["depth"] = 7
+        assert "depth 7" in registry.render()
+
+    def test_duplicate_names_rejected(self):
+        registry = MetricsRegistry()
+        registry.register(Counter("c", "C"))
+        with pytest.raises(ValueError):
+            registry.counter("c", "C")
+
+
+class TestDatabaseMetrics:
+    """Statement labels and engine instrumentation."""
+
+    def test_statement_label(self):
+        assert statement_label("SELECT messages.id FROM messages WHERE x = ?") == "SELECT messages"
+        assert statement_label('INSERT INTO "sessions" (id) VALUES (?)') == "INSERT sessions"
+        assert statement_label("UPDATE messages SET content = ?") == "UPDATE messages"
+        assert statement_label("PRAGMA main.table_info(x)") == "PRAGMA"
+
+    @pytest.mark.asyncio
+    async def test_engine_statements_observed(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        instrument_engine(engine)
+        before = db_query_seconds.count("CREATE metrics_probe")
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE metrics_probe (id INTEGER)"))
+            await conn.execute(text("SELECT id FROM metrics_probe"))
+        await engine.dispose()
+        assert db_query_seconds.count("CREATE metrics_probe") == before + 1
+        assert db_query_seconds.count("SELECT metrics_probe") >= 1
+
+
+class TestMetricsEndpoint:
+    """Test cases for GET /api/metrics."""
+
+    @pytest.mark.asyncio
+    async def test_exposes_route_latency_and_collectors(self, client):
+        await client.get("/api/health")
+        response = await client.get("/api/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert 'huluchat_http_request_seconds_count{method="GET",route="/api/health",status="2xx"}' in body
+        assert "huluchat_websockets_active 0" in body
+        assert "huluchat_chroma_executor_queue_depth" in body
+        assert "huluchat_chat_turns_in_flight 0" in body
+
+    @pytest.mark.asyncio
+    async def test_unmatched_routes_share_a_label(self, client):
+        await client.get("/api/no-such-route/123")
+        body = (await client.get("/api/metrics")).text
+        assert 'route="unmatched",status="4xx"' in body
+        assert "no-such-route" not in body
+
+
+class TestStreamMetrics:
+    """Per-turn provider latency and throughput."""
+
+    def test_observe_stream_metrics(self):
+        from api.chat import StreamResult, observe_stream_metrics
+        from services.metrics import first_token_seconds, generation_tokens_per_second
+        from services.openai_service import TokenUsage
+
+        result = StreamResult(content="x", model="metrics-test", first_token_seconds=0.5)
+        result.usage = TokenUsage(prompt_tokens=10, completion_tokens=30)
+        observe_stream_metrics(result, total_seconds=2.0)
+
+        assert first_token_seconds.count("metrics-test") == 1
+        assert generation_tokens_per_second.count("metrics-test") == 1
+        # 30 tokens in 1.5s lands in the 20 tokens/s bucket
+        assert 'huluchat_provider_tokens_per_second_bucket{model="metrics-test",le="20"} 1' in (
+            generation_tokens_per_second.render()
+        )
@@ -0,0 +1,42 @@
+"""Tests for the Alembic migration chain."""
+import os
+import sqlite3
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from core.config import settings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def alembic_config() -> Config:
+    # No ini file, so env.py leaves the test run's logging configuration alone
+    config = Config()
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    return config
+
+
+def message_columns(path) -> set:
+    with sqlite3.connect(path) as conn:
+        return {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+
+
+class TestUpgrade:
+    """Upgrading existing databases."""
+
+    def test_upgrade_from_002_reaches_head(self, tmp_path, monkeypatch):
+        """Databases at 002 already have images/files (from 001) and still upgrade."""
+        path = tmp_path / "huluchat.db"
+        monkeypatch.setattr(settings, "database_url", f"sqlite+aiosqlite:///{path}")
+        config = alembic_config()
+
+        command.upgrade(config, "002_add_composite_indexes")
+        assert {"images", "files"} <= message_columns(path)
+
+        command.upgrade(config, "head")
+        with sqlite3.connect(path) as conn:
+            (version,) = conn.execute("SELECT version_num FROM alembic_version").fetchone()
+        assert version == ScriptDirectory.from_config(config).get_current_head()
+        assert {"images", "files"} <= message_columns(path)
@@ -1,4 +1,5 @@
 """Ollama Service 单元测试 —— 使用 Mock，无需真实 Ollama。"""
+import asyncio
 import json
 from typing import AsyncIterator
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -6,7 +7,13 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 import httpx
 
-from services.ollama_service import OllamaService
+from core.config import settings
+from services.ollama_service import (
+    OllamaModelDetails,
+    OllamaService,
+    choose_num_ctx,
+    keep_alive_value,
+)
 from services.openai_service import StreamChunk
 
 
@@ -295,6 +302,28 @@ class TestOllamaServiceStreamChat:
             # 空内容的消息不应该产生 chunk
             assert chunks[0].content == "Hello"
 
+    @pytest.mark.asyncio
+    async def test_yields_usage_from_final_chunk(self):
+        """最后一个 chunk 的 prompt_eval_count / eval_count 作为 usage 返回。"""
+        stream_lines = [
+            json.dumps({"message": {"content": "Hi"}, "done": False}),
+            json.dumps({"message": {"content": ""}, "done": True, "prompt_eval_count": 26, "eval_count": 9}),
+        ]
+        with patch("httpx.AsyncClient.stream") as mock_stream:
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.aiter_lines = MagicMock(return_value=async_iter(stream_lines))
+            mock_response.__aenter__ = AsyncMock(return_value=mock_response)
+            mock_response.__aexit__ = AsyncMock()
+            mock_stream.return_value = mock_response
+
+            service = OllamaService()
+            chunks = [c async for c in service.stream_chat([{"role": "user", "content": "Hi"}], "llama3")]
+
+        usage = [c.usage for c in chunks if c.usage]
+        assert [(u.prompt_tokens, u.completion_tokens) for u in usage] == [(26, 9)]
+        assert chunks[-1].is_done
+
     @pytest.mark.asyncio
     async def test_sends_correct_payload_to_ollama(self):
         """验证发送给 Ollama 的请求负载正确。"""
@@ -325,6 +354,9 @@ class TestOllamaServiceStreamChat:
             assert sent_payload["model"] == "llama3"
             assert sent_payload["messages"] == messages
             assert sent_payload["stream"] is True
+            assert sent_payload["keep_alive"] == "30m"
+            # Unknown model: the server default fits a short conversation
+            assert sent_payload["options"]["num_ctx"] == 4096
 
 
 class TestOllamaServiceClientProperty:
@@ -363,3 +395,209 @@ class TestOllamaServiceClientProperty:
             # 应该是同一个实例
             assert client1 is client2
             mock_client_class.assert_called_once()
+
+
+def tags_response(models: list[dict] = None) -> MagicMock:
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"models": models or []}
+    return response
+
+
+class TestOllamaServiceCache:
+    """状态、模型列表和模型元数据缓存测试。"""
+
+    @pytest.mark.asyncio
+    async def test_status_is_cached(self):
+        """TTL 内重复检查不再请求 /api/tags。"""
+        with patch("httpx.AsyncClient.get") as mock_get:
+            mock_get.return_value = tags_response([{"name": "llama3:latest"}])
+            service = OllamaService()
+
+            assert await service.is_available() is True
+            assert await service.is_available() is True
+            # The probe also filled the model list
+            assert (await service.list_models())[0]["name"] == "llama3:latest"
+            assert mock_get.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_probes_share_one_request(self):
+        """并发调用共享同一个进行中的请求（single-flight）。"""
+        release = asyncio.Event()
+
+        async def slow_get(*args, **kwargs):
+            await release.wait()
+            return tags_response()
+
+        with patch("httpx.AsyncClient.get", side_effect=slow_get) as mock_get:
+            service = OllamaService()
+            checks = [asyncio.create_task(service.is_available()) for _ in range(5)]
+            await asyncio.sleep(0)
+            release.set()
+            assert await asyncio.gather(*checks) == [True] * 5
+            assert mock_get.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_status_refreshed_in_background(self, monkeypatch):
+        """过期的可用状态先返回，再在后台刷新。"""
+        with patch("httpx.AsyncClient.get") as mock_get:
+            mock_get.return_value = tags_response()
+            service = OllamaService()
+            assert await service.is_available() is True
+
+            service._status = (0.0, True)
+            mock_get.side_effect = httpx.ConnectError("Connection refused")
+            assert await service.is_available() is True
+            await asyncio.sleep(0)
+            assert await service.is_available() is False
+            assert mock_get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_connection_error_forgets_status(self):
+        with patch("httpx.AsyncClient.get") as mock_get:
+            mock_get.return_value = tags_response()
+            service = OllamaService()
+            await service.is_available()
+            service.mark_unavailable()
+            await service.is_available()
+            assert mock_get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_model_details_cached(self):
+        """/api/show 结果被解析并缓存。"""
+        show = MagicMock()
+        show.status_code = 200
+        show.json.return_value = {
+            "parameters": "stop \"<|eot_id|>\"\nnum_ctx 8192",
+            "model_info": {"general.architecture": "llama", "llama.context_length": 131072},
+            "capabilities": ["completion", "tools"],
+        }
+        with patch("httpx.AsyncClient.post", return_value=show) as mock_post:
+            service = OllamaService()
+            details = await service.get_model_details("llama3")
+            again = await service.get_model_details("llama3")
+
+        assert details is again
+        assert details.context_length == 131072
+        assert details.num_ctx == 8192
+        assert details.capabilities == ["completion", "tools"]
+        assert service.cached_model_details("llama3") is details
+        mock_post.assert_called_once_with("/api/show", json={"model": "llama3"}, timeout=10.0)
+
+    @pytest.mark.asyncio
+    async def test_context_length_uses_model_num_ctx(self, monkeypatch):
+        from api import settings as settings_api
+        from services import ollama_service as module
+        from services.ollama_service import OllamaModelDetails
+
+        service = OllamaService()
+        service._details["qwen"] = (float("inf"), OllamaModelDetails("qwen", 32768, 16384))
+        monkeypatch.setattr(module, "ollama_service", service)
+        # num_ctx grows with the conversation up to the trained context length
+        assert settings_api.get_context_length("ollama:qwen") == 32768
+        assert settings_api.get_context_length("ollama:unknown") == module.OLLAMA_DEFAULT_NUM_CTX
+
+        monkeypatch.setattr(settings, "ollama_auto_num_ctx", False)
+        assert settings_api.get_context_length("ollama:qwen") == 16384
+
+
+class TestOllamaResidency:
+    """keep_alive、num_ctx 选择和模型预热测试。"""
+
+    def test_num_ctx_steps(self, monkeypatch):
+        monkeypatch.setattr(settings, "ollama_max_num_ctx", 32768)
+        details = OllamaModelDetails("llama3", context_length=131072)
+        assert choose_num_ctx(1000, details) == 4096
+        assert choose_num_ctx(5000, details) == 8192
+        assert choose_num_ctx(20000, details) == 32768
+        # Capped by settings.ollama_max_num_ctx
+        assert choose_num_ctx(100000, details) == 32768
+        # Capped by the trained context length
+        assert choose_num_ctx(20000, OllamaModelDetails("small", context_length=8192)) == 8192
+        # The Modelfile's num_ctx is the floor
+        assert choose_num_ctx(10, OllamaModelDetails("big", 131072, num_ctx=16384)) == 16384
+        # Unknown model: server default
+        assert choose_num_ctx(20000, None) == 4096
+
+    def test_num_ctx_never_shrinks_for_loaded_model(self):
+        service = OllamaService()
+        service._details["llama3"] = (float("inf"), OllamaModelDetails("llama3", 131072))
+        service._loaded_num_ctx["llama3"] = 16384
+        assert service.num_ctx_for("llama3", 100) == 16384
+
+    def test_keep_alive_value(self):
+        assert keep_alive_value("30m") == "30m"
+        assert keep_alive_value("-1") == -1
+
+    @pytest.mark.asyncio
+    async def test_long_history_raises_num_ctx(self):
+        with patch("httpx.AsyncClient.stream") as mock_stream:
+            mock_response = MagicMock()
+            mock_response.status_code = 200
+            mock_response.aiter_lines = MagicMock(return_value=async_iter([]))
+            mock_response.__aenter__ = AsyncMock(return_value=mock_response)
+            mock_response.__aexit__ = AsyncMock()
+            mock_stream.return_value = mock_response
+
+            service = OllamaService()
+            service._details["llama3"] = (float("inf"), OllamaModelDetails("llama3", 131072))
+            messages = [{"role": "user", "content": "word " * 20000}]
+            async for _ in service.stream_chat(messages, "llama3"):
+                pass
+
+        assert mock_stream.call_args[1]["json"]["options"]["num_ctx"] == 32768
+        assert service._loaded_num_ctx["llama3"] == 32768
+
+    @pytest.mark.asyncio
+    async def test_warm_up_loads_model_once(self):
+        release = asyncio.Event()
+        show = MagicMock()
+        show.status_code = 200
+        show.json.return_value = {"model_info": {"llama.context_length": 8192}}
+        loaded = MagicMock()
+        loaded.status_code = 200
+
+        async def post(path, **kwargs):
+            if path == "/api/show":
+                return show
+            await release.wait()
+            return loaded
+
+        with patch("httpx.AsyncClient.post", side_effect=post) as mock_post:
+            service = OllamaService()
+            warmups = [asyncio.create_task(service.warm_up("llama3")) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            release.set()
+            assert await asyncio.gather(*warmups) == [True] * 3
+
+        generate = [c for c in mock_post.call_args_list if c[0][0] == "/api/generate"]
+        assert len(generate) == 1
+        assert generate[0][1]["json"] == {
+            "model": "llama3",
+            "keep_alive": "30m",
+            "options": {"num_ctx": 4096},
+        }
+        assert service._loaded_num_ctx["llama3"] == 4096
+
+    @pytest.mark.asyncio
+    async def test_warm_up_unreachable(self):
+        with patch("httpx.AsyncClient.post", side_effect=httpx.ConnectError("refused")):
+            service = OllamaService()
+            service._status = (float("inf"), True)
+            assert await service.warm_up("llama3") is False
+            assert service._status is None
+
+    @pytest.mark.asyncio
+    async def test_warmup_endpoint_strips_prefix(self, monkeypatch):
+        from api import settings as settings_api
+        from services import ollama_service as module
+
+        service = OllamaService()
+        service.warm_up = AsyncMock(return_value=True)
+        monkeypatch.setattr(module, "ollama_service", service)
+        response = await settings_api.warmup_ollama_model(
+            settings_api.OllamaWarmupRequest(model="ollama:llama3")
+        )
+        assert response.model == "llama3"
+        assert response.loaded is True
+        service.warm_up.assert_awaited_once_with("llama3")
@@ -0,0 +1,73 @@
+"""Tests for the shared provider client registry."""
+import asyncio
+
+import httpx
+import pytest
+
+from services.provider_clients import ProviderClientRegistry, key_fingerprint
+
+
+class TestProviderClientRegistry:
+    """Test cases for ProviderClientRegistry."""
+
+    @pytest.mark.asyncio
+    async def test_reuses_client_for_same_settings(self):
+        """The same provider, endpoint and key share one client."""
+        registry = ProviderClientRegistry()
+        first = registry.get("openai", "sk-a", "https://api.example.com/v1")
+        assert registry.get("openai", "sk-a", "https://api.example.com/v1") is first
+        assert registry.created == 1
+        await registry.close()
+
+    @pytest.mark.asyncio
+    async def test_key_change_replaces_and_closes_client(self):
+        """A new key replaces the endpoint's client and closes the old pool."""
+        registry = ProviderClientRegistry()
+        a = registry.get("openai", "sk-a")
+        b = registry.get("openai", "sk-b")
+        assert b is not a
+        assert b.api_key == "sk-b"
+        assert len(registry) == 1
+        await asyncio.sleep(0)
+        assert a.is_closed()
+        assert registry.get("openai", "sk-b") is b
+        await registry.close()
+        assert len(registry) == 0
+        assert b.is_closed()
+
+    @pytest.mark.asyncio
+    async def test_replaced_client_stays_open_while_in_use(self):
+        """A request in flight keeps its client until it finishes."""
+        registry = ProviderClientRegistry()
+        a = registry.get("openai", "sk-a")
+        async with registry.in_use(a):
+            registry.get("openai", "sk-b")
+            await asyncio.sleep(0)
+            assert not a.is_closed()
+        await asyncio.sleep(0)
+        assert a.is_closed()
+        await registry.close()
+
+    @pytest.mark.asyncio
+    async def test_timeout_change_replaces_client(self):
+        registry = ProviderClientRegistry()
+        a = registry.get("openai", "sk-a", timeout=httpx.Timeout(10.0))
+        assert registry.get("openai", "sk-a", timeout=httpx.Timeout(10.0)) is a
+        b = registry.get("openai", "sk-a", timeout=httpx.Timeout(30.0))
+        assert b is not a
+        assert b.timeout == httpx.Timeout(30.0)
+        assert registry.created == 2
+        await registry.close()
+
+    @pytest.mark.asyncio
+    async def test_endpoints_are_separate(self):
+        """Different providers or base URLs get their own pools."""
+        registry = ProviderClientRegistry()
+        a = registry.get("openai", "sk-a")
+        b = registry.get("deepseek", "sk-a", "https://api.deepseek.com")
+        assert a is not b
+        await registry.close()
+
+    def test_fingerprint_hides_key(self):
+        assert "sk-secret" not in key_fingerprint("sk-secret")
+        assert key_fingerprint("sk-a") != key_fingerprint("sk-b")
@@ -0,0 +1,251 @@
+"""Tests for provider retries with backoff."""
+import asyncio
+
+import httpx
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from openai import APIConnectionError, APIStatusError
+
+from core.config import settings
+from services.openai_service import OpenAIService, StreamChunk
+from services.provider_retry import RetryState, is_retryable, retry_stats, with_retry
+from services.provider_scheduler import provider_scheduler
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+
+def status_error(code: int, headers: dict = None) -> APIStatusError:
+    response = httpx.Response(code, headers=headers or {}, request=REQUEST)
+    return APIStatusError(f"status {code}", response=response, body=None)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "provider_max_retries", 3)
+    monkeypatch.setattr(settings, "provider_retry_base_delay", 0.0)
+    monkeypatch.setattr(settings, "provider_retry_budget_seconds", 30.0)
+    retry_stats.reset()
+    yield
+    retry_stats.reset()
+
+
+class Flaky:
+    """A call that fails with the given errors, then returns 'ok'."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class TestRetryPolicy:
+    """Which errors are retried and for how long."""
+
+    def test_retryable_errors(self):
+        assert is_retryable(status_error(429))
+        assert is_retryable(status_error(503))
+        assert is_retryable(APIConnectionError(request=REQUEST))
+        assert not is_retryable(status_error(400))
+        assert not is_retryable(status_error(401))
+        assert not is_retryable(ValueError("bad"))
+
+    def test_retry_after_is_honoured(self):
+        state = RetryState("test", "chat")
+        assert state.next_delay(status_error(429, {"retry-after": "2"})) == 2
+
+    def test_budget_limits_total_wait(self):
+        state = RetryState("test", "chat", budget_seconds=5)
+        assert state.next_delay(status_error(503, {"retry-after": "10"})) is None
+        assert retry_stats.snapshot() == {("test", "chat", "exhausted"): 1}
+
+
+class TestWithRetry:
+    """Test cases for with_retry()."""
+
+    @pytest.mark.asyncio
+    async def test_recovers_from_transient_errors(self):
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+
+        call = Flaky(status_error(500), status_error(429, {"retry-after-ms": "100"}))
+        assert await with_retry("test", "chat", call, sleep=sleep) == "ok"
+        assert call.calls == 3
+        assert delays[1] == pytest.approx(0.1)
+        counts = retry_stats.snapshot()
+        assert counts[("test", "chat", "retry")] == 2
+        assert counts[("test", "chat", "recovered")] == 1
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_raised_immediately(self):
+        call = Flaky(status_error(400))
+        with pytest.raises(APIStatusError):
+            await with_retry("test", "chat", call)
+        assert call.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        call = Flaky(*(status_error(502) for _ in range(5)))
+        with pytest.raises(APIStatusError):
+            await with_retry("test", "chat", call)
+        assert call.calls == 4
+        assert retry_stats.snapshot()[("test", "chat", "exhausted")] == 1
+
+
+class ScriptedService(OpenAIService):
+    """Each attempt yields the scripted chunks, then raises the scripted error."""
+
+    def __init__(self, attempts):
+        self.attempts = list(attempts)
+        self.calls = 0
+
+    async def _stream_attempt(self, api_params, session_id, on_queue_position, signal_slot=False):
+        self.calls += 1
+        chunks, error = self.attempts.pop(0)
+        if signal_slot:
+            yield StreamChunk(waiting_for_slot=True)
+            yield StreamChunk(waiting_for_slot=False)
+        for content in chunks:
+            yield StreamChunk(content=content)
+        if error is not None:
+            raise error
+        yield StreamChunk(is_done=True)
+
+
+class TestStreamRetry:
+    """stream_chat retries only before the first chunk."""
+
+    @pytest.mark.asyncio
+    async def test_retries_before_first_chunk(self):
+        service = ScriptedService([([], status_error(503)), (["Hi"], None)])
+        chunks = [c async for c in service.stream_chat([{"role": "user", "content": "x"}])]
+        assert service.calls == 2
+        assert [c.content for c in chunks if c.content] == ["Hi"]
+        assert chunks[-1].is_done
+
+    @pytest.mark.asyncio
+    async def test_slot_signals_do_not_prevent_retry(self):
+        """Slot signals never reach the client, so the attempt can still be retried."""
+        service = ScriptedService([([], status_error(503)), (["Hi"], None)])
+        chunks = [
+            c async for c in service.stream_chat([{"role": "user", "content": "x"}], signal_slot=True)
+        ]
+        assert service.calls == 2
+        assert [c.content for c in chunks if c.content] == ["Hi"]
+
+    @pytest.mark.asyncio
+    async def test_no_retry_after_content(self):
+        service = ScriptedService([(["partial"], status_error(503)), (["again"], None)])
+        chunks = [c async for c in service.stream_chat([{"role": "user", "content": "x"}])]
+        assert service.calls == 1
+        assert chunks[0].content == "partial"
+        assert chunks[-1].error
+
+
+class FakeStream:
+    """Parsed chat completion stream."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+def content_chunk(text: str):
+    delta = SimpleNamespace(content=text, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+def tool_call_chunk(call_id: str, name: str, arguments: str):
+    function = SimpleNamespace(name=name, arguments=arguments)
+    call = SimpleNamespace(index=0, id=call_id, function=function)
+    delta = SimpleNamespace(content=None, tool_calls=[call])
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+def usage_chunk(prompt_tokens: int, completion_tokens: int):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return SimpleNamespace(choices=[], usage=usage)
+
+
+class TestStreamAttempt:
+    """A real attempt against a mocked client."""
+
+    @staticmethod
+    def install(monkeypatch, stream: FakeStream) -> MagicMock:
+        raw = MagicMock()
+        raw.headers = {}
+        raw.parse.return_value = stream
+        client = MagicMock()
+        client.chat.completions.with_raw_response.create = AsyncMock(return_value=raw)
+        monkeypatch.setattr(OpenAIService, "client", property(lambda self: client))
+        return client
+
+    @pytest.mark.asyncio
+    async def test_streams_and_closes(self, monkeypatch):
+        stream = FakeStream([content_chunk("Hello")])
+        self.install(monkeypatch, stream)
+
+        chunks = [c async for c in OpenAIService().stream_chat([{"role": "user", "content": "x"}], model="m")]
+        assert [c.content for c in chunks if c.content] == ["Hello"]
+        assert chunks[-1].is_done
+        assert stream.closed
+
+    @pytest.mark.asyncio
+    async def test_signals_slot_only_when_asked(self, monkeypatch):
+        self.install(monkeypatch, FakeStream([content_chunk("Hello")]))
+        messages = [{"role": "user", "content": "x"}]
+
+        plain = [c async for c in OpenAIService().stream_chat(messages, model="m")]
+        assert all(c.waiting_for_slot is None for c in plain)
+        signalled = [c async for c in OpenAIService().stream_chat(messages, model="m", signal_slot=True)]
+        assert [c.waiting_for_slot for c in signalled[:2]] == [True, False]
+        assert signalled[2].content == "Hello"
+
+    @pytest.mark.asyncio
+    async def test_reports_stream_usage(self, monkeypatch):
+        client = self.install(monkeypatch, FakeStream([content_chunk("Hi"), usage_chunk(12, 3)]))
+
+        chunks = [c async for c in OpenAIService().stream_chat([{"role": "user", "content": "x"}], model="m")]
+        create = client.chat.completions.with_raw_response.create
+        assert create.call_args.kwargs["stream_options"] == {"include_usage": True}
+        usage = [c.usage for c in chunks if c.usage]
+        assert len(usage) == 1
+        assert (usage[0].prompt_tokens, usage[0].completion_tokens) == (12, 3)
+        assert chunks[-1].is_done
+
+    @pytest.mark.asyncio
+    async def test_slot_is_released_before_tool_calls(self, monkeypatch):
+        """A continuation opened while handling tool calls gets the model's only slot."""
+        monkeypatch.setattr(settings, "model_max_concurrency", 1)
+        self.install(monkeypatch, FakeStream([tool_call_chunk("c1", "srv__tool", "{}")]))
+        service = OpenAIService()
+        messages = [{"role": "user", "content": "x"}]
+
+        async for chunk in service.stream_chat(messages, model="m", session_id="s1"):
+            if chunk.has_tool_calls:
+                assert provider_scheduler.stats()["openai"]["active"] == 0
+
+                async def continuation():
+                    return [c async for c in service.stream_chat(messages, model="m", session_id="s1")]
+
+                # Would wait forever for the slot if the first stream still held it
+                chunks = await asyncio.wait_for(continuation(), timeout=5)
+                assert chunks[-1].is_done
@@ -0,0 +1,216 @@
+"""Tests for the provider request scheduler."""
+import asyncio
+
+import pytest
+
+from core.config import settings
+from services.provider_scheduler import (
+    ProviderScheduler,
+    TokenBucket,
+    parse_reset_duration,
+    parse_retry_after,
+)
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Small limits for predictable scheduling."""
+    monkeypatch.setattr(settings, "provider_max_concurrency", 1)
+    monkeypatch.setattr(settings, "model_max_concurrency", 0)
+    monkeypatch.setattr(settings, "provider_requests_per_minute", 0)
+    monkeypatch.setattr(settings, "ollama_max_concurrency", 1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestParsing:
+    """Rate limit header values."""
+
+    def test_reset_durations(self):
+        assert parse_reset_duration("20ms") == pytest.approx(0.02)
+        assert parse_reset_duration("1.5s") == 1.5
+        assert parse_reset_duration("6m0s") == 360
+        assert parse_reset_duration("7") == 7
+        assert parse_reset_duration("soon") is None
+        assert parse_reset_duration(None) is None
+
+    def test_retry_after(self):
+        assert parse_retry_after({"retry-after": "3"}) == 3
+        assert parse_retry_after({"retry-after-ms": "250", "retry-after": "3"}) == 0.25
+        assert parse_retry_after({}) is None
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket."""
+
+    def test_unlimited_until_headers(self):
+        bucket = TokenBucket(clock=FakeClock())
+        for _ in range(100):
+            assert bucket.wait_time() == 0
+            bucket.take()
+
+    def test_limits_and_refills(self):
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)
+        for _ in range(60):
+            bucket.take()
+        assert bucket.wait_time() == pytest.approx(1.0)
+        clock.now += 1
+        assert bucket.wait_time() == 0
+
+    def test_headers_set_limit_and_remaining(self):
+        bucket = TokenBucket(clock=FakeClock())
+        bucket.update_from_headers({
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "499",
+        })
+        assert bucket.capacity == 500
+        assert bucket.tokens == 499
+
+    def test_exhausted_pauses_until_reset(self):
+        clock = FakeClock()
+        bucket = TokenBucket(clock=clock)
+        bucket.update_from_headers({
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "2s",
+        })
+        assert bucket.wait_time() == pytest.approx(2.0)
+
+    def test_invalid_headers_ignored(self):
+        bucket = TokenBucket(clock=FakeClock())
+        bucket.update_from_headers({"x-ratelimit-remaining-requests": "many"})
+        assert bucket.capacity is None
+
+
+class TestProviderScheduler:
+    """Test cases for ProviderScheduler."""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self, limits):
+        scheduler = ProviderScheduler()
+        running = 0
+        peak = 0
+
+        async def request():
+            nonlocal running, peak
+            async with scheduler.slot("openai", "m"):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(request() for _ in range(4)))
+        assert peak == 1
+        assert scheduler.stats()["openai"]["active"] == 0
+
+    @pytest.mark.asyncio
+    async def test_fair_across_sessions(self, limits):
+        """A session with many requests does not starve the others."""
+        scheduler = ProviderScheduler()
+        order = []
+        gate = asyncio.Event()
+
+        async def request(session_id, name):
+            async with scheduler.slot("openai", "m", session_id):
+                order.append(name)
+                await gate.wait()
+
+        first = asyncio.create_task(request("busy", "busy-0"))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(request("busy", f"busy-{i}")) for i in (1, 2, 3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("other", "other-0")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        assert order[:3] == ["busy-0", "busy-1", "other-0"]
+
+    @pytest.mark.asyncio
+    async def test_queue_position_reported(self, limits):
+        scheduler = ProviderScheduler()
+        gate = asyncio.Event()
+        positions = []
+
+        async def holder():
+            async with scheduler.slot("ollama", "llama3", "a"):
+                await gate.wait()
+
+        async def report(position):
+            positions.append(position)
+
+        async def waiter():
+            async with scheduler.slot("ollama", "llama3", "b", report):
+                pass
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        assert positions == [1]
+        gate.set()
+        await asyncio.gather(held, waiting)
+
+    @pytest.mark.asyncio
+    async def test_per_model_cap(self, limits, monkeypatch):
+        """A model at its cap does not block other models."""
+        monkeypatch.setattr(settings, "provider_max_concurrency", 4)
+        monkeypatch.setattr(settings, "model_max_concurrency", 1)
+        scheduler = ProviderScheduler()
+        gate = asyncio.Event()
+        started = []
+
+        async def request(session_id, model):
+            async with scheduler.slot("openai", model, session_id):
+                started.append(model)
+                await gate.wait()
+
+        tasks = [
+            asyncio.create_task(request("a", "big")),
+            asyncio.create_task(request("b", "big")),
+            asyncio.create_task(request("c", "small")),
+        ]
+        await asyncio.sleep(0.01)
+        assert sorted(started) == ["big", "small"]
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert started == ["big", "small", "big"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self, limits):
+        scheduler = ProviderScheduler()
+        gate = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("openai", "m", "a"):
+                await gate.wait()
+
+        held = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        assert scheduler.stats()["openai"]["queued"] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.stats()["openai"]["queued"] == 0
+        gate.set()
+        await held
+        assert scheduler.stats()["openai"]["active"] == 0
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_provider_waits(self, limits, monkeypatch):
+        monkeypatch.setattr(settings, "provider_max_concurrency", 4)
+        scheduler = ProviderScheduler()
+        scheduler.record_rate_limited("openai", 0.05)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with scheduler.slot("openai", "m"):
+            pass
+        assert loop.time() - started >= 0.04
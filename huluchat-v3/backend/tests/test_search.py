@@ -0,0 +1,201 @@
+"""Tests for full-text session and message search."""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, text
+
+from api.sessions import SessionModel
+from models.schemas import MessageModel
+from models.search import search_tokens
+from services.search import (
+    build_match_query,
+    decode_cursor,
+    encode_cursor,
+    ensure_search_index,
+    search_sessions,
+)
+
+
+async def add_session(db, title="New Chat", folder_id=None, messages=()):
+    session = SessionModel(id=str(uuid.uuid4()), title=title, folder_id=folder_id)
+    db.add(session)
+    for content in messages:
+        db.add(MessageModel(id=str(uuid.uuid4()), session_id=session.id, role="user", content=content))
+    await db.commit()
+    return session
+
+
+class TestMatchQuery:
+    """Test cases for build_match_query() and cursors."""
+
+    def test_words_become_prefix_terms(self):
+        assert build_match_query('Pyth "tips" OR') == '"pyth"* "tips"* "or"*'
+
+    def test_cjk_runs_become_bigram_phrases(self):
+        assert build_match_query("引用回复 图") == '"引用 用回 回复" "图"*'
+        assert build_match_query("HuluChat引用") == '"huluchat"* "引用"'
+
+    def test_search_tokens(self):
+        assert search_tokens("HuluChat 引用回复") == "huluchat 引用 用回 回复 复"
+        assert search_tokens("图") == "图"
+        assert search_tokens(None) == ""
+
+    def test_no_words(self):
+        assert build_match_query("  ?!* ") is None
+
+    def test_cursor_round_trip(self):
+        assert decode_cursor(encode_cursor(-1.25, "abc")) == (-1.25, "abc")
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor")
+
+
+class TestSearchSessions:
+    """Test cases for search_sessions()."""
+
+    @pytest.mark.asyncio
+    async def test_title_and_content_matches(self, db_session):
+        both = await add_session(db_session, "Python tips", messages=["I like python a lot"])
+        content = await add_session(db_session, "Misc", messages=["pythonic code", "unrelated"])
+        await add_session(db_session, "Cooking", messages=["pasta"])
+
+        page = await search_sessions(db_session, "pyth")
+        hits = {hit.session_id: hit for hit in page.hits}
+        assert set(hits) == {both.id, content.id}
+        assert hits[both.id].in_title and hits[both.id].in_content
+        assert hits[both.id].title_highlight == "<mark>Python</mark> tips"
+        assert not hits[content.id].in_title
+        assert [m.snippet for m in hits[content.id].messages] == ["pythonic code"]
+        assert page.next_cursor is None
+
+    @pytest.mark.asyncio
+    async def test_highlight_escapes_content(self, db_session):
+        await add_session(db_session, messages=["<b>python</b> & more"])
+        message = (await search_sessions(db_session, "python")).hits[0].messages[0]
+        assert message.snippet == "<b>python</b> & more"
+        assert message.highlighted == "&lt;b&gt;<mark>python</mark>&lt;/b&gt; &amp; more"
+
+    @pytest.mark.asyncio
+    async def test_at_most_three_messages_per_session(self, db_session):
+        await add_session(db_session, messages=[f"python {i}" for i in range(5)])
+        hit = (await search_sessions(db_session, "python")).hits[0]
+        assert len(hit.messages) == 3
+
+    @pytest.mark.asyncio
+    async def test_cursor_pages(self, db_session):
+        for i in range(5):
+            await add_session(db_session, f"Chat {i}", messages=["python " * (i + 1) + "filler " * 10])
+
+        seen = []
+        cursor = None
+        while True:
+            page = await search_sessions(db_session, "python", limit=2, cursor=cursor)
+            seen.extend(hit.session_id for hit in page.hits)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        full = await search_sessions(db_session, "python")
+        assert seen == [hit.session_id for hit in full.hits]
+        assert len(seen) == 5
+        # More occurrences rank higher
+        assert [hit.score for hit in full.hits] == sorted(hit.score for hit in full.hits)
+
+    @pytest.mark.asyncio
+    async def test_folder_filter(self, db_session):
+        inside = await add_session(db_session, "python a", folder_id="f1")
+        await add_session(db_session, "python b")
+        page = await search_sessions(db_session, "python", folder_id="f1")
+        assert [hit.session_id for hit in page.hits] == [inside.id]
+
+    @pytest.mark.asyncio
+    async def test_date_filter(self, db_session):
+        await add_session(db_session, "python")
+        now = datetime.utcnow()
+        assert len((await search_sessions(db_session, "python", date_from=now - timedelta(days=1))).hits) == 1
+        assert (await search_sessions(db_session, "python", date_to=now - timedelta(days=1))).hits == []
+
+    @pytest.mark.asyncio
+    async def test_cjk_substring_matches(self, db_session):
+        quoted = await add_session(db_session, "引用回复功能", messages=["怎么使用引用回复功能？"])
+        other = await add_session(db_session, "闲聊", messages=["今天的回复很快", "用户引导"])
+
+        for query in ("引用", "回复功能", "用回", "能"):
+            page = await search_sessions(db_session, query)
+            assert [hit.session_id for hit in page.hits] == [quoted.id], query
+        hit = (await search_sessions(db_session, "引用回复")).hits[0]
+        assert hit.title_highlight == "<mark>引用回复</mark>功能"
+        assert hit.messages[0].highlighted == "怎么使用<mark>引用回复</mark>功能？"
+        # A single character matches anywhere in a run
+        assert {hit.session_id for hit in (await search_sessions(db_session, "用")).hits} == {
+            quoted.id, other.id,
+        }
+
+    @pytest.mark.asyncio
+    async def test_mixed_language_query(self, db_session):
+        both = await add_session(db_session, messages=["用Python写爬虫"])
+        await add_session(db_session, messages=["python only"])
+        page = await search_sessions(db_session, "python 爬虫")
+        assert [hit.session_id for hit in page.hits] == [both.id]
+        assert page.hits[0].messages[0].highlighted == "用<mark>Python</mark>写<mark>爬虫</mark>"
+
+    @pytest.mark.asyncio
+    async def test_index_follows_writes(self, db_session):
+        session = await add_session(db_session, "Chat", messages=["python"])
+
+        message = (await db_session.execute(
+            text("SELECT id FROM messages WHERE session_id = :s"), {"s": session.id}
+        )).scalar_one()
+        await db_session.execute(
+            text("UPDATE messages SET content = 'rust' WHERE id = :id"), {"id": message}
+        )
+        session.title = "Golang"
+        await db_session.commit()
+        assert (await search_sessions(db_session, "python")).hits == []
+        assert len((await search_sessions(db_session, "rust")).hits) == 1
+        assert (await search_sessions(db_session, "golang")).hits[0].in_title
+
+        await db_session.execute(delete(MessageModel))
+        await db_session.commit()
+        assert (await search_sessions(db_session, "rust")).hits == []
+
+    @pytest.mark.asyncio
+    async def test_renumbered_rowids_are_reindexed(self, db_session):
+        """A stale index (e.g. after VACUUM renumbered rowids) is rebuilt."""
+        session = await add_session(db_session, "Chat", messages=["python"])
+        assert await ensure_search_index(db_session) == []
+
+        # Like a VACUUM: same rows, new rowids, index untouched
+        await db_session.execute(text("UPDATE messages SET rowid = rowid + 1000"))
+        await db_session.commit()
+        assert (await search_sessions(db_session, "python")).hits == []
+
+        assert await ensure_search_index(db_session) == ["messages"]
+        page = await search_sessions(db_session, "python")
+        assert [hit.session_id for hit in page.hits] == [session.id]
+        assert await ensure_search_index(db_session) == []
+
+
+class TestSearchAPI:
+    """Test cases for GET /api/sessions/search/."""
+
+    @pytest.mark.asyncio
+    async def test_results_and_cursor_header(self, client, db_session):
+        for i in range(3):
+            await add_session(db_session, f"Python {i}", messages=[f"python message {i}"])
+
+        response = await client.get("/api/sessions/search/", params={"q": "python", "limit": 2})
+        assert response.status_code == 200
+        first = response.json()
+        assert len(first) == 2
+        assert first[0]["match_type"] == "both"
+        assert first[0]["matched_messages"][0]["highlighted_snippet"].startswith("<mark>python</mark>")
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = await client.get("/api/sessions/search/", params={"q": "python", "cursor": cursor})
+        assert len(response.json()) == 1
+        assert "X-Next-Cursor" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client):
+        response = await client.get("/api/sessions/search/", params={"q": "python", "cursor": "!!"})
+        assert response.status_code == 400
@@ -54,6 +54,101 @@ class TestSessionsList:
         assert data["sessions"][0]["source"] == "main"
 
 
+class TestSessionsListCursor:
+    """Test cases for cursor pages of the session list."""
+
+    async def add_sessions(self, db_session, count):
+        from datetime import datetime, timedelta
+
+        from api.sessions import SessionModel
+
+        base = datetime(2026, 1, 1)
+        for i in range(count):
+            # Pairs of sessions share updated_at; the id breaks the tie
+            stamp = base + timedelta(minutes=i // 2)
+            db_session.add(SessionModel(id=f"s{i}", title=f"Chat {i}", created_at=stamp, updated_at=stamp))
+        await db_session.commit()
+
+    @pytest.mark.asyncio
+    async def test_pages_in_both_directions(self, client: AsyncClient, db_session):
+        await self.add_sessions(db_session, 5)
+
+        first = (await client.get("/api/sessions/", params={"limit": 2})).json()
+        assert [s["id"] for s in first["sessions"]] == ["s4", "s3"]
+        assert first["has_more"] and first["prev_cursor"] is None
+
+        seen = [s["id"] for s in first["sessions"]]
+        page = first
+        while page["next_cursor"]:
+            page = (await client.get("/api/sessions/", params={
+                "limit": 2, "after": page["next_cursor"], "include_total": False,
+            })).json()
+            assert page["total"] is None
+            seen.extend(s["id"] for s in page["sessions"])
+        assert seen == ["s4", "s3", "s2", "s1", "s0"]
+        assert page["has_more"] is False
+
+        back = (await client.get("/api/sessions/", params={"limit": 2, "before": page["prev_cursor"]})).json()
+        assert [s["id"] for s in back["sessions"]] == ["s2", "s1"]
+
+    @pytest.mark.asyncio
+    async def test_offset_still_supported(self, client: AsyncClient, db_session):
+        await self.add_sessions(db_session, 3)
+        data = (await client.get("/api/sessions/", params={"limit": 1, "offset": 1})).json()
+        assert [s["id"] for s in data["sessions"]] == ["s1"]
+        assert data["has_more"] and data["total"] == 3
+        rest = (await client.get("/api/sessions/", params={"after": data["next_cursor"]})).json()
+        assert [s["id"] for s in rest["sessions"]] == ["s0"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client: AsyncClient):
+        response = await client.get("/api/sessions/", params={"after": "not-a-cursor"})
+        assert response.status_code == 400
+
+
+class TestSessionSummary:
+    """Summary columns kept current by the session summary triggers."""
+
+    async def summary(self, client: AsyncClient, session_id: str) -> dict:
+        sessions = (await client.get("/api/sessions/")).json()["sessions"]
+        return next(s for s in sessions if s["id"] == session_id)
+
+    @pytest.mark.asyncio
+    async def test_follows_message_writes(self, client: AsyncClient, db_session):
+        from sqlalchemy import delete, update
+
+        from models.schemas import MessageModel
+        from models.session_summary import PREVIEW_CHARS
+
+        session_id = (await client.post("/api/sessions/", json={"source": "main"})).json()["id"]
+        assert (await self.summary(client, session_id))["message_count"] == 0
+
+        db_session.add(MessageModel(id="u1", session_id=session_id, role="user", content="question"))
+        db_session.add(MessageModel(
+            id="a1", session_id=session_id, role="assistant", content="x" * 500, model_id="gpt-4o",
+        ))
+        db_session.add(MessageModel(id="u2", session_id=session_id, role="user", content="follow-up"))
+        await db_session.commit()
+        summary = await self.summary(client, session_id)
+        assert summary["message_count"] == 3
+        assert summary["last_message_preview"] == "follow-up"
+        # A user message keeps the model of the last reply
+        assert summary["last_model_id"] == "gpt-4o"
+
+        # Truncation after the first message, as regenerate does
+        await db_session.execute(delete(MessageModel).where(MessageModel.seq > 1))
+        await db_session.commit()
+        summary = await self.summary(client, session_id)
+        assert summary["message_count"] == 1
+        assert summary["last_message_preview"] == "question"
+        assert summary["last_model_id"] is None
+
+        await db_session.execute(update(MessageModel).where(MessageModel.id == "u1").values(content="y" * 500))
+        await db_session.commit()
+        summary = await self.summary(client, session_id)
+        assert summary["last_message_preview"] == "y" * PREVIEW_CHARS
+
+
 class TestSessionCreate:
     """Test cases for creating sessions."""
 
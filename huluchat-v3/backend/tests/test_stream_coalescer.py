@@ -0,0 +1,90 @@
+"""Tests for WebSocket stream chunk coalescing."""
+import asyncio
+
+import pytest
+
+from services.stream_coalescer import CoalesceConfig, StreamCoalescer, MAX_WINDOW_MS
+
+
+class FrameRecorder:
+    """Collects frames sent by a coalescer."""
+
+    def __init__(self):
+        self.frames: list[dict] = []
+
+    async def __call__(self, data: dict) -> None:
+        self.frames.append(data)
+
+
+class TestCoalesceConfig:
+    """Test cases for CoalesceConfig."""
+
+    def test_updated_applies_client_values(self):
+        """Valid client values override the defaults."""
+        config = CoalesceConfig(window_ms=30, max_bytes=1024).updated(
+            {"coalesce_ms": 16, "coalesce_bytes": 256}
+        )
+        assert config.window_ms == 16
+        assert config.max_bytes == 256
+
+    def test_updated_clamps_and_ignores_invalid_values(self):
+        """Out-of-range values are clamped, invalid ones ignored."""
+        base = CoalesceConfig(window_ms=30, max_bytes=1024)
+        assert base.updated({"coalesce_ms": 10_000}).window_ms == MAX_WINDOW_MS
+        assert base.updated({"coalesce_ms": -5}).window_ms == 0
+        assert base.updated({"coalesce_ms": "fast"}).window_ms == 30
+
+    def test_zero_window_disables(self):
+        """A zero window disables coalescing."""
+        assert not CoalesceConfig(window_ms=0).enabled
+
+
+class TestStreamCoalescer:
+    """Test cases for StreamCoalescer."""
+
+    @pytest.mark.asyncio
+    async def test_disabled_sends_every_chunk(self):
+        """With coalescing disabled every chunk is its own frame."""
+        recorder = FrameRecorder()
+        coalescer = StreamCoalescer(recorder, CoalesceConfig(window_ms=0))
+        await coalescer.add("a")
+        await coalescer.add("b")
+        assert [f["content"] for f in recorder.frames] == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_byte_threshold(self):
+        """Reaching the byte threshold flushes immediately."""
+        recorder = FrameRecorder()
+        coalescer = StreamCoalescer(recorder, CoalesceConfig(window_ms=1000, max_bytes=4))
+        await coalescer.add("ab")
+        assert recorder.frames == []
+        await coalescer.add("cd")
+        assert recorder.frames == [{"type": "stream_chunk", "content": "abcd"}]
+        await coalescer.aclose()
+
+    @pytest.mark.asyncio
+    async def test_flushes_on_time_window(self):
+        """Buffered text is sent once the window elapses."""
+        recorder = FrameRecorder()
+        coalescer = StreamCoalescer(recorder, CoalesceConfig(window_ms=10, max_bytes=1024))
+        await coalescer.add("hel")
+        await coalescer.add("lo")
+        await asyncio.sleep(0.05)
+        assert recorder.frames == [{"type": "stream_chunk", "content": "hello"}]
+        assert coalescer.chunks_in == 2
+        assert coalescer.frames_out == 1
+
+    @pytest.mark.asyncio
+    async def test_events_flush_pending_text_first(self):
+        """stream_end is never sent ahead of buffered text."""
+        recorder = FrameRecorder()
+        coalescer = StreamCoalescer(recorder, CoalesceConfig(window_ms=1000, max_bytes=1024))
+        await coalescer.add("partial")
+        await coalescer.send_event({"type": "stream_end"})
+        assert recorder.frames == [
+            {"type": "stream_chunk", "content": "partial"},
+            {"type": "stream_end"},
+        ]
+        # Timer was cancelled, nothing else arrives later
+        await asyncio.sleep(0.01)
+        assert len(recorder.frames) == 2
@@ -0,0 +1,76 @@
+"""Tests for provider stream deadlines."""
+import asyncio
+
+import pytest
+
+from services.openai_service import StreamChunk
+from services.stream_guard import StreamStalled, guard_stream
+
+
+async def scripted(steps, closed):
+    """Yield content chunks, sleeping for numeric steps; "queued"/"granted" signal the slot."""
+    try:
+        for step in steps:
+            if isinstance(step, (int, float)):
+                await asyncio.sleep(step)
+            elif step in ("queued", "granted"):
+                yield StreamChunk(waiting_for_slot=step == "queued")
+            else:
+                yield StreamChunk(content=step)
+        yield StreamChunk(is_done=True)
+    finally:
+        closed.append(True)
+
+
+class TestGuardStream:
+    """Test cases for guard_stream()."""
+
+    @pytest.mark.asyncio
+    async def test_passes_chunks_through(self):
+        closed = []
+        chunks = [c async for c in guard_stream(scripted(["a", "b"], closed), 1, 1)]
+        assert [c.content for c in chunks] == ["a", "b", ""]
+        assert chunks[-1].is_done
+        assert closed
+
+    @pytest.mark.asyncio
+    async def test_first_token_deadline(self):
+        closed = []
+        with pytest.raises(StreamStalled) as exc:
+            async for _ in guard_stream(scripted([1, "late"], closed), 0.02, 1):
+                pass
+        assert exc.value.first_token is True
+        assert closed
+
+    @pytest.mark.asyncio
+    async def test_stall_deadline_after_first_token(self):
+        closed = []
+        received = []
+        with pytest.raises(StreamStalled) as exc:
+            async for chunk in guard_stream(scripted(["a", 1, "b"], closed), 1, 0.02):
+                received.append(chunk.content)
+        assert received == ["a"]
+        assert exc.value.first_token is False
+        assert closed
+
+    @pytest.mark.asyncio
+    async def test_zero_disables_deadline(self):
+        closed = []
+        chunks = [c async for c in guard_stream(scripted([0.02, "a"], closed), 0, 0)]
+        assert chunks[0].content == "a"
+
+    @pytest.mark.asyncio
+    async def test_no_deadline_while_queued_for_slot(self):
+        """Waiting for a provider slot is not a first-token stall."""
+        closed = []
+        steps = ["queued", 0.1, "granted", "a"]
+        chunks = [c async for c in guard_stream(scripted(steps, closed), 0.05, 1)]
+        assert [c.content for c in chunks] == ["a", ""]
+
+    @pytest.mark.asyncio
+    async def test_first_token_deadline_starts_when_slot_granted(self):
+        closed = []
+        with pytest.raises(StreamStalled) as exc:
+            async for _ in guard_stream(scripted(["queued", "granted", 1, "late"], closed), 0.02, 1):
+                pass
+        assert exc.value.first_token is True
@@ -0,0 +1,86 @@
+"""Tests for the resumable stream registry."""
+import asyncio
+
+import pytest
+
+from services.stream_registry import GenerationStream, StreamRegistry
+
+
+def _chunk(content: str) -> dict:
+    return {"type": "stream_chunk", "content": content}
+
+
+class TestGenerationStream:
+    """Test cases for GenerationStream."""
+
+    def test_publish_stamps_sequence_numbers(self):
+        """Events get the stream id and increasing seq numbers."""
+        generation = GenerationStream("s1", buffer_size=8)
+        first = generation.publish({"type": "stream_start"})
+        second = generation.publish(_chunk("a"))
+        assert (first["seq"], second["seq"]) == (1, 2)
+        assert first["stream_id"] == generation.stream_id
+        assert generation.content == "a"
+
+    def test_events_after_returns_missed_events(self):
+        """Only events newer than last_seq are replayed."""
+        generation = GenerationStream("s1", buffer_size=8)
+        for content in ("a", "b", "c"):
+            generation.publish(_chunk(content))
+        assert [e["content"] for e in generation.events_after(1)] == ["b", "c"]
+        assert generation.events_after(3) == []
+
+    def test_events_after_reports_gap(self):
+        """Evicted events cannot be replayed; a resync is needed."""
+        generation = GenerationStream("s1", buffer_size=2)
+        for content in ("a", "b", "c", "d"):
+            generation.publish(_chunk(content))
+        assert generation.events_after(1) is None
+        assert [e["content"] for e in generation.events_after(2)] == ["c", "d"]
+        resync = generation.resync_event()
+        assert resync["type"] == "stream_resync"
+        assert resync["content"] == "abcd"
+        assert resync["seq"] == 4
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_task(self):
+        """cancel() flags the generation and cancels the provider task."""
+        generation = GenerationStream("s1", buffer_size=8)
+        generation.task = asyncio.create_task(asyncio.sleep(60))
+        generation.cancel()
+        await asyncio.wait({generation.task})
+        assert generation.cancel_requested
+        assert generation.task.cancelled()
+
+
+class TestStreamRegistry:
+    """Test cases for StreamRegistry."""
+
+    def test_active_for_session(self):
+        """The unfinished generation of a session is found; finished ones are not."""
+        registry = StreamRegistry(buffer_size=8, retention_seconds=0)
+        generation = registry.create("s1")
+        assert registry.active_for_session("s1") is generation
+        assert registry.active_for_session("s2") is None
+        registry.finish(generation)
+        assert registry.active_for_session("s1") is None
+        assert registry.get(generation.stream_id) is None
+
+    def test_detach_session(self):
+        """Detaching stops live forwarding for a session's generations."""
+        registry = StreamRegistry(buffer_size=8, retention_seconds=0)
+        generation = registry.create("s1")
+        other = registry.create("s2")
+        registry.detach_session("s1")
+        assert generation.attached is False
+        assert other.attached is True
+
+    @pytest.mark.asyncio
+    async def test_finished_generation_is_retained(self):
+        """Finished generations stay resumable for the retention period."""
+        registry = StreamRegistry(buffer_size=8, retention_seconds=0.01)
+        generation = registry.create("s1")
+        registry.finish(generation)
+        assert registry.get(generation.stream_id) is generation
+        await asyncio.sleep(0.05)
+        assert len(registry) == 0
@@ -0,0 +1,130 @@
+"""Tests for per-turn tracing."""
+import asyncio
+import json
+import logging
+
+import pytest
+
+from services import tracing
+from services.tracing import TraceRecorder, current_trace, span
+
+
+class TestSpans:
+    """Spans of a traced turn."""
+
+    def test_span_outside_turn_is_noop(self):
+        assert current_trace() is None
+        with span("load_history") as s:
+            s.set(messages=3)
+        assert span("other") is span("load_history")
+
+    def test_spans_recorded_in_order(self):
+        recorder = TraceRecorder(size=10)
+        with recorder.turn("s1") as trace:
+            with span("save_user_message"):
+                pass
+            with span("load_history") as s:
+                s.set(messages=4)
+        assert current_trace() is None
+
+        assert [s.name for s in trace.spans] == ["save_user_message", "load_history"]
+        assert trace.spans[1].attributes == {"messages": 4}
+        assert trace.spans[1].start >= trace.spans[0].start
+        assert all(s.duration is not None for s in trace.spans)
+        assert recorder.get(trace.trace_id) is trace
+
+    def test_failed_span_keeps_error(self):
+        recorder = TraceRecorder(size=10)
+        with pytest.raises(RuntimeError):
+            with recorder.turn("s1") as trace:
+                with span("provider_stream"):
+                    raise RuntimeError("boom")
+        assert trace.spans[0].attributes["error"] == "RuntimeError"
+        # Failed turns are still kept
+        assert recorder.recent() == [trace]
+
+    @pytest.mark.asyncio
+    async def test_tasks_inherit_the_trace(self):
+        recorder = TraceRecorder(size=10)
+
+        async def tool_call():
+            with span("tool_call"):
+                await asyncio.sleep(0)
+
+        with recorder.turn("s1") as trace:
+            await asyncio.create_task(tool_call())
+        assert [s.name for s in trace.spans] == ["tool_call"]
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setattr(tracing.settings, "chat_tracing_enabled", False)
+        recorder = TraceRecorder(size=10)
+        with recorder.turn("s1") as trace:
+            assert trace is None
+            assert span("load_history") is tracing._NOOP_SPAN
+        assert recorder.recent() == []
+
+
+class TestTraceRecorder:
+    """Buffering and slow turn logging."""
+
+    def test_buffer_is_bounded_and_newest_first(self):
+        recorder = TraceRecorder(size=2)
+        ids = []
+        for session_id in ("a", "b", "c"):
+            with recorder.turn(session_id) as trace:
+                ids.append(trace.trace_id)
+        assert [t.trace_id for t in recorder.recent()] == [ids[2], ids[1]]
+        assert recorder.get(ids[0]) is None
+
+    def test_slow_turns_logged_as_json(self, monkeypatch, caplog, tmp_path):
+        log_file = tmp_path / "slow.jsonl"
+        monkeypatch.setattr(tracing.settings, "chat_trace_slow_seconds", 0.000001)
+        monkeypatch.setattr(tracing.settings, "chat_trace_log_file", str(log_file))
+        recorder = TraceRecorder(size=10)
+        try:
+            with caplog.at_level(logging.WARNING, logger="huluchat.slow_turns"):
+                with recorder.turn("s1") as trace:
+                    trace.set(model="gpt-4o")
+                    with span("provider_stream"):
+                        pass
+        finally:
+            tracing.slow_turn_logger.removeHandler(recorder._file_handler)
+            recorder._file_handler.close()
+
+        logged = json.loads(caplog.records[-1].getMessage())
+        assert logged["trace_id"] == trace.trace_id
+        assert logged["attributes"] == {"model": "gpt-4o"}
+        assert logged["spans"][0]["name"] == "provider_stream"
+        assert json.loads(log_file.read_text().splitlines()[0])["trace_id"] == trace.trace_id
+
+    def test_fast_turns_not_logged(self, monkeypatch, caplog):
+        monkeypatch.setattr(tracing.settings, "chat_trace_slow_seconds", 60.0)
+        recorder = TraceRecorder(size=10)
+        with caplog.at_level(logging.WARNING, logger="huluchat.slow_turns"):
+            with recorder.turn("s1"):
+                pass
+        assert caplog.records == []
+
+
+class TestDebugAPI:
+    """Test cases for /api/debug/traces."""
+
+    @pytest.mark.asyncio
+    async def test_list_and_get(self, client, monkeypatch):
+        recorder = TraceRecorder(size=10)
+        monkeypatch.setattr("api.debug.trace_recorder", recorder)
+        with recorder.turn("s1") as first:
+            pass
+        with recorder.turn("s2") as second:
+            pass
+
+        listed = (await client.get("/api/debug/traces")).json()
+        assert listed["enabled"] is True
+        assert [t["trace_id"] for t in listed["traces"]] == [second.trace_id, first.trace_id]
+
+        only_s1 = (await client.get("/api/debug/traces", params={"session_id": "s1"})).json()
+        assert [t["trace_id"] for t in only_s1["traces"]] == [first.trace_id]
+
+        response = await client.get(f"/api/debug/traces/{first.trace_id}")
+        assert response.json()["session_id"] == "s1"
+        assert (await client.get("/api/debug/traces/missing")).status_code == 404
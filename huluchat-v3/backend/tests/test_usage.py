@@ -0,0 +1,152 @@
+"""Tests for usage capture and aggregation."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from models.usage import MessageUsageModel
+from services.openai_service import TokenUsage
+from services.usage import aggregate_usage, estimate_cost, record_usage
+
+
+async def add_usage(db, model_id, session_id="s1", prompt=100, completion=50,
+                    first_token=0.5, total=1.5, created_at=None):
+    row = await record_usage(
+        db,
+        message_id=f"m-{model_id}-{session_id}-{prompt}",
+        session_id=session_id,
+        model_id=model_id,
+        status="complete",
+        usage=TokenUsage(prompt, completion),
+        first_token_seconds=first_token,
+        total_seconds=total,
+    )
+    if created_at is not None:
+        row.created_at = created_at
+        await db.commit()
+    return row
+
+
+class TestEstimateCost:
+    """Test cases for estimate_cost()."""
+
+    def test_known_model(self):
+        assert estimate_cost("gpt-4o-mini", 1_000_000, 1_000_000) == pytest.approx(0.75)
+
+    def test_local_and_unknown_models(self):
+        assert estimate_cost("ollama:llama3", 1000, 1000) == 0.0
+        assert estimate_cost("my-custom-model", 1000, 1000) is None
+
+
+class TestRecordUsage:
+    """Test cases for record_usage()."""
+
+    @pytest.mark.asyncio
+    async def test_reported_usage(self, db_session):
+        row = await add_usage(db_session, "gpt-4o", prompt=1000, completion=200)
+        assert row.provider == "openai"
+        assert row.estimated is False
+        assert row.cost == pytest.approx((1000 * 2.5 + 200 * 10) / 1_000_000)
+
+    @pytest.mark.asyncio
+    async def test_missing_usage_is_estimated(self, db_session):
+        await record_usage(
+            db_session,
+            message_id="m1",
+            session_id="s1",
+            model_id="ollama:llama3",
+            status="complete",
+            usage=None,
+            first_token_seconds=None,
+            total_seconds=2.0,
+            messages=[{"role": "user", "content": "abcdefgh"}],
+            content="abcd",
+        )
+        row = (await db_session.execute(select(MessageUsageModel))).scalar_one()
+        assert row.estimated is True
+        assert row.provider == "ollama"
+        assert row.prompt_tokens == 6  # 4 overhead + 2
+        assert row.completion_tokens == 1
+
+
+class TestAggregateUsage:
+    """Test cases for aggregate_usage()."""
+
+    @pytest.mark.asyncio
+    async def test_by_model(self, db_session):
+        await add_usage(db_session, "gpt-4o", prompt=100, completion=100, first_token=1.0, total=2.0)
+        await add_usage(db_session, "gpt-4o", session_id="s2", prompt=300, completion=100, first_token=1.0, total=3.0)
+        await add_usage(db_session, "ollama:llama3", prompt=10, completion=10)
+
+        items = await aggregate_usage(db_session, "model")
+        assert [i.key for i in items] == ["gpt-4o", "ollama:llama3"]
+        gpt = items[0]
+        assert gpt.requests == 2
+        assert gpt.prompt_tokens == 400
+        assert gpt.total_tokens == 600
+        assert gpt.avg_first_token_seconds == pytest.approx(1.0)
+        # 200 completion tokens over 1s + 2s of generation
+        assert gpt.tokens_per_second == pytest.approx(200 / 3)
+        assert items[1].cost == 0.0
+
+    @pytest.mark.asyncio
+    async def test_by_day_and_since(self, db_session):
+        now = datetime.utcnow()
+        await add_usage(db_session, "gpt-4o", prompt=1, created_at=now - timedelta(days=40))
+        await add_usage(db_session, "gpt-4o", prompt=2, created_at=now - timedelta(days=1))
+        await add_usage(db_session, "gpt-4o", prompt=3, created_at=now)
+
+        items = await aggregate_usage(db_session, "day", since=now - timedelta(days=30))
+        assert [i.key for i in items] == [
+            (now - timedelta(days=1)).date().isoformat(),
+            now.date().isoformat(),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_by_session_filtered_by_model(self, db_session):
+        await add_usage(db_session, "gpt-4o", session_id="a", prompt=10)
+        await add_usage(db_session, "gpt-4o", session_id="b", prompt=500)
+        await add_usage(db_session, "gpt-4o-mini", session_id="c", prompt=900)
+
+        items = await aggregate_usage(db_session, "session", model_id="gpt-4o")
+        assert [i.key for i in items] == ["b", "a"]
+
+    @pytest.mark.asyncio
+    async def test_unknown_group(self, db_session):
+        with pytest.raises(ValueError):
+            await aggregate_usage(db_session, "user")
+
+
+class TestUsageAPI:
+    """Test cases for the /api/usage endpoints."""
+
+    @pytest.mark.asyncio
+    async def test_endpoints(self, client, db_session):
+        await add_usage(db_session, "gpt-4o", session_id="s1")
+        await add_usage(db_session, "deepseek-chat", session_id="s2", prompt=1000)
+
+        models = (await client.get("/api/usage/models")).json()
+        assert models["group_by"] == "model"
+        assert [i["key"] for i in models["items"]] == ["deepseek-chat", "gpt-4o"]
+
+        daily = (await client.get("/api/usage/daily", params={"model": "gpt-4o"})).json()
+        assert len(daily["items"]) == 1
+        assert daily["items"][0]["requests"] == 1
+
+        sessions = (await client.get("/api/usage/sessions", params={"limit": 1})).json()
+        assert [i["key"] for i in sessions["items"]] == ["s2"]
+
+    @pytest.mark.asyncio
+    async def test_days_window(self, client, db_session):
+        """Omitting days covers all time; days limits the window."""
+        now = datetime.utcnow()
+        await add_usage(db_session, "gpt-4o", prompt=1, created_at=now - timedelta(days=400))
+        await add_usage(db_session, "gpt-4o", prompt=2)
+
+        all_time = (await client.get("/api/usage/models")).json()
+        assert all_time["since"] is None
+        assert all_time["items"][0]["requests"] == 2
+
+        recent = (await client.get("/api/usage/models", params={"days": 30})).json()
+        assert recent["since"] is not None
+        assert recent["items"][0]["requests"] == 1
@@ -0,0 +1,171 @@
+"""Tests for the per-connection outbound WebSocket queue."""
+import asyncio
+
+import pytest
+
+from api.chat import ConnectionManager
+from services.stream_registry import GenerationStream
+from services.ws_outbound import OutboundQueue
+
+
+def _chunk(content: str) -> dict:
+    return {"type": "stream_chunk", "content": content}
+
+
+class FakeWebSocket:
+    """Minimal WebSocket stand-in that records frames."""
+
+    def __init__(self, block: bool = False):
+        self.sent: list[dict] = []
+        self.accepted = False
+        self.closed_code = None
+        self._unblock = asyncio.Event()
+        if not block:
+            self._unblock.set()
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_json(self, data: dict):
+        await self._unblock.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed_code = code
+
+
+class TestOutboundQueue:
+    """Test cases for OutboundQueue."""
+
+    @pytest.mark.asyncio
+    async def test_fifo_order(self):
+        """Messages come out in the order they went in."""
+        queue = OutboundQueue(maxsize=4)
+        queue.put_nowait({"type": "stream_start"})
+        queue.put_nowait(_chunk("a"))
+        assert await queue.get() == {"type": "stream_start"}
+        assert await queue.get() == _chunk("a")
+        assert queue.sent == 2
+
+    def test_merges_text_deltas_when_full(self):
+        """A full queue merges a new text delta into the tail."""
+        queue = OutboundQueue(maxsize=2)
+        assert queue.put_nowait({"type": "stream_start"})
+        assert queue.put_nowait(_chunk("a"))
+        assert queue.put_nowait(_chunk("b"))
+        assert queue.depth == 2
+        assert queue.merged == 1
+        assert list(queue._items)[-1] == _chunk("ab")
+
+    def test_compacts_before_giving_up(self):
+        """Runs of text deltas are merged to make room for other events."""
+        queue = OutboundQueue(maxsize=3)
+        queue.put_nowait(_chunk("a"))
+        queue.put_nowait(_chunk("b"))
+        queue.put_nowait(_chunk("c"))
+        assert queue.put_nowait({"type": "stream_end"})
+        assert list(queue._items) == [_chunk("abc"), {"type": "stream_end"}]
+
+    def test_reports_overflow(self):
+        """A full queue with nothing to merge rejects the message."""
+        queue = OutboundQueue(maxsize=2)
+        queue.put_nowait({"type": "tool_call"})
+        queue.put_nowait({"type": "tool_call"})
+        assert queue.put_nowait({"type": "stream_end"}) is False
+
+    def test_merge_does_not_mutate_original(self):
+        """Merging copies the tail message."""
+        queue = OutboundQueue(maxsize=1)
+        original = _chunk("a")
+        queue.put_nowait(original)
+        queue.put_nowait(_chunk("b"))
+        assert original == _chunk("a")
+
+    @pytest.mark.asyncio
+    async def test_resume_after_merge_does_not_repeat_text(self):
+        """A merged delta carries the newest seq, so resuming from it replays nothing seen."""
+        generation = GenerationStream("s1", buffer_size=8)
+        queue = OutboundQueue(maxsize=2)
+        for content in ("a", "b", "c", "d"):
+            queue.put_nowait(generation.publish(_chunk(content)))
+        queue.put_nowait(generation.publish({"type": "stream_end"}))
+        queue.put_nowait(generation.publish(_chunk("e")))
+
+        received = [await queue.get() for _ in range(queue.depth)]
+        # Connection drops after the first frame; the client resumes from its seq
+        first = received[0]
+        replayed = generation.events_after(first["seq"])
+        text = first["content"] + "".join(e.get("content", "") for e in replayed)
+        assert text == "abcde"
+
+    def test_compact_keeps_newest_seq(self):
+        """Compacting a run of deltas keeps the seq of the last one."""
+        queue = OutboundQueue(maxsize=3)
+        for seq, content in enumerate(("a", "b", "c"), start=1):
+            queue.put_nowait({**_chunk(content), "seq": seq})
+        assert queue.put_nowait({"type": "stream_end", "seq": 4})
+        assert list(queue._items)[0] == {**_chunk("abc"), "seq": 3}
+
+    @pytest.mark.asyncio
+    async def test_get_returns_none_after_close(self):
+        """A closed, drained queue ends the writer loop."""
+        queue = OutboundQueue()
+        queue.close()
+        assert await queue.get() is None
+        assert queue.put_nowait(_chunk("late")) is False
+
+
+class TestConnectionManagerOutbound:
+    """Test cases for ConnectionManager writer tasks."""
+
+    @pytest.mark.asyncio
+    async def test_send_json_is_delivered_by_writer(self):
+        """Queued messages reach the socket in order."""
+        manager = ConnectionManager(queue_size=8)
+        ws = FakeWebSocket()
+        await manager.connect(ws, "s1")
+        await manager.send_json("s1", _chunk("a"))
+        await manager.send_json("s1", {"type": "stream_end"})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert ws.sent == [_chunk("a"), {"type": "stream_end"}]
+        manager.disconnect("s1")
+
+    @pytest.mark.asyncio
+    async def test_slow_client_does_not_block_sender(self):
+        """send_json returns immediately even when the socket is stuck."""
+        manager = ConnectionManager(queue_size=2)
+        ws = FakeWebSocket(block=True)
+        await manager.connect(ws, "s1")
+        for i in range(50):
+            await asyncio.wait_for(manager.send_json("s1", _chunk(str(i))), timeout=0.1)
+        metrics = manager.get_metrics()
+        assert metrics["connections"] == 1
+        assert metrics["max_queue_depth"] <= 2
+        assert metrics["merged_frames"] > 0
+        manager.disconnect("s1")
+
+    @pytest.mark.asyncio
+    async def test_overflow_disconnects_slow_client(self):
+        """A client whose queue overflows with unmergeable events is dropped."""
+        manager = ConnectionManager(queue_size=2)
+        ws = FakeWebSocket(block=True)
+        await manager.connect(ws, "s1")
+        for _ in range(4):
+            await manager.send_json("s1", {"type": "tool_call"})
+        await asyncio.sleep(0.01)
+        assert "s1" not in manager.active_connections
+        assert manager.slow_consumer_disconnects == 1
+        assert ws.closed_code == 1013
+
+    @pytest.mark.asyncio
+    async def test_stale_disconnect_keeps_new_connection(self):
+        """Disconnecting an old socket does not drop its replacement."""
+        manager = ConnectionManager()
+        old_ws, new_ws = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(old_ws, "s1")
+        await manager.connect(new_ws, "s1")
+        manager.disconnect("s1", old_ws)
+        assert manager.active_connections["s1"] is new_ws
+        manager.disconnect("s1", new_ws)
+        assert "s1" not in manager.active_connections
@@ -15,6 +15,7 @@ import {
   updateSettings,
   getModels,
   testConnection,
+  warmupOllamaModel,
   exportSession,
   listFolders,
   createFolder,
@@ -347,6 +348,34 @@ describe("API Client", () => {
     });
   });
 
+  describe("Ollama APIs", () => {
+    describe("warmupOllamaModel", () => {
+      it("should post to the settings warm-up route", async () => {
+        mockFetch.mockResolvedValueOnce({
+          ok: true,
+          json: () => Promise.resolve({ model: "llama3", loaded: true }),
+        });
+
+        const result = await warmupOllamaModel("llama3");
+
+        expect(mockFetch).toHaveBeenCalledWith("http://127.0.0.1:8765/api/settings/ollama/warmup", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ model: "llama3" }),
+        });
+        expect(result).toEqual({ model: "llama3", loaded: true });
+      });
+
+      it("should report not loaded when the request fails", async () => {
+        mockFetch.mockResolvedValueOnce({ ok: false });
+
+        const result = await warmupOllamaModel("llama3");
+
+        expect(result).toEqual({ model: "llama3", loaded: false });
+      });
+    });
+  });
+
   describe("Export API", () => {
     describe("exportSession", () => {
       it("should export session as markdown by default", async () => {
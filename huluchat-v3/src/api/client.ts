@@ -37,6 +37,12 @@ export interface Session {
   source: "main" | "quickpanel";  // Session source: main app or quickpanel
   created_at: string;
   updated_at: string;
+  // Summary of the messages, kept current by the backend
+  message_count?: number;
+  last_message_at?: string | null;
+  last_message_preview?: string | null;  // Start of the last message
+  last_model_id?: string | null;
+  total_tokens?: number;  // Prompt + completion tokens spent
 }
 
 // Folder types
@@ -79,6 +85,7 @@ export interface Message {
   regenerated_from?: string;  // Original message ID if this is a regenerated response
   regenerated_at?: string;  // When this message was regenerated
   created_at: string;
+  seq?: number;  // Position in the session (1, 2, ...)
 }
 
 // Search types
@@ -87,6 +94,8 @@ export interface MessageMatch {
   session_id: string;
   role: "user" | "assistant";
   content_snippet: string;
+  // HTML-escaped snippet with matches wrapped in <mark>
+  highlighted_snippet?: string | null;
   created_at: string;
 }
 
@@ -94,15 +103,21 @@ export interface SessionSearchResult {
   session: Session;
   matched_messages: MessageMatch[];
   match_type: "title" | "content" | "both";
+  // HTML-escaped title with matches wrapped in <mark>
+  title_highlight?: string | null;
+  // bm25 relevance, lower is better
+  score?: number | null;
 }
 
 // Paginated session list response
 export interface SessionListResponse {
   sessions: Session[];
-  total: number;
+  total: number | null; // null when requested with includeTotal: false
   limit: number;
   offset: number;
   has_more: boolean;
+  next_cursor?: string | null; // pass as `after` for the next (older) page
+  prev_cursor?: string | null; // pass as `before` for the previous (newer) page
 }
 
 /**
@@ -120,7 +135,10 @@ export async function healthCheck(): Promise<{ status: string; version: string }
 export interface ListSessionsOptions {
   source?: "main" | "quickpanel";
   limit?: number;  // Default: 50
-  offset?: number; // Default: 0
+  offset?: number; // Default: 0 (ignored with a cursor)
+  after?: string;  // next_cursor of the previous page
+  before?: string; // prev_cursor of the following page
+  includeTotal?: boolean; // Default: true
 }
 
 export async function listSessions(options?: ListSessionsOptions): Promise<SessionListResponse> {
@@ -134,6 +152,15 @@ export async function listSessions(options?: ListSessionsOptions): Promise<Sessi
   if (options?.offset !== undefined) {
     params.append("offset", options.offset.toString());
   }
+  if (options?.after) {
+    params.append("after", options.after);
+  }
+  if (options?.before) {
+    params.append("before", options.before);
+  }
+  if (options?.includeTotal === false) {
+    params.append("include_total", "false");
+  }
   const response = await fetch(`${API_BASE}/sessions/?${params.toString()}`);
   return response.json();
 }
@@ -320,17 +347,39 @@ export async function generateSessionTitle(sessionId: string): Promise<{ title:
   return response.json();
 }
 
+export interface MessagePageOptions {
+  after?: string;   // next_cursor: newer messages
+  before?: string;  // prev_cursor: older messages
+  latest?: boolean; // the newest `limit` messages
+}
+
+export interface MessagePage {
+  messages: Message[];
+  next_cursor?: string | null;
+  prev_cursor?: string | null;
+}
+
 /**
- * Get messages for a session
+ * Get messages for a session, oldest first
+ * Use { latest: true } for a chat view, then prev_cursor as `before` for older messages
  */
 export async function getSessionMessages(
   sessionId: string,
   limit: number = 50,
-  offset: number = 0
-): Promise<{ messages: Message[] }> {
-  const response = await fetch(
-    `${API_BASE}/chat/${sessionId}/messages?limit=${limit}&offset=${offset}`
-  );
+  offset: number = 0,
+  page?: MessagePageOptions
+): Promise<MessagePage> {
+  const params = new URLSearchParams({ limit: limit.toString(), offset: offset.toString() });
+  if (page?.after) {
+    params.append("after", page.after);
+  }
+  if (page?.before) {
+    params.append("before", page.before);
+  }
+  if (page?.latest) {
+    params.append("latest", "true");
+  }
+  const response = await fetch(`${API_BASE}/chat/${sessionId}/messages?${params.toString()}`);
   return response.json();
 }
 
@@ -666,6 +715,25 @@ export async function pullOllamaModel(name: string): Promise<{ status: string; d
   }
 }
 
+/**
+ * 预加载 Ollama 模型，避免首条消息等待模型加载
+ */
+export async function warmupOllamaModel(model: string): Promise<{ model: string; loaded: boolean }> {
+  try {
+    const response = await fetch(`${API_BASE}/settings/ollama/warmup`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ model }),
+    });
+    if (!response.ok) {
+      return { model, loaded: false };
+    }
+    return response.json();
+  } catch {
+    return { model, loaded: false };
+  }
+}
+
 /**
  * 测试 Ollama 连接
  */
@@ -10,6 +10,7 @@ vi.mock("@/api/client", () => ({
   getOllamaModels: vi.fn(),
   recordModelUsage: vi.fn(),
   getRecommendedModel: vi.fn(),
+  warmupOllamaModel: vi.fn(),
 }));
 
 const mockGetSettings = vi.mocked(
@@ -30,6 +31,9 @@ const mockRecordModelUsage = vi.mocked(
 const mockGetRecommendedModel = vi.mocked(
   await import("@/api/client").then((m) => m.getRecommendedModel)
 );
+const mockWarmupOllamaModel = vi.mocked(
+  await import("@/api/client").then((m) => m.warmupOllamaModel)
+);
 
 describe("useModel hook", () => {
   const mockOpenAIModels = [
@@ -62,6 +66,7 @@ describe("useModel hook", () => {
     mockGetOllamaModels.mockResolvedValue([]);
     mockRecordModelUsage.mockResolvedValue({ model_id: "", count: 1, last_used: null });
     mockGetRecommendedModel.mockResolvedValue({ model_id: null, reason: "No usage data available" });
+    mockWarmupOllamaModel.mockResolvedValue({ model: "", loaded: true });
   });
 
   afterEach(() => {
@@ -299,6 +304,25 @@ describe("useModel hook", () => {
       expect(result.current.getModelName()).toBe("Llama 3");
     });
 
+    it("should preload Ollama model when selected", async () => {
+      mockGetModels.mockResolvedValue(mockMixedModels);
+
+      const { result } = renderHook(() => useModel());
+
+      await waitFor(() => {
+        expect(result.current.isLoading).toBe(false);
+      });
+      expect(mockWarmupOllamaModel).not.toHaveBeenCalled();
+
+      act(() => {
+        result.current.setModel("ollama:llama3");
+      });
+
+      await waitFor(() => {
+        expect(mockWarmupOllamaModel).toHaveBeenCalledWith("ollama:llama3");
+      });
+    });
+
     it("should handle models with provider property", async () => {
       mockGetModels.mockResolvedValue(mockMixedModels);
 
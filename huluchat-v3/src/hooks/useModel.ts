@@ -11,6 +11,7 @@ import {
   getOllamaModels,
   recordModelUsage,
   getRecommendedModel,
+  warmupOllamaModel,
   type ModelInfo,
   type OllamaModel,
 } from "@/api/client";
@@ -171,6 +172,15 @@ export function useModel(): UseModelReturn {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  // 选中本地 Ollama 模型时预加载（不阻塞 UI）
+  useEffect(() => {
+    if (currentModel.startsWith("ollama:")) {
+      warmupOllamaModel(currentModel).catch(() => {
+        // Ignore warm-up errors
+      });
+    }
+  }, [currentModel]);
+
   // 设置模型并保存到 localStorage，同时记录使用情况
   const setModel = useCallback((modelId: string) => {
     // 检查模型是否在列表中
@@ -29,6 +29,7 @@ export function useSession(): UseSessionReturn {
   const [error, setError] = useState<string | null>(null);
   const [hasMore, setHasMore] = useState(false);
   const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   const refreshSessions = useCallback(async () => {
@@ -38,7 +39,8 @@ export function useSession(): UseSessionReturn {
       const data: SessionListResponse = await listSessions({ limit: DEFAULT_PAGE_SIZE, offset: 0 });
       setSessions(data.sessions);
       setHasMore(data.has_more);
-      setTotal(data.total);
+      setTotal(data.total ?? data.sessions.length);
+      setNextCursor(data.next_cursor ?? null);
     } catch (err) {
       setError(err instanceof Error ? err.message : "Failed to load sessions");
     } finally {
@@ -52,18 +54,21 @@ export function useSession(): UseSessionReturn {
     setIsLoadingMore(true);
     setError(null);
     try {
-      const data: SessionListResponse = await listSessions({
-        limit: DEFAULT_PAGE_SIZE,
-        offset: sessions.length
-      });
+      // Continue after the last loaded session; fall back to offset for older backends
+      const data: SessionListResponse = await listSessions(
+        nextCursor
+          ? { limit: DEFAULT_PAGE_SIZE, after: nextCursor, includeTotal: false }
+          : { limit: DEFAULT_PAGE_SIZE, offset: sessions.length }
+      );
       setSessions((prev) => [...prev, ...data.sessions]);
       setHasMore(data.has_more);
+      setNextCursor(data.next_cursor ?? null);
     } catch (err) {
       setError(err instanceof Error ? err.message : "Failed to load more sessions");
     } finally {
       setIsLoadingMore(false);
     }
-  }, [sessions.length, hasMore, isLoadingMore]);
+  }, [sessions.length, hasMore, isLoadingMore, nextCursor]);
 
   const selectSession = useCallback(async (id: string) => {
     setIsLoading(true);